@@ -0,0 +1,52 @@
+"""
+💾 CHECKPOINT AKTIVITY
+Ukládání a načítání checkpointů stage pro resume selhaných pipeline.
+"""
+
+from temporalio import activity
+
+from helpers.checkpoint_store import save_checkpoint, load_checkpoints
+
+
+@activity.defn
+async def save_stage_checkpoint(data: dict) -> str:
+    """
+    Uloží checkpoint dokončené stage.
+
+    Args:
+        data: {"workflow_id", "run_id", "checkpoint": {function_key, order, stage, input_hash, current_date, output, metadata}}
+    """
+    workflow_id = data.get("workflow_id")
+    run_id = data.get("run_id")
+    checkpoint = data.get("checkpoint") or {}
+
+    if not workflow_id or not run_id:
+        raise ValueError("❌ workflow_id a run_id jsou povinné pro uložení checkpointu")
+
+    filepath = save_checkpoint(workflow_id, run_id, checkpoint)
+    activity.logger.info(f"💾 Checkpoint uložen: {checkpoint.get('function_key')} -> {filepath}")
+    return filepath
+
+
+@activity.defn
+async def load_stage_checkpoints(data: dict) -> dict:
+    """
+    Načte checkpointy předchozího běhu.
+
+    Args:
+        data: {"workflow_id", "run_id"}
+
+    Returns:
+        {"checkpoints": {function_key: checkpoint}, "current_date": datum předchozího běhu}
+    """
+    workflow_id = data.get("workflow_id")
+    run_id = data.get("run_id")
+
+    if not workflow_id or not run_id:
+        raise ValueError("❌ workflow_id a run_id jsou povinné pro načtení checkpointů")
+
+    checkpoints = load_checkpoints(workflow_id, run_id)
+    current_date = next((cp.get("current_date") for cp in checkpoints.values() if cp.get("current_date")), None)
+
+    activity.logger.info(f"📂 Načteno {len(checkpoints)} checkpointů z běhu {workflow_id}/{run_id}")
+    return {"checkpoints": checkpoints, "current_date": current_date}
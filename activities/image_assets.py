@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+🖼️ IMAGE ASSET PIPELINE
+=======================
+
+Post-generation stage pro obrázky z ImageRenderer asistenta. Vygenerované
+FAL/DALL-E URL časem expirují (podepsané URL) a servírují se v plné velikosti
+1024×1024, takže se obrázky zpracují ještě před publishem:
+
+- stažení souběžně přes sdílený httpx klient (pool spojení, limit velikosti)
+- převod do WebP/AVIF ve více šířkách v process poolu (Pillow je CPU práce)
+- uložení podle obsahu: <dir>/<ab>/<sha256>/<šířka>.<formát> + asset.json
+  (stejný obrázek se podruhé nepřevádí)
+- výsledek pro publish: image_url, srcset, width/height a <source> varianty pro <picture>
+
+Bez Pillow nebo při chybě stažení zůstávají původní URL - stage publish neshodí.
+Bez veřejného asset hostu (base_url) se obrázky nepřevádí a články odkazují na
+původní URL - relativní cesta by na webu článku vedla na 404.
+
+Konfigurace přes ENV IMAGE_ASSETS (JSON):
+IMAGE_ASSETS='{"dir": "/srv/cdn/assets", "base_url": "https://cdn.seofarm.ai/assets", "widths": [480, 768, 1024], "formats": ["avif", "webp"]}'
+    dir          - úložiště, které asset host servíruje (sdílený svazek / synchronizovaný bucket)
+    base_url     - absolutní veřejná URL, pod kterou host servíruje dir (prázdná = pipeline vypnutá)
+    widths       - šířky variant (větší než originál se vynechají)
+    formats      - avif, webp; poslední formát je fallback v <img> (musí být webp)
+    concurrency  - souběžná stahování
+    max_bytes    - maximální velikost staženého obrázku
+    heartbeat_interval - jak často aktivita heartbeatuje během stahování a převodu
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from temporalio import activity
+
+from activities.publish_pool import PublishPoolSettings, PublishProcessPool
+from config import load_env_settings
+from helpers.atomic_write import write_atomic, write_json_atomic
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from PIL import Image, ImageOps, features
+    PIL_AVAILABLE = True
+    AVIF_AVAILABLE = bool(features.check("avif"))
+except ImportError:
+    PIL_AVAILABLE = False
+    AVIF_AVAILABLE = False
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP"}
+
+
+@dataclass
+class ImageAssetSettings:
+    """Nastavení asset pipeline obrázků."""
+    enabled: bool = True
+    dir: str = os.path.join(PROJECT_ROOT, "outputs", "assets")
+    base_url: str = ""  # veřejný asset host servírující dir, bez něj zůstávají původní URL
+    widths: List[int] = field(default_factory=lambda: [480, 768, 1024])
+    formats: List[str] = field(default_factory=lambda: ["avif", "webp"])
+    quality: Dict[str, int] = field(default_factory=lambda: {"avif": 50, "webp": 80})
+    concurrency: int = 4
+    timeout: float = 30.0
+    max_bytes: int = 20 * 1024 * 1024
+    workers: int = 0  # 0 = počet CPU
+    heartbeat_interval: float = 15.0  # musí být pod heartbeat_timeout aktivity ve workflow
+
+
+def _validate_settings(settings: ImageAssetSettings) -> None:
+    if not settings.widths or any(w <= 0 for w in settings.widths):
+        raise ValueError("widths musí obsahovat kladné šířky")
+    if not settings.formats or set(settings.formats) - set(MIME_TYPES) or settings.formats[-1] != "webp":
+        raise ValueError(f"formats musí být z {sorted(MIME_TYPES)} a končit webp")
+    if settings.heartbeat_interval <= 0:
+        raise ValueError("heartbeat_interval musí být kladný")
+    if settings.concurrency < 1 or settings.workers < 0:
+        raise ValueError("concurrency musí být kladný a workers nezáporný")
+    if settings.base_url and not is_public_url(settings.base_url):
+        raise ValueError("base_url musí být absolutní http(s) URL asset hostu")
+
+
+def load_image_asset_settings() -> ImageAssetSettings:
+    """Nastavení z ENV IMAGE_ASSETS."""
+    return load_env_settings("IMAGE_ASSETS", ImageAssetSettings, _validate_settings)
+
+
+def is_public_url(url: str) -> bool:
+    """Absolutní http(s) URL - jen ta funguje na libovolném webu, kam se článek publikuje."""
+    return url.startswith(("https://", "http://"))
+
+
+def _asset_dir(settings: ImageAssetSettings, digest: str) -> str:
+    return os.path.join(settings.dir, digest[:2], digest)
+
+
+def _asset_url(settings: ImageAssetSettings, digest: str, name: str) -> str:
+    return f"{settings.base_url.rstrip('/')}/{digest[:2]}/{digest}/{name}"
+
+
+def _variant_spec(settings: ImageAssetSettings) -> Dict[str, Any]:
+    formats = [fmt for fmt in settings.formats if fmt != "avif" or AVIF_AVAILABLE]
+    return {"widths": sorted(settings.widths), "formats": formats, "quality": settings.quality}
+
+
+def load_cached_asset(settings: ImageAssetSettings, digest: str) -> Optional[Dict[str, Any]]:
+    """Už převedený obrázek se stejnými variantami (asset.json se zapisuje jako poslední)."""
+    try:
+        with open(os.path.join(_asset_dir(settings, digest), "asset.json"), encoding="utf-8") as f:
+            asset = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return asset if asset.get("spec") == _variant_spec(settings) else None
+
+
+def transcode_image(source: bytes, digest: str, settings: ImageAssetSettings) -> Dict[str, Any]:
+    """
+    Převede obrázek na varianty podle šířek a formátů (běží v procesu poolu).
+
+    Returns:
+        Asset - image_url (největší WebP), srcset, width, height, sources (AVIF pro <picture>)
+    """
+    spec = _variant_spec(settings)
+    with Image.open(io.BytesIO(source)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    widths = sorted({min(w, image.width) for w in spec["widths"]})  # bez zvětšování nad originál
+
+    target_dir = _asset_dir(settings, digest)
+    os.makedirs(target_dir, exist_ok=True)
+    srcsets: Dict[str, List[str]] = {fmt: [] for fmt in spec["formats"]}
+    height = image.height
+    for width in widths:
+        height = round(image.height * width / image.width)
+        variant = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for fmt in spec["formats"]:
+            buffer = io.BytesIO()
+            variant.save(buffer, PIL_FORMATS[fmt], quality=spec["quality"].get(fmt, 80))
+            name = f"{width}.{fmt}"
+            write_atomic(os.path.join(target_dir, name), buffer.getvalue())
+            srcsets[fmt].append(f"{_asset_url(settings, digest, name)} {width}w")
+
+    fallback = spec["formats"][-1]
+    asset = {
+        "hash": digest,
+        "spec": spec,
+        "image_url": _asset_url(settings, digest, f"{widths[-1]}.{fallback}"),
+        "srcset": ", ".join(srcsets[fallback]),
+        "width": widths[-1],
+        "height": height,
+        "sources": [{"type": MIME_TYPES[fmt], "srcset": ", ".join(srcsets[fmt])} for fmt in spec["formats"][:-1]],
+    }
+    write_json_atomic(os.path.join(target_dir, "asset.json"), asset)
+    return asset
+
+
+def extract_image_urls(image_output: Any) -> List[str]:
+    """URL úspěšně vygenerovaných obrázků z výstupu ImageRenderer asistenta (v pořadí)."""
+    if isinstance(image_output, str):
+        try:
+            image_output = json.loads(image_output)
+        except ValueError:
+            return []
+    if isinstance(image_output, dict):
+        image_output = image_output.get("images") or image_output.get("generated_images") or []
+    if not isinstance(image_output, list):
+        return []
+    return [item.get("url") or item.get("image_url") for item in image_output
+            if isinstance(item, dict) and (item.get("url") or item.get("image_url")) and item.get("status", "completed") == "completed"]
+
+
+class ImageAssetPipeline:
+    """Stažení (sdílený httpx klient) a převod obrázků (process pool) s omezenou souběžností."""
+
+    def __init__(self, settings: Optional[ImageAssetSettings] = None, pool: Optional[PublishProcessPool] = None):
+        self.settings = settings or load_image_asset_settings()
+        self.pool = pool or PublishProcessPool(PublishPoolSettings(workers=self.settings.workers))
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.settings.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.settings.concurrency,
+                                    max_keepalive_connections=self.settings.concurrency)
+            )
+        return self._client
+
+    async def download(self, url: str) -> bytes:
+        """Stáhne obrázek s limitem velikosti (stream - příliš velký obrázek se nenačte celý)."""
+        async with self._get_client().stream("GET", url) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            if content_type and not content_type.startswith("image/"):
+                raise ValueError(f"❌ {url} nevrací obrázek ({content_type})")
+            chunks, size = [], 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > self.settings.max_bytes:
+                    raise ValueError(f"❌ Obrázek {url} je větší než {self.settings.max_bytes} B")
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def process(self, url: str, slots: asyncio.Semaphore) -> Dict[str, Any]:
+        async with slots:
+            source = await self.download(url)
+        digest = hashlib.sha256(source).hexdigest()
+        asset = await asyncio.to_thread(load_cached_asset, self.settings, digest)
+        if asset is None:
+            asset = await self.pool.run(transcode_image, source, digest, self.settings)
+        return {**asset, "source_url": url}
+
+    async def process_all(self, urls: List[str], on_wait: Optional[Callable[[Dict[str, int]], Any]] = None) -> Dict[str, Any]:
+        """
+        Zpracuje obrázky souběžně.
+
+        Args:
+            on_wait: heartbeat aktivity (activity.heartbeat) - volá se každý heartbeat_interval
+                     a po každém dokončeném obrázku, i když převod v poolu trvá déle
+
+        Returns:
+            {"assets": [asset nebo None pro každou URL], "errors": {url: chyba}}
+        """
+        slots = asyncio.Semaphore(self.settings.concurrency)
+        tasks = [asyncio.ensure_future(self.process(url, slots)) for url in urls]
+        pending = set(tasks)
+        try:
+            while pending:
+                _, pending = await asyncio.wait(pending, timeout=self.settings.heartbeat_interval,
+                                                return_when=asyncio.FIRST_COMPLETED)
+                if on_wait:
+                    on_wait({"done": len(tasks) - len(pending), "total": len(tasks)})
+        finally:
+            # Zrušená aktivita nenechává stahování a převody běžet
+            for task in pending:
+                task.cancel()
+        results = [task.exception() or task.result() for task in tasks]
+        assets, errors = [], {}
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"⚠️ Obrázek {url[:100]} nezpracován: {result}")
+                errors[url] = str(result)
+                assets.append(None)
+            else:
+                assets.append(result)
+        return {"assets": assets, "errors": errors}
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.pool.shutdown()
+
+
+_pipeline: Optional[ImageAssetPipeline] = None
+
+
+def get_image_asset_pipeline() -> ImageAssetPipeline:
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = ImageAssetPipeline()
+    return _pipeline
+
+
+async def close_image_asset_pipeline() -> None:
+    """Zavře httpx klient a process pool (při shutdown workera)."""
+    global _pipeline
+    if _pipeline is not None:
+        await _pipeline.close()
+        _pipeline = None
+
+
+@activity.defn
+async def image_assets_activity(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    🖼️ Stáhne a převede obrázky z ImageRenderer výstupu na lokální responzivní assety.
+
+    Args:
+        data: {"image_output": výstup image_renderer_assistant}
+
+    Returns:
+        {"assets": [...], "errors": {...}} - assets v pořadí obrázků, None u nezpracovaných
+    """
+    urls = extract_image_urls(data.get("image_output"))
+    pipeline = get_image_asset_pipeline()
+    if not urls:
+        return {"assets": [], "errors": {}}
+    if not pipeline.settings.enabled or not pipeline.settings.base_url or not PIL_AVAILABLE:
+        logger.warning("⚠️ Image asset pipeline vypnutá, bez veřejného base_url nebo chybí Pillow - "
+                       "obrázky zůstávají na původních URL")
+        return {"assets": [None] * len(urls), "errors": {}}
+
+    result = await pipeline.process_all(urls, on_wait=activity.heartbeat)
+    done = sum(1 for asset in result["assets"] if asset)
+    logger.info(f"🖼️ Image assety: {done}/{len(urls)} obrázků převedeno ({', '.join(_variant_spec(pipeline.settings)['formats'])})")
+    return result
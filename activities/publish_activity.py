@@ -7,6 +7,7 @@ Temporal activity wrapper pro deterministický publish script.
 Nahrazuje AI PublishAssistant s fail-fast logikou.
 """
 
+import asyncio
 import os
 import json
 from datetime import datetime
@@ -21,6 +22,12 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from helpers.transformers import transform_to_PublishInput, create_project_config
 
+# Transformace + publish script běží v process poolu mimo event loop
+from activities.publish_pool import run_publish_exports
+
+# Index článků pro sitemap a feedy - aktualizuje se po každém úspěšném publishi
+from helpers.article_index import entry_from_publish_input, get_article_index
+
 from logger import get_logger
 
 logger = get_logger(__name__)
@@ -39,6 +46,7 @@ async def publish_activity(data: Dict[str, Any]) -> Dict[str, Any]:
             - topic: Pipeline data obsahující výstupy všech asistentů
             - current_date: ISO datum publikace
             - previous_outputs: Předchozí výstupy (backup)
+            - project_id: Projekt článku (pro index článků, bez něj se článek nezaindexuje)
         
     Returns:
         Dictionary s výsledky exportu
@@ -70,8 +78,8 @@ async def publish_activity(data: Dict[str, Any]) -> Dict[str, Any]:
             **previous_outputs  # Backup data
         }
         
-        # Transformuj na PublishInput strukturu
-        publish_input_data = transform_to_PublishInput(pipeline_data)
+        # Transformuj na PublishInput strukturu a vygeneruj AI FARMA export (CPU - v process poolu)
+        publish_input_data, ai_farma_result, publish_error = await run_publish_exports(pipeline_data)
         
         logger.info(f"✅ Transformace úspěšná - PublishInput vytvořen")
         logger.info(f"📋 Title: {publish_input_data['title']}")
@@ -85,12 +93,10 @@ async def publish_activity(data: Dict[str, Any]) -> Dict[str, Any]:
         results = {}
         
         # ===== AI FARMA EXPORT (NOVÝ FORMÁT) =====
-        logger.info("🚀 Generuji AI FARMA export...")
-        try:
-            ai_farma_result = publish_script(publish_input_data)
+        if publish_error is None:
             results["ai_farma"] = ai_farma_result
-        except ValueError as ve:
-            logger.error(f"❌ VALIDAČNÍ CHYBA v publish script: {ve}")
+        else:
+            logger.error(f"❌ VALIDAČNÍ CHYBA v publish script: {publish_error}")
             logger.error("📋 VSTUPNÍ DATA PRO DEBUG:")
             logger.error(f"   📝 Title: {publish_input_data.get('title', 'MISSING')}")
             logger.error(f"   📄 Summary: {publish_input_data.get('meta', {}).get('description', 'MISSING')}")
@@ -102,7 +108,7 @@ async def publish_activity(data: Dict[str, Any]) -> Dict[str, Any]:
             # I při chybě vytvoř nějaký výsledek pro zobrazení
             ai_farma_result = {
                 "success": False,
-                "error": str(ve),
+                "error": publish_error,
                 "debug_input": publish_input_data
             }
             results["ai_farma"] = ai_farma_result
@@ -184,7 +190,7 @@ async def publish_activity(data: Dict[str, Any]) -> Dict[str, Any]:
             "generated_at": datetime.now().isoformat(),
             "validation_passed": True,
             "files": files_saved,
-            "word_count": len(publish_input_data["content_html"].split()),
+            "word_count": publish_input_data["content_stats"]["word_count"],
             "faq_count": len(publish_input_data["faq"]),
             "visuals_count": len(publish_input_data["visuals"])
         }
@@ -198,6 +204,21 @@ async def publish_activity(data: Dict[str, Any]) -> Dict[str, Any]:
         for file_path in files_saved:
             logger.info(f"  📁 {file_path}")
         
+        # ===== INDEX ČLÁNKŮ =====
+        # Index je odvozený z publishe - jeho chyba publish neshodí, článek se zaindexuje příště
+        project_id = data.get("project_id")
+        if not project_id:
+            logger.warning("⚠️ Publish bez project_id - článek se do indexu článků nezapíše")
+        else:
+            index_entry = entry_from_publish_input(
+                {**publish_input_data, "meta": {**publish_input_data["meta"], "slug": slug}}, project_id
+            )
+            try:
+                index_changed = await asyncio.to_thread(get_article_index().upsert, index_entry)
+                logger.info(f"🗂️ Index článků {project_id}: {slug}/{language} {'aktualizován' if index_changed else 'beze změny'}")
+            except Exception as index_error:
+                logger.warning(f"⚠️ Aktualizace indexu článků selhala: {index_error}")
+        
         # ===== FINÁLNÍ VÝSTUP =====
         
         final_output = {
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+⚙️ PROCESS POOL PRO PUBLISH EXPORT
+==================================
+
+Deterministický publish (transform_to_PublishInput + publish_script) je čistě CPU práce.
+Spuštěný přímo v async aktivitě blokuje event loop workera - heartbeaty a aktivity
+čekající na LLM stojí po dobu každého exportu.
+
+Export proto běží v process poolu:
+- warm pool - procesy (spawn) se spustí a naimportují publish moduly při startu workera
+- omezená fronta - v poolu je nejvýš workers + max_queue exportů, další čekají
+  asynchronně v aktivitě (event loop neblokují)
+- metriky per export - čekání na volný proces (queue) a doba výpočtu (run)
+
+Konfigurace přes ENV PUBLISH_PROCESS_POOL (JSON):
+PUBLISH_PROCESS_POOL='{"enabled": true, "workers": 4, "max_queue": 16}'
+    enabled    - export v process poolu (false = přímo v aktivitě jako dřív)
+    workers    - počet procesů poolu (0 = počet CPU)
+    max_queue  - kolik exportů smí čekat ve frontě poolu na volný proces
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from activities.publish_script import publish_script
+from config import load_env_settings
+from helpers.transformers import transform_to_PublishInput
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+
+@dataclass
+class PublishPoolSettings:
+    """Nastavení process poolu publish exportu."""
+    enabled: bool = True
+    workers: int = 0  # 0 = počet CPU
+    max_queue: int = 16
+
+
+def _validate_settings(settings: PublishPoolSettings) -> None:
+    if settings.workers < 0 or settings.max_queue < 0:
+        raise ValueError("workers a max_queue nesmí být záporné")
+
+
+def load_publish_pool_settings() -> PublishPoolSettings:
+    """Nastavení z ENV PUBLISH_PROCESS_POOL."""
+    return load_env_settings("PUBLISH_PROCESS_POOL", PublishPoolSettings, _validate_settings)
+
+
+def build_publish_exports(pipeline_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Deterministický publish export (běží v procesu poolu).
+
+    Returns:
+        (publish_input, výsledek publish_script, validační chyba publish_script)
+    """
+    publish_input_data = transform_to_PublishInput(pipeline_data)
+    try:
+        return publish_input_data, publish_script(publish_input_data), None
+    except ValueError as ve:
+        return publish_input_data, None, str(ve)
+
+
+def _init_process() -> None:
+    """Start procesu poolu - nastaví logování (publish moduly už naimportoval import tohoto modulu)."""
+    get_logger(__name__)
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+def _timed(fn: Callable, *args) -> Tuple[bool, Any, float]:
+    """Spustí fn v procesu poolu a změří dobu výpočtu - i pro chybu."""
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+        return True, result, time.perf_counter() - started
+    except Exception as e:
+        return False, e, time.perf_counter() - started
+
+
+class PublishProcessPool:
+    """Warm process pool s omezenou frontou pro CPU-bound publish export."""
+
+    def __init__(self, settings: Optional[PublishPoolSettings] = None):
+        self.settings = settings or load_publish_pool_settings()
+        self.workers = self.settings.workers or os.cpu_count() or 2
+        self.inflight = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn - fork procesu s běžícím event loopem a vlákny Temporal SDK není bezpečný
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process
+            )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        """Sloty poolu (běžící + fronta) - semafor patří event loopu, ve kterém vznikl."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.workers + self.settings.max_queue)
+            self._slots_loop = loop
+        return self._slots
+
+    async def start(self) -> None:
+        """Warm pool - spustí všechny procesy předem, první export nečeká na start procesu."""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        pids = await asyncio.gather(*(loop.run_in_executor(executor, _warm_up) for _ in range(self.workers)))
+        logger.info(f"🔥 Publish process pool připraven: {len(set(pids))}/{self.workers} procesů, fronta {self.settings.max_queue}")
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Spustí fn(*args) v procesu poolu; výjimka z fn se vyhodí tady."""
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        async with self._get_slots():
+            self.inflight += 1
+            self._set_inflight()
+            try:
+                ok, value, run_seconds = await loop.run_in_executor(self._get_executor(), _timed, fn, *args)
+            except BrokenProcessPool as e:
+                # Spadlý proces (OOM, kill) rozbije celý executor - další export dostane nový pool
+                self._record("broken", time.perf_counter() - submitted, 0.0)
+                self.shutdown()
+                raise Exception(f"❌ Publish process pool spadl: {e}")
+            finally:
+                self.inflight -= 1
+                self._set_inflight()
+        queued = max(0.0, time.perf_counter() - submitted - run_seconds)
+        self._record("success" if ok else "error", queued, run_seconds)
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self) -> None:
+        """Ukončí procesy poolu (čekající exporty se zruší)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _record(self, outcome: str, queued: float, run_seconds: float) -> None:
+        logger.info(f"⚙️ Publish export ({outcome}): fronta {queued:.3f}s, výpočet {run_seconds:.3f}s")
+        if METRICS_AVAILABLE:
+            get_metrics_collector().record_publish_task(outcome, queued, run_seconds)
+
+    def _set_inflight(self) -> None:
+        if METRICS_AVAILABLE:
+            get_metrics_collector().set_publish_pool_inflight(self.inflight)
+
+
+_pool: Optional[PublishProcessPool] = None
+
+
+def get_publish_pool() -> PublishProcessPool:
+    global _pool
+    if _pool is None:
+        _pool = PublishProcessPool()
+    return _pool
+
+
+async def run_publish_exports(pipeline_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[str]]:
+    """build_publish_exports v process poolu, nebo přímo při vypnutém poolu."""
+    pool = get_publish_pool()
+    if not pool.settings.enabled:
+        return build_publish_exports(pipeline_data)
+    return await pool.run(build_publish_exports, pipeline_data)
@@ -19,13 +19,18 @@ a plně validní pro CMS export.
 - Generování finálních formátů
 """
 
+import io
 import json
 import re
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Literal
+from string import Formatter
+from typing import Any, Callable, Dict, List, Literal, Optional, TextIO, Tuple
 from dataclasses import dataclass
 from urllib.parse import urlparse
 
+from helpers.html_rewriter import content_stats
+
 
 # ===== TYPY A STRUKTURY =====
 
@@ -45,6 +50,7 @@ class PublishVisual:
     srcset: Optional[str] = None
     width: Optional[int] = None
     height: Optional[int] = None
+    sources: Optional[List[Dict[str, str]]] = None  # <source> varianty pro <picture> ({"type", "srcset"}, např. AVIF)
 
 
 @dataclass
@@ -174,14 +180,12 @@ def validate_image_format(url: str) -> bool:
 
 def count_words(html: str) -> int:
     """Počítá slova v HTML (bez tagů)"""
-    text = re.sub(r'<[^>]+>', '', html)
-    words = re.findall(r'\b\w+\b', text)
-    return len(words)
+    return content_stats(html).word_count
 
 
 def count_h2_tags(html: str) -> int:
     """Počítá H2 tagy v HTML"""
-    return len(re.findall(r'<h2[^>]*>', html, re.IGNORECASE))
+    return content_stats(html).h2_count
 
 
 def has_article_wrapper(html: str) -> bool:
@@ -314,11 +318,13 @@ def validate_publish_input(input_data: PublishInput) -> None:
     if not has_article_wrapper(input_data.content_html):
         raise ValueError("Invalid or incomplete content_html - missing <article> wrapper")
     
-    word_count = count_words(input_data.content_html)
+    # Slova i H2 jedním průchodem HTML
+    stats = content_stats(input_data.content_html)
+    word_count = stats.word_count
     if word_count < 1200:
         raise ValueError(f"Invalid or incomplete content_html - only {word_count} words (minimum 1200)")
     
-    h2_count = count_h2_tags(input_data.content_html)
+    h2_count = stats.h2_count
     if h2_count < 5:
         raise ValueError(f"Invalid or incomplete content_html - only {h2_count} H2 tags (minimum 5)")
     
@@ -399,70 +405,153 @@ def generate_slug(title: str) -> str:
     return slug
 
 
-# ===== HTML EXPORT =====
+# ===== 🧱 ARTICLE IR - SDÍLENÝ ZÁKLAD EXPORTNÍCH FORMÁTŮ =====
+# Článek se z PublishInput zkompiluje jednou (slug, keywords, schema.org, vizuály, FAQ)
+# a HTML/JSON/WordPress renderery z něj jen vypisují - nic znovu neodvozují.
 
-def generate_html_output(input_data: PublishInput) -> str:
-    """
-    Generuje kompletní SEO-ready HTML článek
-    """
-    
+@dataclass
+class ArticleIR:
+    """Zkompilovaný článek pro všechny exportní formáty"""
+    title: str
+    slug: str
+    language: str
+    date_published: str
+    format: str
+    content_html: str
+    meta_title: str
+    meta_slug: str
+    description: str
+    keywords: List[str]
+    keywords_joined: str
+    canonical: str
+    schema_org: Dict[str, Any]
+    schema_json: str  # JSON-LD do HTML (odsazený)
+    schema_json_compact: str  # WordPress meta
+    visuals: List[PublishVisual]
+    top_visuals: List[PublishVisual]
+    bottom_visuals: List[PublishVisual]
+    visual_dicts: List[Dict[str, Any]]
+    faq: List[PublishFAQ]
+    faq_dicts: List[Dict[str, str]]
+
+
+def compile_article(input_data: PublishInput) -> ArticleIR:
+    """Jednorázová kompilace PublishInput do ArticleIR"""
     slug = generate_slug(input_data.title)
-    
-    # Meta tagy
-    meta_keywords = ', '.join(input_data.meta.keywords)
-    
-    # Schema.org JSON-LD
-    schema_json = json.dumps(input_data.schema_org, ensure_ascii=False, indent=2)
-    
-    # Visuals - rozdělení na top/bottom
-    top_visuals = [v for v in input_data.visuals if v.position == "top"]
-    bottom_visuals = [v for v in input_data.visuals if v.position == "bottom"]
-    
-    def render_visual(visual: PublishVisual) -> str:
-        srcset_attr = f' srcset="{visual.srcset}"' if visual.srcset else ''
-        width_attr = f' width="{visual.width}"' if visual.width else ''
-        height_attr = f' height="{visual.height}"' if visual.height else ''
-        
-        return f'''
+    meta = input_data.meta
+    return ArticleIR(
+        title=input_data.title,
+        slug=slug,
+        language=input_data.language,
+        date_published=input_data.date_published,
+        format=input_data.format,
+        content_html=input_data.content_html,
+        meta_title=getattr(meta, 'title', input_data.title),
+        meta_slug=getattr(meta, 'slug', slug),
+        description=meta.description,
+        keywords=meta.keywords,
+        keywords_joined=', '.join(meta.keywords),
+        canonical=meta.canonical,
+        schema_org=input_data.schema_org,
+        schema_json=json.dumps(input_data.schema_org, ensure_ascii=False, indent=2),
+        schema_json_compact=json.dumps(input_data.schema_org),
+        visuals=input_data.visuals,
+        top_visuals=[v for v in input_data.visuals if v.position == "top"],
+        bottom_visuals=[v for v in input_data.visuals if v.position == "bottom"],
+        visual_dicts=[
+            {
+                "image_url": v.image_url,
+                "alt": v.alt,
+                "position": v.position,
+                "srcset": v.srcset,
+                "width": v.width,
+                "height": v.height,
+                **({"sources": v.sources} if v.sources else {})
+            } for v in input_data.visuals
+        ],
+        faq=input_data.faq,
+        faq_dicts=[
+            {
+                "question": faq.question,
+                "answer_html": faq.answer_html
+            } for faq in input_data.faq
+        ]
+    )
+
+
+# ===== PŘEDKOMPILOVANÉ ŠABLONY =====
+
+Template = Tuple[Tuple[str, Optional[str]], ...]
+Writer = Callable[[str], Any]
+
+
+def _compile_template(template: str) -> Template:
+    """Rozloží šablonu s {pole} jednou při importu na dvojice (literál, pole)"""
+    return tuple((literal, field) for literal, field, _, _ in Formatter().parse(template))
+
+
+def _render(template: Template, values: Dict[str, Any], write: Writer) -> None:
+    """Streamuje šablonu do writeru - hodnota pole je text, nebo funkce, která sama zapisuje"""
+    for literal, field in template:
+        if literal:
+            write(literal)
+        if field is not None:
+            value = values[field]
+            if callable(value):
+                value(write)
+            else:
+                write(value)
+
+
+_VISUAL_TEMPLATE = _compile_template('''
+        <figure class="article-visual">
+            <img src="{image_url}" 
+                 alt="{alt}"{srcset_attr}{width_attr}{height_attr}
+                 {loading_attr} />
+            <figcaption>{alt}</figcaption>
+        </figure>''')
+
+_PICTURE_VISUAL_TEMPLATE = _compile_template('''
         <figure class="article-visual">
-            <img src="{visual.image_url}" 
-                 alt="{visual.alt}"{srcset_attr}{width_attr}{height_attr}
-                 loading="lazy" />
-            <figcaption>{visual.alt}</figcaption>
-        </figure>'''
-    
-    # FAQ sekce
-    faq_items = []
-    for faq in input_data.faq:
-        faq_items.append(f'''
+            <picture>{sources}
+                <img src="{image_url}" 
+                     alt="{alt}"{srcset_attr}{width_attr}{height_attr}
+                     {loading_attr} />
+            </picture>
+            <figcaption>{alt}</figcaption>
+        </figure>''')
+
+_SOURCE_TEMPLATE = _compile_template('''
+                <source type="{type}" srcset="{srcset}" />''')
+
+_FAQ_ITEM_TEMPLATE = _compile_template('''
         <div class="faq-item">
-            <h3 class="faq-question">{faq.question}</h3>
-            <div class="faq-answer">{faq.answer_html}</div>
+            <h3 class="faq-question">{question}</h3>
+            <div class="faq-answer">{answer_html}</div>
         </div>''')
-    
-    faq_section = f'''
+
+_FAQ_SECTION_TEMPLATE = _compile_template('''
     <section id="faq" class="faq-section">
         <h2>Často kladené otázky</h2>
-        {''.join(faq_items)}
-    </section>'''
-    
-    # Sestavení kompletního HTML
-    html_output = f'''<!DOCTYPE html>
-<html lang="{input_data.language}">
+        {faq_items}
+    </section>''')
+
+_HTML_PAGE_TEMPLATE = _compile_template('''<!DOCTYPE html>
+<html lang="{language}">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{input_data.title}</title>
-    <meta name="description" content="{input_data.meta.description}">
-    <meta name="keywords" content="{meta_keywords}">
-    <link rel="canonical" href="{input_data.meta.canonical}">
-    <meta property="og:title" content="{input_data.title}">
-    <meta property="og:description" content="{input_data.meta.description}">
-    <meta property="og:url" content="{input_data.meta.canonical}">
+    <title>{title}</title>
+    <meta name="description" content="{description}">
+    <meta name="keywords" content="{keywords}">
+    <link rel="canonical" href="{canonical}">
+    <meta property="og:title" content="{title}">
+    <meta property="og:description" content="{description}">
+    <meta property="og:url" content="{canonical}">
     <meta property="og:type" content="article">
     <meta name="twitter:card" content="summary_large_image">
-    <meta name="twitter:title" content="{input_data.title}">
-    <meta name="twitter:description" content="{input_data.meta.description}">
+    <meta name="twitter:title" content="{title}">
+    <meta name="twitter:description" content="{description}">
     
     <script type="application/ld+json">
 {schema_json}
@@ -470,112 +559,211 @@ def generate_html_output(input_data: PublishInput) -> str:
 </head>
 <body>
     <header>
-        <h1>{input_data.title}</h1>
-        <time datetime="{input_data.date_published}">{input_data.date_published}</time>
+        <h1>{title}</h1>
+        <time datetime="{date_published}">{date_published}</time>
     </header>
     
     <main>
-        {''.join(render_visual(v) for v in top_visuals)}
+        {top_visuals}
         
         <section class="article-content">
-            {input_data.content_html}
+            {content_html}
         </section>
         
-        {''.join(render_visual(v) for v in bottom_visuals)}
+        {bottom_visuals}
         
         {faq_section}
     </main>
     
     <footer>
-        <p>Publikováno: {input_data.date_published}</p>
+        <p>Publikováno: {date_published}</p>
     </footer>
 </body>
-</html>'''
-    
-    return html_output
+</html>''')
 
 
-# ===== JSON EXPORT =====
+# ===== HTML EXPORT =====
 
-def generate_json_output(input_data: PublishInput) -> Dict[str, Any]:
-    """
-    Generuje strukturovaný JSON výstup
+def render_html(ir: ArticleIR, write: Optional[Writer] = None) -> Optional[str]:
     """
+    Kompletní SEO-ready HTML článek z IR
     
+    Args:
+        ir: Zkompilovaný článek
+        write: Streaming writer (např. file.write) - bez něj se HTML vrátí jako string
+    """
+    if write is None:
+        buffer = io.StringIO()
+        render_html(ir, buffer.write)
+        return buffer.getvalue()
+    
+    def picture_sources(items: List[Dict[str, str]]) -> Callable[[Writer], None]:
+        def emit(out: Writer) -> None:
+            for source in items:
+                _render(_SOURCE_TEMPLATE, source, out)
+        return emit
+    
+    def visuals(items: List[PublishVisual], eager_first: bool = False) -> Callable[[Writer], None]:
+        def emit(out: Writer) -> None:
+            for i, visual in enumerate(items):
+                values = {
+                    "image_url": visual.image_url,
+                    "alt": visual.alt,
+                    "srcset_attr": f' srcset="{visual.srcset}"' if visual.srcset else '',
+                    "width_attr": f' width="{visual.width}"' if visual.width else '',
+                    "height_attr": f' height="{visual.height}"' if visual.height else '',
+                    # Horní obrázek bývá LCP prvek - lazy loading by jeho načtení odložil
+                    "loading_attr": 'loading="eager" fetchpriority="high"' if eager_first and i == 0 else 'loading="lazy"'
+                }
+                if visual.sources:
+                    values["sources"] = picture_sources(visual.sources)
+                    _render(_PICTURE_VISUAL_TEMPLATE, values, out)
+                else:
+                    _render(_VISUAL_TEMPLATE, values, out)
+        return emit
+    
+    def faq_items(out: Writer) -> None:
+        for faq in ir.faq:
+            _render(_FAQ_ITEM_TEMPLATE, {"question": faq.question, "answer_html": faq.answer_html}, out)
+    
+    _render(_HTML_PAGE_TEMPLATE, {
+        "language": ir.language,
+        "title": ir.title,
+        "description": ir.description,
+        "keywords": ir.keywords_joined,
+        "canonical": ir.canonical,
+        "schema_json": ir.schema_json,
+        "date_published": ir.date_published,
+        "top_visuals": visuals(ir.top_visuals, eager_first=True),
+        "content_html": ir.content_html,
+        "bottom_visuals": visuals(ir.bottom_visuals),
+        "faq_section": lambda out: _render(_FAQ_SECTION_TEMPLATE, {"faq_items": faq_items}, out)
+    }, write)
+    return None
+
+
+def generate_html_output(input_data: PublishInput) -> str:
+    """
+    Generuje kompletní SEO-ready HTML článek
+    """
+    return render_html(compile_article(input_data))
+
+
+# ===== JSON EXPORT =====
+
+def render_json(ir: ArticleIR) -> Dict[str, Any]:
+    """Strukturovaný JSON výstup z IR"""
     return {
-        "title": input_data.title,
-        "slug": generate_slug(input_data.title),
-        "language": input_data.language,
+        "title": ir.title,
+        "slug": ir.slug,
+        "language": ir.language,
         "meta": {
-            "title": getattr(input_data.meta, 'title', input_data.title),  # ✅ PŘIDÁNO
-            "description": input_data.meta.description,
-            "slug": getattr(input_data.meta, 'slug', generate_slug(input_data.title)),  # ✅ PŘIDÁNO
-            "keywords": input_data.meta.keywords,
-            "canonical": input_data.meta.canonical
+            "title": ir.meta_title,
+            "description": ir.description,
+            "slug": ir.meta_slug,
+            "keywords": ir.keywords,
+            "canonical": ir.canonical
         },
-        "content_html": input_data.content_html,
-        "visuals": [
-            {
-                "image_url": v.image_url,
-                "alt": v.alt,
-                "position": v.position,
-                "srcset": v.srcset,
-                "width": v.width,
-                "height": v.height
-            } for v in input_data.visuals
-        ],
-        "faq": [
-            {
-                "question": faq.question,
-                "answer_html": faq.answer_html
-            } for faq in input_data.faq
-        ],
-        "schema_org": input_data.schema_org,
-        "date_published": input_data.date_published,
-        "format": input_data.format
+        "content_html": ir.content_html,
+        "visuals": ir.visual_dicts,
+        "faq": ir.faq_dicts,
+        "schema_org": ir.schema_org,
+        "date_published": ir.date_published,
+        "format": ir.format
     }
 
 
-# ===== WORDPRESS EXPORT =====
-
-def generate_wordpress_output(input_data: PublishInput) -> Dict[str, Any]:
+def generate_json_output(input_data: PublishInput) -> Dict[str, Any]:
     """
-    Generuje WordPress import payload
+    Generuje strukturovaný JSON výstup
     """
-    
-    # WordPress formát content
-    wp_content = input_data.content_html
-    
-    # Přidání FAQ sekce do content
-    faq_html = '<h2>Často kladené otázky</h2>\n'
-    for faq in input_data.faq:
-        faq_html += f'<h3>{faq.question}</h3>\n{faq.answer_html}\n'
-    
-    wp_content += f'\n\n{faq_html}'
+    return render_json(compile_article(input_data))
+
+
+# ===== WORDPRESS EXPORT =====
+
+def render_wordpress(ir: ArticleIR) -> Dict[str, Any]:
+    """WordPress import payload z IR - FAQ sekce připojená za content"""
+    parts = [ir.content_html, '\n\n<h2>Často kladené otázky</h2>\n']
+    for faq in ir.faq:
+        parts.append(f'<h3>{faq.question}</h3>\n{faq.answer_html}\n')
     
     # WordPress meta fields
     wp_meta = {
-        "_yoast_wpseo_title": input_data.title,
-        "_yoast_wpseo_metadesc": input_data.meta.description,
-        "_yoast_wpseo_canonical": input_data.meta.canonical,
-        "_yoast_wpseo_focuskw": input_data.meta.keywords[0] if input_data.meta.keywords else "",
-        "_featured_image": input_data.visuals[0].image_url if input_data.visuals else "",
-        "_schema_org": json.dumps(input_data.schema_org)
+        "_yoast_wpseo_title": ir.title,
+        "_yoast_wpseo_metadesc": ir.description,
+        "_yoast_wpseo_canonical": ir.canonical,
+        "_yoast_wpseo_focuskw": ir.keywords[0] if ir.keywords else "",
+        "_featured_image": ir.visuals[0].image_url if ir.visuals else "",
+        "_schema_org": ir.schema_json_compact
     }
     
     return {
-        "post_title": input_data.title,
-        "post_content": wp_content,
+        "post_title": ir.title,
+        "post_content": "".join(parts),
         "post_status": "draft",
         "post_type": "post",
-        "post_date": input_data.date_published,
+        "post_date": ir.date_published,
         "meta_input": wp_meta,
-        "tags_input": input_data.meta.keywords,
+        "tags_input": ir.keywords,
         "post_category": [],  # Kategorie se nastaví ručně
-        "post_name": generate_slug(input_data.title)
+        "post_name": ir.slug
     }
 
 
+def generate_wordpress_output(input_data: PublishInput) -> Dict[str, Any]:
+    """
+    Generuje WordPress import payload
+    """
+    return render_wordpress(compile_article(input_data))
+
+
+# ===== 🧱 VÍCE FORMÁTŮ Z JEDNOHO IR =====
+
+RENDERERS: Dict[str, Callable[[ArticleIR], Any]] = {
+    "html": render_html,
+    "json": render_json,
+    "wordpress": render_wordpress
+}
+
+
+def _check_formats(formats) -> None:
+    unknown = [f for f in formats if f not in RENDERERS]
+    if unknown:
+        raise ValueError(f"Invalid format {unknown} - must be html, json, or wordpress")
+
+
+def render_formats(ir: ArticleIR, formats=("html", "json", "wordpress")) -> Dict[str, Any]:
+    """Všechny požadované formáty z jednoho zkompilovaného IR"""
+    _check_formats(formats)
+    return {fmt: RENDERERS[fmt](ir) for fmt in formats}
+
+
+def write_formats(ir: ArticleIR, targets: Dict[str, TextIO], executor: Optional[Executor] = None) -> None:
+    """
+    Streamuje formáty z jednoho IR do otevřených streamů
+    
+    Args:
+        ir: Zkompilovaný článek
+        targets: {formát: textový stream} - HTML se zapisuje po kouscích, JSON formáty přes json.dump
+        executor: Sdílený executor pro souběžný zápis formátů (soubory na disku) - bez něj postupně
+    """
+    _check_formats(targets)
+    
+    def write_one(fmt: str, stream: TextIO) -> None:
+        if fmt == "html":
+            render_html(ir, stream.write)
+        else:
+            json.dump(RENDERERS[fmt](ir), stream, ensure_ascii=False, indent=2)
+    
+    if executor is None:
+        for fmt, stream in targets.items():
+            write_one(fmt, stream)
+        return
+    for future in [executor.submit(write_one, fmt, stream) for fmt, stream in targets.items()]:
+        future.result()
+
+
 # ===== 📊 TABULKY - EXTRAKCE Z ASISTENTŮ =====
 
 def extract_table_data_from_assistants(input_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
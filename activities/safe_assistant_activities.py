@@ -12,10 +12,20 @@ from temporalio import activity
 # Naše nové bezpečné moduly
 from activity_wrappers import safe_activity, validate_activity_input, safe_llm_call
 from logger import get_logger, log_llm_request, log_llm_response
-from config import get_llm_config, get_activity_config
+from config import get_llm_config, get_activity_config, EXECUTION_MODE_BATCH
+from helpers.context_budget import ContextSource, budget_context, get_context_policy
+from helpers.output_schemas import (
+    get_structured_output_settings, output_as_text, output_schema_for, parse_structured_output, visual_prompts
+)
+from helpers.section_drafting import build_part_messages, plan_sections, run_section_parallel
+from helpers.stage_handoff import DEFAULT_HANDOFF_TIMEOUT, HandoffPublisher, handoff_input_sha, wait_for_handoff
 
 # Originální závislosti
 from backend.llm_clients.factory import LLMClientFactory
+from backend.llm_clients.batching import checkpoint_from_heartbeat, get_batch_dispatcher
+from backend.llm_clients.micro_batching import get_micro_batcher
+from backend.llm_clients.prompt_cache import shared_prefix
+from backend.llm_clients.image_cache import ImageCacheBatch, get_image_generation_cache, record_image_cache_batch
 from prisma import Prisma
 
 logger = get_logger(__name__)
@@ -80,6 +90,9 @@ async def load_assistants_from_database(project_id: str) -> Dict[str, Any]:
                 "model": assistant.model or "gpt-3.5-turbo",
                 "temperature": assistant.temperature or 0.7,
                 "max_tokens": assistant.max_tokens,
+                "fallback_provider": getattr(assistant, "fallback_provider", None),
+                "fallback_model": getattr(assistant, "fallback_model", None),
+                "output_type": getattr(assistant, "outputType", None) or "string",
                 "order": assistant.order or 0
             })
         
@@ -107,6 +120,9 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
             - topic: Téma/vstup pro asistenta
             - current_date: Aktuální datum (optional)
             - previous_outputs: Výstupy předchozích asistentů (optional)
+            - handoff: Pipelined handoff (optional) - {"workflow_id", "run_id", "publish": function_key}
+              pro upstream stage, {"workflow_id", "run_id", "consume": upstream_key, "spec": {...}, "timeout": s} pro downstream
+            - execution_mode: "interactive" (default) nebo "batch" - textová volání přes provider batch API
         
     Returns:
         Dict s výstupem asistenta
@@ -116,6 +132,18 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
     topic = args.get("topic")
     current_date = args.get("current_date")
     previous_outputs = args.get("previous_outputs", {})
+    execution_mode = args.get("execution_mode")
+    
+    # 🔀 Pipelined handoff - downstream čeká jen na potřebný prefix výstupu upstream stage
+    handoff = args.get("handoff") or {}
+    handoff_meta = None
+    if handoff.get("consume"):
+        topic = await wait_for_handoff(
+            handoff["workflow_id"], handoff["run_id"], handoff["consume"], handoff["spec"], on_wait=activity.heartbeat,
+            timeout=handoff.get("timeout") or DEFAULT_HANDOFF_TIMEOUT
+        )
+        handoff_meta = {"upstream": handoff["consume"], "spec": handoff["spec"], "input_sha": handoff_input_sha(topic)}
+    publisher = HandoffPublisher(handoff["workflow_id"], handoff["run_id"], handoff["publish"]) if handoff.get("publish") else None
     
     validate_activity_input(
         {"assistant_config": assistant_config, "topic": topic},
@@ -192,11 +220,10 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
         # Ostatní asistenti potřebují string
         if isinstance(topic, dict):
             # Pokud je dict, vezmi "output" klíč nebo celý JSON
-            import json
-            topic = topic.get("output", json.dumps(topic, ensure_ascii=False))
+            topic = output_as_text(topic["output"] if "output" in topic else topic)
             logger.info(f"🔄 Topic je dict - převádím na string ({len(str(topic))} chars)")
         elif not isinstance(topic, str):
-            topic = str(topic)
+            topic = output_as_text(topic)
             logger.info(f"🔄 Topic není string - převádím ({type(topic).__name__} -> str)")
         
         # Kontrola prázdnosti pouze pro string topics
@@ -219,18 +246,19 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
             logger.info(f"      🗝️ {key}: {value_length} znaků")
         
         # Shromaždi obsah k analýze ze VŠECH klíčových asistentů
-        content_to_analyze = []
+        context_sources = []
         
         # Definice VŠECH asistentů co QA potřebuje analyzovat (order 1-7, před QA v DB pořadí)
+        # Priorita řídí rozdělení tokenového rozpočtu (1 = výsledný článek, který QA kontroluje)
         assistant_priorities = [
             # V pořadí podle database order:
-            ("brief_assistant_output", "Brief Assistant", 2000),           # order 1
-            ("research_assistant_output", "Research Assistant", 3000),      # order 2  
-            ("fact_validator_assistant_output", "Fact Validator Assistant", 2000), # order 3
-            ("draft_assistant_output", "Draft Assistant", 5000),            # order 4
-            ("humanizer_assistant_output", "Humanizer Assistant", 5000),    # order 5
-            ("seo_assistant_output", "SEO Assistant", 2000),                # order 6
-            ("multimedia_assistant_output", "Multimedia Assistant", 1500),  # order 7
+            ("brief_assistant_output", "Brief Assistant", 3),              # order 1
+            ("research_assistant_output", "Research Assistant", 4),         # order 2  
+            ("fact_validator_assistant_output", "Fact Validator Assistant", 2), # order 3
+            ("draft_assistant_output", "Draft Assistant", 5),               # order 4
+            ("humanizer_assistant_output", "Humanizer Assistant", 1),       # order 5
+            ("seo_assistant_output", "SEO Assistant", 2),                   # order 6
+            ("multimedia_assistant_output", "Multimedia Assistant", 3),     # order 7
             # QA asistent má order 8 (TENTO asistent)
             # ImageRenderer má order 9 (po QA)
         ]
@@ -239,22 +267,16 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
         missing_assistants = []
         empty_assistants = []
         
-        for output_key, assistant_name, max_chars in assistant_priorities:
+        for output_key, source_name, priority in assistant_priorities:
             if output_key in previous_outputs:
                 output = previous_outputs[output_key]
                 if output and str(output).strip():
-                    output_str = str(output)
-                    if len(output_str) > max_chars:
-                        output_preview = output_str[:max_chars] + f"...\n[ZKRÁCENO z {len(output_str)} znaků]"
-                    else:
-                        output_preview = output_str
-                    content_to_analyze.append(f"=== OBSAH K ANALÝZE Z {assistant_name.upper()} ===\n{output_preview}")
-                    logger.info(f"✅ QA přidal {assistant_name}: {len(output_str)} znaků (zkráceno na {min(len(output_str), max_chars)})")
+                    context_sources.append(ContextSource(output_key, source_name, output_as_text(output), priority))
                 else:
-                    empty_assistants.append(f"{assistant_name} ({output_key})")
-                    logger.warning(f"⚠️ QA asistent má prázdný výstup z {assistant_name} ({output_key})")
+                    empty_assistants.append(f"{source_name} ({output_key})")
+                    logger.warning(f"⚠️ QA asistent má prázdný výstup z {source_name} ({output_key})")
             else:
-                missing_assistants.append(f"{assistant_name} ({output_key})")
+                missing_assistants.append(f"{source_name} ({output_key})")
                 logger.warning(f"❌ QA asistent nemá klíč {output_key} v previous_outputs")
         
         # 🔍 DETAILNÍ ANALÝZA CHYBĚJÍCÍCH DAT
@@ -263,10 +285,26 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
         if empty_assistants:
             logger.warning(f"⚠️ QA asistent: PRÁZDNÉ VÝSTUPY z asistentů: {', '.join(empty_assistants)}")
         
-        if content_to_analyze:
+        if context_sources:
+            # 🧮 Tokenový rozpočet podle kontextového okna modelu - deduplikace a krácení podle priority
+            qa_header = f"📅 Aktuální datum: {current_date}\n\nPROVEĎ KOMPLEXNÍ QA KONTROLU tohoto obsahu ze všech asistentů a vrať strukturovanou analýzu ve formátu JSON:"
+            budget = budget_context(
+                context_sources,
+                model=assistant_config.get("model"),
+                system_prompt=assistant_config.get("system_prompt") or "",
+                fixed_text=qa_header,
+                max_output_tokens=assistant_config.get("max_tokens"),
+                policy=get_context_policy(function_key)
+            )
+            content_to_analyze = [
+                f"=== OBSAH K ANALÝZE Z {source.label.upper()} ===\n{source.text}" for source in budget.included()
+            ]
+            for source in budget.sources:
+                logger.info(f"✅ QA přidal {source.label}: ~{source.original_tokens} tokenů -> ~{source.tokens} ({source.mode})")
+            
             # Vytvoř message pro QA analýzu se VŠEMI daty
             analysis_content = "\n\n".join(content_to_analyze)
-            user_message = f"📅 Aktuální datum: {current_date}\n\nPROVEĎ KOMPLEXNÍ QA KONTROLU tohoto obsahu ze všech asistentů a vrať strukturovanou analýzu ve formátu JSON:\n\n{analysis_content}"
+            user_message = f"{qa_header}\n\n{analysis_content}"
             logger.info(f"🔍 QA asistent dostává kompletní obsah k analýze: {len(analysis_content)} znaků z {len(content_to_analyze)} asistentů")
             logger.info(f"📊 QA STATISTIKY: Úspěšných {len(content_to_analyze)}, Prázdných {len(empty_assistants)}, Chybějících {len(missing_assistants)}")
         else:
@@ -279,37 +317,9 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
         multimedia_output = previous_outputs.get("multimedia_assistant_output")
         if multimedia_output:
             try:
-                # MultimediaAssistant vrací markdown JSON blok
-                if isinstance(multimedia_output, str):
-                    import json
-                    # Extrakce JSON z markdown bloku (```json\n...\n```)
-                    if "```json" in multimedia_output:
-                        json_start = multimedia_output.find("```json") + 7
-                        json_end = multimedia_output.find("```", json_start)
-                        if json_end != -1:
-                            json_str = multimedia_output[json_start:json_end].strip()
-                            image_prompts = json.loads(json_str)
-                        else:
-                            raise ValueError("Nepoařilo se najít ukončení JSON bloku v MultimediaAssistant výstupu")
-                    else:
-                        raise ValueError("❌ MultimediaAssistant výstup není validní JSON struktura - publish nemůže pokračovat")
-                else:
-                    # Nativní objekt
-                    image_prompts = multimedia_output
-                
-                # 🔧 OPRAVA: MultimediaAssistant vrací {primary_visuals: [...], optional_visuals: [...]}
-                # Převod na formát pro ImageRenderer: pole s image_prompt položkami
-                visuals_data = []
-                if "primary_visuals" in image_prompts:
-                    visuals_data.extend(image_prompts["primary_visuals"])
-                if "optional_visuals" in image_prompts:
-                    visuals_data.extend(image_prompts["optional_visuals"])
-                
-                # 🎯 PŘEVOD NA FORMAT PRO IMAGERENDERER
-                formatted_prompts = []
-                for visual in visuals_data:
-                    if "image_prompt" in visual:
-                        formatted_prompts.append(visual["image_prompt"])
+                # Výstup MultimediaAssistant je nativní objekt (starší běhy: JSON text) - jen validace
+                multimedia_data = parse_structured_output("multimedia_assistant", multimedia_output)
+                formatted_prompts = visual_prompts(multimedia_data)
                 
                 logger.info(f"🎨 ImageRenderer input: {len(formatted_prompts)} image prompts z MultimediaAssistant")
                 
@@ -342,6 +352,25 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
         else:
             user_message = str(topic)
         
+        # 🧮 Multi-input asistent (LLM_CONTEXT_BUDGET sources) - další výstupy pipeline v tokenovém rozpočtu
+        context_policy = get_context_policy(function_key)
+        extra_sources = [
+            ContextSource(key, key.replace("_output", ""), output_as_text(previous_outputs[key]), priority)
+            for priority, key in enumerate(context_policy.sources, start=1)
+            if previous_outputs and str(previous_outputs.get(key) or "").strip()
+        ]
+        if extra_sources:
+            budget = budget_context(
+                extra_sources,
+                model=assistant_config.get("model"),
+                system_prompt=assistant_config.get("system_prompt") or "",
+                fixed_text=user_message,
+                max_output_tokens=assistant_config.get("max_tokens"),
+                policy=context_policy
+            )
+            context_blocks = [f"=== KONTEXT Z {source.label.upper()} ===\n{source.text}" for source in budget.included()]
+            user_message = "\n\n".join([user_message] + context_blocks)
+        
         if len(str(topic)) > 100:
             logger.info(f"📝 {assistant_name} input: {len(str(topic))} chars")
     
@@ -362,6 +391,9 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
     if max_tokens is None:
         raise Exception(f"❌ CHYBÍ max_tokens pro asistenta {assistant_config.get('name', 'unknown')}!")
     system_prompt = assistant_config.get("system_prompt")
+    # Záložní provider/model pro circuit breaker (volitelné, nastavuje se explicitně v DB)
+    fallback_provider = assistant_config.get("fallback_provider")
+    fallback_model = assistant_config.get("fallback_model")
     
     # 🚫 ŽÁDNÉ FALLBACKY! Pokud system_prompt není v databázi, SELHAT!
     if not system_prompt or not system_prompt.strip():
@@ -371,6 +403,9 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
     if max_tokens == -1:
         max_tokens = None
     
+    # 🧾 Schéma výstupu (SEO, QA, Multimedia, outputType json) - výstup se naparsuje jednou na konci stage
+    output_schema = output_schema_for(function_key, assistant_config.get("output_type"))
+    
     logger.info(f"🤖 LLM konfigurace: {model_provider}/{model} (temp: {temperature}, tokens: {max_tokens or 'unlimited'})")
     
     # Vytvoření LLM clienta
@@ -422,8 +457,25 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
                 
                 # Vygeneruj obrázek pro každý prompt
                 generated_images = []
+                image_params = {"size": "1024x1024", "quality": "standard", "style": "vivid"}
+                # 🗃️ Dedup cache - stejný (nebo blízký) prompt z jiného tématu / retry se negeneruje znovu
+                image_cache = get_image_generation_cache()
+                cache_batch = ImageCacheBatch()
                 
                 for i, prompt in enumerate(image_prompts):
+                    used_urls = {img["url"] for img in generated_images if img["url"]}
+                    match, cached_url = image_cache.lookup(prompt, model_provider, model, exclude_urls=used_urls, **image_params)
+                    cache_batch.record(match)
+                    if cached_url:
+                        logger.info(f"🗃️ Obrázek {i+1} z image cache ({match}): {cached_url[:100]}...")
+                        generated_images.append({
+                            "url": cached_url,
+                            "prompt": prompt,
+                            "status": "completed",
+                            "cached": match
+                        })
+                        continue
+                    
                     logger.info(f"🎨 Generuji obrázek {i+1}/{len(image_prompts)}: {prompt[:100]}...")
                     
                     # Použij safe_llm_call pro image generation
@@ -435,10 +487,10 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
                             provider=model_provider,
                             model=model,
                             prompt=prompt,
-                            size="1024x1024",
-                            quality="standard",
-                            style="vivid",
-                            max_retries=3
+                            **image_params,
+                            max_retries=3,
+                            fallback_provider=fallback_provider,
+                            fallback_model=fallback_model
                         )
                         
                         if not llm_result or "content" not in llm_result:
@@ -474,6 +526,7 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
                         "prompt": prompt,
                         "status": "completed"
                     })
+                    image_cache.store(prompt, model_provider, model, image_url, **image_params)
                     
                     logger.info(f"✅ Obrázek {i+1} vygenerován: {image_url[:100]}...")
                 
@@ -486,7 +539,8 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
                     "successful_count": len(successful_images),
                     "total_count": len(image_prompts),
                     "model": model,
-                    "config": {"provider": model_provider}
+                    "config": {"provider": model_provider},
+                    "cache": record_image_cache_batch(model_provider, model, cache_batch)
                 }
                 
                 logger.info(f"🎉 ImageRenderer HOTOVO: {len(generated_images)} obrázků vygenerováno!")
@@ -541,26 +595,96 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
                 size="1024x1024",
                 quality="standard",
                 style="vivid",
-                max_retries=3
+                max_retries=3,
+                fallback_provider=fallback_provider,
+                fallback_model=fallback_model
             )
             
             if not llm_result or "content" not in llm_result:
                 raise Exception(f"Image generation selhalo - nevalidní response: {llm_result}")
         else:
-            # Pro text modely používáme chat_completion API
-            llm_result = await safe_llm_call(
-                llm_func=llm_client.chat_completion,
+            # Pro text modely používáme chat_completion API - streamovaně, heartbeat na každý chunk
+            text_call = dict(
+                llm_func=llm_client.chat_completion_stream if llm_config.streaming else llm_client.chat_completion,
                 provider=model_provider,
                 model=model,
                 system_prompt=system_prompt,
-                user_message=user_message,
                 temperature=temperature,
                 max_tokens=max_tokens,
-                max_retries=3
+                max_retries=3,
+                fallback_provider=fallback_provider,
+                fallback_model=fallback_model,
+                hedge_key=function_key,
+                # Nativní structured-output režim providera
+                output_schema=output_schema if get_structured_output_settings().native_mode else None
             )
+            
+            # 📦 Batch režim (noční CSV běhy) - request jde do sdílené batch submission provideru
+            batch_dispatcher = get_batch_dispatcher() if execution_mode == EXECUTION_MODE_BATCH else None
+            if batch_dispatcher and not batch_dispatcher.supports(model_provider):
+                logger.warning(f"📦 {model_provider} nemá batch API - {assistant_name} poběží interaktivně")
+                batch_dispatcher = None
+            
+            # Batch odeslaný předchozím pokusem aktivity (z heartbeat details) se dopolluje, neodesílá znovu
+            batch_checkpoint = checkpoint_from_heartbeat(activity.info().heartbeat_details) if batch_dispatcher else {}
+            
+            async def call_text(message: str, stream_sink=None, shared_context: Optional[str] = None) -> Dict[str, Any]:
+                if batch_dispatcher:
+                    return await batch_dispatcher.submit(
+                        model_provider, model, system_prompt, f"{shared_context or ''}{message}", temperature, max_tokens,
+                        on_wait=activity.heartbeat, checkpoint=batch_checkpoint
+                    )
+                extra = {"shared_context": shared_context} if shared_context else {}
+                return await safe_llm_call(user_message=message, stream_sink=stream_sink, **extra, **text_call)
+            
+            # ✂️ Volitelný fan-out po H2 sekcích (draft / humanizer) - výstup zůstává jeden článek
+            section_plan = None
+            if function_key in llm_config.section_parallel_stages:
+                section_plan = plan_sections(function_key, topic, previous_outputs, llm_config.section_parallel_min_sections)
+            
+            if section_plan:
+                logger.info(f"✂️ {assistant_name}: paralelní generování {len(section_plan.sections)} sekcí")
+                # 🗄️ Společný začátek sub-volání (zadání + osnova) se posílá jako cachovatelný sdílený kontext
+                shared_context = shared_prefix(build_part_messages(section_plan, user_message, current_date))
+                
+                async def call_section(message: str) -> Dict[str, Any]:
+                    if shared_context and message.startswith(shared_context):
+                        return await call_text(message[len(shared_context):], shared_context=shared_context)
+                    return await call_text(message)
+                
+                llm_result = await run_section_parallel(
+                    section_plan,
+                    user_message,
+                    call_section,
+                    concurrency=llm_config.section_parallel_concurrency,
+                    current_date=current_date,
+                    on_progress=publisher.publish if publisher else None
+                )
+            elif not batch_dispatcher and not publisher and get_micro_batcher().enabled_for(function_key):
+                # 🧺 Levné stage (Brief, SEO metadata) - sloučení s dalšími tématy do jednoho volání
+                llm_result = await get_micro_batcher().submit(
+                    (model_provider, model, system_prompt, temperature),
+                    function_key,
+                    user_message,
+                    # Sloučená odpověď má vlastní formát - schéma se validuje až po rozdělení výsledků
+                    # Běží i mimo kontext aktivity (task skupiny) - heartbeat jde přes batcher všem čekajícím
+                    lambda message, tokens, heartbeat: safe_llm_call(
+                        user_message=message, heartbeat=heartbeat, **{**text_call, "max_tokens": tokens, "output_schema": None}
+                    ),
+                    max_tokens=max_tokens,
+                    on_wait=activity.heartbeat
+                )
+            else:
+                llm_result = await call_text(user_message, stream_sink=publisher)
         
         duration = (datetime.now() - start_time).total_seconds()
         
+        # Odpověď dodal fallback nebo hedge - reportujeme skutečný provider/model
+        served_by = llm_result.get("hedge") or llm_result.get("fallback")
+        if served_by:
+            model_provider = served_by["provider"]
+            model = served_by["model"]
+        
         # Extraha odpověď
         content = llm_result.get("content", "")
         if not content:
@@ -571,11 +695,14 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
         # Speciální handling pro konkrétní asistenty (kromě ImageRenderer který má vlastní handling výše)
         logger.info(f"🔧 PRE-PROCESSING: {function_key} content preview: {content[:100]}...")
         processed_output = await _process_assistant_output(
-            function_key, content, assistant_name
+            function_key, content, assistant_name, output_schema
         )
-        logger.info(f"🔧 POST-PROCESSING: {function_key} output preview: {processed_output[:100]}...")
+        output_text = output_as_text(processed_output)
+        logger.info(f"🔧 POST-PROCESSING: {function_key} output preview: {output_text[:100]}...")
+        if publisher:
+            publisher.complete(output_text)
         
-        return {
+        result = {
             "status": "completed",
             "output": processed_output,
             "assistant": assistant_name,
@@ -584,101 +711,46 @@ async def execute_assistant(args: Dict[str, Any]) -> Dict[str, Any]:
             "model": model,
             "duration": duration,
             "input_length": len(user_message),
-            "output_length": len(processed_output)
+            "output_length": len(output_text)
         }
+        if handoff_meta:
+            result["metadata"] = {"handoff": handoff_meta}
+        if llm_result.get("micro_batch"):
+            result.setdefault("metadata", {})["micro_batch"] = llm_result["micro_batch"]
+        return result
         
     except Exception as e:
         logger.error(f"❌ LLM volání selhalo pro {assistant_name}: {str(e)}")
+        if publisher:
+            publisher.fail(str(e))
         raise
 
 async def _extract_image_prompts_from_input(user_message: str) -> list:
     """
-    Extrahuje image_prompts z výstupu MultimediaAssistant.
+    Extrahuje image_prompts ze vstupu ImageRendereru.
+    
+    Vstup sestavuje execute_assistant z nativního výstupu MultimediaAssistant jako JSON
+    seznam promptů; přijímá se i samotný výstup MultimediaAssistant (JSON objekt).
     
     Args:
-        user_message: Input pro ImageRenderer (obsahuje output od MultimediaAssistant)
+        user_message: Input pro ImageRenderer
         
     Returns:
         Seznam image_prompts jako List[str]
     """
-    import json
-    import re
-    
     try:
-        logger.info(f"🔍 Extrakce image_prompts z input: {user_message[:200]}...")
-        
-        # Zkusíme najít JSON s image_prompts v user_message
-        # MultimediaAssistant vrací output jako JSON string s image_prompts
-        
-        # Metoda 1: Hledáme JSON přímo
-        try:
-            # Možná je to celé JSON
-            data = json.loads(user_message)
-            if isinstance(data, list) and len(data) > 0:
-                # Je to seznam promptů přímo
-                logger.info(f"🎨 Našel jsem seznam promptů přímo: {len(data)} items")
-                return [str(item) for item in data if str(item).strip()]
-            elif isinstance(data, dict):
-                # 🔧 NOVÁ LOGIKA: Podpora primary_visuals + optional_visuals struktury
-                all_prompts = []
-                
-                if "image_prompts" in data:
-                    prompts = data["image_prompts"]
-                    logger.info(f"🎨 Našel jsem image_prompts v dict: {len(prompts)} items")
-                    all_prompts.extend([str(prompt) for prompt in prompts if str(prompt).strip()])
-                
-                # Podpora nové struktury z MultimediaAssistant
-                if "primary_visuals" in data:
-                    for visual in data["primary_visuals"]:
-                        if "image_prompt" in visual:
-                            all_prompts.append(visual["image_prompt"])
-                    logger.info(f"🎨 Našel jsem {len(data['primary_visuals'])} primary_visuals promptů")
-                
-                if "optional_visuals" in data:
-                    for visual in data["optional_visuals"]:
-                        if "image_prompt" in visual:
-                            all_prompts.append(visual["image_prompt"])
-                    logger.info(f"🎨 Našel jsem {len(data['optional_visuals'])} optional_visuals promptů")
-                
-                if all_prompts:
-                    logger.info(f"🎨 CELKEM nalezeno {len(all_prompts)} image_prompts")
-                    return [prompt.strip() for prompt in all_prompts if prompt.strip()]
-        except json.JSONDecodeError:
-            pass
-        
-        # Metoda 2: Hledáme JSON uvnitř textu pomocí regex
-        json_pattern = r'\[\s*"[^"]+(?:"\s*,\s*"[^"]+)*"\s*\]'
-        json_matches = re.findall(json_pattern, user_message, re.DOTALL)
-        
-        for match in json_matches:
-            try:
-                prompts = json.loads(match)
-                if isinstance(prompts, list) and len(prompts) > 0:
-                    valid_prompts = [str(prompt) for prompt in prompts if str(prompt).strip()]
-                    if valid_prompts:
-                        logger.info(f"🎨 Našel jsem {len(valid_prompts)} promptů pomocí regex")
-                        return valid_prompts
-            except:
-                continue
-        
-        # Metoda 3: Hledáme prompty jako citované řetězce
-        quote_pattern = r'"([^"]{20,})"'
-        quote_matches = re.findall(quote_pattern, user_message)
-        
-        if quote_matches:
-            # Filtruj jen ty co vypadají jako image prompty (aspoň 20 znaků)
-            valid_prompts = [match for match in quote_matches if len(match) >= 20]
-            if valid_prompts:
-                logger.info(f"🎨 Našel jsem {len(valid_prompts)} promptů v uvozovkách")
-                return valid_prompts
-        
-        logger.warning(f"⚠️ Žádné image_prompts nenalezeny v input")
-        logger.warning(f"⚠️ Input sample: {user_message[:500]}")
-        return []
-        
-    except Exception as e:
-        logger.error(f"❌ Chyba při extrakci image_prompts: {e}")
+        data = json.loads(user_message)
+    except (TypeError, ValueError):
+        logger.warning(f"⚠️ ImageRenderer input není JSON - žádné image_prompts: {str(user_message)[:200]}")
         return []
+    
+    if isinstance(data, list):
+        return [str(item).strip() for item in data if str(item).strip()]
+    if isinstance(data, dict):
+        prompts = visual_prompts(data)
+        logger.info(f"🎨 Nalezeno {len(prompts)} image_prompts ve výstupu MultimediaAssistant")
+        return prompts
+    return []
 
 async def _extract_url_from_image_response(image_response: dict) -> str:
     """
@@ -727,13 +799,20 @@ async def _extract_url_from_image_response(image_response: dict) -> str:
 async def _process_assistant_output(
     function_key: str, 
     raw_output: str, 
-    assistant_name: str
-) -> str:
+    assistant_name: str,
+    output_schema: Optional[Dict[str, Any]] = None
+) -> Any:
     """
     Zpracuje výstup asistenta podle jeho typu.
-    ImageRenderer už má vlastní speciální handling, takže tahle funkce se už nepoužívá.
+    ImageRenderer už má vlastní speciální handling (vrací nativní objekt rovnou).
+    
+    Asistent se schématem výstupu (SEO, QA, Multimedia, outputType json) dostane
+    výstup jednou naparsovaný a zvalidovaný jako nativní objekt, ostatní text.
     """
-    # Pro všechny asistenty vrátíme surový výstup
+    if output_schema:
+        output = parse_structured_output(function_key, raw_output, output_schema)
+        logger.info(f"🧾 {assistant_name}: strukturovaný výstup zvalidován ({function_key})")
+        return output
     return raw_output.strip()
 
 # 🗑️ ODSTRANĚNO: _process_image_renderer_output - ImageRenderer má teď vlastní speciální handling
\ No newline at end of file
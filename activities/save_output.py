@@ -1,9 +1,10 @@
-import json
 import os
 from datetime import datetime
 from temporalio import activity
 from dotenv import load_dotenv
 
+from helpers.output_store import get_output_store
+
 # Načtení environment variables
 load_dotenv()
 
@@ -48,23 +49,9 @@ async def save_output(result: dict) -> str:
         raise
 
 async def _save_to_json(result: dict) -> str:
-    """Uloží výstup jako JSON soubor"""
-    
-    # Vytvoření složky pokud neexistuje
-    output_path = "outputs"
-    os.makedirs(output_path, exist_ok=True)
-    
-    # Vytvoření názvu souboru s timestampem
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    workflow_id = result.get("workflow_id", "unknown")
-    filename = f"seo_output_{timestamp}_{workflow_id[:8]}.json"
-    filepath = os.path.join(output_path, filename)
-    
-    # Uložení do JSON souboru
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    
-    return filepath
+    """Uloží výstup do content-addressed úložiště outputs/store/ (mimo event loop)"""
+    stored = await get_output_store().save_run(result)
+    return stored.path
 
 async def _save_to_database(result: dict) -> bool:
     """Uloží výstup do PostgreSQL databáze"""
@@ -1,31 +1,26 @@
-import json
-import os
-from datetime import datetime
 from temporalio import activity
 
+from helpers.output_store import get_output_store
+from helpers.stage_handoff import remove_handoffs
+
 @activity.defn
 async def save_output_to_json(result: dict) -> str:
     """
-    Uloží výstup workflow jako JSON soubor do složky outputs/.
+    Uloží výstup workflow do content-addressed úložiště outputs/store/.
+    Vrací cestu k blobu runu (dohledání přes manifest podle workflow_id/run_id).
+    Zároveň smaže pipelined handoffy dokončeného runu.
     """
     try:
-        # Vytvoření složky pokud neexistuje
-        output_path = "outputs"
-        os.makedirs(output_path, exist_ok=True)
-        
-        # Vytvoření názvu souboru s timestampem
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        workflow_id = result.get("workflow_id", "unknown")
-        filename = f"seo_output_{timestamp}_{workflow_id[:8]}.json"
-        filepath = os.path.join(output_path, filename)
-        
-        # Uložení do JSON souboru
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        
-        activity.logger.info(f"✅ Výstup workflow uložen: {filepath}")
-        return filepath
+        stored = await get_output_store().save_run(result)
+        activity.logger.info(f"✅ Výstup workflow uložen: {stored.path} ({stored.new_blobs} nových blobů, {stored.stored_bytes} B)")
+        # 🔀 Pipelined handoffy runu už nikdo nepřečte
+        if result.get("workflow_id") and result.get("run_id"):
+            try:
+                remove_handoffs(result["workflow_id"], result["run_id"])
+            except OSError as cleanup_error:
+                activity.logger.warning(f"⚠️ Handoffy runu se nepodařilo smazat: {cleanup_error}")
+        return stored.path
         
     except Exception as e:
-        activity.logger.error(f"❌ Chyba při ukládání JSON: {str(e)}")
-        raise 
\ No newline at end of file
+        activity.logger.error(f"❌ Chyba při ukládání výstupu: {str(e)}")
+        raise 
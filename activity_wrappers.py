@@ -8,9 +8,21 @@ import time
 from typing import Any, Dict, Callable, Optional
 from temporalio import activity
 from logger import get_logger, log_activity_start, log_activity_success, log_activity_error
+from backend.llm_clients.base import STREAM_KEEPALIVE_INTERVAL, LLMRateLimitError
+from backend.llm_clients.rate_limiter import get_rate_limiter, estimate_request_tokens
+from backend.llm_clients.circuit_breaker import CLOSED, CircuitOpenError, get_circuit_breaker
+from backend.llm_clients.hedging import (
+    get_hedge_budget, get_hedge_policy, get_latency_tracker, hedge_delay, hedged_call, record_hedge
+)
 
 logger = get_logger(__name__)
 
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
 def safe_activity(
     name: Optional[str] = None,
     timeout_seconds: int = 600,
@@ -133,41 +145,160 @@ def standardize_activity_output(output: Any, activity_name: str) -> Dict[str, An
         "timestamp": time.time()
     }
 
+def _record_ttft(result: Any, provider: str, model: str) -> None:
+    """Time-to-first-token streamované odpovědi do logu a Prometheus metrik."""
+    streaming = (result.get("metadata") or {}).get("streaming") if isinstance(result, dict) else None
+    if not streaming or streaming.get("ttft") is None:
+        return
+    logger.info(f"⚡ TTFT {provider}/{model}: {streaming['ttft']:.2f}s ({streaming.get('chunks', 0)} chunků)")
+    if METRICS_AVAILABLE:
+        get_metrics_collector().record_llm_ttft(provider, model, streaming["ttft"])
+
+def _record_cached_tokens(result: Any, provider: str, model: str) -> None:
+    """Tokeny promptu čtené z provider-side cache do Prometheus metrik."""
+    cached = ((result.get("usage") or {}).get("cached_tokens") or 0) if isinstance(result, dict) else 0
+    if cached and METRICS_AVAILABLE:
+        get_metrics_collector().record_llm_cached_tokens(provider, model, cached)
+
+async def _sleep_with_heartbeat(seconds: float, interval: Optional[float] = None,
+                                heartbeat: Callable[..., Any] = activity.heartbeat) -> None:
+    """Čekání (Retry-After, backoff) po úsecích s heartbeatem - dlouhý Retry-After nesmí vypršet heartbeat timeout aktivity."""
+    interval = interval or STREAM_KEEPALIVE_INTERVAL
+    deadline = time.monotonic() + seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        heartbeat()
+        await asyncio.sleep(min(interval, remaining))
+
 async def safe_llm_call(
     llm_func: Callable,
     provider: str,
     model: str,
     max_retries: int = 3,
+    fallback_provider: Optional[str] = None,
+    fallback_model: Optional[str] = None,
+    hedge_key: Optional[str] = None,
+    stream_sink: Optional[Any] = None,
+    heartbeat: Callable[..., Any] = activity.heartbeat,
     **kwargs
 ) -> Dict[str, Any]:
     """
-    Bezpečné volání LLM s retry logikou.
+    Bezpečné volání LLM s retry logikou, sdíleným rate limitem a circuit breakerem per provider.
+    
+    Pokud je breaker providera otevřený (nebo zbývá poslední pokus) a asistent má
+    nastavený fallback, další pokusy jdou na fallback provider/model. Bez fallbacku
+    otevřený breaker volání okamžitě odmítne (CircuitOpenError).
+    
+    Streamovaná volání (chat_completion_stream) heartbeatují na každý chunk a hlásí TTFT.
+    
+    Textová volání asistentů s hedging politikou (LLM_HEDGING) po kvantilu nedávné
+    latence spustí duplikát a použijí první odpověď.
+    
+    stream_sink (HandoffPublisher) dostává streamovaný text pro pipelined handoff
+    do další stage - před každým pokusem se vyprázdní (reset).
     
     Args:
         llm_func: LLM funkce k volání
         provider: LLM provider (openai, claude, gemini)
         model: Model name
         max_retries: Maximální počet pokusů
+        fallback_provider: Záložní provider (default = stejný provider)
+        fallback_model: Záložní model - bez něj se fallback nepoužije
+        hedge_key: Klíč hedging politiky a rozpočtu (function_key asistenta)
+        stream_sink: Příjemce streamovaného textu (reset/append), jen pro stream volání
+        heartbeat: Heartbeat během volání (výchozí aktivita, ve které volání běží)
         **kwargs: Argumenty pro LLM funkci
         
     Returns:
-        Standardizovaný LLM response
+        Standardizovaný LLM response (při použití fallbacku s klíčem "fallback",
+        při vítězství duplikátu s klíčem "hedge")
     """
     last_error = None
+    rate_limiter = get_rate_limiter()
+    
+    # Rozpoznání typu LLM funkce podle názvu
+    func_name = getattr(llm_func, '__name__', str(llm_func))
+    func_str = str(llm_func)
+    is_image_call = 'image_generation' in func_name or 'image_generation' in func_str
+    # Streamované volání heartbeatuje na každý chunk (on_chunk)
+    is_stream_call = not is_image_call and 'chat_completion_stream' in func_name
+    text_method = "chat_completion_stream" if is_stream_call else "chat_completion"
+    
+    # Odhad vstupních a výstupních tokenů pro TPM budgety - obrázky se počítají jen do RPM
+    estimated_tokens = (0, 0) if is_image_call else estimate_request_tokens(
+        kwargs.get('system_prompt', ''), str(kwargs.get('shared_context') or '') + str(kwargs.get('user_message', '')), kwargs.get('max_tokens')
+    )
+    
+    fallback_available = bool(fallback_model)
+    using_fallback = False
+    
+    # ⏱️ Hedging jen pro text - duplikát obrázku je drahý a latence obrázků je stabilní
+    hedge_policy = None if is_image_call else get_hedge_policy(hedge_key)
+    latency_tracker = get_latency_tracker()
+    hedge_budget = get_hedge_budget()
+    
+    async def call_hedge(call_kwargs: Dict[str, Any], primary_func: Callable, primary_provider: str, primary_model: str):
+        """Duplikát volání - na hedge provider/model z politiky, jinak na ten samý."""
+        target_provider = hedge_policy.provider or primary_provider
+        target_model = hedge_policy.model or primary_model
+        func = primary_func
+        if target_provider != primary_provider:
+            from backend.llm_clients.factory import LLMClientFactory
+            func = getattr(LLMClientFactory.create_client(target_provider), text_method)
+        if rate_limiter:
+            await rate_limiter.acquire(target_provider, target_model, estimated_tokens, on_wait=heartbeat)
+        started = time.monotonic()
+        hedge_result = await func(model=target_model, **call_kwargs)
+        latency_tracker.record(target_provider, target_model, time.monotonic() - started)
+        return hedge_result, target_provider, target_model
+    
+    def allow_hedge(primary_provider: str) -> bool:
+        """Hedge jen v rámci rozpočtu asistenta a na zdravý provider."""
+        hedge_breaker = get_circuit_breaker(hedge_policy.provider or primary_provider)
+        if hedge_breaker and hedge_breaker.state != CLOSED:
+            return False
+        return hedge_budget.try_spend(hedge_key or "default", hedge_policy)
+    
+    def switch_to_fallback() -> bool:
+        """Přepne další pokusy na fallback provider/model. Vrací False, pokud není kam."""
+        nonlocal llm_func, provider, model, using_fallback
+        if not fallback_available or using_fallback:
+            return False
+        from backend.llm_clients.factory import LLMClientFactory
+        target_provider = fallback_provider or provider
+        client = LLMClientFactory.create_client(target_provider)
+        logger.warning(f"🔀 Přepínám na fallback: {provider}/{model} -> {target_provider}/{fallback_model}")
+        llm_func = getattr(client, "image_generation" if is_image_call else text_method)
+        provider, model = target_provider, fallback_model
+        using_fallback = True
+        return True
     
     for attempt in range(max_retries):
+        # 🔌 Otevřený breaker = neztrácíme čas voláním, rovnou fallback nebo fail fast
+        breaker = get_circuit_breaker(provider)
+        if breaker and not breaker.allow_request():
+            if not switch_to_fallback():
+                raise CircuitOpenError(provider, breaker.retry_in())
+            breaker = get_circuit_breaker(provider)
+            if breaker and not breaker.allow_request():
+                raise CircuitOpenError(provider, breaker.retry_in())
+        
+        call_started = None
         try:
             # Heartbeat před každým pokusem
-            activity.heartbeat()
+            heartbeat()
             
-            logger.info(f"🤖 LLM pokus {attempt + 1}/{max_retries}: {provider}/{model}")
+            # 🚦 Počkáme na volný request/token budget (sdílený přes všechny procesy)
+            if rate_limiter:
+                await rate_limiter.acquire(provider, model, estimated_tokens, on_wait=heartbeat)
             
-            # Rozpoznání typu LLM funkce podle názvu
-            func_name = getattr(llm_func, '__name__', str(llm_func))
-            func_str = str(llm_func)
+            logger.info(f"🤖 LLM pokus {attempt + 1}/{max_retries}: {provider}/{model}")
             logger.info(f"🔍 FUNC DEBUG: func_name='{func_name}', func_str='{func_str}'")
             
-            if 'image_generation' in func_name or 'image_generation' in func_str:
+            call_started = time.monotonic()
+            if is_image_call:
                 # Pro image generation API - používáme prompt + model parametr
                 prompt = kwargs.get('prompt', kwargs.get('user_message', ''))
                 size = kwargs.get('size', '1024x1024')
@@ -190,38 +321,118 @@ async def safe_llm_call(
                 
                 logger.info(f"🔍 LLM_CALL DEBUG: user_message type={type(user_message)}, len={len(user_message)}")
                 
-                result = await llm_func(
-                    system_prompt=system_prompt,
-                    user_message=user_message, 
-                    model=model,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
+                call_kwargs = {
+                    "system_prompt": system_prompt,
+                    "user_message": user_message,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens
+                }
+                for optional in ("shared_context", "output_schema"):
+                    if kwargs.get(optional):
+                        call_kwargs[optional] = kwargs[optional]
+                if is_stream_call:
+                    call_kwargs["on_chunk"] = heartbeat
+                delay = hedge_delay(hedge_policy, latency_tracker, provider, model) if hedge_policy else None
+                if stream_sink and is_stream_call:
+                    stream_sink.reset()
+                    # Dva souběžné streamy (hedge) by se prolínaly - hedgované volání publikuje až výsledek
+                    if delay is None:
+                        call_kwargs["on_text"] = stream_sink.append
+                if delay is None:
+                    result = await llm_func(model=model, **call_kwargs)
+                else:
+                    hedge_budget.record_call(hedge_key or "default")
+                    primary_func, primary_provider, primary_model = llm_func, provider, model
+                    
+                    async def primary_call():
+                        return await primary_func(model=primary_model, **call_kwargs), primary_provider, primary_model
+                    
+                    def on_hedge() -> bool:
+                        if not allow_hedge(primary_provider):
+                            return False
+                        logger.info(f"⏱️ {primary_provider}/{primary_model} neodpověděl do {delay:.1f}s - spouštím hedge")
+                        record_hedge(primary_provider, primary_model, "launched")
+                        return True
+                    
+                    (result, served_provider, served_model), hedge_won = await hedged_call(
+                        primary_call,
+                        lambda: call_hedge(call_kwargs, primary_func, primary_provider, primary_model),
+                        delay,
+                        on_hedge=on_hedge
+                    )
+                    if hedge_won:
+                        # Primární volání bylo zrušené - do vzorků jde jako dolní odhad latence
+                        latency_tracker.record(provider, model, time.monotonic() - call_started)
+                        record_hedge(served_provider, served_model, "won")
+                        logger.info(f"⏱️ Hedge vyhrál: {served_provider}/{served_model}")
+                        if breaker:
+                            breaker.release()
+                        if rate_limiter and isinstance(result, dict) and result.get("usage"):
+                            await rate_limiter.record_usage(served_provider, served_model, estimated_tokens, result["usage"])
+                        _record_ttft(result, served_provider, served_model)
+                        _record_cached_tokens(result, served_provider, served_model)
+                        if isinstance(result, dict):
+                            result["hedge"] = {"provider": served_provider, "model": served_model, "delay": delay}
+                        if result and "content" in result:
+                            return result
+                        raise Exception(f"Chat completion vrátil nevalidní response (missing 'content'): {result}")
+            latency = time.monotonic() - call_started
+            
+            # Dorovnání token budgetu podle skutečné spotřeby
+            if rate_limiter and isinstance(result, dict) and result.get("usage"):
+                await rate_limiter.record_usage(provider, model, estimated_tokens, result["usage"])
             
             # Kontrola výsledku podle typu API
             if result:
-                if 'image_generation' in func_name or 'image_generation' in func_str:
+                if is_image_call:
                     # Pro image generation očekáváme "content" klíč
-                    if "content" in result:
-                        logger.info(f"✅ LLM úspěch: {provider}/{model}")
-                        return result
-                    else:
+                    if "content" not in result:
                         raise Exception(f"Image generation vrátil nevalidní response (missing 'content'): {result}")
-                elif "content" in result:
+                elif "content" not in result:
                     # Pro chat completion očekáváme "content" klíč
-                    logger.info(f"✅ LLM úspěch: {provider}/{model}")
-                    return result
-                else:
                     raise Exception(f"Chat completion vrátil nevalidní response (missing 'content'): {result}")
             else:
                 raise Exception(f"LLM vrátil prázdný response: {result}")
+            
+            if breaker:
+                breaker.record_success(latency, stage=hedge_key)
+            latency_tracker.record(provider, model, latency)
+            _record_ttft(result, provider, model)
+            _record_cached_tokens(result, provider, model)
+            logger.info(f"✅ LLM úspěch: {provider}/{model}")
+            if using_fallback:
+                result["fallback"] = {"provider": provider, "model": model}
+            return result
                 
+        except LLMRateLimitError as e:
+            last_error = e
+            # 429 neříká nic o zdraví providera - breaker jen uvolní případný zkušební slot
+            if breaker:
+                breaker.release()
+            # Respektujeme Retry-After - blokace platí pro všechny procesy, další acquire počká
+            retry_after = e.retry_after if e.retry_after is not None else 2 ** (attempt + 1)
+            logger.warning(f"🚦 LLM pokus {attempt + 1} narazil na rate limit, retry za {retry_after:.1f}s: {str(e)}")
+            
+            if attempt < max_retries - 1:
+                if rate_limiter:
+                    await rate_limiter.penalize(provider, model, retry_after)
+                else:
+                    await _sleep_with_heartbeat(retry_after, heartbeat=heartbeat)
         except Exception as e:
             last_error = e
+            if breaker:
+                if call_started is None:
+                    breaker.release()  # selhalo ještě před voláním API
+                else:
+                    breaker.record_failure(time.monotonic() - call_started)
             logger.warning(f"⚠️ LLM pokus {attempt + 1} selhal: {str(e)}")
             
             if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                # Fast failover - při otevřeném breakeru nebo před posledním pokusem bez čekání na fallback
+                breaker_open = breaker is not None and breaker.state != CLOSED
+                if (breaker_open or attempt == max_retries - 2) and switch_to_fallback():
+                    continue
+                await _sleep_with_heartbeat(2 ** attempt, heartbeat=heartbeat)  # Exponential backoff
     
     # Všechny pokusy selhaly
     raise Exception(f"LLM selhalo po {max_retries} pokusech. Poslední chyba: {last_error}")
@@ -31,6 +31,8 @@ class AssistantCreate(BaseModel):
     top_p: float = 0.9
     max_tokens: Optional[int] = -1  # -1 = neomezeno, jinak kladné číslo
     system_prompt: Optional[str] = None
+    fallback_provider: Optional[str] = None  # záložní provider při otevřeném circuit breakeru
+    fallback_model: Optional[str] = None
     
     # UX metadata pro admina
     use_case: Optional[str] = None
@@ -209,6 +211,8 @@ class AssistantUpdate(BaseModel):
     top_p: Optional[float] = None
     max_tokens: Optional[int] = None
     system_prompt: Optional[str] = None
+    fallback_provider: Optional[str] = None  # záložní provider při otevřeném circuit breakeru
+    fallback_model: Optional[str] = None
     
     # UX metadata pro admina
     use_case: Optional[str] = None
@@ -361,6 +365,8 @@ class AssistantResponse(BaseModel):
     top_p: float
     max_tokens: int
     system_prompt: Optional[str] = None
+    fallback_provider: Optional[str] = None  # záložní provider při otevřeném circuit breakeru
+    fallback_model: Optional[str] = None
     
     # UX metadata pro admina
     use_case: Optional[str] = None
@@ -535,6 +541,8 @@ async def create_assistant(assistant: AssistantCreate):
                 "top_p": assistant.top_p,
                 "max_tokens": max_tokens_value,  # NULL pokud nebyl poslán nebo je None
                 "system_prompt": assistant.system_prompt,
+                "fallback_provider": assistant.fallback_provider,
+                "fallback_model": assistant.fallback_model,
                 
                 # UX metadata
                 "use_case": assistant.use_case,
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Callable, Dict, Tuple
+import asyncio
+import logging
+
+from helpers.article_index import (
+    get_article_index,
+    load_article_index_settings,
+    render_json_feed,
+    render_rss,
+    render_sitemap,
+    render_sitemap_index,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["feeds"])
+
+FEED_TITLE = "SEO Farm"
+
+# Vyrenderované dokumenty podle revize projektu - nový publish revizi zvýší a cache se obnoví
+_cache: Dict[Tuple[str, str], Tuple[int, bytes]] = {}
+
+
+def _project_base_url(project_id: str) -> str:
+    """Veřejná URL webu projektu - bez ní by sitemap a feed odkazovaly na cizí web."""
+    base_url = load_article_index_settings().base_urls.get(project_id)
+    if not base_url:
+        raise HTTPException(status_code=404, detail="Projekt nemá nastavenou veřejnou URL (ARTICLE_INDEX.base_urls)")
+    return base_url
+
+
+def _sitemap_document(request: Request, project_id: str) -> bytes:
+    settings = load_article_index_settings()
+    base_url = _project_base_url(project_id)
+    index = get_article_index()
+    if index.count(project_id) <= settings.shard_size:
+        return render_sitemap(index.shard(project_id, 0, settings.shard_size), base_url)
+    return render_sitemap_index(
+        index.shard_lastmods(project_id, settings.shard_size),
+        lambda shard: str(request.url_for("get_sitemap_shard", project_id=project_id, shard=shard))
+    )
+
+
+def _sitemap_shard_document(project_id: str, shard: int) -> bytes:
+    settings = load_article_index_settings()
+    base_url = _project_base_url(project_id)
+    entries = get_article_index().shard(project_id, shard, settings.shard_size)
+    if not entries:
+        raise HTTPException(status_code=404, detail="Shard sitemap neexistuje")
+    return render_sitemap(entries, base_url)
+
+
+def _feed_document(project_id: str, renderer: Callable) -> bytes:
+    settings = load_article_index_settings()
+    base_url = _project_base_url(project_id)
+    return renderer(get_article_index().latest(project_id, settings.feed_size), base_url, FEED_TITLE)
+
+
+async def _cached_response(request: Request, project_id: str, name: str, build: Callable[[], bytes],
+                           media_type: str) -> Response:
+    """Dokument z cache podle revize projektu, s ETag - klient s aktuální revizí dostane 304."""
+    try:
+        _project_base_url(project_id)
+        revision = await asyncio.to_thread(get_article_index().revision, project_id)
+        etag = f'"{revision}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        cached = _cache.get((project_id, name))
+        if cached is None or cached[0] != revision:
+            cached = (revision, await asyncio.to_thread(build))
+            _cache[(project_id, name)] = cached
+        return Response(content=cached[1], media_type=media_type, headers={"ETag": etag})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Chyba při generování {name} projektu {project_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Chyba při generování {name}: {str(e)}")
+
+
+@router.get("/project/{project_id}/sitemap.xml")
+async def get_sitemap(request: Request, project_id: str):
+    """Sitemap publikovaných článků projektu (nad limitem shard_size jako sitemap index)"""
+    return await _cached_response(request, project_id, "sitemap.xml", lambda: _sitemap_document(request, project_id),
+                                  "application/xml")
+
+
+@router.get("/project/{project_id}/sitemap-{shard}.xml")
+async def get_sitemap_shard(request: Request, project_id: str, shard: int):
+    """Jeden shard sitemap projektu"""
+    return await _cached_response(request, project_id, f"sitemap-{shard}.xml",
+                                  lambda: _sitemap_shard_document(project_id, shard), "application/xml")
+
+
+@router.get("/project/{project_id}/feed.json")
+async def get_json_feed(request: Request, project_id: str):
+    """JSON Feed 1.1 nejnovějších článků projektu"""
+    return await _cached_response(request, project_id, "feed.json", lambda: _feed_document(project_id, render_json_feed),
+                                  "application/feed+json")
+
+
+@router.get("/project/{project_id}/feed.xml")
+async def get_rss_feed(request: Request, project_id: str):
+    """RSS 2.0 nejnovějších článků projektu"""
+    return await _cached_response(request, project_id, "feed.xml", lambda: _feed_document(project_id, render_rss),
+                                  "application/rss+xml")
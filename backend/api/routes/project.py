@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from pydantic import BaseModel
+from dataclasses import asdict
 from datetime import datetime
 import re
 import json
@@ -306,4 +307,34 @@ async def delete_project(project_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chyba při mazání projektu: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Chyba při mazání projektu: {str(e)}") 
+class StaticExportRequest(BaseModel):
+    base_url: Optional[str] = None
+    full: bool = False
+
+@router.post("/project/{project_id}/static-export")
+async def export_project_static(project_id: str, request: StaticExportRequest):
+    """
+    Hromadný static export dokončených runů projektu (inkrementálně, jen změněné runy).
+    Běžící export stejného projektu = 409, pool má jen STATIC_EXPORT.api_workers procesů.
+    """
+    try:
+        from static_export import ExportInProgressError, export_project, load_static_export_settings
+        
+        prisma = await get_prisma_client()
+        project = await prisma.project.find_unique(where={"id": project_id})
+        if not project:
+            raise HTTPException(status_code=404, detail="Projekt nenalezen")
+        
+        # Cílový adresář volí jen konfigurace (STATIC_EXPORT.out_dir), ne volající
+        try:
+            summary = await export_project(prisma, project_id, base_url=request.base_url, full=request.full,
+                                           workers=load_static_export_settings().api_workers)
+        except ExportInProgressError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        return asdict(summary)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chyba při static exportu projektu: {str(e)}")
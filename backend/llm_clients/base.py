@@ -4,17 +4,242 @@ Zajišťuje konzistentní interface napříč providery.
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, fields
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, TypeVar
+import asyncio
+import json
 import logging
+import os
+import time
+
+import httpx
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Streaming: maximální pauza mezi dvěma událostmi streamu po prvním bajtu odpovědi,
+# pak je spojení považováno za zaseknuté. Na první bajt se čeká déle (reasoning modely
+# před první událostí přemýšlí). Per model přes ENV LLM_STREAM_TIMEOUTS.
+STREAM_IDLE_TIMEOUT = 25.0
+STREAM_FIRST_BYTE_TIMEOUT = 300.0
+STREAM_CONNECT_TIMEOUT = 10.0
+# Heartbeat aktivity, i když stream mlčí - musí být kratší než LLMConfig.stream_heartbeat_timeout
+STREAM_KEEPALIVE_INTERVAL = 10.0
+
+
+@dataclass
+class StreamTimeouts:
+    """Timeouty streamu jednoho modelu."""
+    idle_seconds: float = STREAM_IDLE_TIMEOUT
+    first_byte_seconds: float = STREAM_FIRST_BYTE_TIMEOUT
+
+    def httpx_timeout(self) -> httpx.Timeout:
+        """Read timeout klienta hlídá čekání na první bajt, pauzy po něm hlídá iter_with_idle_timeout."""
+        return httpx.Timeout(max(self.first_byte_seconds, self.idle_seconds), connect=STREAM_CONNECT_TIMEOUT)
+
+
+def load_stream_timeouts() -> Dict[str, StreamTimeouts]:
+    """
+    Přepisy timeoutů streamu z ENV LLM_STREAM_TIMEOUTS (JSON), klíč "default" nebo model / prefix modelu:
+    LLM_STREAM_TIMEOUTS='{"default": {"idle_seconds": 25}, "o3": {"idle_seconds": 90, "first_byte_seconds": 900}}'
+    """
+    raw = os.getenv("LLM_STREAM_TIMEOUTS")
+    if not raw:
+        return {}
+    allowed = {f.name for f in fields(StreamTimeouts)}
+    try:
+        overrides = json.loads(raw)
+        unknown = {key for values in overrides.values() for key in values} - allowed
+        if unknown:
+            raise ValueError(f"neznámé klíče {sorted(unknown)}")
+        default = overrides.get("default", {})
+        settings = {"default": StreamTimeouts(**default)}
+        for model, values in overrides.items():
+            if model != "default":
+                settings[model.lower()] = StreamTimeouts(**dict(default, **values))
+        if any(t.idle_seconds <= 0 or t.first_byte_seconds <= 0 for t in settings.values()):
+            raise ValueError("timeouty musí být kladné")
+        return settings
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"❌ Neplatná konfigurace LLM_STREAM_TIMEOUTS: {e}")
+
+
+def stream_timeouts_for(model: Optional[str]) -> StreamTimeouts:
+    """Timeouty pro model - přesná shoda, pak nejdelší prefix, pak default."""
+    settings = load_stream_timeouts()
+    name = (model or "").lower()
+    if name in settings:
+        return settings[name]
+    prefixes = [key for key in settings if key != "default" and name.startswith(key)]
+    if prefixes:
+        return settings[max(prefixes, key=len)]
+    return settings.get("default") or StreamTimeouts()
+
+
+async def iter_with_idle_timeout(events: AsyncIterator[T], idle_timeout: float) -> AsyncIterator[T]:
+    """
+    Po první události hlídá pauzu mezi událostmi streamu. Na první událost se čeká
+    bez tohoto limitu - hlídá ji read timeout klienta (StreamTimeouts.first_byte_seconds).
+    """
+    iterator = events.__aiter__()
+    received = False
+    while True:
+        try:
+            if received:
+                item = await asyncio.wait_for(iterator.__anext__(), idle_timeout)
+            else:
+                item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(f"Stream bez události déle než {idle_timeout:.1f}s")
+        received = True
+        yield item
+
+
+class LLMRateLimitError(Exception):
+    """
+    Provider odmítl request kvůli rate limitu (HTTP 429 / přetížení).
+    Nese retry_after v sekundách z hlavičky Retry-After, pokud ji provider poslal.
+    """
+    
+    def __init__(self, provider: str, message: str, retry_after: Optional[float] = None):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Převede hlavičku Retry-After (sekundy nebo HTTP datum) na sekundy."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        import time
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_from_headers(headers: Any) -> Optional[float]:
+    """Vytáhne retry delay z hlaviček odpovědi (Retry-After, případně retry-after-ms)."""
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+    return parse_retry_after(headers.get("retry-after"))
+
+
+async def iter_sse_json(response: Any, idle_timeout: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Rozparsuje server-sent events (httpx streaming response) na JSON payloady "data:" řádků.
+    S idle_timeout spadne stream, který po prvním řádku déle mlčí (httpx.ReadTimeout).
+    """
+    lines = response.aiter_lines()
+    if idle_timeout is not None:
+        lines = iter_with_idle_timeout(lines, idle_timeout)
+    async for line in lines:
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        try:
+            yield json.loads(data)
+        except ValueError:
+            logger.warning(f"⚠️ Nevalidní SSE payload: {data[:200]}")
+
+
+class StreamCollector:
+    """
+    Skládá streamovanou odpověď po chuncích a měří time-to-first-token.
+    on_chunk se volá při každé události streamu (i bez textu) - slouží pro heartbeat,
+    on_text dostává každý kus textu (pipelined handoff do další stage).
+    """
+    
+    def __init__(self, on_chunk: Optional[Callable[[], Any]] = None, on_text: Optional[Callable[[str], Any]] = None):
+        self.on_chunk = on_chunk
+        self.on_text = on_text
+        self.started = time.monotonic()
+        self.last_event_at = self.started
+        self.first_token_at: Optional[float] = None
+        self.parts: List[str] = []
+        self.chunks = 0
+    
+    def event(self) -> None:
+        """Přišla událost streamu (ping, metadata, delta)."""
+        self.last_event_at = time.monotonic()
+        if self.on_chunk:
+            self.on_chunk()
+    
+    def add(self, text: Optional[str]) -> None:
+        """Přišel kus textu odpovědi."""
+        self.event()
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.parts.append(text)
+        self.chunks += 1
+        if self.on_text:
+            self.on_text(text)
+    
+    @asynccontextmanager
+    async def keepalive(self, interval: Optional[float] = None):
+        """
+        Volá on_chunk i během pauz streamu (čekání na první bajt reasoning modelu),
+        aby nevypršel heartbeat aktivity - zaseknutí hlídají timeouty streamu.
+        """
+        if not self.on_chunk:
+            yield
+            return
+        interval = interval or STREAM_KEEPALIVE_INTERVAL
+        
+        async def beat():
+            while True:
+                await asyncio.sleep(interval)
+                if time.monotonic() - self.last_event_at >= interval:
+                    self.on_chunk()
+        
+        task = asyncio.create_task(beat())
+        try:
+            yield
+        finally:
+            task.cancel()
+    
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Metadata streamu pro response["metadata"]["streaming"]."""
+        now = time.monotonic()
+        return {
+            "ttft": (self.first_token_at - self.started) if self.first_token_at is not None else None,
+            "duration": now - self.started,
+            "chunks": self.chunks
+        }
+
+
 class BaseLLMClient(ABC):
     """
     Abstract base class pro všechny LLM providery.
     Každý provider musí implementovat tyto metody.
     """
     
+    # Provider má asynchronní batch API (levnější, výsledky do 24 h) - viz submit_batch
+    supports_batch = False
+    
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.provider_name = self.__class__.__name__.replace('Client', '').lower()
@@ -33,9 +258,71 @@ class BaseLLMClient(ABC):
         """
         Hlavní metoda pro chat completion.
         Musí vracet standardizovaný formát výsledku.
+        
+        Volitelný kwarg shared_context je prefix user message společný více voláním -
+        klient ho (stejně jako statický system prompt) posílá tak, aby ho provider
+        cachoval; tokeny čtené z cache vrací v usage["cached_tokens"].
+
+        Volitelný kwarg output_schema (JSON schéma) zapne nativní structured-output
+        režim providera - content je pak JSON text odpovídající schématu.
         """
         pass
     
+    async def chat_completion_stream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        on_chunk: Optional[Callable[[], Any]] = None,
+        on_text: Optional[Callable[[str], Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Streamovaná varianta chat_completion - stejný výstupní formát, navíc
+        metadata["streaming"] (ttft, duration, chunks). on_chunk se volá při každé
+        události streamu (heartbeat aktivity), on_text s každým kusem textu.
+        
+        Default pro providery bez streamingu: jedno nestreamované volání.
+        """
+        collector = StreamCollector(on_chunk, on_text)
+        async with collector.keepalive():
+            result = await self.chat_completion(system_prompt, user_message, model, temperature, max_tokens, **kwargs)
+        collector.add(result.get("content"))
+        result.setdefault("metadata", {})["streaming"] = collector.stats()
+        return result
+    
+    def build_batch_request(
+        self,
+        custom_id: str,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Jeden request batch submission ve formátu provideru."""
+        raise NotImplementedError(f"{self.provider_name} nepodporuje batch API")
+    
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Odešle batch submission, vrací ID batche u provideru."""
+        raise NotImplementedError(f"{self.provider_name} nepodporuje batch API")
+    
+    async def get_batch_status(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Stav batche: {"state": "in_progress" | "ended" | "failed", "error": ..., ...}.
+        Ostatní klíče jsou provider-specifické a předávají se do get_batch_results.
+        """
+        raise NotImplementedError(f"{self.provider_name} nepodporuje batch API")
+    
+    async def get_batch_results(self, batch_id: str, status: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Výsledky dokončeného batche: custom_id -> standardizovaný response
+        (stejný formát jako chat_completion), nebo {"error": "..."} pro neúspěšný request.
+        """
+        raise NotImplementedError(f"{self.provider_name} nepodporuje batch API")
+    
     @abstractmethod
     async def image_generation(
         self, 
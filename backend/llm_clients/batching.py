@@ -0,0 +1,309 @@
+"""
+Batch režim LLM volání přes asynchronní batch API providerů.
+
+Pro noční CSV běhy nepotřebujeme interaktivní latenci - requesty stejného
+provider/model ze všech souběžných pipeline (aktivit v procesu workeru) se po dobu
+window_seconds sbírají do jedné batch submission (OpenAI Batch API, Anthropic
+Message Batches). Dispatcher batch periodicky polluje a po dokončení rozdá výsledky
+čekajícím aktivitám podle custom_id. Čekající aktivita mezitím heartbeatuje.
+
+Batch u providera přežije worker i aktivitu - batch_id a custom_id odeslaného
+requestu se proto ukládají do checkpointu, který aktivita posílá v heartbeat
+details. Retry aktivity (restart workeru, heartbeat timeout) checkpoint načte
+a místo nové submission polluje původní batch.
+
+Konfigurace přes ENV LLM_BATCH (JSON):
+LLM_BATCH='{"window_seconds": 120, "max_requests": 500, "poll_interval": 60}'
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from config import load_env_settings
+
+logger = logging.getLogger(__name__)
+
+# Klíč checkpointu v heartbeat details aktivity: {otisk requestu: {"batch_id", "custom_id"}}
+CHECKPOINT_DETAILS_KEY = "batch_requests"
+
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+
+@dataclass
+class BatchSettings:
+    """Nastavení sběru a pollování batch submissions."""
+    window_seconds: float = 60.0  # jak dlouho sbírat requesty do jedné submission
+    max_requests: int = 1000  # plná submission se odešle hned
+    poll_interval: float = 60.0  # jak často se ptát providera na stav batche
+    max_wait: float = 86400.0  # completion window providerů (24 h)
+    heartbeat_interval: float = 10.0  # heartbeat čekající aktivity
+
+
+def load_batch_settings() -> BatchSettings:
+    """Nastavení z ENV LLM_BATCH."""
+    return load_env_settings("LLM_BATCH", BatchSettings)
+
+
+class BatchFailedError(Exception):
+    """Provider batch odmítl nebo zrušil (stav failed)."""
+
+
+class BatchUnavailableError(Exception):
+    """Batch z checkpointu nelze dopollovat (selhal, request v něm není) - request se odešle znovu."""
+
+
+def checkpoint_from_heartbeat(details: Sequence[Any]) -> Dict[str, Dict[str, str]]:
+    """Checkpoint odeslaných requestů z heartbeat details předchozího pokusu aktivity."""
+    for detail in details or ():
+        if isinstance(detail, dict) and isinstance(detail.get(CHECKPOINT_DETAILS_KEY), dict):
+            return dict(detail[CHECKPOINT_DETAILS_KEY])
+    return {}
+
+
+def request_fingerprint(params: Dict[str, Any]) -> str:
+    """Otisk requestu - stejný request v dalším pokusu aktivity najde svůj batch."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass(eq=False)
+class _PendingRequest:
+    custom_id: str
+    params: Dict[str, Any]
+    future: asyncio.Future
+    fingerprint: str = ""
+    checkpoint: Optional[Dict[str, Dict[str, str]]] = None
+    on_wait: Optional[Callable[..., Any]] = None
+
+    def heartbeat(self) -> None:
+        """Heartbeat aktivity - s checkpointem v details, pokud ho volající vede."""
+        if not self.on_wait:
+            return
+        if self.checkpoint is None:
+            self.on_wait()
+        else:
+            self.on_wait({CHECKPOINT_DETAILS_KEY: self.checkpoint})
+
+
+class BatchDispatcher:
+    """
+    Sbírá textové requesty per (provider, model) a posílá je jako batch submissions.
+
+    Jedna instance na proces workeru - všechny aktivity běží ve stejné event loop,
+    takže requesty souběžných pipeline končí ve společné submission.
+    """
+
+    def __init__(self, settings: Optional[BatchSettings] = None, client_factory: Optional[Callable[[str], Any]] = None):
+        self.settings = settings or load_batch_settings()
+        self._client_factory = client_factory
+        self._clients: Dict[str, Any] = {}
+        self._pending: Dict[Tuple[str, str], List[_PendingRequest]] = {}
+        self._timers: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._batches: Set[asyncio.Task] = set()
+        self._polls: Dict[str, asyncio.Task] = {}  # batch_id -> pollování sdílené obnovenými requesty
+
+    def _client(self, provider: str) -> Any:
+        if provider not in self._clients:
+            factory = self._client_factory
+            if factory is None:
+                from backend.llm_clients.factory import LLMClientFactory
+                factory = LLMClientFactory.create_client
+            self._clients[provider] = factory(provider)
+        return self._clients[provider]
+
+    def supports(self, provider: str) -> bool:
+        """Má provider batch API? Bez něj volání běží interaktivně."""
+        return bool(getattr(self._client(provider), "supports_batch", False))
+
+    async def submit(
+        self,
+        provider: str,
+        model: str,
+        system_prompt: str,
+        user_message: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        on_wait: Optional[Callable[..., Any]] = None,
+        checkpoint: Optional[Dict[str, Dict[str, str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Zařadí request do nejbližší batch submission a počká na jeho výsledek.
+
+        Args:
+            on_wait: heartbeat aktivity (activity.heartbeat) - s checkpointem dostane details
+            checkpoint: {otisk requestu: {"batch_id", "custom_id"}} - dispatcher do něj zapíše
+                odeslaný request; request nalezený v checkpointu se znovu neodesílá,
+                jen se dopolluje jeho batch
+
+        Returns:
+            Standardizovaný LLM response (stejný formát jako chat_completion)
+        """
+        key = (provider, model)
+        params = {
+            "system_prompt": system_prompt,
+            "user_message": user_message,
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        fingerprint = request_fingerprint(params)
+        submitted = (checkpoint or {}).get(fingerprint)
+        if submitted:
+            try:
+                return await self._resume(key, submitted, checkpoint, on_wait)
+            except BatchUnavailableError as e:
+                logger.warning(f"⚠️ {e} - request se odešle znovu")
+                checkpoint.pop(fingerprint, None)
+
+        request = _PendingRequest(
+            custom_id=uuid.uuid4().hex,
+            params=params,
+            future=asyncio.get_running_loop().create_future(),
+            fingerprint=fingerprint,
+            checkpoint=checkpoint,
+            on_wait=on_wait
+        )
+        pending = self._pending.setdefault(key, [])
+        pending.append(request)
+        if len(pending) >= self.settings.max_requests:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+
+        try:
+            return await self._wait(request.future, request)
+        finally:
+            if not request.future.done():
+                # Aktivita zrušena - výsledek se zahodí, neodeslaný request vypadne ze sběru
+                request.future.cancel()
+                if request in self._pending.get(key, []):
+                    self._pending[key].remove(request)
+
+    async def _resume(self, key: Tuple[str, str], submitted: Dict[str, str],
+                      checkpoint: Dict[str, Dict[str, str]], on_wait: Optional[Callable[..., Any]]) -> Dict[str, Any]:
+        """Dopolluje batch odeslaný předchozím pokusem aktivity a vrátí výsledek jejího requestu."""
+        provider, model = key
+        batch_id, custom_id = submitted["batch_id"], submitted["custom_id"]
+        logger.info(f"📦 Navazuji na batch {batch_id} (request {custom_id}) - bez nové submission")
+        poll = self._polls.get(batch_id)
+        if poll is None:
+            poll = asyncio.create_task(self._poll(self._client(provider), batch_id, time.monotonic()))
+            self._polls[batch_id] = poll
+            poll.add_done_callback(lambda _: self._polls.pop(batch_id, None))
+        waiter = _PendingRequest(custom_id, {}, poll, checkpoint=checkpoint, on_wait=on_wait)
+        try:
+            results = await self._wait(poll, waiter)
+        except BatchFailedError as e:
+            raise BatchUnavailableError(str(e))
+        result = results.get(custom_id)
+        if result is None:
+            raise BatchUnavailableError(f"Batch {batch_id} neobsahuje request {custom_id}")
+        if "error" in result:
+            raise Exception(f"❌ Batch request {custom_id} selhal: {result['error']}")
+        return result
+
+    async def _wait(self, future: asyncio.Future, request: _PendingRequest) -> Any:
+        deadline = time.monotonic() + self.settings.window_seconds + self.settings.max_wait
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=self.settings.heartbeat_interval)
+            except asyncio.TimeoutError:
+                if time.monotonic() > deadline:
+                    raise Exception(f"❌ Výsledek batch requestu {request.custom_id} nedorazil do {self.settings.max_wait:.0f}s")
+                request.heartbeat()
+
+    async def _flush_later(self, key: Tuple[str, str]) -> None:
+        await asyncio.sleep(self.settings.window_seconds)
+        self._timers.pop(key, None)
+        self._flush(key)
+
+    def _flush(self, key: Tuple[str, str]) -> None:
+        """Odešle nasbírané requesty klíče jako jednu submission."""
+        timer = self._timers.pop(key, None)
+        if timer and timer is not asyncio.current_task():
+            timer.cancel()
+        requests = [r for r in self._pending.pop(key, []) if not r.future.done()]
+        if not requests:
+            return
+        task = asyncio.create_task(self._run_batch(key, requests))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _poll(self, client: Any, batch_id: str, started: float) -> Dict[str, Dict[str, Any]]:
+        """Polluje batch do dokončení a vrátí výsledky podle custom_id."""
+        while True:
+            try:
+                status = await client.get_batch_status(batch_id)
+            except Exception as e:
+                # Výpadek pollování neznamená selhání batche - zkusíme to při dalším intervalu
+                logger.warning(f"⚠️ Stav batche {batch_id} nelze zjistit: {e}")
+                status = {"state": "in_progress"}
+            if status["state"] == "failed":
+                raise BatchFailedError(f"❌ Batch {batch_id} selhal: {status.get('error')}")
+            if status["state"] == "ended":
+                break
+            if time.monotonic() - started > self.settings.max_wait:
+                raise Exception(f"❌ Batch {batch_id} nedoběhl do {self.settings.max_wait:.0f}s")
+            await asyncio.sleep(self.settings.poll_interval)
+        return await client.get_batch_results(batch_id, status)
+
+    async def _run_batch(self, key: Tuple[str, str], requests: List[_PendingRequest]) -> None:
+        provider, model = key
+        client = self._client(provider)
+        started = time.monotonic()
+        try:
+            batch_id = await client.submit_batch([client.build_batch_request(r.custom_id, **r.params) for r in requests])
+            logger.info(f"📦 Batch {batch_id}: {len(requests)} requestů pro {provider}/{model}")
+            # Checkpoint hned po odeslání - retry aktivity naváže na tento batch
+            for request in requests:
+                if request.checkpoint is not None and not request.future.done():
+                    request.checkpoint[request.fingerprint] = {"batch_id": batch_id, "custom_id": request.custom_id}
+                    request.heartbeat()
+            results = await self._poll(client, batch_id, started)
+        except Exception as e:
+            logger.error(f"❌ Batch submission {provider}/{model} selhala: {e}")
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            self._record(provider, model, len(requests), started, {"failed": len(requests)})
+            return
+
+        outcomes = {"succeeded": 0, "errored": 0}
+        for request in requests:
+            result = results.get(request.custom_id) or {"error": "výsledek v batchi chybí"}
+            outcome = "errored" if "error" in result else "succeeded"
+            outcomes[outcome] += 1
+            if request.future.done():
+                continue
+            if outcome == "errored":
+                request.future.set_exception(Exception(f"❌ Batch request {request.custom_id} selhal: {result['error']}"))
+            else:
+                request.future.set_result(result)
+        logger.info(f"📦 Batch {batch_id} dokončen za {time.monotonic() - started:.0f}s: {outcomes}")
+        self._record(provider, model, len(requests), started, outcomes)
+
+    @staticmethod
+    def _record(provider: str, model: str, size: int, started: float, outcomes: Dict[str, int]) -> None:
+        if METRICS_AVAILABLE:
+            get_metrics_collector().record_llm_batch(provider, model, size, time.monotonic() - started, outcomes)
+
+
+_dispatcher: Optional[BatchDispatcher] = None
+
+
+def get_batch_dispatcher() -> BatchDispatcher:
+    """Sdílený dispatcher procesu workeru."""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = BatchDispatcher()
+    return _dispatcher
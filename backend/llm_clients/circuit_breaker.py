@@ -0,0 +1,276 @@
+"""
+Circuit breaker per LLM provider.
+
+Sleduje klouzavé okno výsledků volání (chybovost + podíl pomalých volání). Při degradaci
+providera se rychle otevře a další volání okamžitě odmítá, takže safe_llm_call
+nečeká na timeouty a může přepnout na fallback provider/model asistenta.
+Po uplynutí open_seconds pustí jedno zkušební volání (half-open) - úspěch
+breaker zavře, selhání ho znovu otevře.
+
+Stav je per proces (každý worker si degradaci zjistí sám během pár volání).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, fields
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Číselná hodnota stavu pro Prometheus gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+@dataclass
+class CircuitBreakerSettings:
+    """Prahy jednoho breakeru."""
+    window_seconds: float = 120.0  # klouzavé okno pro chybovost a latenci
+    min_calls: int = 4  # pod tento počet volání v okně se chybovost nevyhodnocuje
+    failure_rate_threshold: float = 0.5  # podíl chyb (vč. pomalých volání), který breaker otevře
+    consecutive_failures: int = 3  # tolik chyb za sebou otevře breaker hned (open fast)
+    slow_call_seconds: float = 90.0  # delší úspěšné volání se v okně počítá jako selhání
+    slow_call_stages: Dict[str, float] = field(default_factory=dict)  # práh per asistent/stage (function_key)
+    open_seconds: float = 30.0  # jak dlouho zůstane otevřený před zkušebním voláním
+    half_open_max_calls: int = 1  # počet souběžných zkušebních volání
+
+    def slow_call_threshold(self, stage: Optional[str] = None) -> float:
+        """Práh pomalého volání - reasoning stage (např. brief) smí běžet déle než krátké stage."""
+        return self.slow_call_stages.get(stage, self.slow_call_seconds) if stage else self.slow_call_seconds
+
+
+class CircuitOpenError(Exception):
+    """Breaker providera je otevřený - volání bylo odmítnuto bez kontaktu s API."""
+
+    def __init__(self, provider: str, retry_in: float):
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(f"❌ Circuit breaker pro {provider} je otevřený, další pokus za {retry_in:.0f}s")
+
+
+class CircuitBreaker:
+    """Breaker jednoho providera. Thread-safe, hodiny jsou injektovatelné kvůli testům."""
+
+    def __init__(
+        self,
+        name: str,
+        settings: Optional[CircuitBreakerSettings] = None,
+        clock: Callable[[], float] = time.monotonic,
+        on_state_change: Optional[Callable[["CircuitBreaker", str, str], None]] = None
+    ):
+        self.name = name
+        self.settings = settings or CircuitBreakerSettings()
+        self.clock = clock
+        self.on_state_change = on_state_change
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._consecutive_failures = 0
+        self._calls: Deque[Tuple[float, bool, float]] = deque()  # (čas, selhání, latence)
+
+    # ---- stav ----
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(self.clock())
+            return self._state
+
+    def _refresh(self, now: float) -> None:
+        """Otevřený breaker po open_seconds přejde do half-open."""
+        if self._state == OPEN and now - self._opened_at >= self.settings.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def _transition(self, new_state: str) -> None:
+        old_state = self._state
+        if old_state == new_state:
+            return
+        self._state = new_state
+        if new_state == OPEN:
+            self._opened_at = self.clock()
+        if new_state in (OPEN, HALF_OPEN):
+            self._half_open_in_flight = 0
+        if new_state == CLOSED:
+            self._calls.clear()
+            self._consecutive_failures = 0
+
+        log = logger.warning if new_state == OPEN else logger.info
+        log(f"🔌 Circuit breaker {self.name}: {old_state} -> {new_state}")
+        if self.on_state_change:
+            try:
+                self.on_state_change(self, old_state, new_state)
+            except Exception as e:
+                logger.debug(f"Listener circuit breakeru selhal: {e}")
+
+    def _prune(self, now: float) -> None:
+        horizon = now - self.settings.window_seconds
+        while self._calls and self._calls[0][0] < horizon:
+            self._calls.popleft()
+
+    def _failure_rate(self) -> float:
+        if not self._calls:
+            return 0.0
+        return sum(1 for _, failed, _ in self._calls if failed) / len(self._calls)
+
+    # ---- API pro volajícího ----
+
+    def allow_request(self) -> bool:
+        """
+        Smí volání proběhnout? V half-open stavu rezervuje slot zkušebního volání,
+        volající pak musí zavolat record_success/record_failure/release.
+        """
+        with self._lock:
+            self._refresh(self.clock())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_in_flight < self.settings.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """Za kolik sekund otevřený breaker pustí zkušební volání."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.settings.open_seconds - (self.clock() - self._opened_at))
+
+    def record_success(self, latency: float, stage: Optional[str] = None) -> None:
+        """
+        Úspěšné volání. Pomalé (nad prahem stage) se započítá do chybovosti okna,
+        ale nepřidá se k chybám za sebou - provider odpovídá, jen pomalu.
+        """
+        threshold = self.settings.slow_call_threshold(stage)
+        slow = latency >= threshold
+        if slow:
+            logger.warning(f"🐢 {self.name}: pomalé volání {latency:.1f}s (limit {threshold:.0f}s)")
+        with self._lock:
+            now = self.clock()
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+                return
+            self._consecutive_failures = 0
+            self._calls.append((now, slow, latency))
+            self._prune(now)
+            self._open_on_failure_rate()
+
+    def record_failure(self, latency: float = 0.0) -> None:
+        """Selhání volání (chyba API, timeout, nevalidní odpověď)."""
+        with self._lock:
+            now = self.clock()
+            if self._state == HALF_OPEN:
+                # Zkušební volání selhalo - provider je stále nezdravý
+                self._transition(OPEN)
+                return
+            self._consecutive_failures += 1
+            self._calls.append((now, True, latency))
+            self._prune(now)
+            if self._state != CLOSED:
+                return
+            if self._consecutive_failures >= self.settings.consecutive_failures:
+                self._transition(OPEN)
+            else:
+                self._open_on_failure_rate()
+
+    def _open_on_failure_rate(self) -> None:
+        s = self.settings
+        if self._state == CLOSED and len(self._calls) >= s.min_calls and self._failure_rate() >= s.failure_rate_threshold:
+            self._transition(OPEN)
+
+    def release(self) -> None:
+        """Volání skončilo bez verdiktu o zdraví providera (např. 429) - uvolní half-open slot."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    def snapshot(self) -> Dict[str, float]:
+        """Aktuální stav pro metriky a diagnostiku."""
+        with self._lock:
+            now = self.clock()
+            self._refresh(now)
+            self._prune(now)
+            latencies = sorted(latency for _, _, latency in self._calls)
+            return {
+                "state": self._state,
+                "calls": len(self._calls),
+                "failure_rate": self._failure_rate(),
+                "p95_latency": latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            }
+
+
+def load_breaker_settings() -> Dict[str, CircuitBreakerSettings]:
+    """
+    Přepisy prahů z ENV LLM_CIRCUIT_BREAKER (JSON), klíč "default" nebo název providera:
+    LLM_CIRCUIT_BREAKER='{"default": {"open_seconds": 60}, "claude": {"slow_call_seconds": 120}}'
+    Práh pomalého volání per stage: {"openai": {"slow_call_stages": {"brief_assistant": 300}}}
+    """
+    raw = os.getenv("LLM_CIRCUIT_BREAKER")
+    if not raw:
+        return {}
+    allowed = {f.name for f in fields(CircuitBreakerSettings)}
+    try:
+        overrides = json.loads(raw)
+        default = {k: v for k, v in overrides.get("default", {}).items() if k in allowed}
+        settings = {"default": CircuitBreakerSettings(**default)}
+        for provider, values in overrides.items():
+            if provider != "default":
+                merged = dict(default, **{k: v for k, v in values.items() if k in allowed})
+                settings[provider.lower()] = CircuitBreakerSettings(**merged)
+        return settings
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"❌ Neplatná konfigurace LLM_CIRCUIT_BREAKER: {e}")
+
+
+def _export_state(breaker: CircuitBreaker, old_state: str, new_state: str) -> None:
+    """Promítne přechod breakeru do Prometheus metrik (pokud jsou k dispozici)."""
+    if not METRICS_AVAILABLE:
+        return
+    metrics = get_metrics_collector()
+    metrics.record_circuit_transition(breaker.name, new_state)
+    metrics.set_circuit_state(breaker.name, STATE_VALUES[new_state], breaker._failure_rate())
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> Optional[CircuitBreaker]:
+    """
+    Vrátí breaker pro provider (singleton per proces).
+    None pokud je vypnutý přes LLM_CIRCUIT_BREAKER_ENABLED=false.
+    """
+    if os.getenv("LLM_CIRCUIT_BREAKER_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    key = (provider or "").lower()
+    with _breakers_lock:
+        if key not in _breakers:
+            settings = load_breaker_settings()
+            _breakers[key] = CircuitBreaker(
+                key,
+                settings.get(key) or settings.get("default"),
+                on_state_change=_export_state
+            )
+            if METRICS_AVAILABLE:
+                get_metrics_collector().set_circuit_state(key, STATE_VALUES[CLOSED], 0.0)
+        return _breakers[key]
+
+
+def get_breaker_states() -> Dict[str, Dict[str, float]]:
+    """Snapshot všech breakerů v procesu."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
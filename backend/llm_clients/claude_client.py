@@ -4,11 +4,15 @@ Implementuje Anthropic Claude API s multi-provider podporou.
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 import httpx
 import json
 
-from .base import BaseLLMClient
+from .base import (
+    BaseLLMClient, LLMRateLimitError, StreamCollector, retry_after_from_headers, iter_sse_json,
+    stream_timeouts_for
+)
+from .prompt_cache import cacheable
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +24,17 @@ CLAUDE_CONFIG = {
     "api_version": "2023-06-01"
 }
 
+# Tool, přes který Claude odevzdává strukturovaný výstup
+STRUCTURED_OUTPUT_TOOL = "structured_output"
+
 class ClaudeClient(BaseLLMClient):
     """
     Claude (Anthropic) LLM Client implementace.
     Podporuje Claude-3 modely pro text generation.
     """
     
+    supports_batch = True
+    
     def __init__(self, api_key: str):
         super().__init__(api_key)
         self.base_url = "https://api.anthropic.com/v1"
@@ -50,25 +59,152 @@ class ClaudeClient(BaseLLMClient):
         model: str,
         temperature: float = 0.7,
         max_tokens: int = 800,
+        shared_context: Optional[str] = None,
+        output_schema: Optional[Dict[str, Any]] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Claude Chat Completion přes Anthropic API.
+        shared_context je prefix user message společný více voláním (cachuje se).
+        output_schema vynutí strukturovaný výstup (tool use) - content je JSON.
         """
         self._log_request(model, system_prompt, user_message)
+        payload = self._build_payload(
+            system_prompt, user_message, model, temperature, max_tokens, kwargs, shared_context, output_schema
+        )
         
+        try:
+            async with httpx.AsyncClient(timeout=CLAUDE_CONFIG["timeout"]) as client:
+                response = await client.post(
+                    f"{self.base_url}/messages",
+                    headers=self.headers,
+                    json=payload
+                )
+                response.raise_for_status()
+                
+                result = self._message_to_response(
+                    response.json(), model, {"temperature": temperature, "max_tokens": max_tokens}
+                )
+                
+                self._log_response(result)
+                return result
+                
+        except httpx.HTTPStatusError as e:
+            self._raise_http_error(e)
+            
+        except Exception as e:
+            logger.error(f"❌ [CLAUDE] Chat completion selhalo: {str(e)}")
+            raise
+    
+    async def chat_completion_stream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: int = 800,
+        on_chunk: Optional[Callable[[], Any]] = None,
+        on_text: Optional[Callable[[str], Any]] = None,
+        shared_context: Optional[str] = None,
+        output_schema: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Claude Chat Completion se streamingem (SSE). on_chunk se volá při každé
+        události včetně ping, zaseknuté spojení spadne na idle timeoutu streamu (po prvním bajtu).
+        Se strukturovaným výstupem se streamuje JSON vstup toolu (input_json_delta).
+        """
+        self._log_request(model, system_prompt, user_message)
+        payload = self._build_payload(
+            system_prompt, user_message, model, temperature, max_tokens, kwargs, shared_context, output_schema
+        )
+        payload["stream"] = True
+        
+        collector = StreamCollector(on_chunk, on_text)
+        usage = {"input_tokens": 0, "output_tokens": 0, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        stop_reason = None
+        stop_sequence = None
+        timeouts = stream_timeouts_for(model)
+        
+        try:
+            async with collector.keepalive(), httpx.AsyncClient(timeout=timeouts.httpx_timeout()) as client:
+                async with client.stream("POST", f"{self.base_url}/messages", headers=self.headers, json=payload) as response:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    
+                    async for event in iter_sse_json(response, timeouts.idle_seconds):
+                        event_type = event.get("type")
+                        if event_type == "content_block_delta":
+                            delta = event.get("delta", {})
+                            collector.add(delta.get("text") or delta.get("partial_json"))
+                            continue
+                        collector.event()
+                        if event_type == "message_start":
+                            message = event.get("message", {})
+                            model = message.get("model", model)
+                            usage.update({k: v or 0 for k, v in message.get("usage", {}).items() if k in usage})
+                        elif event_type == "message_delta":
+                            stop_reason = event.get("delta", {}).get("stop_reason")
+                            stop_sequence = event.get("delta", {}).get("stop_sequence")
+                            usage["output_tokens"] = event.get("usage", {}).get("output_tokens", usage["output_tokens"])
+                        elif event_type == "error":
+                            raise Exception(f"Claude API stream error: {event.get('error', {}).get('message', event)}")
+            
+            result = self._standardize_response(
+                content=collector.content,
+                model=model,
+                usage=self._usage(usage),
+                metadata={
+                    "config_used": {
+                        "temperature": temperature,
+                        "max_tokens": max_tokens
+                    },
+                    "claude_data": {
+                        "stop_reason": stop_reason,
+                        "stop_sequence": stop_sequence
+                    },
+                    "streaming": collector.stats()
+                }
+            )
+            self._log_response(result)
+            return result
+        
+        except httpx.HTTPStatusError as e:
+            self._raise_http_error(e)
+        
+        except Exception as e:
+            logger.error(f"❌ [CLAUDE] Streamovaná chat completion selhala: {str(e)}")
+            raise
+    
+    def _build_payload(self, system_prompt: str, user_message: str, model: str, temperature: float,
+                       max_tokens: Optional[int], extra: Dict[str, Any],
+                       shared_context: Optional[str] = None,
+                       output_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Sestaví Messages API payload (společné pro standardní i streamované volání)."""
         # Ověření modelu
         if not self.validate_model(model):
             raise ValueError(f"Model {model} není podporován Claude providerem")
         
         # Varování před nepodporovanými parametry
-        unsupported = set(kwargs.keys()) - set(self.get_supported_parameters())
+        unsupported = set(extra.keys()) - set(self.get_supported_parameters())
         if unsupported:
             logger.warning(f"⚠️ [CLAUDE] Ignoruji nepodporované parametry: {list(unsupported)}")
         
+        # 🗄️ Prompt caching - statický system prompt a sdílený kontext dostanou cache_control breakpoint
+        system: Any = system_prompt
+        if cacheable(system_prompt):
+            system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        content: Any = f"{shared_context}{user_message}" if shared_context else user_message
+        if cacheable(shared_context):
+            content = [
+                {"type": "text", "text": shared_context, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": user_message}
+            ]
+        
         # Claude má specifický formát pro system prompt
         messages = [
-            {"role": "user", "content": user_message}
+            {"role": "user", "content": content}
         ]
         
         # Claude vyžaduje povinně max_tokens field s validní hodnotou
@@ -81,65 +217,147 @@ class ClaudeClient(BaseLLMClient):
             "model": model,
             "max_tokens": effective_max_tokens,
             "temperature": temperature,
-            "system": system_prompt,  # Claude má samostatné system pole
+            "system": system,  # Claude má samostatné system pole
             "messages": messages
         }
         
+        # 🧾 Structured output - Claude nemá JSON režim, vynucený tool use vrací vstup toolu podle schématu
+        if output_schema:
+            payload["tools"] = [{
+                "name": STRUCTURED_OUTPUT_TOOL,
+                "description": "Odevzdání výstupu ve strukturovaném formátu",
+                "input_schema": output_schema
+            }]
+            payload["tool_choice"] = {"type": "tool", "name": STRUCTURED_OUTPUT_TOOL}
+        
+        return payload
+    
+    @staticmethod
+    def _usage(usage: Dict[str, Any]) -> Dict[str, int]:
+        """Usage Claude API -> standardní formát. input_tokens nezahrnují tokeny čtené/zapsané do cache."""
+        cached = usage.get("cache_read_input_tokens") or 0
+        cache_write = usage.get("cache_creation_input_tokens") or 0
+        prompt_tokens = (usage.get("input_tokens") or 0) + cached + cache_write
+        completion_tokens = usage.get("output_tokens") or 0
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cached_tokens": cached,
+            "cache_write_tokens": cache_write
+        }
+    
+    def _message_to_response(self, data: Dict[str, Any], model: str, config_used: Dict[str, Any]) -> Dict[str, Any]:
+        """Převede Message objekt Claude API na standardizovaný response."""
+        # Claude response format parsing
+        content = ""
+        if "content" in data and len(data["content"]) > 0:
+            content = data["content"][0].get("text", "")
+        # Structured output - výsledek je vstup vynuceného toolu
+        for block in data.get("content") or []:
+            if block.get("type") == "tool_use" and block.get("name") == STRUCTURED_OUTPUT_TOOL:
+                content = json.dumps(block.get("input", {}), ensure_ascii=False)
+        
+        return self._standardize_response(
+            content=content,
+            model=data.get("model", model),
+            usage=self._usage(data.get("usage", {})),
+            metadata={
+                "config_used": config_used,
+                "claude_data": {
+                    "stop_reason": data.get("stop_reason"),
+                    "stop_sequence": data.get("stop_sequence")
+                }
+            }
+        )
+    
+    def build_batch_request(
+        self,
+        custom_id: str,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Request pro Message Batches API - stejný payload jako /messages."""
+        return {
+            "custom_id": custom_id,
+            "params": self._build_payload(system_prompt, user_message, model, temperature, max_tokens, {})
+        }
+    
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Odešle Message Batch (až 100 000 requestů, výsledky do 24 h)."""
         try:
             async with httpx.AsyncClient(timeout=CLAUDE_CONFIG["timeout"]) as client:
                 response = await client.post(
-                    f"{self.base_url}/messages",
+                    f"{self.base_url}/messages/batches",
                     headers=self.headers,
-                    json=payload
+                    json={"requests": requests}
                 )
                 response.raise_for_status()
-                
+                batch_id = response.json()["id"]
+        except httpx.HTTPStatusError as e:
+            self._raise_http_error(e)
+        logger.info(f"📦 [CLAUDE] Batch {batch_id} odeslán: {len(requests)} requestů")
+        return batch_id
+    
+    async def get_batch_status(self, batch_id: str) -> Dict[str, Any]:
+        """Stav Message Batche (processing_status in_progress / canceling / ended)."""
+        try:
+            async with httpx.AsyncClient(timeout=CLAUDE_CONFIG["timeout"]) as client:
+                response = await client.get(f"{self.base_url}/messages/batches/{batch_id}", headers=self.headers)
+                response.raise_for_status()
                 data = response.json()
-                
-                # Claude response format parsing
-                content = ""
-                if "content" in data and len(data["content"]) > 0:
-                    content = data["content"][0].get("text", "")
-                
-                usage = data.get("usage", {})
-                
-                result = self._standardize_response(
-                    content=content,
-                    model=data.get("model", model),
-                    usage={
-                        "prompt_tokens": usage.get("input_tokens", 0),
-                        "completion_tokens": usage.get("output_tokens", 0),
-                        "total_tokens": usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
-                    },
-                    metadata={
-                        "config_used": {
-                            "temperature": temperature,
-                            "max_tokens": max_tokens
-                        },
-                        "claude_data": {
-                            "stop_reason": data.get("stop_reason"),
-                            "stop_sequence": data.get("stop_sequence")
-                        }
-                    }
-                )
-                
-                self._log_response(result)
-                return result
-                
         except httpx.HTTPStatusError as e:
-            error_detail = ""
-            try:
-                error_data = e.response.json()
-                error_detail = error_data.get("error", {}).get("message", str(e))
-            except:
-                error_detail = str(e)
-            
-            logger.error(f"❌ [CLAUDE] HTTP Error {e.response.status_code}: {error_detail}")
-            raise Exception(f"Claude API error: {error_detail}")
-            
-        except Exception as e:
-            logger.error(f"❌ [CLAUDE] Chat completion selhalo: {str(e)}")
-            raise
+            self._raise_http_error(e)
+        ended = data.get("processing_status") == "ended"
+        return {
+            "state": "ended" if ended else "in_progress",
+            "results_url": data.get("results_url"),
+            "request_counts": data.get("request_counts", {})
+        }
+    
+    async def get_batch_results(self, batch_id: str, status: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Stáhne JSONL výsledky batche (succeeded / errored / canceled / expired)."""
+        url = status.get("results_url") or f"{self.base_url}/messages/batches/{batch_id}/results"
+        try:
+            async with httpx.AsyncClient(timeout=CLAUDE_CONFIG["timeout"]) as client:
+                response = await client.get(url, headers=self.headers)
+                response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            self._raise_http_error(e)
+        
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            result = item.get("result", {})
+            if result.get("type") == "succeeded":
+                message = result.get("message", {})
+                results[item["custom_id"]] = self._message_to_response(
+                    message, message.get("model", ""), {"batch_id": batch_id}
+                )
+            else:
+                # errored nese chybu v result.error.error, canceled / expired chybu nemají
+                error = (result.get("error") or {}).get("error") or {}
+                results[item["custom_id"]] = {"error": f"{result.get('type')}: {error.get('message', 'bez detailu')}"}
+        return results
+    
+    def _raise_http_error(self, e: httpx.HTTPStatusError):
+        """Převede HTTP chybu Claude API na LLMRateLimitError / Exception."""
+        error_detail = ""
+        try:
+            error_data = e.response.json()
+            error_detail = error_data.get("error", {}).get("message", str(e))
+        except:
+            error_detail = str(e)
+        
+        logger.error(f"❌ [CLAUDE] HTTP Error {e.response.status_code}: {error_detail}")
+        if e.response.status_code in (429, 529):  # rate limit / overloaded
+            raise LLMRateLimitError("claude", f"Claude API rate limit: {error_detail}", retry_after_from_headers(e.response.headers))
+        raise Exception(f"Claude API error: {error_detail}")
     
     async def image_generation(
         self, 
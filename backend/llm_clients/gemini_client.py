@@ -4,14 +4,42 @@ Implementuje Google Gemini API s multi-provider podporou.
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Tuple
 import httpx
 import json
 
-from .base import BaseLLMClient
+from .base import (
+    BaseLLMClient, LLMRateLimitError, StreamCollector, retry_after_from_headers, iter_sse_json,
+    stream_timeouts_for
+)
+from .prompt_cache import GeminiContextCache, cacheable, get_prompt_cache_settings, prompt_cache_key
 
 logger = logging.getLogger(__name__)
 
+# cachedContents sdílené všemi instancemi klienta v procesu (klient se vytváří per volání)
+_context_cache = GeminiContextCache()
+
+# Klíče JSON schématu, které podporuje Gemini responseSchema (OpenAPI podmnožina)
+_GEMINI_SCHEMA_KEYS = ("type", "properties", "required", "items", "minItems", "maxItems", "enum", "description")
+
+
+def _gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON schéma -> Gemini responseSchema (typy velkými písmeny, bez nepodporovaných klíčů)."""
+    converted: Dict[str, Any] = {}
+    for key in _GEMINI_SCHEMA_KEYS:
+        if key not in schema:
+            continue
+        value = schema[key]
+        if key == "type":
+            value = value.upper()
+        elif key == "properties":
+            value = {name: _gemini_schema(sub) for name, sub in value.items()}
+        elif key == "items":
+            value = _gemini_schema(value)
+        converted[key] = value
+    return converted
+
+
 # Gemini konfigurace
 GEMINI_CONFIG = {
     "temperature": 0.7,
@@ -30,6 +58,8 @@ class GeminiClient(BaseLLMClient):
         super().__init__(api_key)
         self.api_key = api_key
         self.base_url = f"https://generativelanguage.googleapis.com/{GEMINI_CONFIG['api_version']}"
+        # cachedContents API je dostupné ve v1beta
+        self.cache_base_url = "https://generativelanguage.googleapis.com/v1beta"
         self._log_config()
     
     def _log_config(self):
@@ -46,47 +76,22 @@ class GeminiClient(BaseLLMClient):
         model: str,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,  # Bez omezení tokenov
+        shared_context: Optional[str] = None,
+        output_schema: Optional[Dict[str, Any]] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
         Gemini Chat Completion přes Google Generative AI API.
+        shared_context je prefix user message společný více voláním (cachuje se).
+        output_schema zapne JSON režim (responseMimeType + responseSchema).
         """
         self._log_request(model, system_prompt, user_message)
-        
-        # Ověření modelu
-        if not self.validate_model(model):
-            raise ValueError(f"Model {model} není podporován Gemini providerem")
-        
-        # Varování před nepodporovanými parametry
-        unsupported = set(kwargs.keys()) - set(self.get_supported_parameters())
-        if unsupported:
-            logger.warning(f"⚠️ [GEMINI] Ignoruji nepodporované parametry: {list(unsupported)}")
-        
-        # Gemini formát - kombinuje system a user message
-        combined_prompt = f"{system_prompt}\n\nUser: {user_message}\n\nAssistant:"
+        base_url, payload, cache_key = await self._prepare_request(
+            system_prompt, user_message, model, temperature, max_tokens, kwargs, shared_context, output_schema
+        )
         
         # Gemini API endpoint
-        url = f"{self.base_url}/models/{model}:generateContent"
-        
-        generation_config = {
-            "temperature": temperature,
-            "candidateCount": 1
-        }
-        
-        # Přidáme maxOutputTokens pouze pokud je specifikováno a není -1 (neomezeno)
-        if max_tokens is not None and max_tokens != -1:
-            generation_config["maxOutputTokens"] = max_tokens
-        
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": combined_prompt}
-                    ]
-                }
-            ],
-            "generationConfig": generation_config
-        }
+        url = f"{base_url}/models/{model}:generateContent"
         
         try:
             async with httpx.AsyncClient(timeout=GEMINI_CONFIG["timeout"]) as client:
@@ -157,11 +162,7 @@ class GeminiClient(BaseLLMClient):
                 result = self._standardize_response(
                     content=content,
                     model=model,
-                    usage={
-                        "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
-                        "completion_tokens": usage_metadata.get("candidatesTokenCount", 0),
-                        "total_tokens": usage_metadata.get("totalTokenCount", 0)
-                    },
+                    usage=self._usage(usage_metadata),
                     metadata={
                         "config_used": {
                             "temperature": temperature,
@@ -178,20 +179,228 @@ class GeminiClient(BaseLLMClient):
                 return result
                 
         except httpx.HTTPStatusError as e:
-            error_detail = ""
-            try:
-                error_data = e.response.json()
-                error_detail = error_data.get("error", {}).get("message", str(e))
-            except:
-                error_detail = str(e)
-            
-            logger.error(f"❌ [GEMINI] HTTP Error {e.response.status_code}: {error_detail}")
-            raise Exception(f"Gemini API error: {error_detail}")
+            self._raise_http_error(e, cache_key)
             
         except Exception as e:
             logger.error(f"❌ [GEMINI] Chat completion selhalo: {str(e)}")
             raise
     
+    async def chat_completion_stream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        on_chunk: Optional[Callable[[], Any]] = None,
+        on_text: Optional[Callable[[str], Any]] = None,
+        shared_context: Optional[str] = None,
+        output_schema: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Gemini Chat Completion se streamingem (streamGenerateContent?alt=sse).
+        """
+        self._log_request(model, system_prompt, user_message)
+        base_url, payload, cache_key = await self._prepare_request(
+            system_prompt, user_message, model, temperature, max_tokens, kwargs, shared_context, output_schema
+        )
+        url = f"{base_url}/models/{model}:streamGenerateContent"
+        
+        collector = StreamCollector(on_chunk, on_text)
+        usage_metadata = {}
+        finish_reason = None
+        safety_ratings = []
+        timeouts = stream_timeouts_for(model)
+        
+        try:
+            async with collector.keepalive(), httpx.AsyncClient(timeout=timeouts.httpx_timeout()) as client:
+                async with client.stream(
+                    "POST",
+                    url,
+                    params={"key": self.api_key, "alt": "sse"},
+                    headers={"Content-Type": "application/json"},
+                    json=payload
+                ) as response:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()
+                    
+                    async for chunk in iter_sse_json(response, timeouts.idle_seconds):
+                        usage_metadata = chunk.get("usageMetadata", usage_metadata)
+                        candidates = chunk.get("candidates") or [{}]
+                        candidate = candidates[0]
+                        finish_reason = candidate.get("finishReason", finish_reason)
+                        safety_ratings = candidate.get("safetyRatings", safety_ratings)
+                        parts = candidate.get("content", {}).get("parts", [])
+                        collector.add("".join(part.get("text", "") for part in parts))
+            
+            # STRICT MODE - žádné fallbacky
+            if not collector.content:
+                raise ValueError(f"❌ GEMINI stream nevrátil žádný text (finish_reason={finish_reason})")
+            
+            result = self._standardize_response(
+                content=collector.content,
+                model=model,
+                usage=self._usage(usage_metadata),
+                metadata={
+                    "config_used": {
+                        "temperature": temperature,
+                        "max_output_tokens": max_tokens
+                    },
+                    "gemini_data": {
+                        "finish_reason": finish_reason,
+                        "safety_ratings": safety_ratings
+                    },
+                    "streaming": collector.stats()
+                }
+            )
+            self._log_response(result)
+            return result
+        
+        except httpx.HTTPStatusError as e:
+            self._raise_http_error(e, cache_key)
+        
+        except Exception as e:
+            logger.error(f"❌ [GEMINI] Streamovaná chat completion selhala: {str(e)}")
+            raise
+    
+    def _build_payload(self, system_prompt: str, user_message: str, model: str, temperature: float,
+                       max_tokens: Optional[int], extra: Dict[str, Any],
+                       shared_context: Optional[str] = None,
+                       output_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Sestaví generateContent payload (společné pro standardní i streamované volání)."""
+        # Ověření modelu
+        if not self.validate_model(model):
+            raise ValueError(f"Model {model} není podporován Gemini providerem")
+        
+        # Varování před nepodporovanými parametry
+        unsupported = set(extra.keys()) - set(self.get_supported_parameters())
+        if unsupported:
+            logger.warning(f"⚠️ [GEMINI] Ignoruji nepodporované parametry: {list(unsupported)}")
+        
+        # Gemini formát - kombinuje system a user message
+        combined_prompt = f"{system_prompt}\n\nUser: {shared_context or ''}{user_message}\n\nAssistant:"
+        
+        generation_config = {
+            "temperature": temperature,
+            "candidateCount": 1
+        }
+        
+        # Přidáme maxOutputTokens pouze pokud je specifikováno a není -1 (neomezeno)
+        if max_tokens is not None and max_tokens != -1:
+            generation_config["maxOutputTokens"] = max_tokens
+        
+        # 🧾 Structured output - JSON režim, schéma jen pokud předepisuje strukturu
+        if output_schema:
+            generation_config["responseMimeType"] = "application/json"
+            response_schema = _gemini_schema(output_schema)
+            if response_schema.get("properties"):
+                generation_config["responseSchema"] = response_schema
+        
+        payload = {
+            "contents": [
+                {
+                    "parts": [
+                        {"text": combined_prompt}
+                    ]
+                }
+            ],
+            "generationConfig": generation_config
+        }
+        
+        return payload
+    
+    async def _prepare_request(self, system_prompt: str, user_message: str, model: str, temperature: float,
+                               max_tokens: Optional[int], extra: Dict[str, Any],
+                               shared_context: Optional[str],
+                               output_schema: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any], Optional[str]]:
+        """
+        Payload generateContent - s cachovatelným system promptem / kontextem přes cachedContents.
+        
+        Returns:
+            (base URL API, payload, klíč použité cache nebo None)
+        """
+        payload = self._build_payload(
+            system_prompt, user_message, model, temperature, max_tokens, extra, shared_context, output_schema
+        )
+        # responseSchema je spolehlivě dostupné ve v1beta (stejně jako cachedContents)
+        base_url = self.cache_base_url if output_schema else self.base_url
+        cached_context = shared_context if cacheable(shared_context) else None
+        if not (cacheable(system_prompt) or cached_context):
+            return base_url, payload, None
+        
+        cache_key = prompt_cache_key(model, system_prompt, cached_context)
+        cache_name = await self._get_cached_content(cache_key, model, system_prompt, cached_context)
+        if not cache_name:
+            return base_url, payload, None
+        
+        # System prompt (a sdílený kontext) jsou v cache, posílá se jen proměnná část
+        tail = user_message if cached_context else f"{shared_context or ''}{user_message}"
+        payload["contents"] = [{"role": "user", "parts": [{"text": tail}]}]
+        payload["cachedContent"] = cache_name
+        return self.cache_base_url, payload, cache_key
+    
+    async def _get_cached_content(self, cache_key: str, model: str, system_prompt: str,
+                                  shared_context: Optional[str]) -> Optional[str]:
+        """Jméno cachedContents pro klíč - založí ho při prvním použití, neúspěch se pamatuje po dobu TTL."""
+        known, cache_name = _context_cache.get(cache_key)
+        if known:
+            return cache_name
+        
+        ttl = get_prompt_cache_settings().gemini_ttl_seconds
+        body: Dict[str, Any] = {
+            "model": f"models/{model}",
+            "systemInstruction": {"parts": [{"text": system_prompt}]},
+            "ttl": f"{ttl}s"
+        }
+        if shared_context:
+            body["contents"] = [{"role": "user", "parts": [{"text": shared_context}]}]
+        try:
+            async with httpx.AsyncClient(timeout=GEMINI_CONFIG["timeout"]) as client:
+                response = await client.post(
+                    f"{self.cache_base_url}/cachedContents",
+                    params={"key": self.api_key},
+                    headers={"Content-Type": "application/json"},
+                    json=body
+                )
+                response.raise_for_status()
+                cache_name = response.json().get("name")
+            logger.info(f"🗄️ [GEMINI] Založena cache {cache_name} pro {model} (TTL {ttl}s)")
+        except Exception as e:
+            # Např. prompt pod minimem tokenů modelu - volání poběží bez cache
+            logger.warning(f"⚠️ [GEMINI] cachedContents pro {model} nelze založit, pokračuji bez cache: {e}")
+            cache_name = None
+        _context_cache.put(cache_key, cache_name, ttl)
+        return cache_name
+    
+    @staticmethod
+    def _usage(usage_metadata: Dict[str, Any]) -> Dict[str, int]:
+        """usageMetadata -> standardní formát vč. tokenů z cache."""
+        return {
+            "prompt_tokens": usage_metadata.get("promptTokenCount", 0),
+            "completion_tokens": usage_metadata.get("candidatesTokenCount", 0),
+            "total_tokens": usage_metadata.get("totalTokenCount", 0),
+            "cached_tokens": usage_metadata.get("cachedContentTokenCount", 0)
+        }
+    
+    def _raise_http_error(self, e: httpx.HTTPStatusError, cache_key: Optional[str] = None):
+        """Převede HTTP chybu Gemini API na LLMRateLimitError / Exception."""
+        if cache_key and e.response.status_code in (403, 404):
+            # Cache mezitím expirovala / byla smazána - retry si založí novou
+            _context_cache.invalidate(cache_key)
+        error_detail = ""
+        try:
+            error_data = e.response.json()
+            error_detail = error_data.get("error", {}).get("message", str(e))
+        except:
+            error_detail = str(e)
+        
+        logger.error(f"❌ [GEMINI] HTTP Error {e.response.status_code}: {error_detail}")
+        if e.response.status_code == 429:
+            raise LLMRateLimitError("gemini", f"Gemini API rate limit: {error_detail}", retry_after_from_headers(e.response.headers))
+        raise Exception(f"Gemini API error: {error_detail}")
+    
     async def image_generation(
         self, 
         prompt: str, 
@@ -337,6 +546,8 @@ class GeminiClient(BaseLLMClient):
                 error_detail = str(e)
             
             logger.error(f"❌ [FAL.AI] Image generation HTTP Error {e.response.status_code}: {error_detail}")
+            if e.response.status_code == 429:
+                raise LLMRateLimitError("gemini", f"FAL.AI rate limit: {error_detail}", retry_after_from_headers(e.response.headers))
             raise Exception(f"FAL.AI Image generation error: {error_detail}")
             
         except Exception as e:
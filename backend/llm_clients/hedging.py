@@ -0,0 +1,212 @@
+"""
+Hedged LLM requesty proti dlouhému chvostu latence.
+
+Když primární volání neodpoví do zvoleného kvantilu nedávných latencí daného
+provider/model, spustí se duplikát (volitelně na jiný provider/model). Vyhrává
+první úspěšná odpověď, poražené volání se zruší. Objem hedgí je omezený
+rozpočtem per asistent (podíl z počtu volání v klouzavém okně).
+
+Hedging je opt-in přes ENV LLM_HEDGING (klíč = function_key asistenta nebo "default"):
+LLM_HEDGING='{"draft_assistant": {"quantile": 0.9, "budget_ratio": 0.1, "provider": "openai", "model": "gpt-4o"}}'
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Kolik posledních latencí držet per provider/model
+LATENCY_SAMPLES = 200
+
+
+@dataclass
+class HedgePolicy:
+    """Hedging konfigurace jednoho asistenta."""
+    quantile: float = 0.95  # hedge po tomto kvantilu nedávných latencí
+    min_samples: int = 10  # bez dostatku vzorků se nehedguje (leda s initial_delay)
+    min_delay: float = 5.0  # nikdy nehedgovat dřív
+    initial_delay: Optional[float] = None  # zpoždění, dokud není dost vzorků (None = nehedgovat)
+    budget_ratio: float = 0.1  # max podíl hedgí vůči volání v okně
+    budget_burst: int = 1  # hedge povolené i při malém počtu volání
+    budget_window: float = 3600.0
+    provider: Optional[str] = None  # cíl duplikátu (default = stejný provider)
+    model: Optional[str] = None  # cíl duplikátu (default = stejný model)
+
+
+class LatencyTracker:
+    """Klouzavé vzorky latencí úspěšných volání per provider/model."""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES):
+        self.max_samples = max_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(provider: str, model: str) -> str:
+        return f"{(provider or '').lower()}/{(model or '').lower()}"
+
+    def record(self, provider: str, model: str, latency: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(self._key(provider, model), deque(maxlen=self.max_samples))
+            samples.append(latency)
+
+    def quantile(self, provider: str, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """Kvantil latence, None pokud je vzorků méně než min_samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(self._key(provider, model), ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+        return samples[index]
+
+
+class HedgeBudget:
+    """Rozpočet hedgí per asistent - počet hedgí v okně <= budget_ratio * počet volání."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._calls: Dict[str, Deque[float]] = {}
+        self._hedges: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prune(events: Deque[float], horizon: float) -> None:
+        while events and events[0] < horizon:
+            events.popleft()
+
+    def record_call(self, key: str) -> None:
+        with self._lock:
+            self._calls.setdefault(key, deque()).append(self.clock())
+
+    def try_spend(self, key: str, policy: HedgePolicy) -> bool:
+        """Rezervuje jeden hedge, pokud to rozpočet asistenta dovolí."""
+        with self._lock:
+            now = self.clock()
+            calls = self._calls.setdefault(key, deque())
+            hedges = self._hedges.setdefault(key, deque())
+            self._prune(calls, now - policy.budget_window)
+            self._prune(hedges, now - policy.budget_window)
+            allowed = max(int(policy.budget_ratio * len(calls)), policy.budget_burst)
+            if len(hedges) >= allowed:
+                return False
+            hedges.append(now)
+            return True
+
+
+def hedge_delay(policy: HedgePolicy, tracker: LatencyTracker, provider: str, model: str) -> Optional[float]:
+    """Za kolik sekund spustit duplikát. None = pro tento provider/model zatím nehedgovat."""
+    observed = tracker.quantile(provider, model, policy.quantile, policy.min_samples)
+    if observed is None:
+        observed = policy.initial_delay
+    if observed is None:
+        return None
+    return max(policy.min_delay, observed)
+
+
+async def _cancel(task: "asyncio.Task") -> None:
+    task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[Any]],
+    hedge: Callable[[], Awaitable[Any]],
+    delay: float,
+    on_hedge: Optional[Callable[[], bool]] = None
+) -> Tuple[Any, bool]:
+    """
+    Spustí primary, po delay sekundách bez odpovědi i hedge. Vrací první úspěšný výsledek.
+
+    Args:
+        on_hedge: volá se těsně před spuštěním duplikátu; vrátí-li False, duplikát se nespustí
+                  (např. vyčerpaný rozpočet)
+
+    Returns:
+        (výsledek, True pokud vyhrál duplikát)
+
+    Raises:
+        Chybu primárního volání, pokud selžou obě
+    """
+    primary_task = asyncio.ensure_future(primary())
+    hedge_task = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done or (on_hedge is not None and not on_hedge()):
+            return await primary_task, False
+
+        hedge_task = asyncio.ensure_future(hedge())
+        pending = {primary_task, hedge_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for loser in pending:
+                        await _cancel(loser)
+                    return task.result(), task is hedge_task
+                logger.warning(f"⚠️ {'Hedge' if task is hedge_task else 'Primární'} volání selhalo: {task.exception()}")
+        # Obě selhala - propagujeme chybu primárního volání
+        return primary_task.result(), False
+    finally:
+        for task in (primary_task, hedge_task):
+            if task is not None and not task.done():
+                await _cancel(task)
+
+
+def load_hedge_policies() -> Dict[str, HedgePolicy]:
+    """Hedging politiky z ENV LLM_HEDGING (JSON), klíč = function_key nebo "default"."""
+    raw = os.getenv("LLM_HEDGING")
+    if not raw:
+        return {}
+    allowed = {f.name for f in fields(HedgePolicy)}
+    try:
+        policies = {}
+        for key, values in json.loads(raw).items():
+            unknown = set(values) - allowed
+            if unknown:
+                raise ValueError(f"neznámé klíče {sorted(unknown)}")
+            policies[key] = HedgePolicy(**values)
+        return policies
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"❌ Neplatná konfigurace LLM_HEDGING: {e}")
+
+
+def get_hedge_policy(hedge_key: Optional[str]) -> Optional[HedgePolicy]:
+    """Politika pro asistenta (function_key), fallback na "default". None = hedging vypnutý."""
+    policies = load_hedge_policies()
+    if not policies:
+        return None
+    return policies.get(hedge_key or "") or policies.get("default")
+
+
+def record_hedge(provider: str, model: str, outcome: str) -> None:
+    """Započítá hedge do Prometheus metrik (outcome: launched / won)."""
+    if METRICS_AVAILABLE:
+        get_metrics_collector().record_llm_hedge(provider, model, outcome)
+
+
+_latency_tracker = LatencyTracker()
+_hedge_budget = HedgeBudget()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    return _latency_tracker
+
+
+def get_hedge_budget() -> HedgeBudget:
+    return _hedge_budget
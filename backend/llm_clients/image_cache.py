@@ -0,0 +1,240 @@
+"""
+Deduplikační cache generování obrázků.
+
+MultimediaAssistant generuje pro příbuzná témata jedné dávky téměř stejné
+image prompty a retry ImageRendereru generuje znovu obrázky, které už existují.
+Cache před image_generation proto vrací URL už vygenerovaného obrázku:
+    přesná shoda - normalizovaný prompt + provider/model + size/quality/style
+    blízká shoda - (volitelně) Jaccard podobnost slovních shinglů promptu
+                   se stejným modelem a parametry
+
+Cache je v procesu workeru (LRU podle max_entries). URL providerů expirují
+(DALL-E ~1 h), proto ttl_seconds - obrázky si pro publish stejně stáhne
+image_assets_activity.
+
+Konfigurace přes ENV IMAGE_GENERATION_CACHE (JSON):
+IMAGE_GENERATION_CACHE='{"enabled": true, "max_entries": 1000, "ttl_seconds": 3000, "similarity": 0.85}'
+    similarity  - práh blízké shody (0 = jen přesná shoda)
+    shingle_size - počet slov v shinglu
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Optional, Set, Tuple
+
+from config import load_env_settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+EXACT = "exact"
+NEAR = "near"
+MISS = "miss"
+
+
+@dataclass
+class ImageCacheSettings:
+    """Nastavení deduplikační cache obrázků."""
+    enabled: bool = True
+    max_entries: int = 1000
+    ttl_seconds: int = 3000  # rezerva pod expirací podepsaných URL providerů
+    similarity: float = 0.0  # 0 = blízká shoda vypnutá
+    shingle_size: int = 3
+
+
+def _validate_settings(settings: ImageCacheSettings) -> None:
+    if not 0 <= settings.similarity <= 1:
+        raise ValueError("similarity musí být v rozsahu 0-1")
+    if settings.max_entries < 1 or settings.shingle_size < 1:
+        raise ValueError("max_entries a shingle_size musí být kladné")
+
+
+def load_image_cache_settings() -> ImageCacheSettings:
+    """Nastavení z ENV IMAGE_GENERATION_CACHE."""
+    return load_env_settings("IMAGE_GENERATION_CACHE", ImageCacheSettings, _validate_settings)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Prompt bez rozdílů ve velikosti písmen, interpunkci a bílých znacích."""
+    text = unicodedata.normalize("NFKC", prompt or "").lower()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def prompt_shingles(normalized: str, size: int) -> FrozenSet[str]:
+    """Množina po sobě jdoucích n-tic slov (kratší prompt = jeden shingle)."""
+    words = normalized.split()
+    if len(words) <= size:
+        return frozenset([" ".join(words)]) if words else frozenset()
+    return frozenset(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def variant_key(provider: str, model: str, size: Optional[str], quality: Optional[str], style: Optional[str]) -> str:
+    """Parametry generování, které musí sedět i u blízké shody."""
+    return "|".join(part or "" for part in (provider, model, size, quality, style))
+
+
+@dataclass
+class _Entry:
+    variant: str
+    url: str
+    shingles: FrozenSet[str]
+    expires_at: float
+
+
+@dataclass
+class ImageCacheBatch:
+    """Statistika cache pro jednu dávku promptů (jedno volání ImageRendereru)."""
+    hits: int = 0
+    near_hits: int = 0
+    misses: int = 0
+
+    def record(self, match: str) -> None:
+        if match == EXACT:
+            self.hits += 1
+        elif match == NEAR:
+            self.near_hits += 1
+        else:
+            self.misses += 1
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.hits + self.near_hits + self.misses
+        saved = self.hits + self.near_hits
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "saved_generations": saved,
+            "hit_rate": round(saved / total, 3) if total else 0.0
+        }
+
+
+class ImageGenerationCache:
+    """
+    LRU cache URL vygenerovaných obrázků - klíč (normalizovaný prompt, model, parametry).
+
+    Pro blízkou shodu drží invertovaný index shingle -> klíče, takže kandidáti
+    se hledají jen mezi záznamy se společným shinglem, ne přes celou cache.
+    """
+
+    def __init__(self, settings: Optional[ImageCacheSettings] = None):
+        self.settings = settings or load_image_cache_settings()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._shingle_index: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(normalized: str, variant: str) -> str:
+        return hashlib.sha256(f"{variant}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for shingle in entry.shingles:
+            keys = self._shingle_index.get(shingle)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._shingle_index[shingle]
+
+    def _near_match(self, shingles: FrozenSet[str], variant: str, now: float, exclude: Set[str]) -> Optional[str]:
+        overlaps: Dict[str, int] = {}
+        for shingle in shingles:
+            for key in self._shingle_index.get(shingle, ()):
+                overlaps[key] = overlaps.get(key, 0) + 1
+        best_key, best_score = None, self.settings.similarity
+        for key, common in overlaps.items():
+            entry = self._entries[key]
+            if entry.variant != variant or entry.expires_at <= now or entry.url in exclude:
+                continue
+            score = common / (len(shingles) + len(entry.shingles) - common)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def lookup(self, prompt: str, provider: str, model: str, size: Optional[str] = None,
+               quality: Optional[str] = None, style: Optional[str] = None,
+               exclude_urls: Optional[Set[str]] = None) -> Tuple[str, Optional[str]]:
+        """
+        Args:
+            exclude_urls: URL, které se vrátit nesmí (obrázky už použité ve stejném článku)
+
+        Returns:
+            (EXACT | NEAR | MISS, URL obrázku nebo None)
+        """
+        if not self.settings.enabled:
+            return MISS, None
+        normalized = normalize_prompt(prompt)
+        variant = variant_key(provider, model, size, quality, style)
+        key = self._key(normalized, variant)
+        now = time.time()
+        exclude = exclude_urls or set()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove(key)
+                entry = None
+            if entry is not None and entry.url in exclude:
+                entry = None
+            match = EXACT if entry is not None else MISS
+            if entry is None and self.settings.similarity > 0:
+                key = self._near_match(prompt_shingles(normalized, self.settings.shingle_size), variant, now, exclude)
+                if key is not None:
+                    entry, match = self._entries[key], NEAR
+            if entry is None:
+                return MISS, None
+            self._entries.move_to_end(key)
+            return match, entry.url
+
+    def store(self, prompt: str, provider: str, model: str, url: str, size: Optional[str] = None,
+              quality: Optional[str] = None, style: Optional[str] = None) -> None:
+        """Uloží URL vygenerovaného obrázku; nejdéle nepoužitý záznam nad max_entries vypadne."""
+        if not self.settings.enabled or not url:
+            return
+        normalized = normalize_prompt(prompt)
+        variant = variant_key(provider, model, size, quality, style)
+        key = self._key(normalized, variant)
+        shingles = prompt_shingles(normalized, self.settings.shingle_size)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(variant, url, shingles, time.time() + self.settings.ttl_seconds)
+            for shingle in shingles:
+                self._shingle_index.setdefault(shingle, set()).add(key)
+            while len(self._entries) > self.settings.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def record_image_cache_batch(provider: str, model: str, batch: ImageCacheBatch) -> Dict[str, Any]:
+    """Zaloguje (a do metrik zapíše) úsporu cache za dávku; vrací souhrn pro výstup ImageRendereru."""
+    summary = batch.summary()
+    if summary["saved_generations"]:
+        logger.info(f"🗃️ Image cache {provider}/{model}: ušetřeno {summary['saved_generations']} generování "
+                    f"({summary['hits']} přesných, {summary['near_hits']} blízkých shod, {summary['misses']} nových)")
+    if METRICS_AVAILABLE:
+        get_metrics_collector().record_image_cache(provider, model, {EXACT: batch.hits, NEAR: batch.near_hits, MISS: batch.misses})
+    return summary
+
+
+_cache: Optional[ImageGenerationCache] = None
+
+
+def get_image_generation_cache() -> ImageGenerationCache:
+    global _cache
+    if _cache is None:
+        _cache = ImageGenerationCache()
+    return _cache
@@ -0,0 +1,273 @@
+"""
+Cross-topic micro-batching levných stage.
+
+Stage s krátkým strukturovaným výstupem (Brief, SEO metadata) posílají při velkém
+CSV běhu stovky téměř stejných requestů - pokaždé se stejným dlouhým system_prompt.
+Micro-batcher v procesu workeru sbírá requesty stejného asistenta (provider, model,
+system prompt, teplota) po dobu window_seconds a pošle je jako jeden multi-topic
+prompt se strukturovanou JSON odpovědí. Výsledky se rozdělí zpět jednotlivým
+workflow podle pořadí zadání.
+
+Zadání, jehož výsledek ve sloučené odpovědi chybí (nebo sloučené volání selže),
+se zopakuje samostatným voláním v kontextu své aktivity - výstup stage tak nikdy
+nezávisí na tom, s kým byl request sloučen.
+
+Sloučené volání běží ve vlastním tasku s prázdným contextvars kontextem - nepatří
+žádné z čekajících aktivit (zrušení ani dokončení jedné z nich ho neovlivní) a jeho
+heartbeaty (chunky streamu, čekání na rate limit, retry) dostane každá čekající aktivita.
+
+Konfigurace přes ENV LLM_MICRO_BATCH (JSON):
+LLM_MICRO_BATCH='{"stages": ["brief_assistant", "seo_assistant"], "window_seconds": 2, "max_topics": 8}'
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import load_env_settings
+from helpers.json_extract import extract_json
+
+logger = logging.getLogger(__name__)
+
+try:
+    from monitoring.prometheus_metrics import get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+# Výsledek "zavolej samostatně" pro čekající aktivitu
+_STANDALONE = object()
+
+
+@dataclass
+class MicroBatchSettings:
+    """Nastavení slučování requestů napříč tématy."""
+    stages: Tuple[str, ...] = ()  # function_key asistentů, které se slučují (prázdné = vypnuto)
+    window_seconds: float = 2.0  # jak dlouho sbírat requesty do jednoho volání
+    max_topics: int = 8  # plná skupina se odešle hned
+    heartbeat_interval: float = 5.0  # heartbeat čekající aktivity
+
+
+def _validate_settings(settings: MicroBatchSettings) -> None:
+    if settings.max_topics < 2:
+        raise ValueError("max_topics musí být alespoň 2")
+
+
+def load_micro_batch_settings() -> MicroBatchSettings:
+    """Nastavení z ENV LLM_MICRO_BATCH."""
+    return load_env_settings("LLM_MICRO_BATCH", MicroBatchSettings, _validate_settings, tuple_keys=("stages",))
+
+
+def build_combined_message(messages: List[str]) -> str:
+    """Jeden multi-topic prompt z user messages jednotlivých témat."""
+    parts = [
+        f"Následuje {len(messages)} navzájem nezávislých zadání. Každé zpracuj samostatně přesně podle "
+        "instrukcí v systémovém promptu, jako by bylo jediné - obsah jednoho zadání nesmí ovlivnit ostatní.",
+        "Odpověz POUZE JSON objektem ve tvaru "
+        '{"results": [{"id": 1, "output": "<kompletní výstup pro zadání 1>"}, ...]} '
+        "- pro každé zadání právě jeden prvek, output je celý výstup jako řetězec.",
+    ]
+    for index, message in enumerate(messages, start=1):
+        parts.append(f"=== ZADÁNÍ {index} ===\n{message}")
+    return "\n\n".join(parts)
+
+
+def parse_combined_response(content: str, count: int) -> Dict[int, str]:
+    """
+    Rozdělí sloučenou odpověď na výstupy jednotlivých zadání.
+
+    Returns:
+        {id zadání (1..count): výstup} - chybějící nebo nevalidní prvky ve slovníku nejsou
+    """
+    data = extract_json(content or "", default=None)
+    items = data.get("results") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return {}
+
+    outputs: Dict[int, str] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id, output = item.get("id"), item.get("output")
+        if isinstance(item_id, str) and item_id.strip().isdigit():
+            item_id = int(item_id)
+        if not isinstance(item_id, int) or not 1 <= item_id <= count or item_id in outputs:
+            continue
+        if isinstance(output, (dict, list)):
+            # Strukturovaný výstup (SEO metadata) vrátíme jako JSON text, stejně jako samostatné volání
+            output = json.dumps(output, ensure_ascii=False, indent=2)
+        if isinstance(output, str) and output.strip():
+            outputs[item_id] = output.strip()
+    return outputs
+
+
+def _no_heartbeat(*details: Any) -> None:
+    pass
+
+
+@dataclass(eq=False)
+class _PendingTopic:
+    user_message: str
+    call: Callable[[str, Optional[int], Callable[..., Any]], Awaitable[Dict[str, Any]]]
+    max_tokens: Optional[int]
+    future: asyncio.Future
+    on_wait: Optional[Callable[[], Any]] = None
+    context: Optional[contextvars.Context] = None  # kontext aktivity - heartbeat z tasku skupiny
+
+
+class MicroBatcher:
+    """
+    Slučuje requesty stejného asistenta napříč tématy do jednoho volání.
+
+    Jedna instance na proces workeru - souběžné aktivity různých pipeline běží
+    ve stejné event loop a sdílí skupiny podle klíče (function_key, provider,
+    model, system prompt, teplota).
+    """
+
+    def __init__(self, settings: Optional[MicroBatchSettings] = None):
+        self.settings = settings or load_micro_batch_settings()
+        self._pending: Dict[Hashable, List[_PendingTopic]] = {}
+        self._timers: Dict[Hashable, asyncio.Task] = {}
+        self._groups = set()
+
+    def enabled_for(self, function_key: str) -> bool:
+        return function_key in self.settings.stages
+
+    async def submit(
+        self,
+        key: Hashable,
+        function_key: str,
+        user_message: str,
+        call: Callable[[str, Optional[int], Callable[..., Any]], Awaitable[Dict[str, Any]]],
+        max_tokens: Optional[int] = None,
+        on_wait: Optional[Callable[[], Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Zařadí téma do skupiny a vrátí jeho výsledek.
+
+        Args:
+            key: Klíč skupiny - slučují se jen requesty se stejným klíčem
+            function_key: Asistent (logy, metriky)
+            user_message: User message tohoto tématu
+            call: async (message, max_tokens, heartbeat) -> LLM response; stejný pro celou skupinu
+                (nesmí záviset na kontextu aktivity - heartbeatuje jen přes předaný heartbeat)
+            max_tokens: Limit výstupu jednoho tématu (sloučené volání dostane násobek)
+            on_wait: Heartbeat čekající aktivity
+
+        Returns:
+            Standardizovaný LLM response tématu (s klíčem "micro_batch" při sloučení)
+        """
+        group_key = (function_key, key)
+        topic = _PendingTopic(user_message, call, max_tokens, asyncio.get_running_loop().create_future(),
+                              on_wait, contextvars.copy_context())
+        pending = self._pending.setdefault(group_key, [])
+        pending.append(topic)
+        if len(pending) >= self.settings.max_topics:
+            self._flush(group_key)
+        elif group_key not in self._timers:
+            self._timers[group_key] = asyncio.create_task(self._flush_later(group_key))
+
+        try:
+            result = await self._wait(topic, on_wait)
+        finally:
+            if not topic.future.done():
+                # Aktivita zrušena - neodeslané téma vypadne ze skupiny
+                topic.future.cancel()
+                if topic in self._pending.get(group_key, []):
+                    self._pending[group_key].remove(topic)
+
+        if result is _STANDALONE:
+            return await call(user_message, max_tokens, on_wait or _no_heartbeat)
+        return result
+
+    async def _wait(self, topic: _PendingTopic, on_wait: Optional[Callable[[], Any]]) -> Any:
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(topic.future), timeout=self.settings.heartbeat_interval)
+            except asyncio.TimeoutError:
+                if on_wait:
+                    on_wait()
+
+    async def _flush_later(self, group_key: Hashable) -> None:
+        await asyncio.sleep(self.settings.window_seconds)
+        self._timers.pop(group_key, None)
+        self._flush(group_key)
+
+    def _flush(self, group_key: Hashable) -> None:
+        timer = self._timers.pop(group_key, None)
+        if timer and timer is not asyncio.current_task():
+            timer.cancel()
+        topics = [t for t in self._pending.pop(group_key, []) if not t.future.done()]
+        if len(topics) == 1:
+            # Nebylo s kým sloučit - téma se zavolá samostatně
+            topics[0].future.set_result(_STANDALONE)
+        elif topics:
+            # Prázdný kontext - task skupiny nedědí kontext aktivity, která skupinu naplnila
+            task = asyncio.create_task(self._run_group(group_key[0], topics), context=contextvars.Context())
+            self._groups.add(task)
+            task.add_done_callback(self._groups.discard)
+
+    @staticmethod
+    def _heartbeat_waiters(topics: List[_PendingTopic]) -> None:
+        """Heartbeat všech aktivit, které na skupinu ještě čekají (každá ve svém kontextu)."""
+        for topic in topics:
+            if topic.on_wait and not topic.future.done():
+                try:
+                    topic.context.run(topic.on_wait)
+                except Exception as e:
+                    logger.debug(f"Heartbeat čekající aktivity selhal: {e}")
+
+    async def _run_group(self, function_key: str, topics: List[_PendingTopic]) -> None:
+        count = len(topics)
+        limits = [t.max_tokens for t in topics]
+        max_tokens = sum(limits) if all(limits) else None
+        try:
+            # call se liší jen closure aktivity - klíč skupiny zaručuje stejný provider, model i prompt
+            response = await topics[0].call(build_combined_message([t.user_message for t in topics]), max_tokens,
+                                            lambda *details: self._heartbeat_waiters(topics))
+            outputs = parse_combined_response(response.get("content", ""), count)
+        except Exception as e:
+            logger.warning(f"⚠️ Sloučené volání {function_key} ({count} témat) selhalo, témata poběží samostatně: {e}")
+            response, outputs = {}, {}
+
+        merged = len(outputs)
+        usage = {
+            name: value // max(merged, 1)
+            for name, value in (response.get("usage") or {}).items() if isinstance(value, int)
+        }
+        for index, topic in enumerate(topics, start=1):
+            if topic.future.done():
+                continue
+            if index in outputs:
+                topic.future.set_result({
+                    **response,
+                    "content": outputs[index],
+                    "usage": usage,
+                    "micro_batch": {"size": count}
+                })
+            else:
+                topic.future.set_result(_STANDALONE)
+
+        if merged < count:
+            logger.warning(f"⚠️ {function_key}: sloučená odpověď obsahuje {merged}/{count} výsledků, zbytek samostatně")
+        else:
+            logger.info(f"🧺 {function_key}: {count} témat jedním voláním")
+        if METRICS_AVAILABLE:
+            get_metrics_collector().record_llm_micro_batch(
+                function_key, count, {"merged": merged, "fallback": count - merged}
+            )
+
+
+_micro_batcher: Optional[MicroBatcher] = None
+
+
+def get_micro_batcher() -> MicroBatcher:
+    """Sdílený micro-batcher procesu workeru."""
+    global _micro_batcher
+    if _micro_batcher is None:
+        _micro_batcher = MicroBatcher()
+    return _micro_batcher
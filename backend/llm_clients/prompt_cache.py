@@ -0,0 +1,115 @@
+"""
+Provider-side prompt caching statických system promptů.
+
+System prompt asistenta z databáze je pro všechna témata stejný a posílá se
+při každém volání znovu. Klienti ho proto posílají tak, aby ho provider mohl
+cachovat:
+    Claude  - cache_control breakpoint na system promptu (a sdíleném kontextu)
+    OpenAI  - stabilní prefix (system -> sdílený kontext -> proměnná část) + prompt_cache_key
+    Gemini  - cachedContents se systemInstruction, odkazované z generateContent
+
+Sdílený kontext (shared_context) je volitelný prefix user message společný více
+voláním - např. zadání a osnova při sekčním generování draftu.
+
+Počty tokenů z cache vrací klienti v usage jako "cached_tokens"
+(Claude navíc "cache_write_tokens").
+
+Konfigurace přes ENV LLM_PROMPT_CACHE (JSON):
+LLM_PROMPT_CACHE='{"enabled": true, "min_chars": 4000, "gemini_ttl_seconds": 3600}'
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from config import load_env_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PromptCacheSettings:
+    """Nastavení prompt cachingu."""
+    enabled: bool = True
+    min_chars: int = 4000  # kratší prefix provider stejně necachuje (minimum ~1024 tokenů)
+    gemini_ttl_seconds: int = 3600  # životnost cachedContents v Gemini
+
+
+def load_prompt_cache_settings() -> PromptCacheSettings:
+    """Nastavení z ENV LLM_PROMPT_CACHE."""
+    return load_env_settings("LLM_PROMPT_CACHE", PromptCacheSettings)
+
+
+_settings: Optional[PromptCacheSettings] = None
+
+
+def get_prompt_cache_settings() -> PromptCacheSettings:
+    global _settings
+    if _settings is None:
+        _settings = load_prompt_cache_settings()
+    return _settings
+
+
+def cacheable(text: Optional[str]) -> bool:
+    """Vyplatí se text cachovat? (caching zapnutý a text nad minimem providerů)"""
+    settings = get_prompt_cache_settings()
+    return settings.enabled and bool(text) and len(text) >= settings.min_chars
+
+
+def prompt_cache_key(*parts: Optional[str]) -> str:
+    """Stabilní klíč cachovaného prefixu."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def shared_prefix(messages: List[str]) -> Optional[str]:
+    """
+    Společný prefix user messages (zkrácený na hranici odstavce) pro cachování.
+
+    Returns:
+        Prefix, nebo None pokud je krátký nebo jde o jedinou zprávu
+    """
+    if len(messages) < 2:
+        return None
+    prefix = os.path.commonprefix(messages)
+    boundary = prefix.rfind("\n\n")
+    prefix = prefix[:boundary + 2] if boundary > 0 else ""
+    return prefix if cacheable(prefix) else None
+
+
+class GeminiContextCache:
+    """
+    Registr cachedContents v procesu workeru - klíč (model, system prompt, kontext) -> jméno cache.
+
+    Neúspěšné založení (např. prompt pod minimem modelu) se pamatuje po dobu TTL,
+    aby se nezkoušelo při každém volání.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        """(známý klíč, jméno cache nebo None při dřívějším neúspěchu)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry[1] <= time.time():
+                self._entries.pop(key, None)
+                return False, None
+            return True, entry[0]
+
+    def put(self, key: str, name: Optional[str], ttl_seconds: float) -> None:
+        # Rezerva 60 s, aby se neodkazovalo na cache těsně před expirací
+        with self._lock:
+            self._entries[key] = (name, time.time() + max(ttl_seconds - 60, 0))
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
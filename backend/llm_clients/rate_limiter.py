@@ -0,0 +1,295 @@
+"""
+Token-bucket rate limiter pro LLM providery.
+
+Limity se drží per provider + model (requests/minute a zvlášť vstupní a výstupní
+tokens/minute - providery je počítají odděleně) ve sdíleném SQLite souboru, takže
+je respektují všechny aktivity ve všech worker procesech na stejném stroji.
+Retry-After z 429 odpovědí zablokuje daný klíč pro všechny.
+
+Limiter je ve výchozím stavu vypnutý - limity závisí na tieru účtu, zapíná se
+LLM_RATE_LIMIT_ENABLED=true spolu s LLM_RATE_LIMITS podle skutečných limitů účtu.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .base import LLMRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# Odhad výstupu, když asistent nemá max_tokens (neomezeno)
+DEFAULT_COMPLETION_ESTIMATE = 1000
+# Jak dlouho nejvýš čekat na volný slot, než to vzdáme
+DEFAULT_MAX_WAIT = 300.0
+# Maximální jednotlivý spánek - mezi nimi se posílá heartbeat
+MAX_SLEEP_CHUNK = 5.0
+
+
+@dataclass
+class RateLimit:
+    """Limit jednoho klíče (provider nebo provider/model)."""
+    rpm: float
+    input_tpm: Optional[float] = None  # None = vstupní tokeny se nelimitují (např. image modely)
+    output_tpm: Optional[float] = None  # None = výstupní tokeny se nelimitují
+
+
+# Limity nejnižšího tieru jednotlivých providerů - přepište podle účtu přes ENV
+# LLM_RATE_LIMITS='{"claude": {"rpm": 4000, "input_tpm": 2000000, "output_tpm": 400000}}'
+DEFAULT_RATE_LIMITS: Dict[str, RateLimit] = {
+    "openai": RateLimit(rpm=500, input_tpm=30000),  # OpenAI má jeden TPM budget, výstup počítá z max_tokens
+    "openai/dall-e-3": RateLimit(rpm=5),
+    "openai/dall-e-2": RateLimit(rpm=5),
+    "claude": RateLimit(rpm=50, input_tpm=30000, output_tpm=8000),
+    "gemini": RateLimit(rpm=60, input_tpm=100000),
+    "gemini/imagen-4": RateLimit(rpm=10),
+    "gemini/imagen-3": RateLimit(rpm=10),
+}
+FALLBACK_RATE_LIMIT = RateLimit(rpm=60, input_tpm=60000)
+RATE_LIMIT_KEYS = ("rpm", "input_tpm", "output_tpm")
+
+
+def estimate_tokens(*texts: Optional[str]) -> int:
+    """Rychlý odhad počtu tokenů (~4 znaky na token)."""
+    return sum(math.ceil(len(text) / 4) for text in texts if text)
+
+
+def estimate_request_tokens(system_prompt: Optional[str], user_message: Optional[str], max_tokens: Optional[int]) -> Tuple[int, int]:
+    """Odhad tokenů requestu - (prompt, očekávaný výstup podle max_tokens)."""
+    completion = max_tokens if max_tokens and max_tokens > 0 else DEFAULT_COMPLETION_ESTIMATE
+    return estimate_tokens(system_prompt, user_message), completion
+
+
+def load_rate_limits() -> Dict[str, RateLimit]:
+    """Defaultní limity + přepisy z ENV LLM_RATE_LIMITS (JSON), neznámé klíče jsou chyba."""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    raw = os.getenv("LLM_RATE_LIMITS")
+    if raw:
+        try:
+            for key, value in json.loads(raw).items():
+                unknown = set(value) - set(RATE_LIMIT_KEYS)
+                if unknown:
+                    raise ValueError(f"neznámé klíče {sorted(unknown)} u {key}")
+                limits[key.lower()] = RateLimit(
+                    rpm=float(value["rpm"]),
+                    input_tpm=float(value["input_tpm"]) if value.get("input_tpm") else None,
+                    output_tpm=float(value["output_tpm"]) if value.get("output_tpm") else None
+                )
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"❌ Neplatná konfigurace LLM_RATE_LIMITS: {e}")
+    return limits
+
+
+def _refill(value: float, per_minute: float, elapsed: float) -> float:
+    return min(per_minute, value + elapsed * per_minute / 60)
+
+
+def _budget_wait(available: float, needed: float, per_minute: Optional[float]) -> float:
+    """Sekundy do doplnění budgetu na needed tokenů (0 = stačí)."""
+    return (needed - available) * 60 / per_minute if per_minute and available < needed else 0.0
+
+
+class SQLiteTokenBucketStore:
+    """
+    Sdílený stav token bucketů v SQLite.
+    Každá operace běží v BEGIN IMMEDIATE transakci = zámek přes všechny procesy.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS rate_buckets (
+                    key TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    input_tokens REAL NOT NULL,
+                    output_tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10, isolation_level=None)
+
+    def _load(self, conn: sqlite3.Connection, key: str, limit: RateLimit, now: float):
+        """Načte bucket (requests, vstupní tokeny, výstupní tokeny) a doplní ho za uplynulý čas."""
+        row = conn.execute(
+            "SELECT requests, input_tokens, output_tokens, updated_at, blocked_until FROM rate_buckets WHERE key = ?", (key,)
+        ).fetchone()
+        input_tpm, output_tpm = limit.input_tpm or 0.0, limit.output_tpm or 0.0
+        if row is None:
+            return limit.rpm, input_tpm, output_tpm, 0.0
+        requests, input_tokens, output_tokens, updated_at, blocked_until = row
+        elapsed = max(0.0, now - updated_at)
+        return (_refill(requests, limit.rpm, elapsed), _refill(input_tokens, input_tpm, elapsed),
+                _refill(output_tokens, output_tpm, elapsed), blocked_until)
+
+    def _save(self, conn: sqlite3.Connection, key: str, requests: float, input_tokens: float, output_tokens: float,
+              now: float, blocked_until: float):
+        conn.execute(
+            "INSERT OR REPLACE INTO rate_buckets (key, requests, input_tokens, output_tokens, updated_at, blocked_until) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, requests, input_tokens, output_tokens, now, blocked_until)
+        )
+
+    def try_acquire(self, key: str, limit: RateLimit, input_tokens: int, output_tokens: int = 0, now: Optional[float] = None) -> float:
+        """
+        Pokusí se odebrat 1 request, input_tokens vstupních a output_tokens výstupních tokenů.
+
+        Returns:
+            0 pokud se podařilo, jinak počet sekund, po kterých to má smysl zkusit znovu
+        """
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            requests, input_available, output_available, blocked_until = self._load(conn, key, limit, now)
+
+            if blocked_until > now:
+                wait = blocked_until - now
+            else:
+                # Request větší než celý minutový budget by nikdy neprošel - stačí plný bucket
+                input_needed = min(input_tokens, limit.input_tpm) if limit.input_tpm else 0
+                output_needed = min(output_tokens, limit.output_tpm) if limit.output_tpm else 0
+                request_wait = (1 - requests) * 60 / limit.rpm if requests < 1 else 0.0
+                wait = max(request_wait,
+                           _budget_wait(input_available, input_needed, limit.input_tpm),
+                           _budget_wait(output_available, output_needed, limit.output_tpm))
+                if wait <= 0:
+                    requests -= 1
+                    input_available -= input_needed
+                    output_available -= output_needed
+
+            self._save(conn, key, requests, input_available, output_available, now, blocked_until)
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def adjust_tokens(self, key: str, limit: RateLimit, input_delta: int, output_delta: int = 0, now: Optional[float] = None) -> None:
+        """Dorovná token budgety podle skutečné spotřeby (kladné delta = spotřebováno víc než odhad)."""
+        input_delta = input_delta if limit.input_tpm else 0
+        output_delta = output_delta if limit.output_tpm else 0
+        if not input_delta and not output_delta:
+            return
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            requests, input_available, output_available, blocked_until = self._load(conn, key, limit, now)
+            self._save(conn, key, requests, min(limit.input_tpm or 0.0, input_available - input_delta),
+                       min(limit.output_tpm or 0.0, output_available - output_delta), now, blocked_until)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def block(self, key: str, limit: RateLimit, seconds: float, now: Optional[float] = None) -> None:
+        """Zablokuje klíč pro všechny procesy (Retry-After od providera)."""
+        now = time.time() if now is None else now
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            requests, input_available, output_available, blocked_until = self._load(conn, key, limit, now)
+            self._save(conn, key, 0.0, input_available, output_available, now, max(blocked_until, now + seconds))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+class ProviderRateLimiter:
+    """Asynchronní rate limiter per provider + model nad sdíleným store."""
+
+    def __init__(self, store: SQLiteTokenBucketStore, limits: Optional[Dict[str, RateLimit]] = None, max_wait: float = DEFAULT_MAX_WAIT):
+        self.store = store
+        self.limits = limits if limits is not None else load_rate_limits()
+        self.max_wait = max_wait
+
+    def resolve(self, provider: str, model: str):
+        """Vrátí (klíč, limit) - přednost má provider/model, pak provider, pak fallback."""
+        provider = (provider or "").lower()
+        model_key = f"{provider}/{(model or '').lower()}"
+        if model_key in self.limits:
+            return model_key, self.limits[model_key]
+        return provider, self.limits.get(provider, FALLBACK_RATE_LIMIT)
+
+    async def acquire(self, provider: str, model: str, estimated_tokens: Tuple[int, int] = (0, 0),
+                      on_wait: Optional[Callable[[], None]] = None) -> float:
+        """
+        Počká na volný request + vstupní a výstupní token budget.
+
+        Args:
+            estimated_tokens: (vstupní, výstupní) odhad z estimate_request_tokens
+            on_wait: volá se před každým čekáním (např. activity.heartbeat)
+
+        Returns:
+            Celková doba čekání v sekundách
+
+        Raises:
+            LLMRateLimitError: Budget se neuvolnil do max_wait
+        """
+        key, limit = self.resolve(provider, model)
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self.store.try_acquire, key, limit, *estimated_tokens)
+            if wait <= 0:
+                if waited:
+                    logger.info(f"🚦 Rate limit {key}: čekáno {waited:.1f}s")
+                return waited
+            if waited + wait > self.max_wait:
+                raise LLMRateLimitError(provider, f"Lokální rate limit {key} se neuvolnil do {self.max_wait:.0f}s", retry_after=wait)
+            if on_wait:
+                on_wait()
+            sleep_for = min(wait, MAX_SLEEP_CHUNK)
+            await asyncio.sleep(sleep_for)
+            waited += sleep_for
+
+    async def record_usage(self, provider: str, model: str, estimated_tokens: Tuple[int, int], usage: Dict[str, Any]) -> None:
+        """Dorovná budgety podle skutečného usage z odpovědi (prompt_tokens / completion_tokens)."""
+        actual_input, actual_output = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+        if not actual_input and not actual_output:
+            return
+        key, limit = self.resolve(provider, model)
+        estimated_input, estimated_output = estimated_tokens
+        input_delta = actual_input - min(estimated_input, limit.input_tpm or 0) if actual_input else 0
+        output_delta = actual_output - min(estimated_output, limit.output_tpm or 0) if actual_output else 0
+        await asyncio.to_thread(self.store.adjust_tokens, key, limit, input_delta, output_delta)
+
+    async def penalize(self, provider: str, model: str, retry_after: float) -> None:
+        """Provider vrátil 429 - zablokuje klíč pro všechny procesy na retry_after sekund."""
+        key, limit = self.resolve(provider, model)
+        logger.warning(f"🚦 Rate limit od providera {key} - blokuji na {retry_after:.1f}s")
+        await asyncio.to_thread(self.store.block, key, limit, retry_after)
+
+
+_rate_limiter: Optional[ProviderRateLimiter] = None
+
+
+def get_rate_limiter() -> Optional[ProviderRateLimiter]:
+    """
+    Vrátí sdílený rate limiter (singleton per proces, stav sdílený přes SQLite).
+    None pokud není zapnutý přes LLM_RATE_LIMIT_ENABLED=true (výchozí stav - limity závisí na tieru účtu).
+    """
+    global _rate_limiter
+    if os.getenv("LLM_RATE_LIMIT_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    if _rate_limiter is None:
+        db_path = os.getenv("LLM_RATE_LIMIT_DB") or os.path.join(tempfile.gettempdir(), "seo_farm_llm_rate_limits.sqlite")
+        _rate_limiter = ProviderRateLimiter(SQLiteTokenBucketStore(db_path))
+    return _rate_limiter
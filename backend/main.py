@@ -1,16 +1,19 @@
+import asyncio
 import logging
-from typing import Optional, List
+from typing import Optional, List, Literal
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Query, Path
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from temporal_client import start_seo_pipeline, list_workflows, get_workflow_result, describe_workflow_execution, terminate_workflow
+from temporal_client import start_seo_pipeline, list_workflows, get_workflow_result, describe_workflow_execution, terminate_workflow, get_workflow_start_options, check_task_queues
+from workflow_ids import DuplicateWorkflowError, WorkflowReusePolicy, build_workflow_id, content_version_from_workflow_id, normalize_topic, pipeline_succeeded
 
 # Import nových API routerů
 from backend.api.routes.project import router as project_router
 from backend.api.routes.assistant import router as assistant_router
 from backend.api.routes.workflow_run import router as workflow_run_router
 from backend.api.routes.api_keys import router as api_keys_router
+from backend.api.routes.feeds import router as feeds_router
 
 # Import databázového připojení
 from api.database import connect_database, disconnect_database
@@ -28,7 +31,10 @@ async def lifespan(app: FastAPI):
     # Startup
     await connect_database()
     logger.info("✅ Databáze připojena při startu")
+    # Názvy front z ENV backendu se zapékají do workflow - ověření, že na nich pollují workery (na pozadí)
+    queue_check = asyncio.create_task(check_task_queues())
     yield
+    queue_check.cancel()
     # Shutdown
     await disconnect_database()
     logger.info("🔄 Databáze odpojená při ukončení")
@@ -59,6 +65,14 @@ class PipelineRequest(BaseModel):
     topic: str = Field(..., min_length=1, description="Téma pro SEO zpracování")
     project_id: Optional[str] = Field(None, description="ID projektu pro propojení workflow")
     csv: Optional[CSVData] = Field(None, description="Volitelný CSV soubor")
+    content_version: int = Field(1, ge=1, description="Verze obsahu - vyšší verze vynutí novou generaci tématu")
+    reuse_policy: Optional[WorkflowReusePolicy] = Field(None, description="reject | attach | force - co dělat s duplicitní pipeline")
+
+class ResumePipelineRequest(BaseModel):
+    workflow_id: str = Field(..., min_length=1, description="ID workflow, na jehož checkpointy se navazuje")
+    run_id: str = Field(..., min_length=1, description="Run ID navazovaného běhu")
+    content_version: Optional[int] = Field(None, ge=1, description="Verze obsahu - default verze původního běhu")
+    execution_mode: Optional[Literal["interactive", "batch"]] = Field(None, description="Default režim původního běhu")
 
 class PipelineResponse(BaseModel):
     status: str = Field(..., description="Status spuštění workflow")
@@ -75,6 +89,7 @@ app.include_router(project_router)
 app.include_router(assistant_router)
 app.include_router(workflow_run_router)
 app.include_router(api_keys_router)
+app.include_router(feeds_router)
 
 # Databázové připojení je nyní spravováno přes lifespan context manager
 
@@ -88,6 +103,10 @@ class BatchPipelineRequest(BaseModel):
     project_id: str = Field(..., description="ID projektu pro propojení workflow")
     csv: CSVData = Field(..., description="CSV soubor s tématy")
     batch_name: Optional[str] = Field(None, description="Název batch jobu")
+    content_version: int = Field(1, ge=1, description="Verze obsahu pro všechna témata v batchi")
+    reuse_policy: Optional[WorkflowReusePolicy] = Field(None, description="reject | attach | force - co dělat s duplicitní pipeline")
+    skip_completed: bool = Field(True, description="Přeskočit témata, která už mají dokončený článek")
+    execution_mode: Literal["interactive", "batch"] = Field("interactive", description="batch = LLM volání přes provider batch API (levnější, výsledky v řádu hodin)")
 
 class BatchPipelineResponse(BaseModel):
     """Response pro batch spuštění."""
@@ -95,6 +114,26 @@ class BatchPipelineResponse(BaseModel):
     batch_id: str = Field(..., description="ID batch jobu")
     total_workflows: int = Field(..., description="Celkový počet spuštěných workflow")
     workflow_ids: list[str] = Field(..., description="Seznam workflow ID")
+    skipped_topics: list[str] = Field(default=[], description="Témata přeskočená jako duplicitní nebo už dokončená")
+
+
+async def find_completed_workflow_run(prisma, project_id: str, workflow_id: str):
+    """
+    Najde dokončený běh pipeline se stejným deterministickým workflow ID.
+    
+    Hledáme přes prefix, aby se započítaly i běhy spuštěné s politikou force (suffix _r<hex>).
+    Status COMPLETED nestačí - selhaná pipeline vrací failed_result a končí také jako
+    COMPLETED, článek má jen běh s úspěšným výsledkem (pipeline_succeeded).
+    """
+    runs = await prisma.workflowrun.find_many(
+        where={
+            "projectId": project_id,
+            "workflowId": {"startswith": workflow_id},
+            "status": "COMPLETED"
+        },
+        order={"finishedAt": "desc"}
+    )
+    return next((run for run in runs if pipeline_succeeded(run.resultJson)), None)
 
 
 # ===== 📊 LANDING PAGES S TABULKAMI =====
@@ -197,6 +236,7 @@ async def batch_pipeline_run(request: BatchPipelineRequest):
         logger.info(f"🚀 BATCH PROCESSING STARTED:")
         logger.info(f"   🏗️ Project ID: {request.project_id}")
         logger.info(f"   📄 Batch: {request.batch_name or 'Bez názvu'}")
+        logger.info(f"   📦 Execution mode: {request.execution_mode}")
         
         # Ověření existence projektu
         prisma = await get_prisma_client()
@@ -211,13 +251,20 @@ async def batch_pipeline_run(request: BatchPipelineRequest):
             csv_reader = csv.reader(io.StringIO(csv_content))
             
             topics = []
+            seen_topics = set()
             for row_idx, row in enumerate(csv_reader):
                 if row_idx == 0:  # Skip header
                     continue
                 if row and row[0].strip():  # Non-empty topic
+                    # Deduplikace v rámci CSV podle normalizovaného tématu
+                    normalized = normalize_topic(row[0])
+                    if normalized in seen_topics:
+                        logger.info(f"♻️ Duplicitní téma v CSV přeskočeno: '{row[0].strip()}'")
+                        continue
+                    seen_topics.add(normalized)
                     topics.append(row[0].strip())
             
-            logger.info(f"📋 Parsováno {len(topics)} témat z CSV")
+            logger.info(f"📋 Parsováno {len(topics)} unikátních témat z CSV")
             
         except Exception as e:
             logger.error(f"❌ Chyba při parsování CSV: {str(e)}")
@@ -233,19 +280,42 @@ async def batch_pipeline_run(request: BatchPipelineRequest):
         # Spuštění workflow pro každé téma
         workflow_ids = []
         failed_topics = []
+        skipped_topics = []
         
         for i, topic in enumerate(topics):
             try:
+                # ♻️ Přeskočení témat s již dokončeným článkem
+                if request.skip_completed:
+                    base_workflow_id = build_workflow_id(request.project_id, topic, request.content_version)
+                    completed_run = await find_completed_workflow_run(prisma, request.project_id, base_workflow_id)
+                    if completed_run:
+                        logger.info(f"⏭️ Téma '{topic}' už má dokončený článek ({completed_run.workflowId}) - přeskakuji")
+                        skipped_topics.append(topic)
+                        continue
+                
                 logger.info(f"🚀 Spouštím workflow {i+1}/{len(topics)}: '{topic}'")
                 
-                workflow_id, run_id = await start_seo_pipeline(
-                    topic=topic,
-                    project_id=request.project_id,
-                    csv_base64=None  # Individual workflow, no CSV needed
-                )
+                try:
+                    workflow_id, run_id, started = await start_seo_pipeline(
+                        topic=topic,
+                        project_id=request.project_id,
+                        csv_base64=None,  # Individual workflow, no CSV needed
+                        content_version=request.content_version,
+                        reuse_policy=request.reuse_policy,
+                        workflow_options={"execution_mode": request.execution_mode}
+                    )
+                except DuplicateWorkflowError as dup:
+                    logger.info(f"⏭️ Téma '{topic}' už běží nebo je dokončené ({dup.workflow_id}) - přeskakuji")
+                    skipped_topics.append(topic)
+                    continue
                 
                 workflow_ids.append(workflow_id)
                 
+                if not started:
+                    # Připojeno k existujícímu workflow - databázový záznam už existuje
+                    logger.info(f"🔗 Workflow {i+1} připojen k existujícímu běhu: {workflow_id}")
+                    continue
+                
                 # Vytvoření databázového záznamu
                 from backend.api.routes.workflow_run import WorkflowRunCreate, create_workflow_run
                 
@@ -266,6 +336,7 @@ async def batch_pipeline_run(request: BatchPipelineRequest):
         success_count = len(workflow_ids)
         logger.info(f"🎉 BATCH COMPLETED:")
         logger.info(f"   ✅ Úspěšně: {success_count}/{len(topics)}")
+        logger.info(f"   ⏭️ Přeskočeno: {len(skipped_topics)}")
         logger.info(f"   ❌ Chyby: {len(failed_topics)}")
         
         if failed_topics:
@@ -275,7 +346,8 @@ async def batch_pipeline_run(request: BatchPipelineRequest):
             status=f"Batch spuštěn: {success_count}/{len(topics)} workflow",
             batch_id=batch_id,
             total_workflows=success_count,
-            workflow_ids=workflow_ids
+            workflow_ids=workflow_ids,
+            skipped_topics=skipped_topics
         )
         
     except HTTPException:
@@ -328,18 +400,27 @@ async def pipeline_run(request: PipelineRequest):
         
         # Spuštění Temporal workflow
         logger.info("🔌 Připojuji se k Temporal serveru...")
-        workflow_id, run_id = await start_seo_pipeline(
-            topic=request.topic,
-            project_id=request.project_id,
-            csv_base64=csv_base64
-        )
+        try:
+            workflow_id, run_id, started = await start_seo_pipeline(
+                topic=request.topic,
+                project_id=request.project_id,
+                csv_base64=csv_base64,
+                content_version=request.content_version,
+                reuse_policy=request.reuse_policy
+            )
+        except DuplicateWorkflowError as dup:
+            logger.warning(f"♻️ Duplicitní pipeline odmítnuta: {dup.workflow_id}")
+            raise HTTPException(
+                status_code=409,
+                detail={"error": str(dup), "workflow_id": dup.workflow_id}
+            )
         
         logger.info(f"✅ Temporal workflow úspěšně spuštěn:")
         logger.info(f"   🆔 Workflow ID: {workflow_id}")
         logger.info(f"   🏃 Run ID: {run_id}")
         
-        # Vytvoření záznamu v databázi pokud je zadán project_id
-        if request.project_id:
+        # Vytvoření záznamu v databázi pokud je zadán project_id (při attach už záznam existuje)
+        if request.project_id and started:
             try:
                 # Import WorkflowRunCreate modelu a create_workflow_run funkce
                 from backend.api.routes.workflow_run import WorkflowRunCreate, create_workflow_run
@@ -371,7 +452,7 @@ async def pipeline_run(request: PipelineRequest):
         logger.info(f"🎉 Pipeline úspěšně spuštěna pro téma: '{request.topic}'")
         
         return PipelineResponse(
-            status="started",
+            status="started" if started else "attached",
             workflow_id=workflow_id,
             run_id=run_id,
             project_id=request.project_id,
@@ -808,56 +889,12 @@ async def retry_publish_script(request: dict):
             output_preview = str(log.get("output", ""))[:100] + "..." if log.get("output") else "NO OUTPUT"
             logger.info(f"  {i+1:2d}. {stage} - {status} - {output_preview}")
         
-        # Extrakce výstupů asistentů ze stage_logs
-        components = {
-            "draft_assistant_output": "",
-            "seo_assistant_output": "",
-            "humanizer_assistant_output": "",
-            "humanizer_output_after_fact_validation": "",  # ✅ PŘIDÁNO
-            "multimedia_assistant_output": "",
-            "image_renderer_assistant_output": "",
-            "qa_assistant_output": "",
-            "fact_validator_assistant_output": "",
-            "brief_assistant_output": ""
-        }
-        
-        # Projdeme stage_logs a najdeme výstupy jednotlivých asistentů
-        for log in stage_logs:
-            stage_name = log.get("stage", "")
-            output = log.get("output", "")
-            
-            if stage_name and output:
-                # 🔍 DETAILNÍ DEBUG MAPPING
-                logger.info(f"🔍 Zpracovávám stage: '{stage_name}' -> output length: {len(str(output))}")
-                
-                # Mapování stage names na component keys
-                if "seo" in stage_name.lower():
-                    components["seo_assistant_output"] = output
-                    logger.info(f"✅ SEO output ÚSPĚŠNĚ namapován: {len(str(output))} znaků")
-                    logger.info(f"🔍 SEO output preview: {str(output)[:200]}...")
-                elif "draft" in stage_name.lower():
-                    components["draft_assistant_output"] = output
-                    logger.info(f"✅ Draft output nalezen: {len(str(output))} znaků")
-                elif "humanizer" in stage_name.lower():
-                    components["humanizer_assistant_output"] = output
-                    components["humanizer_output_after_fact_validation"] = output  # ✅ PŘIDÁNO - same jako humanizer
-                    logger.info(f"✅ Humanizer output nalezen: {len(str(output))} znaků")
-                    logger.info(f"✅ Humanizer také namapován jako humanizer_output_after_fact_validation")
-                elif "multimedia" in stage_name.lower():
-                    components["multimedia_assistant_output"] = output
-                    logger.info(f"✅ Multimedia output nalezen: {len(str(output))} znaků")
-                elif "image" in stage_name.lower():
-                    components["image_renderer_assistant_output"] = output
-                    logger.info(f"✅ Image output nalezen: {len(str(output))} znaků")
-                elif "qa" in stage_name.lower():
-                    components["qa_assistant_output"] = output
-                    logger.info(f"✅ QA output nalezen: {len(str(output))} znaků")
-                elif "fact" in stage_name.lower() or "validator" in stage_name.lower():
-                    components["fact_validator_assistant_output"] = output
-                    logger.info(f"✅ FactValidator output nalezen: {len(str(output))} znaků")
-                elif "brief" in stage_name.lower():
-                    components["brief_assistant_output"] = output
-                    logger.info(f"✅ Brief output nalezen: {len(str(output))} znaků")
+        # Extrakce výstupů asistentů ze stage_logs (sdílené mapování se static exportem)
+        from helpers.transformers import pipeline_components_from_stage_logs
+        components = pipeline_components_from_stage_logs(stage_logs)
+        for key, value in components.items():
+            if value:
+                logger.info(f"✅ {key} nalezen: {len(str(value))} znaků")
         
         logger.info(f"📊 Extrakce dokončena: {sum(1 for v in components.values() if v)} neprázdných výstupů")
         
@@ -873,7 +910,7 @@ async def retry_publish_script(request: dict):
             
             logger.info("🔧 Spouštím PublishScript přímo jako Python funkci...")
             logger.info(f"📊 Components keys: {list(components.keys())}")
-            logger.info(f"📊 SEO output sample: {components.get('seo_assistant_output', 'MISSING')[:300]}...")
+            logger.info(f"📊 SEO output sample: {str(components.get('seo_assistant_output', 'MISSING'))[:300]}...")
             logger.info(f"📊 Draft output sample: {components.get('draft_assistant_output', 'MISSING')[:200]}...")
             
             # Debug SEO parsování
@@ -886,17 +923,14 @@ async def retry_publish_script(request: dict):
                 # Debug QA parsování
                 qa_data = parse_qa_faq(components.get('qa_assistant_output', ''))
                 logger.info(f"🔍 QA parsováno: {len(qa_data)} FAQ položek")
-                logger.info(f"🔍 QA sample: {components.get('qa_assistant_output', 'MISSING')[:500]}...")
+                logger.info(f"🔍 QA sample: {str(components.get('qa_assistant_output', 'MISSING'))[:500]}...")
             except Exception as e:
                 logger.error(f"❌ Chyba při parsování: {e}")
             
-            # Transform pipeline data na PublishInput format - PŘED transformací převeď dict na string
-            logger.info("🔧 Převádím dict objekty na stringy před transformací...")
+            # Transform pipeline data na PublishInput format - strukturované výstupy (dict/list)
+            # zůstávají nativní, transformers je nepřeparsovávají
             for key, value in components.items():
-                if isinstance(value, dict):
-                    components[key] = json.dumps(value, ensure_ascii=False)
-                    logger.info(f"✅ {key}: dict převeden na JSON string")
-                elif not isinstance(value, str):
+                if not isinstance(value, (str, dict, list)):
                     components[key] = str(value)
                     logger.info(f"✅ {key}: {type(value)} převeden na string")
             
@@ -1028,6 +1062,95 @@ async def retry_publish_script(request: dict):
         logger.error(f"❌ Chyba v retry_publish_script: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Neočekávaná chyba: {str(e)}")
 
+@app.post("/api/resume-pipeline")
+async def resume_pipeline(request: ResumePipelineRequest):
+    """
+    Spustí nový běh pipeline navazující na checkpointy předchozího běhu.
+    Znovu se spustí jen selhaná stage a všechny následující - šetří AI kredity.
+
+    Verze obsahu a execution_mode se převezmou z původního běhu (workflow ID a jeho options),
+    jinak by resume běžel pod jiným deduplikačním klíčem nebo v jiném režimu.
+    Checkpointy zapisují workery - CHECKPOINT_DIR musí být sdílený s backendem.
+    """
+    try:
+        workflow_id = request.workflow_id
+        run_id = request.run_id
+
+        logger.info(f"♻️ Resume pipeline: {workflow_id} (run: {run_id})")
+
+        prisma = await get_prisma_client()
+        workflow_record = await prisma.workflowrun.find_first(
+            where={"workflowId": workflow_id, "runId": run_id}
+        )
+        if not workflow_record:
+            raise HTTPException(status_code=404, detail="Workflow nenalezen v databázi pro zadané parametry")
+
+        import sys
+        import os
+        import re
+        sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+        from helpers.checkpoint_store import get_checkpoint_dir, load_checkpoints
+
+        checkpoints = load_checkpoints(workflow_id, run_id)
+        if not checkpoints:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Předchozí běh nemá žádné checkpointy v {get_checkpoint_dir()} (CHECKPOINT_DIR musí být sdílený "
+                       f"s workery) - použijte nové spuštění pipeline"
+            )
+
+        # Batch záznamy mají v DB prefix [BATCH:<id>] - pro workflow potřebujeme čisté téma
+        topic = re.sub(r"^\[BATCH:[^\]]+\]\s*", "", workflow_record.topic)
+
+        content_version = request.content_version or content_version_from_workflow_id(workflow_id, workflow_record.projectId, topic)
+        if content_version is None:
+            raise HTTPException(status_code=400, detail="Verzi obsahu nelze odvodit z workflow ID - zadejte content_version")
+        execution_mode = request.execution_mode
+        if execution_mode is None:
+            original_options = await get_workflow_start_options(workflow_id, run_id)
+            execution_mode = original_options.get("execution_mode") or "interactive"
+
+        new_workflow_id, new_run_id, _ = await start_seo_pipeline(
+            topic=topic,
+            project_id=workflow_record.projectId,
+            content_version=content_version,
+            reuse_policy=WorkflowReusePolicy.FORCE,  # Resume je vždy nový běh
+            workflow_options={"resume_from": {"workflow_id": workflow_id, "run_id": run_id}, "execution_mode": execution_mode}
+        )
+
+        database_id = None
+        try:
+            from backend.api.routes.workflow_run import WorkflowRunCreate, create_workflow_run
+
+            workflow_response = await create_workflow_run(WorkflowRunCreate(
+                projectId=workflow_record.projectId,
+                topic=workflow_record.topic,
+                runId=new_run_id,
+                workflowId=new_workflow_id
+            ))
+            database_id = workflow_response.id
+        except Exception as e:
+            logger.error(f"⚠️ Chyba při vytváření databázového záznamu: {str(e)}")
+
+        logger.info(f"✅ Resume spuštěn: {new_workflow_id} s {len(checkpoints)} checkpointy")
+
+        return {
+            "status": "started",
+            "workflow_id": new_workflow_id,
+            "run_id": new_run_id,
+            "database_id": database_id,
+            "resumed_from": {"workflow_id": workflow_id, "run_id": run_id},
+            "content_version": content_version,
+            "execution_mode": execution_mode,
+            "checkpointed_stages": list(checkpoints.keys())
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Chyba v resume_pipeline: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Neočekávaná chyba: {str(e)}")
+
 # ===== 📊 LANDING PAGES API ENDPOINT =====
 
 @app.post("/api/landing-pages", response_model=LandingPageResponse)
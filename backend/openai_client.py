@@ -8,16 +8,24 @@ podle finální specifikace. Žádné defaultní hodnoty nejsou ponechány!
 import json
 import logging
 import os
-from typing import Optional, Dict, Any, List
-from openai import OpenAI
+from typing import Optional, Dict, Any, List, Callable
+from openai import AsyncOpenAI, RateLimitError
 import asyncio
 # Import BaseLLMClient bez circular dependency
 try:
-    from backend.llm_clients.base import BaseLLMClient
+    from backend.llm_clients.base import (
+        BaseLLMClient, LLMRateLimitError, StreamCollector, retry_after_from_headers,
+        iter_with_idle_timeout, stream_timeouts_for
+    )
+    from backend.llm_clients.prompt_cache import cacheable, prompt_cache_key
 except ImportError:
     import sys
     sys.path.append(os.path.dirname(__file__))
-    from llm_clients.base import BaseLLMClient
+    from llm_clients.base import (
+        BaseLLMClient, LLMRateLimitError, StreamCollector, retry_after_from_headers,
+        iter_with_idle_timeout, stream_timeouts_for
+    )
+    from llm_clients.prompt_cache import cacheable, prompt_cache_key
 
 logger = logging.getLogger(__name__)
 
@@ -81,14 +89,14 @@ class OpenAIClient(BaseLLMClient):
     Všechny API volání procházejí přes tuto třídu s přesnými parametry.
     """
     
+    supports_batch = True
+    
     def __init__(self, api_key: str):
         """Inicializace OpenAI clienta s API klíčem."""
         super().__init__(api_key)
         self.api_key = api_key
-        self.client = OpenAI(
-            api_key=self.api_key,
-            timeout=OPENAI_CONFIG["timeout"]
-        )
+        # Jen async client - sync volání by blokovalo event loop workeru; vytváří se líně
+        self._async_client: Optional[AsyncOpenAI] = None
         logger.info(f"🤖 OpenAI client inicializován s auditem parametrů")
         self._log_config()
     
@@ -128,6 +136,8 @@ class OpenAIClient(BaseLLMClient):
         model: str,
         temperature: float = 0.7,
         max_tokens: Optional[int] = None,
+        shared_context: Optional[str] = None,
+        output_schema: Optional[Dict[str, Any]] = None,
         **kwargs
     ) -> Dict[str, Any]:
         """
@@ -137,6 +147,8 @@ class OpenAIClient(BaseLLMClient):
             system_prompt: System prompt pro asistenta
             user_message: Uživatelská zpráva
             model: Override pro model (optional)
+            shared_context: Prefix user message společný více voláním (součást cachovaného prefixu)
+            output_schema: JSON schéma výstupu - response_format json_schema
             **kwargs: Dodatečné parametry (budou logovány ale ne použity!)
             
         Returns:
@@ -153,33 +165,14 @@ class OpenAIClient(BaseLLMClient):
         logger.info(f"📝 PROMPT_LENGTH: system={len(system_prompt)}, user={len(user_message)}")
         
         try:
-            # Připravíme parametry
-            api_params = {
-                "model": model_to_use,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                "temperature": OPENAI_CONFIG["temperature"],
-                "top_p": OPENAI_CONFIG["top_p"],
-                "frequency_penalty": OPENAI_CONFIG["frequency_penalty"],
-                "presence_penalty": OPENAI_CONFIG["presence_penalty"]
-            }
-            
-            # Přidáme max_tokens pouze pokud je specifikováno
-            if OPENAI_CONFIG["max_tokens"] is not None:
-                api_params["max_tokens"] = OPENAI_CONFIG["max_tokens"]
-            
-            response = self.client.chat.completions.create(**api_params)
+            api_params = self._build_chat_params(system_prompt, user_message, model_to_use, shared_context, output_schema)
+            # Async client - blokující sync volání by na minuty zastavilo event loop workeru (heartbeaty, další aktivity)
+            response = await self._get_async_client().chat.completions.create(timeout=OPENAI_CONFIG["timeout"], **self._sdk_params(api_params))
             
             result = {
                 "content": response.choices[0].message.content,
                 "model": response.model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens if response.usage else 0,
-                    "completion_tokens": response.usage.completion_tokens if response.usage else 0,
-                    "total_tokens": response.usage.total_tokens if response.usage else 0
-                },
+                "usage": self._usage(response.usage),
                 "config_used": OPENAI_CONFIG.copy(),
                 "timestamp": asyncio.get_event_loop().time() if asyncio.get_event_loop().is_running() else None
             }
@@ -187,11 +180,220 @@ class OpenAIClient(BaseLLMClient):
             logger.info(f"✅ CHAT_COMPLETION úspěšný: {result['usage']['total_tokens']} tokenů")
             return result
             
+        except RateLimitError as e:
+            logger.error(f"❌ Chat completion narazilo na rate limit ({model_to_use}): {str(e)}")
+            raise LLMRateLimitError("openai", f"OpenAI rate limit: {str(e)}", retry_after_from_headers(e.response.headers))
         except Exception as e:
             # STRICT MODE - žádné fallbacky
             logger.error(f"❌ Chat completion selhalo s modelem {model_to_use}: {str(e)}")
             raise
     
+    async def chat_completion_stream(
+        self,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        on_chunk: Optional[Callable[[], Any]] = None,
+        on_text: Optional[Callable[[str], Any]] = None,
+        shared_context: Optional[str] = None,
+        output_schema: Optional[Dict[str, Any]] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Streamovaná varianta chat_completion se stejnými auditovanými parametry.
+        on_chunk se volá při každém chunku, zaseknutý stream spadne na idle timeoutu (po prvním bajtu).
+        """
+        model_to_use = model or OPENAI_CONFIG["model"]
+        if kwargs:
+            logger.warning(f"⚠️ Ignoruji nepodporované parametry: {list(kwargs.keys())}")
+        
+        logger.info(f"🤖 CHAT_COMPLETION_STREAM: model={model_to_use}")
+        logger.info(f"📝 PROMPT_LENGTH: system={len(system_prompt)}, user={len(user_message)}")
+        
+        collector = StreamCollector(on_chunk, on_text)
+        timeouts = stream_timeouts_for(model_to_use)
+        usage = None
+        response_model = model_to_use
+        try:
+            api_params = self._build_chat_params(system_prompt, user_message, model_to_use, shared_context, output_schema)
+            async with collector.keepalive():
+                stream = await self._get_async_client().chat.completions.create(
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=timeouts.httpx_timeout(),
+                    **self._sdk_params(api_params)
+                )
+                async for chunk in iter_with_idle_timeout(stream, timeouts.idle_seconds):
+                    response_model = chunk.model or response_model
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if chunk.choices:
+                        collector.add(chunk.choices[0].delta.content)
+                    else:
+                        collector.event()
+            
+            result = {
+                "content": collector.content,
+                "model": response_model,
+                "usage": self._usage(usage),
+                "config_used": OPENAI_CONFIG.copy(),
+                "metadata": {"streaming": collector.stats()},
+                "timestamp": asyncio.get_event_loop().time()
+            }
+            
+            logger.info(f"✅ CHAT_COMPLETION_STREAM úspěšný: {result['usage']['total_tokens']} tokenů, TTFT {result['metadata']['streaming']['ttft']}")
+            return result
+            
+        except RateLimitError as e:
+            logger.error(f"❌ Chat completion stream narazil na rate limit ({model_to_use}): {str(e)}")
+            raise LLMRateLimitError("openai", f"OpenAI rate limit: {str(e)}", retry_after_from_headers(e.response.headers))
+        except Exception as e:
+            # STRICT MODE - žádné fallbacky
+            logger.error(f"❌ Chat completion stream selhal s modelem {model_to_use}: {str(e)}")
+            raise
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """Async client pro chat completion, streaming a batch API - vytváří se líně."""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                timeout=OPENAI_CONFIG["timeout"]
+            )
+        return self._async_client
+    
+    def build_batch_request(
+        self,
+        custom_id: str,
+        system_prompt: str,
+        user_message: str,
+        model: str,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Řádek vstupního JSONL pro Batch API - stejné auditované parametry jako chat_completion."""
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": self._build_chat_params(system_prompt, user_message, model or OPENAI_CONFIG["model"])
+        }
+    
+    async def submit_batch(self, requests: List[Dict[str, Any]]) -> str:
+        """Nahraje JSONL soubor a založí batch (completion window 24 h)."""
+        client = self._get_async_client()
+        jsonl = "\n".join(json.dumps(request, ensure_ascii=False) for request in requests).encode("utf-8")
+        try:
+            input_file = await client.files.create(file=("batch.jsonl", jsonl), purpose="batch")
+            batch = await client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        except RateLimitError as e:
+            raise LLMRateLimitError("openai", f"OpenAI rate limit: {str(e)}", retry_after_from_headers(e.response.headers))
+        logger.info(f"📦 OpenAI batch {batch.id} odeslán: {len(requests)} requestů")
+        return batch.id
+    
+    async def get_batch_status(self, batch_id: str) -> Dict[str, Any]:
+        """Stav batche - completed / expired / cancelled mají (částečné) výsledky, failed neprošel validací."""
+        batch = await self._get_async_client().batches.retrieve(batch_id)
+        if batch.status == "failed":
+            errors = [error.message for error in (batch.errors.data if batch.errors and batch.errors.data else [])]
+            return {"state": "failed", "error": "; ".join(e for e in errors if e) or "batch failed"}
+        state = "ended" if batch.status in ("completed", "expired", "cancelled") else "in_progress"
+        return {"state": state, "output_file_id": batch.output_file_id, "error_file_id": batch.error_file_id}
+    
+    async def get_batch_results(self, batch_id: str, status: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Stáhne výstupní a chybový JSONL a převede odpovědi na standardizovaný formát."""
+        client = self._get_async_client()
+        results = {}
+        for file_id in (status.get("output_file_id"), status.get("error_file_id")):
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                body = response.get("body") or {}
+                if response.get("status_code") == 200 and body.get("choices"):
+                    results[item["custom_id"]] = {
+                        "content": body["choices"][0]["message"]["content"],
+                        "model": body.get("model"),
+                        "usage": self._usage(body.get("usage")),
+                        "config_used": OPENAI_CONFIG.copy(),
+                        "metadata": {"batch_id": batch_id}
+                    }
+                else:
+                    error = item.get("error") or body.get("error") or {}
+                    results[item["custom_id"]] = {"error": f"{response.get('status_code')}: {error.get('message', 'bez detailu')}"}
+        return results
+    
+    @staticmethod
+    def _usage(usage: Any) -> Dict[str, int]:
+        """Usage z SDK objektu i z JSON těla batch výsledku -> standardní formát vč. cached_tokens."""
+        if usage is None:
+            return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+        if not isinstance(usage, dict):
+            usage = usage.model_dump()
+        details = usage.get("prompt_tokens_details") or {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "total_tokens": usage.get("total_tokens") or 0,
+            "cached_tokens": details.get("cached_tokens") or 0
+        }
+    
+    @staticmethod
+    def _sdk_params(api_params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Parametry pro volání přes SDK - prompt_cache_key jde v extra_body, připnuté
+        openai==1.58.1 ho jako argument create() nezná. Batch JSONL ho posílá přímo v body.
+        """
+        params = dict(api_params)
+        cache_key = params.pop("prompt_cache_key", None)
+        if cache_key:
+            params["extra_body"] = {"prompt_cache_key": cache_key}
+        return params
+    
+    def _build_chat_params(self, system_prompt: str, user_message: str, model: str,
+                           shared_context: Optional[str] = None,
+                           output_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Auditované parametry Chat Completion API (společné pro standardní i streamované volání)."""
+        # 🗄️ Prompt caching - OpenAI cachuje automaticky nejdelší shodný prefix requestu,
+        # proto pořadí: statický system prompt -> sdílený kontext -> proměnná část zprávy
+        api_params = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"{shared_context}{user_message}" if shared_context else user_message}
+            ],
+            "temperature": OPENAI_CONFIG["temperature"],
+            "top_p": OPENAI_CONFIG["top_p"],
+            "frequency_penalty": OPENAI_CONFIG["frequency_penalty"],
+            "presence_penalty": OPENAI_CONFIG["presence_penalty"]
+        }
+        
+        # Přidáme max_tokens pouze pokud je specifikováno
+        if OPENAI_CONFIG["max_tokens"] is not None:
+            api_params["max_tokens"] = OPENAI_CONFIG["max_tokens"]
+        
+        # Stejný klíč = směrování na stejný cache shard (vyšší hit rate při stovkách témat)
+        if cacheable(system_prompt):
+            api_params["prompt_cache_key"] = prompt_cache_key(model, system_prompt)[:32]
+        
+        # 🧾 Structured output - nativní JSON schema režim (bez strict, schéma připouští volitelná pole)
+        if output_schema:
+            api_params["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "structured_output", "schema": output_schema, "strict": False}
+            }
+        
+        return api_params
+    
     async def image_generation(
         self, 
         prompt: str, 
@@ -231,7 +433,8 @@ class OpenAIClient(BaseLLMClient):
         logger.info(f"📝 PROMPT_LENGTH: {len(prompt)} chars")
         
         try:
-            response = self.client.images.generate(
+            response = await self._get_async_client().images.generate(
+                timeout=DALLE_CONFIG["timeout"],
                 model=DALLE_CONFIG["model"],
                 prompt=prompt,
                 n=DALLE_CONFIG["n"],
@@ -270,6 +473,9 @@ class OpenAIClient(BaseLLMClient):
             logger.info(f"✅ IMAGE_GENERATION úspěšný: {len(result['images'])} obrázků")
             return result
             
+        except RateLimitError as e:
+            logger.error(f"❌ Image generation narazilo na rate limit: {str(e)}")
+            raise LLMRateLimitError("openai", f"OpenAI rate limit: {str(e)}", retry_after_from_headers(e.response.headers))
         except Exception as e:
             logger.error(f"❌ Image generation selhalo: {str(e)}")
             raise
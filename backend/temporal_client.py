@@ -1,10 +1,25 @@
 import os
 import logging
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from temporalio.client import Client
+from temporalio.common import WorkflowIDReusePolicy
+from temporalio.client import WorkflowExecutionStatus
+from temporalio.exceptions import WorkflowAlreadyStartedError
+from temporalio.service import RPCError, RPCStatusCode
 from dotenv import load_dotenv
 
+from config import pinned_workflow_options
+
+from workflow_ids import (
+    WorkflowReusePolicy,
+    DuplicateWorkflowError,
+    parse_reuse_policy,
+    pipeline_succeeded,
+    build_workflow_id,
+    build_forced_workflow_id,
+)
+
 # Načtení environment variables
 load_dotenv()
 
@@ -27,9 +42,10 @@ def extract_topic_from_workflow_id(workflow_id: str) -> str:
                 topic = topic[len(prefix):]
                 break
         
-        # Odebereme timestamp suffix (poslední _číslo)
+        # Odebereme suffixy: force suffix (_r<hex>), hash (_<hex16>) nebo starý timestamp (_číslo)
         import re
-        topic = re.sub(r'_\d+$', '', topic)
+        topic = re.sub(r'_r[0-9a-f]{8}$', '', topic)
+        topic = re.sub(r'_(?:[0-9a-f]{16}|\d+)$', '', topic)
         
         # Nahradíme podtržítka mezerami
         topic = topic.replace('_', ' ')
@@ -54,19 +70,60 @@ def extract_topic_from_workflow_id(workflow_id: str) -> str:
         logger.warning(f"⚠️ Nelze extrahovat topic z workflow_id '{workflow_id}': {str(e)}")
         return f"Workflow {workflow_id}"
 
-async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_base64: Optional[str] = None) -> Tuple[str, str]:
+async def find_existing_pipeline(client: Client, workflow_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Poslední běh workflow, který blokuje nové spuštění stejného ID.
+
+    Blokuje běžící pipeline a dokončená pipeline s článkem (pipeline_succeeded).
+    Selhaná pipeline - i ta, kterou Temporal vede jako COMPLETED s failed_result -
+    nové spuštění nepovoluje blokovat.
+
+    Returns:
+        (run_id, status) blokujícího běhu, nebo None
+    """
+    handle = client.get_workflow_handle(workflow_id)
+    try:
+        description = await handle.describe()
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            return None
+        raise
+    if description.status == WorkflowExecutionStatus.RUNNING:
+        return description.run_id, "RUNNING"
+    if description.status == WorkflowExecutionStatus.COMPLETED:
+        result = await client.get_workflow_handle(workflow_id, run_id=description.run_id).result()
+        if pipeline_succeeded(result):
+            return description.run_id, "COMPLETED"
+    return None
+
+
+async def start_seo_pipeline(
+    topic: str,
+    project_id: Optional[str] = None,
+    csv_base64: Optional[str] = None,
+    content_version: int = 1,
+    reuse_policy: Optional[WorkflowReusePolicy] = None,
+    workflow_options: Optional[dict] = None
+) -> Tuple[str, str, bool]:
     """
     Spustí SEO pipeline workflow přes Temporal klienta s podporou asistentů z databáze.
     
+    Workflow ID je deterministické pro (project_id, normalizované téma, content_version),
+    opakované odeslání stejného tématu tedy nespustí duplicitní pipeline.
+    
     Args:
         topic: Téma pro SEO zpracování
         project_id: ID projektu pro načtení asistentů z databáze
         csv_base64: Volitelný CSV obsah v Base64 formátu
+        content_version: Verze obsahu - zvýšením vynutíte novou generaci stejného tématu
+        reuse_policy: reject | attach | force (default z ENV WORKFLOW_ID_REUSE_POLICY, jinak reject)
+        workflow_options: Volitelné options pro AssistantPipelineWorkflow (např. resume_from, execution_mode)
         
     Returns:
-        Tuple[workflow_id, run_id]
+        Tuple[workflow_id, run_id, started] - started=False pokud jsme se připojili k existujícímu workflow
         
     Raises:
+        DuplicateWorkflowError: Politika reject a pipeline už běží/byla dokončena
         Exception: Pokud chybí připojení k Temporal serveru
     """
     try:
@@ -99,9 +156,8 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
             logger.error(f"   🚨 Error: {str(conn_error)}")
             raise Exception(f"Nelze se připojit k Temporal serveru {temporal_host}: {str(conn_error)}")
         
-        # Generování workflow ID
-        safe_topic = topic.replace(' ', '_').replace('?', '').replace('!', '').lower()
-        timestamp = int(__import__('time').time())
+        # Politika pro opakované spuštění stejného tématu
+        policy = parse_reuse_policy(reuse_policy or os.getenv("WORKFLOW_ID_REUSE_POLICY"))
         
         # Rozhodnutí o typu workflow na základě existence projektu a asistentů v DB  
         if project_id:
@@ -144,7 +200,10 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
                 logger.info(f"✅ Projekt {project.name} ověřen - nalezeno {len(assistants)} aktivních asistentů")
                 
                 workflow_type = "AssistantPipelineWorkflow"
-                workflow_id = f"assistant_pipeline_{safe_topic}_{timestamp}"
+                if policy == WorkflowReusePolicy.FORCE:
+                    workflow_id = build_forced_workflow_id(project_id, topic, content_version)
+                else:
+                    workflow_id = build_workflow_id(project_id, topic, content_version)
                 logger.info(f"🤖 Používám AssistantPipelineWorkflow s asistenty z databáze (projekt {project_id})")
                 
             except Exception as e:
@@ -157,8 +216,8 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
         
         logger.info(f"🆔 Generuji workflow identifikátory:")
         logger.info(f"   📋 Původní topic: '{topic}'")
-        logger.info(f"   🔗 Safe topic: '{safe_topic}'")
-        logger.info(f"   ⏰ Timestamp: {timestamp}")
+        logger.info(f"   🔢 Content version: {content_version}")
+        logger.info(f"   ♻️ Reuse policy: {policy.value}")
         logger.info(f"   🆔 Workflow ID: {workflow_id}")
         logger.info(f"   🎯 Workflow Type: {workflow_type}")
         
@@ -170,6 +229,9 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
         
         # Nastavení timeoutů
         run_timeout_minutes = 30  # Zvýšený timeout pro delší pipeline
+        if (workflow_options or {}).get("execution_mode") == "batch":
+            # 📦 Batch API vrací výsledky až v řádu hodin (completion window 24 h na stage)
+            run_timeout_minutes = int(float(os.getenv("BATCH_RUN_TIMEOUT_HOURS", "72")) * 60)
         task_timeout_minutes = 5   # Zvýšený timeout pro jednotlivé asistenty
         
         logger.info(f"⏱️ Workflow timeouty:")
@@ -188,14 +250,45 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
                 current_date = __import__('datetime').datetime.now().strftime("%d. %m. %Y")
                 logger.info(f"   📋 Arguments: topic='{topic}', project_id='{project_id}', csv_base64={bool(csv_base64)}, date='{current_date}'")
                 
-                workflow_handle = await client.start_workflow(
-                    "AssistantPipelineWorkflow",
-                    args=[topic, project_id, csv_base64, current_date],
-                    id=workflow_id,
-                    task_queue=os.getenv("TEMPORAL_TASK_QUEUE", "default"),  # Explicit env nebo standard
-                    run_timeout=__import__('datetime').timedelta(minutes=run_timeout_minutes),
-                    task_timeout=__import__('datetime').timedelta(minutes=task_timeout_minutes)
-                )
+                # Běžící nebo úspěšně dokončená pipeline blokuje nové spuštění (kromě FORCE)
+                existing = None if policy == WorkflowReusePolicy.FORCE else await find_existing_pipeline(client, workflow_id)
+                if existing:
+                    existing_run_id, existing_status = existing
+                    if policy != WorkflowReusePolicy.ATTACH:
+                        logger.warning(f"♻️ Duplicitní pipeline odmítnuta: {workflow_id} ({existing_status})")
+                        raise DuplicateWorkflowError(
+                            workflow_id,
+                            f"Pipeline pro téma '{topic}' už běží nebo byla dokončena ({workflow_id})"
+                        )
+                    logger.info(f"🔗 Připojeno k existujícímu workflow: {workflow_id} (run {existing_run_id}, status {existing_status})")
+                    return workflow_id, existing_run_id, False
+                
+                try:
+                    workflow_handle = await client.start_workflow(
+                        "AssistantPipelineWorkflow",
+                        # ENV nastavení plánování aktivit se zapéká při startu - replay na jiném workeru je deterministický
+                        args=[topic, project_id, csv_base64, current_date, {**(workflow_options or {}), "pinned": pinned_workflow_options()}],
+                        id=workflow_id,
+                        task_queue=os.getenv("TEMPORAL_TASK_QUEUE", "default"),  # Explicit env nebo standard
+                        run_timeout=__import__('datetime').timedelta(minutes=run_timeout_minutes),
+                        task_timeout=__import__('datetime').timedelta(minutes=task_timeout_minutes),
+                        # Uzavřený běh o duplicitě nerozhoduje - úspěch ověřil find_existing_pipeline
+                        # (selhaná pipeline končí jako COMPLETED s failed_result)
+                        id_reuse_policy=WorkflowIDReusePolicy.ALLOW_DUPLICATE
+                    )
+                except WorkflowAlreadyStartedError:
+                    # Souběžné spuštění stejného tématu mezi kontrolou a startem
+                    if policy != WorkflowReusePolicy.ATTACH:
+                        logger.warning(f"♻️ Duplicitní pipeline odmítnuta: {workflow_id}")
+                        raise DuplicateWorkflowError(
+                            workflow_id,
+                            f"Pipeline pro téma '{topic}' už běží nebo byla dokončena ({workflow_id})"
+                        )
+                    
+                    # ATTACH - vrátíme poslední běh existujícího workflow
+                    existing = await client.get_workflow_handle(workflow_id).describe()
+                    logger.info(f"🔗 Připojeno k existujícímu workflow: {workflow_id} (run {existing.run_id}, status {existing.status})")
+                    return workflow_id, existing.run_id, False
             else:
                 # KRITICKÁ CHYBA - tato větev by se nikdy neměla vykonat
                 # Pokud neexistuje project_id, funkce by měla vyhodit chybu výše
@@ -224,8 +317,10 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
             
             logger.info(f"✅ {workflow_type} byla úspěšně spuštěna pro téma: '{topic}'")
             
-            return workflow_id, run_id
+            return workflow_id, run_id, True
             
+        except DuplicateWorkflowError:
+            raise
         except Exception as workflow_error:
             logger.error(f"❌ Chyba při spouštění workflow:")
             logger.error(f"   🎯 Workflow: {workflow_type}")
@@ -236,6 +331,8 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
             logger.error(f"   📝 Error type: {type(workflow_error).__name__}")
             raise Exception(f"Chyba při spuštění workflow {workflow_type}: {str(workflow_error)}")
         
+    except DuplicateWorkflowError:
+        raise
     except Exception as e:
         logger.error(f"❌ Kritická chyba v start_seo_pipeline:")
         logger.error(f"   📋 Topic: '{topic}'")
@@ -245,6 +342,70 @@ async def start_seo_pipeline(topic: str, project_id: Optional[str] = None, csv_b
         logger.error(f"   📝 Error type: {type(e).__name__}")
         raise Exception(f"Nelze spustit SEO pipeline: {str(e)}")
 
+async def find_unserved_task_queues(client: Client, namespace: str) -> Dict[str, str]:
+    """
+    Task queues z ENV backendu, na kterých nepolluje žádný worker.
+
+    ENV backendu je jediný zdroj pravdy pro názvy front - start workflow je zapéká do
+    options["pinned"] a workflow pak aktivity plánuje jen na ně, ENV workerů se nečte.
+    Fronta bez pollerů znamená, že workery mají jiné TEMPORAL_QUEUE_*_NAME (nebo neběží)
+    a aktivity na ní budou čekat do timeoutu.
+
+    Returns:
+        název fronty -> workload ("workflow" pro hlavní queue)
+    """
+    from temporalio.api.enums.v1 import TaskQueueType
+    from temporalio.api.taskqueue.v1 import TaskQueue
+    from temporalio.api.workflowservice.v1 import DescribeTaskQueueRequest
+
+    queues = {os.getenv("TEMPORAL_TASK_QUEUE", "default"): ("workflow", TaskQueueType.TASK_QUEUE_TYPE_WORKFLOW)}
+    for workload, name in pinned_workflow_options()["task_queues"].items():
+        queues.setdefault(name, (workload, TaskQueueType.TASK_QUEUE_TYPE_ACTIVITY))
+
+    unserved = {}
+    for name, (workload, queue_type) in queues.items():
+        response = await client.workflow_service.describe_task_queue(DescribeTaskQueueRequest(
+            namespace=namespace, task_queue=TaskQueue(name=name), task_queue_type=queue_type
+        ))
+        if not response.pollers:
+            unserved[name] = workload
+    return unserved
+
+async def check_task_queues() -> None:
+    """Kontrola při startu backendu - fronty bez workerů jen loguje, Temporal nemusí ještě běžet."""
+    temporal_host = os.getenv("TEMPORAL_HOST", "localhost:7233")
+    temporal_namespace = os.getenv("TEMPORAL_NAMESPACE", "default")
+    try:
+        client = await Client.connect(temporal_host, namespace=temporal_namespace)
+        unserved = await find_unserved_task_queues(client, temporal_namespace)
+    except Exception as e:
+        logger.warning(f"⚠️ Task queues nelze ověřit ({temporal_host}): {e}")
+        return
+    for name, workload in unserved.items():
+        logger.warning(f"⚠️ Na task queue '{name}' ({workload}) nepolluje žádný worker - "
+                       f"sjednoťte TEMPORAL_QUEUE_*_NAME workerů s ENV backendu (ten je zapečený do nových workflow)")
+    if not unserved:
+        logger.info("✅ Všechny task queues z ENV backendu mají workery")
+
+async def get_workflow_start_options(workflow_id: str, run_id: str) -> dict:
+    """
+    Options, se kterými byl běh AssistantPipelineWorkflow spuštěn (5. argument workflow).
+
+    Returns:
+        dict options (prázdný pro běhy spuštěné bez options)
+    """
+    temporal_host = os.getenv("TEMPORAL_HOST", "localhost:7233")
+    temporal_namespace = os.getenv("TEMPORAL_NAMESPACE")
+    if not temporal_namespace:
+        raise Exception("❌ TEMPORAL_NAMESPACE environment variable musí být explicitně nastavena")
+
+    client = await Client.connect(temporal_host, namespace=temporal_namespace)
+    history = await client.get_workflow_handle(workflow_id, run_id=run_id).fetch_history()
+    started = history.events[0].workflow_execution_started_event_attributes
+    args = await client.data_converter.decode(started.input.payloads)
+    return args[4] if len(args) > 4 and isinstance(args[4], dict) else {}
+
+
 async def list_workflows(limit: int = 30) -> list[dict]:
     """
     Načte seznam workflow executions z Temporal serveru.
@@ -0,0 +1,127 @@
+"""
+🆔 DETERMINISTICKÁ WORKFLOW ID
+Idempotentní identifikátory pipeline odvozené z (projekt, normalizované téma, verze obsahu).
+"""
+
+import hashlib
+import json
+import re
+import unicodedata
+import uuid
+from enum import Enum
+from typing import Any, Optional
+
+WORKFLOW_ID_PREFIX = "assistant_pipeline"
+TOPIC_SLUG_MAX_LENGTH = 60
+HASH_LENGTH = 16
+
+
+class WorkflowReusePolicy(str, Enum):
+    """Co dělat, když pipeline se stejným ID už existuje."""
+    REJECT = "reject"   # duplicitu odmítnout (znovu lze spustit jen po selhání)
+    ATTACH = "attach"   # připojit se k běžícímu/existujícímu workflow
+    FORCE = "force"     # vždy spustit nový běh (unikátní suffix)
+
+
+class DuplicateWorkflowError(Exception):
+    """Pipeline pro stejný (projekt, téma, verzi) už běží nebo byla dokončena."""
+
+    def __init__(self, workflow_id: str, message: Optional[str] = None):
+        self.workflow_id = workflow_id
+        super().__init__(message or f"Workflow {workflow_id} už existuje")
+
+
+def parse_reuse_policy(value: Optional[str]) -> WorkflowReusePolicy:
+    """
+    Převede textovou hodnotu (API/ENV) na WorkflowReusePolicy.
+
+    Raises:
+        ValueError: Neznámá politika
+    """
+    if isinstance(value, WorkflowReusePolicy):
+        return value
+    if not value:
+        return WorkflowReusePolicy.REJECT
+    try:
+        return WorkflowReusePolicy(value.strip().lower())
+    except ValueError:
+        supported = [p.value for p in WorkflowReusePolicy]
+        raise ValueError(f"Neznámá reuse policy '{value}'. Podporované: {supported}")
+
+
+def pipeline_succeeded(result: Any) -> bool:
+    """
+    Vyprodukoval běh pipeline článek?
+
+    Workflow při selhání stage vrací failed_result místo výjimky, takže Temporal
+    i workflow_runs ho vedou jako COMPLETED - rozhoduje až obsah výsledku:
+    pipeline_success a úspěšný publish. Přijímá výsledek workflow, nebo resultJson
+    z DB (řetězec, případně obalený v {"result": ...}).
+    """
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except ValueError:
+            return False
+    if not isinstance(result, dict):
+        return False
+    if "pipeline_success" not in result and isinstance(result.get("result"), dict):
+        result = result["result"]
+    publish_output = result.get("publish_output")
+    return result.get("pipeline_success") is True and isinstance(publish_output, dict) and publish_output.get("success") is True
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Normalizuje téma pro deduplikaci - bez diakritiky, lowercase, jednotné mezery.
+
+    'Má ještě cenu  si pořizovat fotovoltaiku?' -> 'ma jeste cenu si porizovat fotovoltaiku'
+    """
+    if not topic or not topic.strip():
+        raise ValueError("❌ Topic nesmí být prázdný")
+
+    decomposed = unicodedata.normalize("NFKD", topic)
+    ascii_topic = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    ascii_topic = ascii_topic.lower()
+    ascii_topic = re.sub(r"[^\w\s-]", " ", ascii_topic)
+    return " ".join(ascii_topic.split())
+
+
+def topic_hash(project_id: str, topic: str, content_version: int = 1) -> str:
+    """Stabilní hash pro (projekt, normalizované téma, verze obsahu)."""
+    if not project_id:
+        raise ValueError("❌ project_id je povinný pro výpočet workflow ID")
+    key = f"{project_id}|{normalize_topic(topic)}|v{int(content_version)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:HASH_LENGTH]
+
+
+def build_workflow_id(project_id: str, topic: str, content_version: int = 1) -> str:
+    """
+    Sestaví deterministické workflow ID.
+
+    Formát: assistant_pipeline_<čitelný_slug>_<hash16>
+    Čitelná část zůstává kvůli extract_topic_from_workflow_id a přehledu v Temporal UI,
+    jednoznačnost zajišťuje pouze hash.
+    """
+    slug = normalize_topic(topic).replace(" ", "_").replace("-", "_")
+    slug = slug[:TOPIC_SLUG_MAX_LENGTH].rstrip("_")
+    return f"{WORKFLOW_ID_PREFIX}_{slug}_{topic_hash(project_id, topic, content_version)}"
+
+
+def build_forced_workflow_id(project_id: str, topic: str, content_version: int = 1) -> str:
+    """Workflow ID pro politiku FORCE - deterministický základ + náhodný suffix."""
+    return f"{build_workflow_id(project_id, topic, content_version)}_r{uuid.uuid4().hex[:8]}"
+
+
+def content_version_from_workflow_id(workflow_id: str, project_id: str, topic: str, max_version: int = 100) -> Optional[int]:
+    """
+    Verze obsahu, se kterou bylo workflow ID sestaveno (i s FORCE suffixem).
+
+    Hash je jednosměrný - verze se najde porovnáním s build_workflow_id pro 1..max_version.
+    None pokud ID neodpovídá projektu a tématu (např. starý formát s timestampem).
+    """
+    base_id = re.sub(r"_r[0-9a-f]{8}$", "", workflow_id)
+    for version in range(1, max_version + 1):
+        if build_workflow_id(project_id, topic, version) == base_id:
+            return version
+    return None
@@ -3,18 +3,93 @@
 Centralizované nastavení pro stabilní běh v produkčním prostředí.
 """
 
+import json
 import os
-from typing import Optional, Dict, Any
-from dataclasses import dataclass
+from typing import Optional, Dict, Any, Tuple, Callable, Type, TypeVar
+from dataclasses import dataclass, field, fields
+
+# 🚦 WORKLOAD TŘÍDY - každá má vlastní task queue a worker pool
+WORKLOAD_TEXT = "text"        # LLM textové asistenty (dlouhá I/O volání)
+WORKLOAD_IMAGE = "image"      # generování obrázků (pomalé, drahé, nízký rate limit)
+WORKLOAD_PUBLISH = "publish"  # deterministický publish script (CPU)
+WORKLOAD_CLASSES = (WORKLOAD_TEXT, WORKLOAD_IMAGE, WORKLOAD_PUBLISH)
+
+# Stage, které místo textu generují obrázky
+IMAGE_STAGE_KEYS = {"image_renderer_assistant"}
+
+# 📦 REŽIM PROVÁDĚNÍ PIPELINE - batch posílá textová LLM volání přes provider batch API
+EXECUTION_MODE_INTERACTIVE = "interactive"
+EXECUTION_MODE_BATCH = "batch"
+EXECUTION_MODES = (EXECUTION_MODE_INTERACTIVE, EXECUTION_MODE_BATCH)
+
+@dataclass
+class QueueConfig:
+    """Konfigurace jedné task queue a jejího worker poolu."""
+    name: str
+    max_concurrent_activities: int
+    max_activities_per_second: Optional[float] = None  # rate limit jednoho workera
+    max_task_queue_activities_per_second: Optional[float] = None  # rate limit celé queue (všichni workeři)
+
+def _default_queues() -> Dict[str, QueueConfig]:
+    return {
+        WORKLOAD_TEXT: QueueConfig(name="seo-llm-text", max_concurrent_activities=8),
+        WORKLOAD_IMAGE: QueueConfig(name="seo-image", max_concurrent_activities=3, max_task_queue_activities_per_second=1.0),
+        WORKLOAD_PUBLISH: QueueConfig(name="seo-publish", max_concurrent_activities=os.cpu_count() or 2),
+    }
 
 @dataclass
 class TemporalConfig:
     """Konfigurace pro Temporal server a workery."""
     host: str = "localhost:7233"
     namespace: str = "default"
-    task_queue: str = "default"
+    task_queue: str = "default"  # workflow + lehké aktivity (DB, checkpointy, ukládání)
     max_workers: int = 12  # ⚡ BATCH PROCESSING: Zvýšeno pro paralelní zpracování stovek témat
-    graceful_shutdown_timeout: int = 30
+    graceful_shutdown_timeout: int = 1200  # ≥ nejdelší start_to_close aktivity (pipelined stage 2× 600 s) - rozběhnuté aktivity se při shutdownu dokončí
+    queues: Dict[str, QueueConfig] = field(default_factory=_default_queues)
+    
+    def queue_for(self, workload: str) -> str:
+        """Vrátí název task queue pro workload třídu."""
+        if workload not in self.queues:
+            raise ValueError(f"❌ Neznámá workload třída '{workload}'. Podporované: {list(self.queues.keys())}")
+        return self.queues[workload].name
+
+def workload_for_stage(function_key: str) -> str:
+    """Určí workload třídu podle function_key stage."""
+    if function_key == "publish_script":
+        return WORKLOAD_PUBLISH
+    if function_key in IMAGE_STAGE_KEYS:
+        return WORKLOAD_IMAGE
+    return WORKLOAD_TEXT
+
+@dataclass
+class SupervisorConfig:
+    """Konfigurace multi-process supervisoru workerů."""
+    processes: int = 0  # 0 = počet CPU jader
+    heartbeat_interval: int = 10  # jak často worker zapisuje heartbeat
+    heartbeat_timeout: int = 60  # starší heartbeat = proces je nezdravý a restartuje se
+    startup_grace: int = 60  # čas na připojení k Temporal před první kontrolou heartbeatu
+    restart_backoff: float = 2.0  # základ exponenciálního backoffu při crash loopu
+    max_restart_backoff: int = 60
+    metrics_port: int = 9090
+    run_dir: str = ".worker_supervisor"  # heartbeaty, status a prometheus multiprocess data
+    kill_grace: int = 30  # rezerva po graceful shutdown Temporal workeru, teprve pak SIGKILL
+    
+    def resolved_processes(self) -> int:
+        return self.processes if self.processes > 0 else (os.cpu_count() or 1)
+
+@dataclass
+class AutoscalerConfig:
+    """Konfigurace autoscaleru workerů podle hloubky front."""
+    mode: str = "local"  # local = škáluje procesy supervisoru, metric = jen publikuje desired replicas
+    min_workers: int = 1
+    max_workers: int = 10
+    target_backlog_per_worker: int = 5  # scale up nad tuto hloubku fronty na jeden worker
+    scale_up_latency: float = 30.0  # nejstarší úkol ve frontě čeká déle = přidej worker
+    scale_down_backlog: int = 1  # fronta musí být takto prázdná, aby se ubíralo
+    scale_up_cooldown: int = 60
+    scale_down_cooldown: int = 300  # a musí být prázdná alespoň takto dlouho
+    sample_interval: int = 15
+    metrics_port: int = 9091
 
 @dataclass
 class ActivityConfig:
@@ -31,6 +106,20 @@ class LLMConfig:
     default_max_tokens: Optional[int] = None  # Neomezeno
     request_timeout: int = 120  # 2 minuty
     api_base_url: str = "http://localhost:8000"
+    streaming: bool = True  # textové stage streamují a heartbeatují na každý chunk
+    stream_heartbeat_timeout: int = 30  # heartbeat timeout streamovaných stage (> STREAM_KEEPALIVE_INTERVAL)
+    blocking_heartbeat_timeout: int = 180  # heartbeat timeout nestreamovaných volání (obrázky, LLM_STREAMING=false)
+    section_parallel_stages: Tuple[str, ...] = ()  # stage s paralelním generováním po H2 sekcích (draft_assistant, humanizer_assistant)
+    section_parallel_concurrency: int = 4  # max souběžných sub-volání jedné stage
+    section_parallel_min_sections: int = 3  # s menší osnovou se stage generuje jedním voláním
+    pipelined_handoff: Dict[str, Dict[str, int]] = field(default_factory=dict)  # downstream function_key -> požadovaný prefix upstream výstupu
+    batch_stage_timeout: int = 25 * 3600  # timeout textové stage v batch režimu (completion window providerů 24 h + rezerva)
+    
+    def heartbeat_timeout_for(self, workload: str) -> int:
+        """Heartbeat timeout stage - streamované textové stage se hlídají v sekundách."""
+        if self.streaming and workload == WORKLOAD_TEXT:
+            return self.stream_heartbeat_timeout
+        return self.blocking_heartbeat_timeout
 
 @dataclass
 class LoggingConfig:
@@ -41,11 +130,62 @@ class LoggingConfig:
     max_bytes: int = 10 * 1024 * 1024  # 10MB
     backup_count: int = 5
 
+# 🧩 JSON NASTAVENÍ MODULŮ - např. LLM_PROMPT_CACHE='{"enabled": false}'
+S = TypeVar("S")
+
+def settings_from_dict(cls: Type[S], values: Dict[str, Any], tuple_keys: Tuple[str, ...] = (), where: str = "") -> S:
+    """
+    Dataclass nastavení z JSON objektu.
+
+    Args:
+        tuple_keys: Pole, jejichž JSON seznam se převede na tuple
+        where: Upřesnění do chybové hlášky (např. " pro draft_assistant")
+
+    Raises:
+        ValueError: Neznámý klíč nebo špatný typ hodnoty
+    """
+    if not isinstance(values, dict):
+        raise ValueError(f"očekáván JSON objekt{where}")
+    unknown = set(values) - {f.name for f in fields(cls)}
+    if unknown:
+        raise ValueError(f"neznámé klíče {sorted(unknown)}{where}")
+    values = dict(values)
+    for key in tuple_keys:
+        if key in values:
+            if not isinstance(values[key], list):
+                raise ValueError(f"{key}{where} musí být seznam")
+            values[key] = tuple(values[key])
+    return cls(**values)
+
+def load_env_settings(env_name: str, cls: Type[S], validate: Optional[Callable[[S], None]] = None,
+                      tuple_keys: Tuple[str, ...] = ()) -> S:
+    """
+    Nastavení modulu z ENV env_name (JSON objekt), bez ENV výchozí hodnoty dataclass.
+
+    Args:
+        validate: Kontrola hodnot - chybu hlásí vyhozením ValueError
+
+    Raises:
+        ValueError: "❌ Neplatná konfigurace <ENV>: ..." (nevalidní JSON, neznámé klíče, hodnoty)
+    """
+    raw = os.getenv(env_name)
+    if not raw:
+        return cls()
+    try:
+        settings = settings_from_dict(cls, json.loads(raw), tuple_keys)
+        if validate:
+            validate(settings)
+        return settings
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"❌ Neplatná konfigurace {env_name}: {e}")
+
 class Config:
     """Hlavní konfigurační třída pro celý systém."""
     
     def __init__(self):
         self.temporal = TemporalConfig()
+        self.supervisor = SupervisorConfig()
+        self.autoscaler = AutoscalerConfig()
         self.activity = ActivityConfig()
         self.llm = LLMConfig()
         self.logging = LoggingConfig()
@@ -58,9 +198,56 @@ class Config:
         # Temporal
         self.temporal.host = os.getenv("TEMPORAL_HOST", self.temporal.host)
         self.temporal.namespace = os.getenv("TEMPORAL_NAMESPACE", self.temporal.namespace)
+        self.temporal.task_queue = os.getenv("TEMPORAL_TASK_QUEUE", self.temporal.task_queue)
+        if os.getenv("TEMPORAL_GRACEFUL_SHUTDOWN_TIMEOUT"):
+            self.temporal.graceful_shutdown_timeout = int(os.getenv("TEMPORAL_GRACEFUL_SHUTDOWN_TIMEOUT"))
+        
+        # Task queues per workload - např. TEMPORAL_QUEUE_IMAGE_CONCURRENCY=2
+        for workload, queue in self.temporal.queues.items():
+            prefix = f"TEMPORAL_QUEUE_{workload.upper()}"
+            queue.name = os.getenv(f"{prefix}_NAME", queue.name)
+            if os.getenv(f"{prefix}_CONCURRENCY"):
+                queue.max_concurrent_activities = int(os.getenv(f"{prefix}_CONCURRENCY"))
+            if os.getenv(f"{prefix}_RATE"):
+                queue.max_activities_per_second = float(os.getenv(f"{prefix}_RATE"))
+            if os.getenv(f"{prefix}_QUEUE_RATE"):
+                queue.max_task_queue_activities_per_second = float(os.getenv(f"{prefix}_QUEUE_RATE"))
+        
+        # Supervisor
+        if os.getenv("WORKER_PROCESSES"):
+            self.supervisor.processes = int(os.getenv("WORKER_PROCESSES"))
+        if os.getenv("WORKER_METRICS_PORT"):
+            self.supervisor.metrics_port = int(os.getenv("WORKER_METRICS_PORT"))
+        self.supervisor.run_dir = os.getenv("WORKER_SUPERVISOR_DIR", self.supervisor.run_dir)
+        
+        # Autoscaler
+        self.autoscaler.mode = os.getenv("AUTOSCALER_MODE", self.autoscaler.mode)
+        if os.getenv("AUTOSCALER_MIN_WORKERS"):
+            self.autoscaler.min_workers = int(os.getenv("AUTOSCALER_MIN_WORKERS"))
+        if os.getenv("AUTOSCALER_MAX_WORKERS"):
+            self.autoscaler.max_workers = int(os.getenv("AUTOSCALER_MAX_WORKERS"))
+        if os.getenv("AUTOSCALER_TARGET_BACKLOG"):
+            self.autoscaler.target_backlog_per_worker = int(os.getenv("AUTOSCALER_TARGET_BACKLOG"))
         
         # LLM
         self.llm.api_base_url = os.getenv("API_BASE_URL", self.llm.api_base_url)
+        self.llm.streaming = os.getenv("LLM_STREAMING", "true").lower() not in ("0", "false", "no")
+        if os.getenv("LLM_STREAM_HEARTBEAT_TIMEOUT"):
+            self.llm.stream_heartbeat_timeout = int(os.getenv("LLM_STREAM_HEARTBEAT_TIMEOUT"))
+        if os.getenv("LLM_SECTION_PARALLEL"):
+            # např. LLM_SECTION_PARALLEL=draft_assistant,humanizer_assistant
+            self.llm.section_parallel_stages = tuple(k.strip() for k in os.getenv("LLM_SECTION_PARALLEL").split(",") if k.strip())
+        if os.getenv("LLM_SECTION_PARALLEL_CONCURRENCY"):
+            self.llm.section_parallel_concurrency = int(os.getenv("LLM_SECTION_PARALLEL_CONCURRENCY"))
+        if os.getenv("LLM_PIPELINED_HANDOFF"):
+            # např. LLM_PIPELINED_HANDOFF='{"seo_assistant": {"sections": 3}}' - SEO startuje na prvních 3 sekcích humanizeru
+            from helpers.stage_handoff import validate_handoff_spec
+            specs = json.loads(os.getenv("LLM_PIPELINED_HANDOFF"))
+            if not isinstance(specs, dict):
+                raise ValueError("❌ LLM_PIPELINED_HANDOFF musí být JSON objekt {function_key: {...}}")
+            self.llm.pipelined_handoff = {key: validate_handoff_spec(key, spec) for key, spec in specs.items()}
+        if os.getenv("LLM_BATCH_STAGE_TIMEOUT"):
+            self.llm.batch_stage_timeout = int(os.getenv("LLM_BATCH_STAGE_TIMEOUT"))
         
         # Logging
         log_level = os.getenv("LOG_LEVEL", self.logging.level)
@@ -83,10 +270,39 @@ class Config:
 # Globální instance konfigurace
 config = Config()
 
+def pinned_workflow_options() -> Dict[str, Any]:
+    """
+    ENV nastavení, podle kterých workflow plánuje aktivity (task queues, timeouty, pipelined handoff).
+
+    Resolvují se jednou při startu workflow a předávají v options["pinned"] - workflow
+    kód ENV workera nečte, jinak by worker s jinou konfigurací při replay vygeneroval
+    jiné příkazy (non-determinism error).
+
+    Jediným zdrojem pravdy je tedy ENV procesu, který workflow spouští (backend).
+    TEMPORAL_QUEUE_*_NAME workerů musí být stejné - backend to při startu ověřuje
+    (temporal_client.check_task_queues) a fronty bez pollerů hlásí warningem.
+    """
+    return {
+        "task_queues": {workload: queue.name for workload, queue in config.temporal.queues.items()},
+        "activity_timeouts": {
+            "heartbeat": {workload: config.llm.heartbeat_timeout_for(workload) for workload in WORKLOAD_CLASSES},
+            "blocking_heartbeat": config.llm.blocking_heartbeat_timeout,
+            "batch_stage": config.llm.batch_stage_timeout,
+        },
+        # Zda se downstream stage spouští souběžně s upstream (jiná sekvence příkazů)
+        "pipelined_handoff": config.llm.pipelined_handoff,
+    }
+
 # Convenience funkce pro rychlý přístup
 def get_temporal_config() -> TemporalConfig:
     return config.temporal
 
+def get_supervisor_config() -> SupervisorConfig:
+    return config.supervisor
+
+def get_autoscaler_config() -> AutoscalerConfig:
+    return config.autoscaler
+
 def get_activity_config() -> ActivityConfig:
     return config.activity
 
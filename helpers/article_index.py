@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+🗂️ INDEX PUBLIKOVANÝCH ČLÁNKŮ
+=============================
+
+Inkrementálně udržovaný index článků pro sitemap a feedy. Řádek indexu
+(projekt, slug, jazyk, canonical, datum publikace, content hash) zapisuje publish_activity
+po úspěšném publishi - sitemap ani feed tak nemusí parsovat uložené výsledky runů.
+
+- každý projekt má vlastní články (stejný slug ve dvou projektech jsou dva články),
+  revizi a veřejnou base URL - sitemap a feedy se servírují per projekt
+
+- SQLite (standardní knihovna) - upsert jednoho článku je jedna transakce,
+  worker a backend sdílí soubor (WAL)
+- revize projektu se zvýší jen při skutečné změně článku (jiný content hash nebo metadata)
+  - backend podle ní cachuje vyrenderované sitemapy a feedy (ETag)
+- sitemap se nad 50 000 URL (limit sitemaps.org) dělí na shardy se sitemap indexem
+
+Konfigurace přes ENV ARTICLE_INDEX (JSON):
+ARTICLE_INDEX='{"path": "outputs/article_index.sqlite3", "base_urls": {"<project_id>": "https://blog.example.cz"}, "shard_size": 50000, "feed_size": 50}'
+    base_urls - veřejná URL webu projektu; projekt bez ní sitemap ani feed nemá
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from email.utils import format_datetime
+from typing import Any, Callable, Dict, List, Optional
+from xml.sax.saxutils import escape
+
+from config import load_env_settings
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SITEMAP_MAX_URLS = 50000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    project_id TEXT NOT NULL,
+    slug TEXT NOT NULL,
+    language TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    date_published TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (project_id, slug, language)
+);
+CREATE INDEX IF NOT EXISTS articles_project_date ON articles (project_id, date_published);
+CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+_COLUMNS = ("project_id", "slug", "language", "canonical", "title", "summary", "keywords", "date_published", "content_hash")
+_KEY_COLUMNS = 3
+
+
+@dataclass
+class ArticleIndexSettings:
+    """Nastavení indexu článků."""
+    path: str = os.path.join(PROJECT_ROOT, "outputs", "article_index.sqlite3")
+    base_urls: Dict[str, str] = field(default_factory=dict)  # project_id -> veřejná URL webu
+    shard_size: int = SITEMAP_MAX_URLS
+    feed_size: int = 50
+
+
+def _validate_settings(settings: ArticleIndexSettings) -> None:
+    if not 1 <= settings.shard_size <= SITEMAP_MAX_URLS or settings.feed_size < 1:
+        raise ValueError(f"shard_size musí být 1-{SITEMAP_MAX_URLS} a feed_size kladný")
+    invalid = [project for project, url in settings.base_urls.items() if not str(url).startswith(("https://", "http://"))]
+    if invalid:
+        raise ValueError(f"base_urls musí být absolutní http(s) URL (projekty {invalid})")
+
+
+def load_article_index_settings() -> ArticleIndexSettings:
+    """Nastavení z ENV ARTICLE_INDEX."""
+    return load_env_settings("ARTICLE_INDEX", ArticleIndexSettings, _validate_settings)
+
+
+@dataclass
+class ArticleIndexEntry:
+    """Jeden článek v indexu."""
+    slug: str
+    language: str
+    canonical: str
+    title: str
+    summary: str
+    date_published: str
+    content_hash: str
+    keywords: List[str] = field(default_factory=list)
+    project_id: str = ""
+
+    def url(self, base_url: str) -> str:
+        """Canonical URL článku, bez canonical ze SEO <base_url>/<slug>/."""
+        return self.canonical or f"{base_url.rstrip('/')}/{self.slug}/"
+
+
+def entry_from_publish_input(publish_input: Dict[str, Any], project_id: str = "") -> ArticleIndexEntry:
+    """Řádek indexu z PublishInput (výstup transform_to_PublishInput)."""
+    meta = publish_input["meta"]
+    serialized = json.dumps(publish_input, sort_keys=True, ensure_ascii=False, default=str)
+    return ArticleIndexEntry(
+        slug=meta["slug"],
+        language=publish_input.get("language", "cs"),
+        canonical=meta.get("canonical") or "",
+        title=publish_input["title"],
+        summary=publish_input.get("summary") or meta.get("description", ""),
+        date_published=publish_input["date_published"],
+        content_hash=hashlib.sha256(serialized.encode("utf-8")).hexdigest(),
+        keywords=list(meta.get("keywords") or []),
+        project_id=project_id
+    )
+
+
+class ArticleIndex:
+    """SQLite index článků - spojení per operace (volá se z vláken i procesů)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or load_article_index_settings().path
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(articles)")}
+            if columns and "project_id" not in columns:
+                # Index bez projektů - je odvozený z publishe, články se zaindexují znovu při dalším publishi
+                logger.warning(f"⚠️ Index článků {self.path} nemá projekty - zakládám ho znovu")
+                conn.executescript("DROP TABLE articles; DROP TABLE IF EXISTS index_meta;")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    def upsert(self, entry: ArticleIndexEntry) -> bool:
+        """Vloží/aktualizuje článek; vrací False, pokud se v indexu nic nezměnilo."""
+        row = {**asdict(entry), "keywords": json.dumps(entry.keywords, ensure_ascii=False)}
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                current = conn.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM articles WHERE project_id = ? AND slug = ? AND language = ?",
+                    (entry.project_id, entry.slug, entry.language)
+                ).fetchone()
+                if current is not None and all(current[column] == row[column] for column in _COLUMNS):
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.execute(
+                    f"INSERT INTO articles ({', '.join(_COLUMNS)}, updated_at) VALUES ({', '.join('?' * len(_COLUMNS))}, ?) "
+                    f"ON CONFLICT (project_id, slug, language) DO UPDATE SET "
+                    f"{', '.join(f'{column} = excluded.{column}' for column in _COLUMNS[_KEY_COLUMNS:])}, updated_at = excluded.updated_at",
+                    (*(row[column] for column in _COLUMNS), datetime.now().isoformat())
+                )
+                conn.execute(
+                    "INSERT INTO index_meta (key, value) VALUES (?, 1) ON CONFLICT (key) DO UPDATE SET value = value + 1",
+                    (_revision_key(entry.project_id),)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def revision(self, project_id: str) -> int:
+        """Revize článků projektu - mění se jen při změně článku projektu."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM index_meta WHERE key = ?", (_revision_key(project_id),)).fetchone()
+        return row[0] if row else 0
+
+    def count(self, project_id: str) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM articles WHERE project_id = ?", (project_id,)).fetchone()[0]
+
+    def shard(self, project_id: str, shard: int, shard_size: int) -> List[ArticleIndexEntry]:
+        """Články projektu v jednom shardu sitemap (stabilní řazení podle slugu a jazyka)."""
+        return self._select(project_id, "ORDER BY slug, language LIMIT ? OFFSET ?", (shard_size, shard * shard_size))
+
+    def shard_lastmods(self, project_id: str, shard_size: int) -> List[str]:
+        """Nejnovější date_published každého shardu projektu - pro <lastmod> v sitemap indexu."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT shard, MAX(date_published) FROM ("
+                "  SELECT (ROW_NUMBER() OVER (ORDER BY slug, language) - 1) / ? AS shard, date_published"
+                "  FROM articles WHERE project_id = ?"
+                ") GROUP BY shard ORDER BY shard",
+                (shard_size, project_id)
+            ).fetchall()
+        return [row[1] for row in rows]
+
+    def latest(self, project_id: str, limit: int) -> List[ArticleIndexEntry]:
+        """Nejnověji publikované články projektu (pro feedy)."""
+        return self._select(project_id, "ORDER BY date_published DESC, slug LIMIT ?", (limit,))
+
+    def _select(self, project_id: str, clause: str, params: tuple) -> List[ArticleIndexEntry]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM articles WHERE project_id = ? {clause}",
+                                (project_id, *params)).fetchall()
+        return [ArticleIndexEntry(**{**dict(row), "keywords": json.loads(row["keywords"])}) for row in rows]
+
+
+def _revision_key(project_id: str) -> str:
+    return f"revision:{project_id}"
+
+
+# ===== RENDERERY SITEMAP A FEEDŮ =====
+
+def render_sitemap(entries: List[ArticleIndexEntry], base_url: str) -> bytes:
+    """sitemap.xml (urlset) pro jeden shard."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for entry in entries:
+        lines.append(f"  <url><loc>{escape(entry.url(base_url))}</loc>"
+                     f"<lastmod>{escape(entry.date_published[:10])}</lastmod></url>")
+    lines.append("</urlset>")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def render_sitemap_index(lastmods: List[str], shard_url: Callable[[int], str]) -> bytes:
+    """Sitemap index odkazující na shardy (lastmods[i] = nejnovější článek shardu i)."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+    for shard, lastmod in enumerate(lastmods):
+        lines.append(f"  <sitemap><loc>{escape(shard_url(shard))}</loc>"
+                     f"<lastmod>{escape(lastmod[:10])}</lastmod></sitemap>")
+    lines.append("</sitemapindex>")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def render_json_feed(entries: List[ArticleIndexEntry], base_url: str, title: str) -> bytes:
+    """JSON Feed 1.1 v pořadí entries."""
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": title,
+        "home_page_url": base_url.rstrip("/") + "/",
+        "feed_url": f"{base_url.rstrip('/')}/feed.json",
+        "items": [
+            {
+                "id": entry.url(base_url),
+                "url": entry.url(base_url),
+                "title": entry.title,
+                "summary": entry.summary,
+                "content_text": entry.summary,
+                "date_published": entry.date_published,
+                "language": entry.language,
+                "tags": entry.keywords,
+            }
+            for entry in entries
+        ],
+    }
+    return json.dumps(feed, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _rss_date(value: str) -> str:
+    try:
+        return format_datetime(datetime.fromisoformat(value.replace("Z", "+00:00")))
+    except ValueError:
+        return value
+
+
+def render_rss(entries: List[ArticleIndexEntry], base_url: str, title: str) -> bytes:
+    """RSS 2.0 v pořadí entries."""
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<rss version="2.0">',
+             "<channel>",
+             f"  <title>{escape(title)}</title>",
+             f"  <link>{escape(base_url.rstrip('/') + '/')}</link>",
+             f"  <description>{escape(title)}</description>"]
+    for entry in entries:
+        url = escape(entry.url(base_url))
+        lines.append(f"  <item><title>{escape(entry.title)}</title><link>{url}</link>"
+                     f'<guid isPermaLink="true">{url}</guid><pubDate>{escape(_rss_date(entry.date_published))}</pubDate>'
+                     f"<description>{escape(entry.summary)}</description></item>")
+    lines.extend(["</channel>", "</rss>"])
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def render_sitemap_files(entries: List[ArticleIndexEntry], base_url: str,
+                         shard_size: int = SITEMAP_MAX_URLS) -> Dict[str, bytes]:
+    """
+    Sitemap soubory pro statický bundle: sitemap.xml, nad shard_size URL
+    sitemap.xml jako index a sitemap-<n>.xml shardy.
+    """
+    entries = sorted(entries, key=lambda e: (e.slug, e.language))
+    if len(entries) <= shard_size:
+        return {"sitemap.xml": render_sitemap(entries, base_url)}
+    shards = [entries[i:i + shard_size] for i in range(0, len(entries), shard_size)]
+    files = {f"sitemap-{n}.xml": render_sitemap(shard, base_url) for n, shard in enumerate(shards)}
+    files["sitemap.xml"] = render_sitemap_index(
+        [max(e.date_published for e in shard) for shard in shards],
+        lambda n: f"{base_url.rstrip('/')}/sitemap-{n}.xml"
+    )
+    return files
+
+
+_index: Optional[ArticleIndex] = None
+
+
+def get_article_index() -> ArticleIndex:
+    global _index
+    if _index is None:
+        _index = ArticleIndex()
+    return _index
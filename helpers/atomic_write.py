@@ -0,0 +1,30 @@
+"""
+💾 ATOMICKÝ ZÁPIS SOUBORŮ
+Zápis přes dočasný soubor ve stejném adresáři + os.replace - čtenář (jiný proces,
+souběžná aktivita) vidí vždy buď starý, nebo celý nový obsah, nikdy rozepsaný soubor.
+"""
+
+import json
+import os
+import uuid
+from typing import Any
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Atomicky zapíše bytes do path (chybějící adresáře vytvoří, dočasný soubor po chybě smaže)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Unikátní jméno pro souběžné zapisovatele; open() na rozdíl od mkstemp zachová práva podle umask
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "xb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_json_atomic(path: str, value: Any) -> None:
+    """Atomicky zapíše JSON (UTF-8, bez escapování diakritiky)."""
+    write_atomic(path, json.dumps(value, ensure_ascii=False).encode("utf-8"))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+💾 STAGE CHECKPOINT STORE
+=========================
+
+Checkpointy dokončených stage pipeline pod klíčem (run, stage, input hash).
+Nový běh může navázat na checkpointy předchozího běhu a spustit jen
+selhanou stage a všechny následující.
+
+Struktura na disku (ENV CHECKPOINT_DIR):
+    outputs/checkpoints/<workflow_id>/<run_id>/<order>_<function_key>.json
+
+Checkpointy zapisují workery a /api/resume-pipeline je čte v backendu - při nasazení
+na více strojů musí CHECKPOINT_DIR ukazovat na sdílené úložiště. Staré checkpointy
+maže `scripts/outputs_store.py gc` (prune_checkpoints).
+
+Modul používá pouze standardní knihovnu - compute_input_hash se volá
+přímo ve workflow a musí zůstat deterministický.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from helpers.atomic_write import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CHECKPOINT_DIR = os.path.join(PROJECT_ROOT, "outputs", "checkpoints")
+
+# Parametry asistenta, které ovlivňují výstup stage
+HASHED_ASSISTANT_FIELDS = ("function_key", "system_prompt", "model_provider", "model", "temperature", "max_tokens")
+
+
+def get_checkpoint_dir() -> str:
+    """Vrátí kořenový adresář checkpointů (ENV CHECKPOINT_DIR nebo outputs/checkpoints)."""
+    return os.getenv("CHECKPOINT_DIR") or DEFAULT_CHECKPOINT_DIR
+
+
+def _safe_name(value: str) -> str:
+    """Převede ID na bezpečný název souboru/adresáře."""
+    if not value:
+        raise ValueError("❌ Identifikátor checkpointu nesmí být prázdný")
+    return re.sub(r"[^\w.-]", "_", str(value))
+
+
+def compute_input_hash(assistant: Dict[str, Any], topic_input: Any, current_date: Optional[str], previous_outputs: Dict[str, Any]) -> str:
+    """
+    Spočítá hash vstupu stage - konfigurace asistenta + vstupní text + výstupy předchozích stage.
+
+    Shodný hash znamená, že opakované volání LLM by dostalo identický vstup
+    a checkpoint lze bezpečně znovu použít.
+    """
+    payload = {
+        "assistant": {field: assistant.get(field) for field in HASHED_ASSISTANT_FIELDS},
+        "topic": topic_input,
+        "current_date": current_date,
+        "previous_outputs": previous_outputs,
+    }
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def run_checkpoint_dir(workflow_id: str, run_id: str, base_dir: Optional[str] = None) -> str:
+    """Adresář checkpointů pro konkrétní běh workflow."""
+    return os.path.join(base_dir or get_checkpoint_dir(), _safe_name(workflow_id), _safe_name(run_id))
+
+
+def save_checkpoint(workflow_id: str, run_id: str, checkpoint: Dict[str, Any], base_dir: Optional[str] = None) -> str:
+    """
+    Atomicky uloží checkpoint jedné stage.
+
+    Args:
+        workflow_id: ID workflow
+        run_id: Run ID workflow
+        checkpoint: Dict s function_key, order, input_hash, output (+ metadata, current_date, stage)
+
+    Returns:
+        Cesta k uloženému souboru
+    """
+    for key in ("function_key", "input_hash", "output"):
+        if checkpoint.get(key) is None:
+            raise ValueError(f"❌ Checkpoint nemá povinný klíč '{key}'")
+
+    target_dir = run_checkpoint_dir(workflow_id, run_id, base_dir)
+    os.makedirs(target_dir, exist_ok=True)
+
+    order = checkpoint.get("order")
+    prefix = f"{int(order):02d}_" if order is not None else ""
+    filepath = os.path.join(target_dir, f"{prefix}{_safe_name(checkpoint['function_key'])}.json")
+
+    record = {
+        **checkpoint,
+        "workflow_id": workflow_id,
+        "run_id": run_id,
+        "saved_at": datetime.now().isoformat(),
+    }
+
+    # Atomický zápis, aby čtení nikdy nevidělo rozepsaný checkpoint
+    write_json_atomic(filepath, record)
+
+    return filepath
+
+
+def load_checkpoints(workflow_id: str, run_id: str, base_dir: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Načte všechny checkpointy běhu.
+
+    Returns:
+        Dict function_key -> checkpoint (prázdný pokud běh nemá checkpointy)
+    """
+    target_dir = run_checkpoint_dir(workflow_id, run_id, base_dir)
+    if not os.path.isdir(target_dir):
+        return {}
+
+    checkpoints = {}
+    for filename in sorted(os.listdir(target_dir)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(target_dir, filename), "r", encoding="utf-8") as f:
+                record = json.load(f)
+            checkpoints[record["function_key"]] = record
+        except Exception as e:
+            logger.warning(f"⚠️ Poškozený checkpoint {filename} přeskočen: {e}")
+    return checkpoints
+
+
+def find_reusable_checkpoint(checkpoints: Dict[str, Dict[str, Any]], function_key: str, input_hash: str) -> Optional[Dict[str, Any]]:
+    """Vrátí checkpoint stage pouze pokud sedí input hash, jinak None."""
+    checkpoint = checkpoints.get(function_key)
+    if checkpoint and checkpoint.get("input_hash") == input_hash:
+        return checkpoint
+    return None
+
+
+def prune_checkpoints(max_age_days: float, base_dir: Optional[str] = None) -> int:
+    """Smaže checkpointy runů, do kterých nikdo nezapsal déle než max_age_days; vrací počet runů."""
+    root = base_dir or get_checkpoint_dir()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for workflow_dir in os.scandir(root):
+        if not workflow_dir.is_dir():
+            continue
+        for run_dir in os.scandir(workflow_dir.path):
+            if not run_dir.is_dir():
+                continue
+            mtimes = [entry.stat().st_mtime for entry in os.scandir(run_dir.path)] or [run_dir.stat().st_mtime]
+            if max(mtimes) < cutoff:
+                shutil.rmtree(run_dir.path, ignore_errors=True)
+                removed += 1
+        try:
+            os.rmdir(workflow_dir.path)  # prázdný adresář workflow
+        except OSError:
+            pass
+    return removed
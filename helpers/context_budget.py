@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+🧮 TOKEN-AWARE CONTEXT BUDGET
+=============================
+
+Skládá vstup multi-input asistentů (QA, případně další podle konfigurace)
+z výstupů předchozích stage tak, aby se vešel do tokenového rozpočtu:
+
+1. lokální odhad tokenů (bez tokenizeru providera) podle typu textu
+2. rozpočet = min(max_input_tokens, kontextové okno modelu - system prompt - rezerva na výstup)
+3. deduplikace odstavců opakujících se napříč stage (draft vs. humanizer apod.)
+   - ponechá se výskyt ve zdroji s vyšší prioritou
+4. rozdělení rozpočtu mezi zdroje podle priority (váha 1/priorita, water-filling)
+5. zdroje nad přidělený rozpočet se zkrátí - nízká priorita extraktivně
+   (nadpisy + první věta odstavce), vysoká priorita ořezem na hranici odstavce
+
+Konfigurace přes ENV LLM_CONTEXT_BUDGET (klíč = function_key asistenta nebo "default"):
+LLM_CONTEXT_BUDGET='{"qa_assistant": {"max_input_tokens": 16000},
+                     "seo_assistant": {"sources": ["humanizer_assistant_output", "brief_assistant_output"]}}'
+"""
+
+import json
+import logging
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from config import settings_from_dict
+
+logger = logging.getLogger(__name__)
+
+# Kontextová okna modelů (prefix názvu -> tokeny), nejdelší shoda vyhrává
+MODEL_CONTEXT_WINDOWS = {
+    "claude": 200_000,
+    "gpt-4o": 128_000,
+    "gpt-4-turbo": 128_000,
+    "gpt-4.1": 1_000_000,
+    "gpt-4": 8_192,
+    "gpt-3.5": 16_385,
+    "o1": 200_000,
+    "o3": 200_000,
+    "gemini-1.0": 32_760,
+    "gemini": 1_000_000,
+}
+DEFAULT_CONTEXT_WINDOW = 32_000
+
+MIN_DEDUPE_CHARS = 80  # kratší odstavce (nadpisy, oddělovače) se neodstraňují
+
+_TOKEN_PIECES = re.compile(r"[^\W\d_]+|\d+|\S")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class ContextBudgetPolicy:
+    """Rozpočet vstupu jednoho asistenta."""
+    max_input_tokens: int = 12_000  # strop vstupu, i když by kontextové okno dovolilo víc
+    output_reserve: int = 4_096  # rezerva na výstup, pokud asistent nemá max_tokens
+    min_source_tokens: int = 150  # menší příděl nemá smysl - zdroj se vynechá
+    dedupe: bool = True
+    sources: Tuple[str, ...] = ()  # výstupy stage (klíče previous_outputs) v pořadí priority - pro generické asistenty
+
+
+@dataclass
+class ContextSource:
+    """Jeden vstup asistenta - výstup předchozí stage."""
+    key: str
+    label: str
+    text: str
+    priority: int = 1  # 1 = nejdůležitější
+
+
+@dataclass
+class BudgetedSource:
+    key: str
+    label: str
+    text: str
+    tokens: int
+    original_tokens: int
+    mode: str  # full | deduplicated | compressed | truncated | duplicate | dropped
+
+
+@dataclass
+class ContextBudget:
+    sources: List[BudgetedSource] = field(default_factory=list)
+    budget: int = 0
+
+    @property
+    def used(self) -> int:
+        return sum(s.tokens for s in self.sources)
+
+    def included(self) -> List[BudgetedSource]:
+        return [s for s in self.sources if s.mode != "dropped"]
+
+
+def load_context_policies() -> Dict[str, ContextBudgetPolicy]:
+    """Politiky z ENV LLM_CONTEXT_BUDGET - JSON objekt {function_key: ContextBudgetPolicy}."""
+    raw = os.getenv("LLM_CONTEXT_BUDGET")
+    if not raw:
+        return {}
+    try:
+        specs = json.loads(raw)
+        if not isinstance(specs, dict):
+            raise ValueError("očekáván JSON objekt {function_key: {...}}")
+        return {function_key: settings_from_dict(ContextBudgetPolicy, values, ("sources",), f" pro {function_key}")
+                for function_key, values in specs.items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"❌ Neplatná konfigurace LLM_CONTEXT_BUDGET: {e}")
+
+
+_policies: Optional[Dict[str, ContextBudgetPolicy]] = None
+
+
+def get_context_policy(function_key: str) -> ContextBudgetPolicy:
+    """Politika asistenta, jinak "default", jinak výchozí hodnoty."""
+    global _policies
+    if _policies is None:
+        _policies = load_context_policies()
+    return _policies.get(function_key) or _policies.get("default") or ContextBudgetPolicy()
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Lokální odhad počtu tokenů (BPE tokenizery LLM providerů).
+
+    ASCII slova ~4 znaky/token, slova s diakritikou a jiná písma se dělí jemněji
+    (~2.5 znaku/token), čísla ~3 číslice/token, interpunkce a emoji po jednom.
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece.isascii() and piece.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif len(piece) > 1:
+            tokens += math.ceil(len(piece) / 2.5)
+        else:
+            tokens += 1
+    return tokens
+
+
+def context_window(model: Optional[str]) -> int:
+    """Kontextové okno modelu podle nejdelšího shodného prefixu názvu."""
+    name = (model or "").lower()
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if name.startswith(prefix)]
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+def _paragraphs(text: str) -> List[str]:
+    return [p for p in re.split(r"\n\s*\n", text.strip()) if p.strip()]
+
+
+def _normalize(paragraph: str) -> str:
+    text = re.sub(r"^[#>*\-\s]+", "", paragraph.strip(), flags=re.MULTILINE)
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _is_structured(text: str) -> bool:
+    """JSON výstupy (SEO, multimedia) se nesmí krátit extraktivně."""
+    stripped = text.lstrip()
+    return stripped.startswith(("{", "[", "```json"))
+
+
+def deduplicate(sources: Sequence[ContextSource]) -> Dict[str, Tuple[str, Optional[str]]]:
+    """
+    Odstraní odstavce, které už obsahuje zdroj s vyšší prioritou.
+
+    Returns:
+        {key: (text bez duplicit, label zdroje, se kterým je celý obsah shodný, jinak None)}
+    """
+    seen: Dict[str, str] = {}
+    result = {}
+    for source in sorted(sources, key=lambda s: s.priority):
+        if _is_structured(source.text):
+            result[source.key] = (source.text, None)
+            continue
+        kept, owners = [], []
+        for paragraph in _paragraphs(source.text):
+            normalized = _normalize(paragraph)
+            if len(normalized) >= MIN_DEDUPE_CHARS and normalized in seen:
+                owners.append(seen[normalized])
+                continue
+            if len(normalized) >= MIN_DEDUPE_CHARS:
+                seen[normalized] = source.label
+            kept.append(paragraph)
+        duplicate_of = max(set(owners), key=owners.count) if owners and not any(
+            len(_normalize(p)) >= MIN_DEDUPE_CHARS for p in kept) else None
+        result[source.key] = ("\n\n".join(kept), duplicate_of)
+    return result
+
+
+def allocate_budget(demands: Sequence[Tuple[int, int]], budget: int, min_tokens: int = 0) -> List[int]:
+    """
+    Rozdělí rozpočet mezi zdroje (priorita, požadované tokeny).
+
+    Zdroje s menším požadavkem než jejich váhový podíl dostanou vše, zbytek se
+    rozdělí mezi ostatní podle váhy 1/priorita. Pokud by zdroj dostal méně než
+    min_tokens, vynechají se nejdřív zdroje s nejnižší prioritou.
+    """
+    active = [i for i, (_, demand) in enumerate(demands) if demand > 0]
+    allocation = [0] * len(demands)
+    while active:
+        remaining = budget
+        pending = list(active)
+        allocation = [0] * len(demands)
+        while pending:
+            weights = {i: 1 / max(demands[i][0], 1) for i in pending}
+            total = sum(weights.values())
+            satisfied = [i for i in pending if demands[i][1] <= remaining * weights[i] / total]
+            if not satisfied:
+                for i in pending:
+                    allocation[i] = int(remaining * weights[i] / total)
+                break
+            for i in satisfied:
+                allocation[i] = demands[i][1]
+                remaining -= demands[i][1]
+                pending.remove(i)
+        starved = [i for i in active if allocation[i] < min(min_tokens, demands[i][1])]
+        if not starved:
+            return allocation
+        # Vynechá se zdroj s nejnižší prioritou (při shodě ten pozdější) a rozdělí se znovu
+        active.remove(max(active, key=lambda i: (demands[i][0], i)))
+    return [0] * len(demands)
+
+
+def compress_text(text: str, max_tokens: int, extractive: bool = True) -> Tuple[str, str]:
+    """
+    Zkrátí text na max_tokens.
+
+    Returns:
+        (zkrácený text, režim "compressed" | "truncated")
+    """
+    original = count_tokens(text)
+    mode = "truncated"
+    if extractive and not _is_structured(text):
+        # Nadpisy a první věta každého odstavce
+        summary = []
+        for paragraph in _paragraphs(text):
+            lines = paragraph.strip().splitlines()
+            if lines[0].lstrip().startswith("#"):
+                summary.append(lines[0])
+                lines = lines[1:]
+            rest = " ".join(line.strip() for line in lines).strip()
+            if rest:
+                summary.append(_SENTENCE_END.split(rest, 1)[0])
+        text = "\n\n".join(summary)
+        mode = "compressed"
+
+    marker = f"\n\n[ZKRÁCENO z ~{original} tokenů]"
+    limit = max_tokens - count_tokens(marker)
+    if count_tokens(text) <= limit:
+        return text + marker, mode
+
+    kept, used = [], 0
+    for paragraph in _paragraphs(text):
+        tokens = count_tokens(paragraph) + 1
+        if used + tokens > limit:
+            break
+        kept.append(paragraph)
+        used += tokens
+    if not kept:
+        # Ani první odstavec se nevejde - ořez po znacích podle hustoty tokenů
+        first = _paragraphs(text)[0] if _paragraphs(text) else text
+        kept = [first[:max(int(len(first) * limit / max(count_tokens(first), 1)), 0)]]
+    return "\n\n".join(kept) + marker, mode
+
+
+def budget_context(
+    sources: Sequence[ContextSource],
+    model: Optional[str],
+    system_prompt: str = "",
+    fixed_text: str = "",
+    max_output_tokens: Optional[int] = None,
+    policy: Optional[ContextBudgetPolicy] = None,
+    header_tokens: int = 15
+) -> ContextBudget:
+    """
+    Sestaví vstupy asistenta v tokenovém rozpočtu.
+
+    Args:
+        sources: Vstupy (pořadí výstupu se zachová, o krácení rozhoduje priorita)
+        model: Model asistenta (kontextové okno)
+        system_prompt: System prompt (odečítá se od okna)
+        fixed_text: Pevná část user message mimo zdroje
+        max_output_tokens: max_tokens asistenta (jinak policy.output_reserve)
+        policy: Politika rozpočtu (default ContextBudgetPolicy())
+        header_tokens: Režie nadpisu jednoho zdroje v message
+
+    Returns:
+        ContextBudget se zdroji v původním pořadí
+    """
+    policy = policy or ContextBudgetPolicy()
+    reserve = max_output_tokens if max_output_tokens and max_output_tokens > 0 else policy.output_reserve
+    window_left = context_window(model) - count_tokens(system_prompt) - count_tokens(fixed_text) - reserve
+    budget = max(min(policy.max_input_tokens, window_left) - header_tokens * len(sources), 0)
+
+    if policy.dedupe:
+        deduped = deduplicate(sources)
+    else:
+        deduped = {s.key: (s.text, None) for s in sources}
+
+    texts, duplicates = {}, {}
+    for source in sources:
+        text, duplicate_of = deduped[source.key]
+        if duplicate_of:
+            text = f"[Obsah je shodný s výstupem {duplicate_of} výše]"
+            duplicates[source.key] = True
+        texts[source.key] = text
+
+    demands = [(s.priority, count_tokens(texts[s.key])) for s in sources]
+    allocation = allocate_budget(demands, budget, policy.min_source_tokens)
+    # Nejvyšší priorita mezi zdroji - krácení ostatních je extraktivní
+    top_priority = min((s.priority for s in sources), default=1)
+
+    result = ContextBudget(budget=budget)
+    for source, (_, demand), allowed in zip(sources, demands, allocation):
+        original_tokens = count_tokens(source.text)
+        text = texts[source.key]
+        if duplicates.get(source.key):
+            mode = "duplicate"
+        elif allowed <= 0:
+            mode, text = "dropped", ""
+        elif demand > allowed:
+            text, mode = compress_text(text, allowed, extractive=source.priority > top_priority)
+        else:
+            mode = "deduplicated" if text != source.text else "full"
+        result.sources.append(BudgetedSource(source.key, source.label, text, count_tokens(text), original_tokens, mode))
+
+    logger.info(f"🧮 Context budget {result.used}/{budget} tokenů: " + ", ".join(
+        f"{s.label} {s.original_tokens}->{s.tokens} ({s.mode})" for s in result.sources
+    ))
+    return result
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+✏️ HTML REWRITER PRO NADPISY ČLÁNKU
+===================================
+
+Jeden průchod HTML obsahem článku:
+- nahradí H1-H3 nadpisy ze SEO asistenta podle pořadí výskytu
+  (n-tý <h2> dostane n-tý H2 ze SEO - duplicitní nadpisy se nepletou)
+- zároveň spočítá slova (text bez tagů) a nadpisy výsledného HTML
+
+Otevírací tag nadpisu (id, class) zůstává, nahrazuje se jen obsah nadpisu.
+Výsledek se skládá z kousků a spojí jednou - žádné opakované str.replace přes celý článek.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Stejná definice tagu i slova jako původní count_words (<[^>]+>, \b\w+\b)
+_TAG = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)?[^>]*>")
+_WORD = re.compile(r"\w+")
+_HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3}
+_HEADING_END = {level: re.compile(rf"</h{level}\s*>", re.IGNORECASE) for level in _HEADING_LEVELS.values()}
+
+
+@dataclass
+class ContentStats:
+    """Statistiky HTML obsahu článku."""
+    word_count: int = 0
+    h1_count: int = 0
+    h2_count: int = 0
+    h3_count: int = 0
+
+
+class _WordCounter:
+    """Počítá slova v textu rozděleném tagy - slovo přes hranici tagu (<b>a</b>b) je jedno."""
+
+    def __init__(self):
+        self.count = 0
+        self._in_word = False
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        words = len(_WORD.findall(text))
+        if words and self._in_word and _WORD.match(text):
+            words -= 1
+        self.count += words
+        self._in_word = bool(_WORD.match(text[-1]))
+
+
+def _replacements(seo_headings: Optional[Dict[str, Any]]) -> Dict[int, Any]:
+    """Nové nadpisy podle úrovně: H1 jeden text (pro každý <h1>), H2/H3 seznamy podle pořadí."""
+    seo_headings = seo_headings or {}
+    replacements: Dict[int, Any] = {}
+    if seo_headings.get("h1"):
+        replacements[1] = str(seo_headings["h1"])
+    for level in (2, 3):
+        values = seo_headings.get(f"h{level}")
+        if isinstance(values, list):
+            replacements[level] = [str(value) for value in values]
+    return replacements
+
+
+def rewrite_headings(content_html: str, seo_headings: Optional[Dict[str, Any]] = None) -> Tuple[str, ContentStats]:
+    """
+    Nahradí nadpisy H1-H3 a spočítá statistiky výsledného HTML v jednom průchodu.
+
+    Args:
+        content_html: HTML obsah článku
+        seo_headings: {"h1": str, "h2": [str], "h3": [str]} ze SEO asistenta (None = jen statistiky)
+
+    Returns:
+        (nové HTML, statistiky)
+    """
+    replacements = _replacements(seo_headings)
+    seen = {1: 0, 2: 0, 3: 0}
+    words = _WordCounter()
+    parts: List[str] = []
+    cursor = 0
+
+    match = _TAG.search(content_html)
+    while match:
+        text = content_html[cursor:match.start()]
+        parts.append(text)
+        words.feed(text)
+        parts.append(match.group())
+        cursor = match.end()
+
+        level = _HEADING_LEVELS.get((match.group(2) or "").lower())
+        if level and not match.group(1):
+            index = seen[level]
+            seen[level] += 1
+            new_heading = replacements.get(level)
+            if isinstance(new_heading, list):
+                new_heading = new_heading[index] if index < len(new_heading) else None
+            # Neuzavřený nadpis se nechává beze změny
+            end = _HEADING_END[level].search(content_html, cursor) if new_heading is not None else None
+            if end:
+                parts.append(new_heading)
+                words.feed(_TAG.sub("", new_heading))
+                parts.append(end.group())
+                cursor = end.end()
+        match = _TAG.search(content_html, cursor)
+
+    text = content_html[cursor:]
+    parts.append(text)
+    words.feed(text)
+
+    stats = ContentStats(word_count=words.count, h1_count=seen[1], h2_count=seen[2], h3_count=seen[3])
+    return "".join(parts), stats
+
+
+def content_stats(content_html: str) -> ContentStats:
+    """Statistiky HTML bez úprav nadpisů."""
+    return rewrite_headings(content_html)[1]
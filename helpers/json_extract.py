@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+🔎 JSON EXTRACTOR PRO VÝSTUPY LLM
+=================================
+
+Jeden sdílený extraktor JSONu z textu odpovědi modelu pro všechny parsery
+(transformers, structured output, micro-batching, sekční drafting).
+
+Jeden průchod textem:
+1. start - ```json blok (má přednost před závorkami v úvodním textu), jinak první { / [
+2. rychlá cesta - raw_decode přímo od startu (C dekodér, text za hodnotou se ignoruje,
+   bez kopírování úseku)
+3. jen když rychlá cesta selže - párování závorek přes tokeny (řetězce celé jedním regexem)
+   - konec hodnoty = návrat na hloubku 0, zbytek textu (komentář, uzavírací ```) se ignoruje
+   - čárky před } / ] (trailing commas) se zaznamenají a vynechají
+   - jediné json.loads nad nalezeným úsekem
+
+Chyby hlásí JSONExtractError s offsetem (a řádkem/sloupcem) v původním textu.
+"""
+
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+_FENCE_START = re.compile(r"```[ \t]*json[ \t]*\r?\n", re.IGNORECASE)
+_VALUE_START = re.compile(r"[{\[]")
+# Celý řetězec, samotná uvozovka (neukončený řetězec), nebo strukturální znak
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|"|[{}\[\],]', re.DOTALL)
+_CLOSING = {"}": "{", "]": "["}
+
+_DECODER = json.JSONDecoder()
+
+_MISSING = object()
+
+
+class JSONExtractError(ValueError):
+    """JSON v textu chybí nebo je nevalidní - offset ukazuje do původního textu."""
+
+    def __init__(self, message: str, text: str, offset: int, found: bool = True):
+        self.offset = offset
+        self.line = text.count("\n", 0, offset) + 1
+        self.column = offset - text.rfind("\n", 0, offset)
+        self.found = found  # text obsahoval kandidáta na JSON hodnotu
+        super().__init__(f"{message} (offset {offset}, řádek {self.line}, sloupec {self.column})")
+
+
+def _scan_value(text: str, start: int) -> Tuple[int, List[int]]:
+    """
+    Najde konec JSON hodnoty začínající na start ({ nebo [).
+
+    Returns:
+        (offset za koncem hodnoty, pozice trailing čárek k vynechání)
+    """
+    stack: List[str] = []
+    trailing: List[int] = []
+    last_comma = -1
+    for match in _TOKEN.finditer(text, start):
+        token = match.group()
+        position = match.start()
+        if token == '"':
+            raise JSONExtractError("neukončený řetězec", text, position)
+        if token == ",":
+            last_comma = position
+            continue
+        if token in "{[":
+            stack.append(token)
+        elif token in "}]":
+            if not stack or stack[-1] != _CLOSING[token]:
+                raise JSONExtractError(f"nečekané '{token}'", text, position)
+            stack.pop()
+            # Čárka těsně před závorkou (jen whitespace mezi) = trailing comma
+            if last_comma > start and not text[last_comma + 1:position].strip():
+                trailing.append(last_comma)
+            if not stack:
+                return match.end(), trailing
+        last_comma = -1
+    raise JSONExtractError(f"neukončená JSON hodnota ({len(stack)} neuzavřených závorek)", text, start)
+
+
+def _decode(text: str, start: int, end: int, trailing: List[int]) -> Any:
+    """json.loads nad úsekem [start, end) bez trailing čárek."""
+    if trailing:
+        pieces, cursor = [], start
+        for comma in trailing:
+            pieces.append(text[cursor:comma])
+            cursor = comma + 1
+        pieces.append(text[cursor:end])
+        source = "".join(pieces)
+    else:
+        source = text[start:end]
+    try:
+        return json.loads(source)
+    except json.JSONDecodeError as e:
+        # Pozice v upraveném úseku -> offset v původním textu
+        offset = start + e.pos
+        for comma in trailing:
+            if comma <= offset:
+                offset += 1
+        raise JSONExtractError(f"nevalidní JSON: {e.msg}", text, offset)
+
+
+def _parse_at(text: str, start: int) -> Tuple[Any, int]:
+    """Dekóduje hodnotu od start - rychlá cesta raw_decode, jinak sken s trailing čárkami."""
+    try:
+        return _DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        end, trailing = _scan_value(text, start)
+        return _decode(text, start, end, trailing), end
+
+
+def locate_json(text: str) -> Tuple[Any, int, int]:
+    """
+    Najde a dekóduje první JSON objekt/pole v textu.
+
+    Returns:
+        (hodnota, offset začátku, offset konce) v původním textu
+
+    Raises:
+        JSONExtractError: Text neobsahuje JSON objekt/pole, nebo je nevalidní
+    """
+    if not isinstance(text, str):
+        raise TypeError(f"extrakce JSON očekává text, dostala {type(text).__name__}")
+    fence = _FENCE_START.search(text)
+    if fence:
+        # Obsah ```json bloku je vždy JSON - chyba v něm je chyba výstupu
+        start = _VALUE_START.search(text, fence.end())
+        if not start:
+            raise JSONExtractError("```json blok neobsahuje objekt ani pole", text, fence.end())
+        value, end = _parse_at(text, start.start())
+        return value, start.start(), end
+
+    first_error: Optional[JSONExtractError] = None
+    candidate = _VALUE_START.search(text)
+    while candidate:
+        start = candidate.start()
+        try:
+            value, end = _DECODER.raw_decode(text, start)
+            return value, start, end
+        except json.JSONDecodeError:
+            pass
+        try:
+            end, trailing = _scan_value(text, start)
+        except JSONExtractError as e:
+            # Nespárovaná závorka v úvodním textu ("{název", "1]") - další kandidát
+            first_error = first_error or e
+            candidate = _VALUE_START.search(text, start + 1)
+            continue
+        try:
+            return _decode(text, start, end, trailing), start, end
+        except JSONExtractError as e:
+            # Spárovaný, ale nevalidní úsek ("[1. krok]") - vnořené závorky se už nezkouší
+            first_error = first_error or e
+            candidate = _VALUE_START.search(text, end)
+    if first_error:
+        raise first_error
+    raise JSONExtractError("text neobsahuje JSON objekt ani pole", text, 0, found=False)
+
+
+def extract_json(text: str, default: Any = _MISSING) -> Any:
+    """
+    První JSON objekt/pole z odpovědi modelu (```json blok, okolní text, trailing čárky).
+
+    Args:
+        text: Odpověď modelu
+        default: Návratová hodnota místo výjimky, pokud JSON chybí nebo je nevalidní
+
+    Raises:
+        JSONExtractError: Bez default, pokud JSON chybí nebo je nevalidní
+    """
+    try:
+        return locate_json(text)[0]
+    except JSONExtractError:
+        if default is _MISSING:
+            raise
+        return default
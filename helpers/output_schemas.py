@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+🧾 STRUCTURED OUTPUT - SCHÉMATA VÝSTUPŮ ASISTENTŮ
+=================================================
+
+Asistenti se strukturovaným výstupem (SEO, QA, Multimedia) deklarují JSON schéma.
+Schéma se předá providerovi jako nativní structured-output režim:
+    Claude  - vynucený tool use s input_schema
+    OpenAI  - response_format json_schema
+    Gemini  - generationConfig.responseMimeType + responseSchema
+
+Výstup se na konci stage jednou naparsuje a zvaliduje a dál pipeline putuje
+jako nativní objekt - publish ani další stage ho už znovu neparsují.
+
+Asistent bez schématu v registru, který má v DB outputType "json"/"dict",
+dostane obecné schéma (JSON objekt bez předepsané struktury).
+
+Konfigurace přes ENV LLM_STRUCTURED_OUTPUT (JSON):
+LLM_STRUCTURED_OUTPUT='{"enabled": true, "native_mode": true}'
+    enabled      - parse-once + validace výstupu podle schématu
+    native_mode  - schéma se posílá providerovi (jinak jen parse/validace textu)
+"""
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from config import load_env_settings
+from helpers.json_extract import JSONExtractError, extract_json
+
+logger = logging.getLogger(__name__)
+
+_STRING = {"type": "string"}
+_STRING_LIST = {"type": "array", "items": _STRING}
+_VISUAL = {
+    "type": "object",
+    "required": ["image_prompt"],
+    "properties": {
+        "image_prompt": _STRING,
+        "alt": _STRING,
+    },
+}
+
+# Schémata výstupů podle function_key asistenta
+OUTPUT_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "seo_assistant": {
+        "type": "object",
+        "required": ["seo_metadata"],
+        "properties": {
+            "seo_metadata": {
+                "type": "object",
+                "required": ["title", "meta_description", "slug"],
+                "properties": {
+                    "title": _STRING,
+                    "meta_description": _STRING,
+                    "slug": _STRING,
+                    "keywords": _STRING_LIST,
+                },
+            },
+            "keywords": _STRING_LIST,
+            "canonical": _STRING,
+            "headings": {
+                "type": "object",
+                "properties": {"h1": _STRING, "h2": _STRING_LIST, "h3": _STRING_LIST},
+            },
+        },
+    },
+    "qa_assistant": {
+        "type": "object",
+        "required": ["faq"],
+        "properties": {
+            "faq": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "required": ["question", "answer"],
+                    "properties": {"question": _STRING, "answer": _STRING},
+                },
+            },
+        },
+    },
+    "multimedia_assistant": {
+        "type": "object",
+        "required": ["primary_visuals"],
+        "properties": {
+            "primary_visuals": {"type": "array", "minItems": 2, "maxItems": 2, "items": _VISUAL},
+            "optional_visuals": {"type": "array", "items": _VISUAL},
+        },
+    },
+}
+
+# Starší formát výstupu jako holé pole - zabalí se pod klíč objektu ze schématu
+LIST_OUTPUT_KEYS = {"qa_assistant": "faq"}
+
+GENERIC_OBJECT_SCHEMA = {"type": "object"}
+JSON_OUTPUT_TYPES = ("json", "dict")
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+@dataclass
+class StructuredOutputSettings:
+    """Nastavení strukturovaných výstupů."""
+    enabled: bool = True
+    native_mode: bool = True
+
+
+def load_structured_output_settings() -> StructuredOutputSettings:
+    """Nastavení z ENV LLM_STRUCTURED_OUTPUT."""
+    return load_env_settings("LLM_STRUCTURED_OUTPUT", StructuredOutputSettings)
+
+
+_settings: Optional[StructuredOutputSettings] = None
+
+
+def get_structured_output_settings() -> StructuredOutputSettings:
+    global _settings
+    if _settings is None:
+        _settings = load_structured_output_settings()
+    return _settings
+
+
+def output_schema_for(function_key: str, output_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Schéma výstupu asistenta - z registru, případně obecné podle outputType z DB. None = volný text."""
+    if not get_structured_output_settings().enabled:
+        return None
+    if function_key in OUTPUT_SCHEMAS:
+        return OUTPUT_SCHEMAS[function_key]
+    if (output_type or "").lower() in JSON_OUTPUT_TYPES:
+        return GENERIC_OBJECT_SCHEMA
+    return None
+
+
+def validate_output(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """Validace podmnožiny JSON schématu (type, required, properties, items, minItems, maxItems)."""
+    expected = schema.get("type")
+    if expected:
+        python_type = _TYPES[expected]
+        # bool je v Pythonu podtyp int - číslo nesmí být true/false
+        if not isinstance(value, python_type) or (expected in ("integer", "number") and isinstance(value, bool)):
+            return [f"{path}: očekáván {expected}, je {type(value).__name__}"]
+    errors = []
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}.{key}: chybí")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate_output(value[key], sub_schema, f"{path}.{key}"))
+    elif isinstance(value, list):
+        if "minItems" in schema and len(value) < schema["minItems"]:
+            errors.append(f"{path}: minimálně {schema['minItems']} položek, má {len(value)}")
+        if "maxItems" in schema and len(value) > schema["maxItems"]:
+            errors.append(f"{path}: maximálně {schema['maxItems']} položek, má {len(value)}")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate_output(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def parse_structured_output(function_key: str, raw_output: Any, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Jednorázové naparsování a validace výstupu stage.
+
+    Args:
+        function_key: Asistent, který výstup vytvořil
+        raw_output: Text odpovědi modelu, nebo už nativní objekt (projde jen validací)
+        schema: Schéma výstupu (default z registru podle function_key)
+
+    Returns:
+        Nativní objekt výstupu
+
+    Raises:
+        ValueError: Výstup není JSON nebo neodpovídá schématu
+    """
+    schema = schema or OUTPUT_SCHEMAS.get(function_key) or GENERIC_OBJECT_SCHEMA
+    if isinstance(raw_output, str):
+        try:
+            data = extract_json(raw_output)
+        except JSONExtractError as e:
+            if function_key != "seo_assistant":
+                raise ValueError(f"❌ {function_key}: výstup není validní JSON - {e}")
+            # Textový formát SEO asistenta (**title:** ...) - jediná podporovaná ne-JSON podoba
+            from helpers.transformers import convert_seo_text_to_json
+            data = convert_seo_text_to_json(raw_output)
+            data["seo_metadata"] = data.pop("metadata")
+    else:
+        data = raw_output
+
+    list_key = LIST_OUTPUT_KEYS.get(function_key)
+    if list_key and isinstance(data, list):
+        data = {list_key: data}
+
+    errors = validate_output(data, schema)
+    if errors:
+        raise ValueError(f"❌ {function_key}: výstup neodpovídá schématu - {'; '.join(errors[:5])}")
+    return data
+
+
+def output_as_text(output: Any) -> str:
+    """Výstup stage jako text pro prompt další stage (nativní objekty jako JSON)."""
+    if isinstance(output, str):
+        return output
+    return json.dumps(output, ensure_ascii=False, indent=2)
+
+
+def visual_prompts(multimedia_output: Dict[str, Any]) -> List[str]:
+    """Image prompty z výstupu MultimediaAssistant (primary_visuals + optional_visuals)."""
+    prompts = [str(prompt) for prompt in multimedia_output.get("image_prompts", [])]
+    for key in ("primary_visuals", "optional_visuals"):
+        for visual in multimedia_output.get(key) or []:
+            if isinstance(visual, dict) and visual.get("image_prompt"):
+                prompts.append(str(visual["image_prompt"]))
+    return [prompt.strip() for prompt in prompts if prompt.strip()]
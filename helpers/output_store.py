@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+🗄️ CONTENT-ADDRESSED ÚLOŽIŠTĚ VÝSTUPŮ PIPELINE
+==============================================
+
+Náhrada plochého outputs/seo_output_<timestamp>_<workflow>.json:
+- bloby podle obsahu (sha256 kanonického JSON), gzip, shardované adresáře
+      outputs/store/blobs/ab/cd/<sha256>.json.gz
+- výstup každé stage (a final_output/publish_output) je samostatný blob -
+  stejný výstup v retry, resume nebo jako final_output se uloží jednou
+- dokument runu (stage_logs s odkazy {"$blob": hash}) je také blob
+- manifest (SQLite) mapuje workflow_id/run_id -> blob runu a všechny jeho bloby
+- zápis v threadu mimo event loop, přes dočasný soubor + os.replace
+- retence (stáří, počet runů) a kompakce (smazání blobů bez odkazu z manifestu) -
+  na pozadí mimo ukládání runu, nebo ručně / cronem přes `scripts/outputs_store.py gc`
+
+Konfigurace přes ENV OUTPUT_STORE (JSON):
+OUTPUT_STORE='{"dir": "outputs/store", "compress_level": 6, "retention_days": 90, "max_runs": 0, "maintenance_every": 100}'
+    retention_days     - runy starší než N dní se z manifestu odstraní (0 = bez limitu)
+    max_runs           - v manifestu zůstane jen N nejnovějších runů (0 = bez limitu)
+    maintenance_every  - po kolika uložených runech se na pozadí spustí retence + kompakce (0 = jen ručně)
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config import load_env_settings
+from helpers.atomic_write import write_atomic
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOB_REF = "$blob"
+# Velké top-level výstupy runu, které se ukládají jako samostatné bloby (vedle stage_logs[].output)
+BLOB_FIELDS = ("final_output", "publish_output")
+# Nepoužitý blob mladší než tohle může patřit právě ukládanému runu - kompakce ho nechá
+COMPACTION_GRACE_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key TEXT PRIMARY KEY,
+    workflow_id TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    saved_at TEXT NOT NULL,
+    root_blob TEXT NOT NULL,
+    blobs TEXT NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    stored_bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_workflow ON runs (workflow_id, saved_at);
+CREATE INDEX IF NOT EXISTS runs_saved_at ON runs (saved_at);
+"""
+
+
+@dataclass
+class OutputStoreSettings:
+    """Nastavení úložiště výstupů."""
+    dir: str = os.path.join(PROJECT_ROOT, "outputs", "store")
+    compress_level: int = 6
+    retention_days: int = 0  # 0 = bez limitu
+    max_runs: int = 0  # 0 = bez limitu
+    maintenance_every: int = 100  # 0 = retence a kompakce jen ručně
+
+
+def _validate_settings(settings: OutputStoreSettings) -> None:
+    if not 0 <= settings.compress_level <= 9:
+        raise ValueError("compress_level musí být 0-9")
+    if settings.retention_days < 0 or settings.max_runs < 0 or settings.maintenance_every < 0:
+        raise ValueError("retention_days, max_runs a maintenance_every nesmí být záporné")
+
+
+def load_output_store_settings() -> OutputStoreSettings:
+    """Nastavení z ENV OUTPUT_STORE."""
+    return load_env_settings("OUTPUT_STORE", OutputStoreSettings, _validate_settings)
+
+
+@dataclass
+class StoredRun:
+    """Záznam runu v manifestu."""
+    workflow_id: str
+    run_id: str
+    topic: str
+    saved_at: str
+    root_blob: str
+    path: str
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+    new_blobs: int = 0
+
+
+def _canonical(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class OutputStore:
+    """Content-addressed úložiště výstupů runů s manifestem v SQLite."""
+
+    def __init__(self, settings: Optional[OutputStoreSettings] = None):
+        self.settings = settings or load_output_store_settings()
+        self.root = self.settings.dir
+        self.blob_dir = os.path.join(self.root, "blobs")
+        self.manifest_path = os.path.join(self.root, "manifest.sqlite3")
+        self._initialized = False
+        self._saves = 0
+        self._maintaining = False
+        self._lock = threading.Lock()
+
+    # ===== BLOBY =====
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest[:2], digest[2:4], f"{digest}.json.gz")
+
+    def put_blob(self, value: Any) -> Tuple[str, bool, int, int]:
+        """
+        Uloží hodnotu jako blob (pokud už neexistuje).
+
+        Returns:
+            (sha256, nový blob, velikost JSON, velikost na disku)
+        """
+        data = _canonical(value)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if os.path.exists(path):
+            # Čerstvé mtime chrání blob před kompakcí, než se zapíše manifest runu
+            os.utime(path)
+            return digest, False, len(data), os.path.getsize(path)
+
+        compressed = gzip.compress(data, compresslevel=self.settings.compress_level, mtime=0)
+        write_atomic(path, compressed)
+        return digest, True, len(data), len(compressed)
+
+    def get_blob(self, digest: str) -> Any:
+        with open(self.blob_path(digest), "rb") as f:
+            return json.loads(gzip.decompress(f.read()))
+
+    # ===== RUNY =====
+
+    def write_run(self, result: Dict[str, Any], saved_at: Optional[str] = None) -> StoredRun:
+        """Uloží výsledek runu - výstupy stage jako bloby, dokument runu a řádek manifestu."""
+        saved_at = saved_at or datetime.now().isoformat()
+        blobs: Set[str] = set()
+        totals = {"raw": 0, "stored": 0, "new": 0}
+
+        def put(value: Any) -> Dict[str, str]:
+            digest, new, raw_bytes, stored_bytes = self.put_blob(value)
+            blobs.add(digest)
+            totals["new"] += int(new)
+            if new:
+                totals["stored"] += stored_bytes
+            totals["raw"] += raw_bytes
+            return {BLOB_REF: digest}
+
+        document = dict(result)
+        for key in BLOB_FIELDS:
+            if document.get(key):
+                document[key] = put(document[key])
+        document["stage_logs"] = [
+            {**log, "output": put(log["output"])} if isinstance(log, dict) and log.get("output") else log
+            for log in result.get("stage_logs") or []
+        ]
+        root_blob = put(document)[BLOB_REF]
+
+        stored = StoredRun(
+            workflow_id=str(result.get("workflow_id") or "unknown"),
+            run_id=str(result.get("run_id") or saved_at),
+            topic=str(result.get("topic") or ""),
+            saved_at=saved_at,
+            root_blob=root_blob,
+            path=self.blob_path(root_blob),
+            raw_bytes=totals["raw"],
+            stored_bytes=totals["stored"],
+            new_blobs=totals["new"]
+        )
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (run_key, workflow_id, run_id, topic, saved_at, root_blob, blobs, raw_bytes, stored_bytes) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (f"{stored.workflow_id}/{stored.run_id}", stored.workflow_id, stored.run_id, stored.topic, saved_at,
+                 root_blob, json.dumps(sorted(blobs)), stored.raw_bytes, stored.stored_bytes)
+            )
+        return stored
+
+    async def save_run(self, result: Dict[str, Any]) -> StoredRun:
+        """
+        write_run mimo event loop. Každých maintenance_every uložení se spustí retence a kompakce
+        ve vlákně na pozadí - ukládající aktivita na průchod celým úložištěm nečeká.
+        """
+        stored = await asyncio.to_thread(self.write_run, result)
+        with self._lock:
+            self._saves += 1
+            due = bool(self.settings.maintenance_every) and self._saves % self.settings.maintenance_every == 0 and not self._maintaining
+            if due:
+                self._maintaining = True
+        if due:
+            threading.Thread(target=self._maintain_in_background, name="output-store-maintenance", daemon=True).start()
+        return stored
+
+    def _maintain_in_background(self) -> None:
+        try:
+            self.maintain()
+        except Exception as e:
+            logger.warning(f"⚠️ Údržba output store selhala: {e}")
+        finally:
+            with self._lock:
+                self._maintaining = False
+
+    def find_run(self, workflow_id: str, run_id: Optional[str] = None) -> Optional[StoredRun]:
+        """Záznam runu z manifestu; bez run_id nejnovější run workflow."""
+        runs = self.list_runs(workflow_id=workflow_id, run_id=run_id, limit=1)
+        return runs[0] if runs else None
+
+    def load_run(self, workflow_id: str, run_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Složí uložený výsledek runu zpět do původní podoby."""
+        stored = self.find_run(workflow_id, run_id)
+        if stored is None:
+            return None
+        document = self.get_blob(stored.root_blob)
+        for key in BLOB_FIELDS:
+            if isinstance(document.get(key), dict) and BLOB_REF in document[key]:
+                document[key] = self.get_blob(document[key][BLOB_REF])
+        for log in document.get("stage_logs") or []:
+            if isinstance(log, dict) and isinstance(log.get("output"), dict) and BLOB_REF in log["output"]:
+                log["output"] = self.get_blob(log["output"][BLOB_REF])
+        return document
+
+    def list_runs(self, workflow_id: Optional[str] = None, run_id: Optional[str] = None, limit: int = 100) -> List[StoredRun]:
+        """Runy z manifestu, nejnovější první."""
+        conditions, params = [], []
+        if workflow_id is not None:
+            conditions.append("workflow_id = ?")
+            params.append(workflow_id)
+        if run_id is not None:
+            conditions.append("run_id = ?")
+            params.append(run_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT workflow_id, run_id, topic, saved_at, root_blob, raw_bytes, stored_bytes FROM runs {where} "
+                f"ORDER BY saved_at DESC LIMIT ?",
+                (*params, limit)
+            ).fetchall()
+        return [StoredRun(path=self.blob_path(row["root_blob"]), **dict(row)) for row in rows]
+
+    # ===== RETENCE A KOMPAKCE =====
+
+    def apply_retention(self, now: Optional[datetime] = None) -> int:
+        """Odstraní z manifestu runy mimo retention_days / max_runs; vrací počet odstraněných."""
+        removed = 0
+        with closing(self._connect()) as conn:
+            if self.settings.retention_days:
+                cutoff = ((now or datetime.now()) - timedelta(days=self.settings.retention_days)).isoformat()
+                removed += conn.execute("DELETE FROM runs WHERE saved_at < ?", (cutoff,)).rowcount
+            if self.settings.max_runs:
+                removed += conn.execute(
+                    "DELETE FROM runs WHERE run_key NOT IN (SELECT run_key FROM runs ORDER BY saved_at DESC LIMIT ?)",
+                    (self.settings.max_runs,)
+                ).rowcount
+        return removed
+
+    def compact(self, grace_seconds: int = COMPACTION_GRACE_SECONDS) -> Dict[str, int]:
+        """Smaže bloby, na které neodkazuje žádný run v manifestu (a zbytky dočasných souborů)."""
+        with closing(self._connect()) as conn:
+            referenced = set()
+            for (blobs,) in conn.execute("SELECT blobs FROM runs"):
+                referenced.update(json.loads(blobs))
+
+        stats = {"removed_blobs": 0, "freed_bytes": 0, "kept_blobs": 0}
+        cutoff = time.time() - grace_seconds
+        for dirpath, _, filenames in os.walk(self.blob_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                digest = filename.split(".", 1)[0]
+                if filename.endswith(".json.gz") and digest in referenced:
+                    stats["kept_blobs"] += 1
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                stats["removed_blobs"] += 1
+                stats["freed_bytes"] += stat.st_size
+        return stats
+
+    def maintain(self) -> Dict[str, int]:
+        """Retence + kompakce."""
+        removed_runs = self.apply_retention()
+        stats = {"removed_runs": removed_runs, **self.compact()}
+        logger.info(f"🧹 Output store: {removed_runs} runů mimo retenci, {stats['removed_blobs']} blobů smazáno "
+                    f"({stats['freed_bytes']} B), {stats['kept_blobs']} blobů zůstává")
+        return stats
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(self.root, exist_ok=True)
+        conn = sqlite3.connect(self.manifest_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+
+_store: Optional[OutputStore] = None
+
+
+def get_output_store() -> OutputStore:
+    global _store
+    if _store is None:
+        _store = OutputStore()
+    return _store
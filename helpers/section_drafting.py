@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+✂️ SEKČNÍ PARALELNÍ DRAFTING
+============================
+
+Volitelný fan-out režim pro dlouhé textové stage (draft_assistant, humanizer_assistant).
+Místo jednoho LLM volání na celý článek se každá H2 sekce generuje v samostatném
+paralelním sub-volání se sdíleným kontextem a výsledky se složí zpět v pořadí osnovy.
+Latence stage pak odpovídá nejpomalejší sekci, ne součtu všech sekcí.
+
+Zdroje osnovy:
+    - draft_assistant: SEO výstup (headings.h2), jinak "Doporučená struktura článku (outline)" z Briefu
+    - humanizer_assistant: H2 nadpisy vstupního draftu (každá sekce se humanizuje zvlášť)
+
+Bez použitelné osnovy (méně než min_sections sekcí) se vrací None a stage běží postaru.
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from helpers.json_extract import extract_json
+
+logger = logging.getLogger(__name__)
+
+SECTION_PARALLEL_STAGES = ("draft_assistant", "humanizer_assistant")
+
+_OUTLINE_HEADING = re.compile(r"^\s*#{1,6}\s*(.*(outline|osnov|struktur).*)$", re.IGNORECASE)
+_MD_HEADING = re.compile(r"^\s*(#{1,6})\s+")
+_LIST_ITEM = re.compile(r"^(\s*)(?:[-*+]|\d+[.)])\s+(.*)$")
+_LEVEL_PREFIX = re.compile(r"^(H[1-6])\s*[:\-–]\s*", re.IGNORECASE)
+_FENCE = re.compile(r"^```[\w-]*\s*\n(.*?)\n```\s*$", re.DOTALL)
+
+
+@dataclass
+class Section:
+    """Jedna H2 sekce článku."""
+    title: str
+    subheadings: List[str] = field(default_factory=list)  # H3 z osnovy (jen pro draft)
+    source: Optional[str] = None  # původní text sekce (jen pro humanizer)
+
+
+@dataclass
+class SectionPlan:
+    """Plán fan-outu jedné stage."""
+    function_key: str
+    sections: List[Section]
+    h1: Optional[str] = None
+    preamble: Optional[str] = None  # text před první H2 (H1 + úvod) - humanizer ho zpracuje jako první část
+
+
+def _clean(text: str) -> str:
+    """Odstraní markdown zvýraznění a prefix úrovně (H2:) z položky osnovy."""
+    text = text.strip().replace("**", "").replace("__", "").strip()
+    return _LEVEL_PREFIX.sub("", text).strip().strip("*").strip()
+
+
+def _parse_json(value: Any) -> Optional[Any]:
+    """Nativní objekt nebo JSON string (i v ```json bloku)."""
+    if isinstance(value, (dict, list)):
+        return value
+    if not isinstance(value, str):
+        return None
+    return extract_json(value, default=None)
+
+
+def outline_from_seo(seo_output: Any) -> Optional[SectionPlan]:
+    """Osnova z výstupu SEOAssistant ({"headings": {"h1": ..., "h2": [...]}})."""
+    data = _parse_json(seo_output)
+    headings = data.get("headings") if isinstance(data, dict) else None
+    if not isinstance(headings, dict) or not isinstance(headings.get("h2"), list):
+        return None
+    sections = [Section(title=_clean(str(title))) for title in headings["h2"] if str(title).strip()]
+    h1 = headings.get("h1")
+    return SectionPlan("draft_assistant", sections, h1=_clean(h1) if isinstance(h1, str) else None)
+
+
+def outline_from_brief(brief_output: Any) -> Optional[SectionPlan]:
+    """
+    Osnova z Briefu - blok pod nadpisem obsahujícím "outline" / "osnova" / "struktura".
+    Položky na nejvyšší úrovni seznamu (nebo s prefixem H2:) jsou sekce, vnořené položky H3.
+    """
+    if not isinstance(brief_output, str):
+        return None
+    lines = brief_output.splitlines()
+    start = None
+    outline_level = 0
+    for i, line in enumerate(lines):
+        if _OUTLINE_HEADING.match(line):
+            start = i + 1
+            outline_level = len(_MD_HEADING.match(line).group(1))
+            break
+    if start is None:
+        return None
+
+    h1 = None
+    sections: List[Section] = []
+    top_indent = None
+    for line in lines[start:]:
+        heading = _MD_HEADING.match(line)
+        if heading and len(heading.group(1)) <= outline_level:
+            break  # konec bloku osnovy
+        if not line.strip():
+            continue
+        stripped = _clean(line.lstrip("#").strip()) if heading else None
+        raw = line.strip().replace("**", "").replace("__", "")
+        if raw.upper().startswith("H1"):
+            h1 = _clean(raw)
+            continue
+        item = _LIST_ITEM.match(line)
+        if item:
+            indent = len(item.group(1).expandtabs(4))
+            text = item.group(2).replace("**", "").strip()
+            explicit = _LEVEL_PREFIX.match(text)
+            level = explicit.group(1).upper() if explicit else None
+            if top_indent is None:
+                top_indent = indent
+            if level == "H2" or (level is None and indent <= top_indent):
+                sections.append(Section(title=_clean(text)))
+            elif sections:
+                sections[-1].subheadings.append(_clean(text))
+        elif heading and stripped:
+            # Osnova zapsaná nadpisy místo seznamu
+            if len(heading.group(1)) == outline_level + 1 or raw.upper().startswith("H2"):
+                sections.append(Section(title=stripped))
+            elif sections:
+                sections[-1].subheadings.append(stripped)
+    sections = [s for s in sections if s.title]
+    return SectionPlan("draft_assistant", sections, h1=h1) if sections else None
+
+
+def split_markdown_sections(text: str) -> SectionPlan:
+    """Rozdělí markdown článek podle H2 nadpisů (mimo code bloky)."""
+    preamble_lines: List[str] = []
+    sections: List[Section] = []
+    current: Optional[List[str]] = None
+    in_code = False
+    h1 = None
+    for line in text.splitlines():
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        if not in_code and line.startswith("## "):
+            current = [line]
+            sections.append(Section(title=line[3:].strip(), source=""))
+        elif current is not None:
+            current.append(line)
+        else:
+            preamble_lines.append(line)
+            if h1 is None and line.startswith("# "):
+                h1 = line[2:].strip()
+        if current is not None and sections:
+            sections[-1].source = "\n".join(current).strip()
+    preamble = "\n".join(preamble_lines).strip() or None
+    return SectionPlan("humanizer_assistant", sections, h1=h1, preamble=preamble)
+
+
+def plan_sections(
+    function_key: str,
+    topic: Any,
+    previous_outputs: Optional[Dict[str, Any]],
+    min_sections: int = 3
+) -> Optional[SectionPlan]:
+    """Sestaví plán fan-outu pro stage. None = stage poběží jedním voláním."""
+    previous_outputs = previous_outputs or {}
+    plan = None
+    if function_key == "draft_assistant":
+        plan = outline_from_seo(previous_outputs.get("seo_assistant_output")) \
+            or outline_from_brief(previous_outputs.get("brief_assistant_output"))
+    elif function_key == "humanizer_assistant" and isinstance(topic, str):
+        plan = split_markdown_sections(topic)
+
+    if not plan or len(plan.sections) < min_sections:
+        return None
+    return plan
+
+
+def _outline_text(plan: SectionPlan) -> str:
+    lines = [f"# {plan.h1}"] if plan.h1 else []
+    for i, section in enumerate(plan.sections, 1):
+        lines.append(f"{i}. ## {section.title}")
+        lines.extend(f"   - ### {sub}" for sub in section.subheadings)
+    return "\n".join(lines)
+
+
+def build_part_messages(plan: SectionPlan, user_message: str, current_date: Optional[str] = None) -> List[str]:
+    """User message pro každé sub-volání v pořadí výsledného článku."""
+    outline = _outline_text(plan)
+    messages = []
+    if plan.function_key == "draft_assistant":
+        for i, section in enumerate(plan.sections):
+            intro = (f"Začni H1 nadpisem článku `# {plan.h1 or '...'}` a krátkým úvodem, pak pokračuj sekcí. "
+                     if i == 0 else "Nepiš H1 ani úvod článku. ")
+            subs = f" Podnadpisy H3: {', '.join(section.subheadings)}." if section.subheadings else ""
+            messages.append(
+                f"{user_message}\n\n---\n✂️ SEKČNÍ REŽIM - článek se píše paralelně po sekcích.\n"
+                f"Osnova celého článku:\n{outline}\n\n"
+                f"Napiš POUZE sekci {i + 1}/{len(plan.sections)}: `## {section.title}`.{subs} "
+                f"{intro}Začni nadpisem `## {section.title}` (u první sekce po úvodu), nepiš ostatní sekce ani závěr celého článku."
+            )
+    else:
+        date_line = f"📅 Aktuální datum: {current_date}\n\n" if current_date else ""
+        parts = ([plan.preamble] if plan.preamble else []) + [s.source for s in plan.sections]
+        for i, part in enumerate(parts):
+            messages.append(
+                f"{date_line}✂️ SEKČNÍ REŽIM - článek se zpracovává paralelně po částech.\n"
+                f"Osnova celého článku:\n{outline}\n\n"
+                f"Zpracuj POUZE následující část {i + 1}/{len(parts)}. Zachovej její nadpis, strukturu a formátování, "
+                f"nepřidávej úvod ani závěr celého článku:\n\n{part}"
+            )
+    return messages
+
+
+def _normalize_part(content: str, expected_heading: Optional[str]) -> str:
+    """Odstraní obalový code blok a doplní chybějící H2 nadpis sekce."""
+    text = content.strip()
+    fenced = _FENCE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    if expected_heading and not re.search(rf"^##\s+{re.escape(expected_heading)}\s*$", text, re.MULTILINE):
+        if not text.startswith("# ") and not re.match(r"^##\s", text):
+            text = f"## {expected_heading}\n\n{text}"
+    return text
+
+
+def stitch_parts(plan: SectionPlan, contents: List[str]) -> str:
+    """Složí výstupy sub-volání zpět do jednoho článku v pořadí osnovy."""
+    headings: List[Optional[str]] = [s.title for s in plan.sections]
+    if plan.function_key == "humanizer_assistant" and plan.preamble:
+        headings = [None] + headings
+    if len(contents) != len(headings):
+        raise ValueError(f"❌ Počet částí ({len(contents)}) neodpovídá plánu ({len(headings)})")
+    return "\n\n".join(_normalize_part(content, heading) for content, heading in zip(contents, headings))
+
+
+async def run_section_parallel(
+    plan: SectionPlan,
+    user_message: str,
+    call_part: Callable[[str], Awaitable[Dict[str, Any]]],
+    concurrency: int = 4,
+    current_date: Optional[str] = None,
+    on_progress: Optional[Callable[[str], Any]] = None
+) -> Dict[str, Any]:
+    """
+    Spustí sub-volání paralelně (max concurrency najednou) a složí výsledek.
+
+    Args:
+        call_part: async funkce (user_message) -> LLM response dict s "content" a "usage"
+        on_progress: dostává složený souvislý prefix hotových částí (pipelined handoff)
+
+    Returns:
+        LLM response dict se složeným "content", sečteným "usage" a "sections"
+    """
+    messages = build_part_messages(plan, user_message, current_date)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    headings: List[Optional[str]] = [s.title for s in plan.sections]
+    if len(messages) > len(headings):
+        headings = [None] + headings
+    done: Dict[int, str] = {}
+    published = 0
+
+    async def run(i: int, message: str) -> Dict[str, Any]:
+        nonlocal published
+        async with semaphore:
+            logger.info(f"✂️ {plan.function_key}: část {i + 1}/{len(messages)} spuštěna")
+            result = await call_part(message)
+        if on_progress:
+            done[i] = _normalize_part(result.get("content", ""), headings[i])
+            # Publikujeme jen souvislý prefix od začátku článku
+            if published in done:
+                while published in done:
+                    published += 1
+                on_progress("\n\n".join(done[j] for j in range(published)))
+        return result
+
+    # Selhání kterékoli části = selhání stage (žádné fallbacky na polovičatý článek) -
+    # ostatní části se hned zruší, ať zbytečně nepálí tokeny
+    tasks = [asyncio.ensure_future(run(i, m)) for i, m in enumerate(messages)]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        failed = next((task for task in tasks if task.done() and task.exception()), None)
+        if failed:
+            raise failed.exception()
+        results = [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    # Součet všech číselných položek usage (vč. cached_tokens pro metriky prompt cache)
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    for result in results:
+        for key, value in (result.get("usage") or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                usage[key] = usage.get(key, 0) + value
+
+    first = results[0]
+    return {
+        "content": stitch_parts(plan, [r.get("content", "") for r in results]),
+        "model": first.get("model"),
+        "provider": first.get("provider"),
+        "usage": usage,
+        "metadata": {"sections": len(results)},
+        "hedge": next((r["hedge"] for r in results if r.get("hedge")), None),
+        "fallback": next((r["fallback"] for r in results if r.get("fallback")), None),
+    }
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+🔀 PIPELINED HANDOFF MEZI STAGE
+===============================
+
+Stage N+1 může začít dřív, než stage N doběhne - upstream průběžně publikuje
+streamovaný text (nebo souvislý prefix hotových sekcí) a downstream čeká jen
+na prefix, který skutečně potřebuje.
+
+Požadovaný prefix je deterministická funkce výsledného výstupu upstream stage:
+    {"sections": K}  - preambule (H1 + úvod) a prvních K H2 sekcí
+    {"chars": N}     - prvních N znaků, zkrácených na poslední hranici odstavce
+
+Workflow stejný prefix spočítá z hotového výstupu upstream (handoff_prefix) a ověří
+ho proti input_sha, které vrátí downstream aktivita - pipeline_data jsou tak stejná
+jako při sekvenčním běhu se stejnou konfigurací.
+
+Struktura na disku (sdílený adresář pro všechny workery, ENV HANDOFF_DIR):
+    outputs/handoff/<workflow_id>/<run_id>/<function_key>.json
+Adresář runu smaže save_output_to_json po dokončení pipeline (remove_handoffs),
+zbytky selhaných runů uklízí `scripts/outputs_store.py gc` (prune_handoffs).
+
+Modul používá pouze standardní knihovnu - handoff_prefix a handoff_input_sha
+se volají přímo ve workflow a musí zůstat deterministické.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from typing import Any, Callable, Dict, Optional
+
+from helpers.atomic_write import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HANDOFF_DIR = os.path.join(PROJECT_ROOT, "outputs", "handoff")
+
+HANDOFF_SPEC_KEYS = ("sections", "chars")
+# Handoffy runu bez zápisu déle než tohle patří selhanému runu (delší než batch stage)
+DEFAULT_PRUNE_AGE = 48 * 3600
+# Upstream musí doběhnout (complete/failed) do svého timeoutu - déle nemá smysl čekat
+DEFAULT_HANDOFF_TIMEOUT = 600
+
+_H2 = re.compile(r"^## ", re.MULTILINE)
+
+
+def get_handoff_dir() -> str:
+    """Vrátí kořenový adresář handoffů (ENV HANDOFF_DIR nebo outputs/handoff)."""
+    return os.getenv("HANDOFF_DIR") or DEFAULT_HANDOFF_DIR
+
+
+def validate_handoff_spec(function_key: str, spec: Any) -> Dict[str, int]:
+    """Ověří specifikaci požadovaného prefixu - právě jeden klíč z HANDOFF_SPEC_KEYS s kladnou hodnotou."""
+    if not isinstance(spec, dict) or len(spec) != 1:
+        raise ValueError(f"❌ Handoff pro {function_key} musí mít právě jeden klíč z {HANDOFF_SPEC_KEYS}: {spec}")
+    key, value = next(iter(spec.items()))
+    if key not in HANDOFF_SPEC_KEYS:
+        raise ValueError(f"❌ Neznámý handoff klíč '{key}' pro {function_key} (povolené: {HANDOFF_SPEC_KEYS})")
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"❌ Handoff '{key}' pro {function_key} musí být kladné celé číslo: {value}")
+    return {key: value}
+
+
+def _h2_offsets(text: str):
+    """Pozice H2 nadpisů mimo code bloky."""
+    offsets = []
+    in_code = False
+    position = 0
+    for line in text.splitlines(keepends=True):
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        elif not in_code and _H2.match(line):
+            offsets.append(position)
+        position += len(line)
+    return offsets
+
+
+def handoff_prefix(text: str, spec: Dict[str, int], complete: bool = True) -> Optional[str]:
+    """
+    Prefix výstupu upstream stage, na který downstream čeká.
+
+    Args:
+        text: Dosavadní (complete=False) nebo výsledný (complete=True) výstup upstream
+        spec: {"sections": K} nebo {"chars": N}
+        complete: Upstream doběhl - kratší výstup se použije celý
+
+    Returns:
+        Prefix, nebo None pokud ještě není k dispozici
+    """
+    text = text.lstrip()
+    if "sections" in spec:
+        offsets = _h2_offsets(text)
+        # K-tá sekce je hotová až ve chvíli, kdy začne (K+1)-ní nadpis
+        if len(offsets) > spec["sections"]:
+            return text[:offsets[spec["sections"]]].strip()
+    else:
+        limit = spec["chars"]
+        if len(text) >= limit:
+            prefix = text[:limit]
+            boundary = prefix.rfind("\n\n")
+            return (prefix[:boundary] if boundary > 0 else prefix).strip()
+    return text.strip() if complete else None
+
+
+def handoff_input_sha(text: str) -> str:
+    """Otisk vstupu downstream stage pro kontrolu ve workflow."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _handoff_path(workflow_id: str, run_id: str, function_key: str, base_dir: Optional[str] = None) -> str:
+    safe = [re.sub(r"[^\w.-]", "_", str(value)) for value in (workflow_id, run_id, function_key)]
+    if not all(safe):
+        raise ValueError("❌ Identifikátor handoffu nesmí být prázdný")
+    return os.path.join(base_dir or get_handoff_dir(), safe[0], safe[1], f"{safe[2]}.json")
+
+
+def remove_handoffs(workflow_id: str, run_id: str, base_dir: Optional[str] = None) -> bool:
+    """Smaže handoffy dokončeného runu; vrací True, pokud nějaké existovaly."""
+    run_dir = os.path.dirname(_handoff_path(workflow_id, run_id, "_", base_dir))
+    if not os.path.isdir(run_dir):
+        return False
+    shutil.rmtree(run_dir, ignore_errors=True)
+    try:
+        os.rmdir(os.path.dirname(run_dir))  # prázdný adresář workflow
+    except OSError:
+        pass
+    return True
+
+
+def prune_handoffs(max_age: float = DEFAULT_PRUNE_AGE, base_dir: Optional[str] = None) -> int:
+    """Smaže handoffy runů, do kterých nikdo nezapsal déle než max_age sekund; vrací počet runů."""
+    root = base_dir or get_handoff_dir()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for workflow_dir in os.scandir(root):
+        if not workflow_dir.is_dir():
+            continue
+        for run_dir in os.scandir(workflow_dir.path):
+            if not run_dir.is_dir():
+                continue
+            mtimes = [entry.stat().st_mtime for entry in os.scandir(run_dir.path)] or [run_dir.stat().st_mtime]
+            if max(mtimes) < cutoff:
+                shutil.rmtree(run_dir.path, ignore_errors=True)
+                removed += 1
+        try:
+            os.rmdir(workflow_dir.path)
+        except OSError:
+            pass
+    return removed
+
+
+def read_handoff(workflow_id: str, run_id: str, function_key: str, base_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Načte aktuální stav handoffu, None pokud upstream zatím nic nepublikoval."""
+    path = _handoff_path(workflow_id, run_id, function_key, base_dir)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class HandoffPublisher:
+    """
+    Průběžně publikuje výstup upstream stage.
+
+    append() přidává streamovaný text (zápis nejvýš jednou za min_interval),
+    publish() nahradí celý dosavadní text (souvislý prefix hotových sekcí),
+    reset() zahodí text rozpracovaného pokusu před retry.
+    """
+
+    def __init__(self, workflow_id: str, run_id: str, function_key: str,
+                 base_dir: Optional[str] = None, min_interval: float = 0.5):
+        self.path = _handoff_path(workflow_id, run_id, function_key, base_dir)
+        self.min_interval = min_interval
+        self.parts = []
+        self._last_write = 0.0
+
+    def _write(self, text: str, complete: bool = False, error: Optional[str] = None) -> None:
+        record = {"text": text, "complete": complete, "failed": error is not None, "error": error, "updated_at": time.time()}
+        # Atomický zápis, aby čtení nikdy nevidělo rozepsaný stav
+        write_json_atomic(self.path, record)
+        self._last_write = time.monotonic()
+
+    def reset(self) -> None:
+        if self.parts:
+            self.parts = []
+            self._write("")
+
+    def append(self, text: str) -> None:
+        self.parts.append(text)
+        if time.monotonic() - self._last_write >= self.min_interval:
+            self._write("".join(self.parts))
+
+    def publish(self, text: str) -> None:
+        self.parts = [text]
+        self._write(text)
+
+    def complete(self, text: str) -> None:
+        self.parts = [text]
+        self._write(text, complete=True)
+
+    def fail(self, error: str) -> None:
+        self._write("".join(self.parts), error=error or "upstream selhal")
+
+
+async def wait_for_handoff(
+    workflow_id: str,
+    run_id: str,
+    function_key: str,
+    spec: Dict[str, int],
+    on_wait: Optional[Callable[[], Any]] = None,
+    poll_interval: float = 0.5,
+    base_dir: Optional[str] = None,
+    timeout: float = DEFAULT_HANDOFF_TIMEOUT
+) -> str:
+    """
+    Počká, až upstream publikuje požadovaný prefix, a vrátí ho.
+    on_wait se volá při každém čekání (heartbeat aktivity). Selhání upstream nebo
+    vypršení timeoutu (upstream zabitý bez zápisu, worker bez sdíleného HANDOFF_DIR) = výjimka.
+    """
+    started = time.monotonic()
+    while True:
+        state = read_handoff(workflow_id, run_id, function_key, base_dir)
+        if state:
+            if state.get("failed"):
+                raise Exception(f"❌ Upstream stage {function_key} selhala: {state.get('error')}")
+            prefix = handoff_prefix(state.get("text") or "", spec, complete=bool(state.get("complete")))
+            if prefix is not None:
+                logger.info(f"🔀 Handoff z {function_key}: {len(prefix)} znaků po {time.monotonic() - started:.1f}s "
+                            f"(upstream {'hotový' if state.get('complete') else 'stále běží'})")
+                return prefix
+        if time.monotonic() - started >= timeout:
+            raise Exception(f"❌ Handoff z {function_key} nedorazil do {timeout:.0f}s "
+                            f"({'upstream nic nepublikoval' if state is None else 'prefix není k dispozici'})")
+        if on_wait:
+            on_wait()
+        await asyncio.sleep(poll_interval)
@@ -11,39 +11,37 @@ import re
 import logging
 
 logger = logging.getLogger(__name__)
+from dataclasses import asdict
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Literal
 from urllib.parse import urljoin
 
+from helpers.html_rewriter import rewrite_headings
+from helpers.json_extract import JSONExtractError, extract_json, locate_json
+
 
 # ===== PARSING FUNCTIONS =====
 
-def parse_seo_metadata(seo_output: str) -> Dict[str, Any]:
+def parse_seo_metadata(seo_output: Any) -> Dict[str, Any]:
     """
     Parsuje SEO metadata z SEO asistenta - STRICT MODE s TEXT→JSON konverzí
     
     Args:
-        seo_output: Raw výstup z SEO asistenta (JSON nebo TEXT)
+        seo_output: Nativní objekt (structured output, už zvalidovaný) nebo raw výstup (JSON nebo TEXT)
         
     Returns:
         Strukturovaná SEO metadata
     """
     try:
         # 🔧 EXTRAKCE JSON z různých formátů
-        cleaned_output = seo_output.strip()
-        
-        # Varianta 1: Čistý JSON
-        if cleaned_output.startswith('{'):
-            data = json.loads(cleaned_output)
-        # Varianta 2: Markdown wrapped JSON (```json ... ```)
-        elif '```json' in cleaned_output:
-            json_start = cleaned_output.find('```json') + 7
-            json_end = cleaned_output.find('```', json_start)
-            if json_end > json_start:
-                json_content = cleaned_output[json_start:json_end].strip()
-                data = json.loads(json_content)
-            else:
-                raise ValueError("❌ Nevalidní markdown JSON blok")
+        cleaned_output = seo_output.strip() if isinstance(seo_output, str) else ""
+        
+        # Varianta 0: Nativní objekt ze structured output - bez parsování
+        if isinstance(seo_output, dict):
+            data = seo_output
+        # Varianta 1+2: Čistý JSON nebo markdown wrapped JSON (```json ... ```)
+        elif cleaned_output.startswith('{') or '```json' in cleaned_output:
+            data = extract_json(cleaned_output)
         else:
             # Konverze TEXT → JSON
             data = convert_seo_text_to_json(cleaned_output)
@@ -107,7 +105,7 @@ def parse_seo_metadata(seo_output: str) -> Dict[str, Any]:
             "headings": data.get("headings", {}),
             "content_structure": data.get("content_structure", [])
         }
-    except json.JSONDecodeError as e:
+    except JSONExtractError as e:
         raise ValueError(f"❌ SEO asistent vygeneroval nevalidní JSON: {str(e)}")
     except Exception as e:
         raise ValueError(f"❌ Parsování SEO výstupu selhalo: {str(e)}")
@@ -242,29 +240,21 @@ def extract_json_from_markdown(text: str) -> str:
     Returns:
         Čistý JSON string
     """
-    import re
-    
-    # Hledej ```json ... ``` blok
-    json_match = re.search(r'```json\s*\n(.*?)\n```', text, re.DOTALL | re.IGNORECASE)
-    if json_match:
-        return json_match.group(1).strip()
-    
-    # Hledej ``` blok bez specifikace jazyka, ale obsahující JSON
-    generic_match = re.search(r'```\s*\n(\{.*?\})\s*\n```', text, re.DOTALL)
-    if generic_match:
-        return generic_match.group(1).strip()
-    
-    # Pokud už je čistý JSON, vrať původní
-    return text.strip()
+    try:
+        _, start, end = locate_json(text)
+        return text[start:end]
+    except JSONExtractError:
+        # Bez nalezitelného JSONu vrať původní text - validaci dělá volající
+        return text.strip()
 
 
 
-def parse_qa_faq(qa_output: str) -> List[Dict[str, str]]:
+def parse_qa_faq(qa_output: Any) -> List[Dict[str, str]]:
     """
     Parsuje FAQ z QA asistenta - STRICT MODE s ```json podporou
     
     Args:
-        qa_output: Raw výstup z QA asistenta (JSON nebo ```json blok)
+        qa_output: Nativní objekt (structured output) nebo raw výstup z QA asistenta (JSON nebo ```json blok)
         
     Returns:
         Seznam FAQ položek
@@ -273,13 +263,16 @@ def parse_qa_faq(qa_output: str) -> List[Dict[str, str]]:
         ValueError: Pokud není validní JSON nebo nemá dostatek FAQ
     """
     try:
-        # Extrahuj JSON z markdown bloku pokud je potřeba
-        clean_json = extract_json_from_markdown(qa_output)
-        
-        if not (clean_json.strip().startswith('[') or clean_json.strip().startswith('{')):
-            raise ValueError("❌ QA asistent nevygeneroval validní JSON output")
-            
-        data = json.loads(clean_json)
+        if isinstance(qa_output, (dict, list)):
+            data = qa_output
+        else:
+            # JSON i z markdown bloku nebo s okolním textem
+            try:
+                data = extract_json(qa_output)
+            except JSONExtractError as e:
+                if not e.found:
+                    raise ValueError("❌ QA asistent nevygeneroval validní JSON output")
+                raise
         faq_items = []
         
         if isinstance(data, list):
@@ -301,26 +294,31 @@ def parse_qa_faq(qa_output: str) -> List[Dict[str, str]]:
         
         return faq_items
         
-    except json.JSONDecodeError as e:
+    except JSONExtractError as e:
         raise ValueError(f"❌ QA asistent vygeneroval nevalidní JSON: {str(e)}")
     except Exception as e:
         raise ValueError(f"❌ Parsování QA FAQ selhalo: {str(e)}")
 
 
-def parse_image_visuals(image_output: str) -> List[Dict[str, Any]]:
+def parse_image_visuals(image_output: Any) -> List[Dict[str, Any]]:
     """
     Parsuje vizuály z ImageRenderer asistenta
     
     Args:
-        image_output: Raw výstup z ImageRenderer
+        image_output: Nativní objekt ImageRenderer ({"images": [...]}) nebo raw výstup
         
     Returns:
         Seznam vizuálů
     """
     try:
-        # JSON parsing
-        if image_output.strip().startswith('[') or image_output.strip().startswith('{'):
+        # Nativní objekt nebo JSON parsing
+        data = None
+        if isinstance(image_output, (dict, list)):
+            data = image_output
+            image_output = ""
+        elif image_output.strip().startswith('[') or image_output.strip().startswith('{'):
             data = json.loads(image_output)
+        if data is not None:
             if isinstance(data, list):
                 visuals = []
                 for i, item in enumerate(data[:2]):  # Max 2 obrázky
@@ -395,31 +393,9 @@ def apply_seo_headings_to_content(content_html: str, seo_headings: Dict[str, Any
     if not seo_headings:
         return content_html
     
-    # Pokud máme strukturu nadpisů ze SEO asistenta, aplikuj je
     try:
-        # Jednoduchá implementace - hledej existující H1-H3 a nahraď je
-        if "h1" in seo_headings:
-            content_html = re.sub(r'<h1[^>]*>.*?</h1>', f'<h1>{seo_headings["h1"]}</h1>', content_html, flags=re.IGNORECASE | re.DOTALL)
-        
-        if "h2" in seo_headings and isinstance(seo_headings["h2"], list):
-            h2_list = seo_headings["h2"]
-            # Najdi všechny H2 tagy a postupně je nahraď
-            h2_pattern = r'<h2[^>]*>.*?</h2>'
-            existing_h2s = re.findall(h2_pattern, content_html, re.IGNORECASE | re.DOTALL)
-            
-            for i, new_h2 in enumerate(h2_list):
-                if i < len(existing_h2s):
-                    content_html = content_html.replace(existing_h2s[i], f'<h2>{new_h2}</h2>', 1)
-        
-        if "h3" in seo_headings and isinstance(seo_headings["h3"], list):
-            h3_list = seo_headings["h3"]
-            h3_pattern = r'<h3[^>]*>.*?</h3>'
-            existing_h3s = re.findall(h3_pattern, content_html, re.IGNORECASE | re.DOTALL)
-            
-            for i, new_h3 in enumerate(h3_list):
-                if i < len(existing_h3s):
-                    content_html = content_html.replace(existing_h3s[i], f'<h3>{new_h3}</h3>', 1)
-        
+        # Jeden průchod - n-tý nadpis dané úrovně dostane n-tý nadpis ze SEO
+        content_html, _ = rewrite_headings(content_html, seo_headings)
         return content_html
         
     except Exception as e:
@@ -445,11 +421,9 @@ def parse_multimedia_primary_visuals(multimedia_output) -> List[Dict[str, Any]]:
         if isinstance(multimedia_output, dict):
             data = multimedia_output
         elif isinstance(multimedia_output, str):
-            # Extrahuj JSON z markdown bloku pokud je potřeba
-            clean_json = extract_json_from_markdown(multimedia_output)
-            if clean_json.strip().startswith('{'):
-                data = json.loads(clean_json)
-            else:
+            # JSON i z markdown bloku nebo s okolním textem
+            data = extract_json(multimedia_output, default=None)
+            if not isinstance(data, dict):
                 raise ValueError("Multimedia output není valid JSON")
         else:
             raise ValueError("Neplatný formát multimedia_output")
@@ -470,7 +444,7 @@ def parse_multimedia_primary_visuals(multimedia_output) -> List[Dict[str, Any]]:
         for i, visual in enumerate(primary_visuals):
             visuals.append({
                 "image_url": visual.get("image_url", visual.get("url", "")),
-                "prompt": visual.get("prompt", ""),
+                "prompt": visual.get("prompt", visual.get("image_prompt", "")),
                 "alt": visual.get("alt", f"Ilustrační obrázek {i+1}"),
                 "position": "top" if i == 0 else "bottom",
                 "srcset": visual.get("srcset"),
@@ -484,6 +458,39 @@ def parse_multimedia_primary_visuals(multimedia_output) -> List[Dict[str, Any]]:
         raise ValueError(f"Parsování multimedia_assistant.primary_visuals selhalo: {str(e)}")
 
 
+def apply_image_assets(visuals: List[Dict[str, Any]], image_assets: Any) -> List[Dict[str, Any]]:
+    """
+    Doplní vizuálům lokální responzivní assety z image_assets_activity
+
+    Vizuál se spáruje s assetem podle původní URL obrázku; vizuál bez URL dostane
+    další nepoužitý asset v pořadí. Vizuály bez assetu zůstávají beze změny, stejně
+    jako u assetů s relativní URL (starší výstupy bez veřejného asset hostu).
+    """
+    assets = image_assets.get("assets", []) if isinstance(image_assets, dict) else image_assets
+    assets = [asset for asset in assets or []
+              if isinstance(asset, dict) and str(asset.get("image_url") or "").startswith(("https://", "http://"))]
+    by_source = {asset.get("source_url"): asset for asset in assets}
+    used = set()
+    enriched = []
+    for visual in visuals:
+        asset = by_source.get(visual.get("image_url")) if visual.get("image_url") else None
+        if asset is None and not visual.get("image_url"):
+            asset = next((a for a in assets if a["hash"] not in used), None)
+        if asset is None:
+            enriched.append(visual)
+            continue
+        used.add(asset["hash"])
+        enriched.append({
+            **visual,
+            "image_url": asset["image_url"],
+            "srcset": asset.get("srcset"),
+            "width": asset.get("width"),
+            "height": asset.get("height"),
+            "sources": asset.get("sources") or None,
+        })
+    return enriched
+
+
 def parse_schema_org(content: str, seo_data: Dict[str, Any], date_published: str) -> Dict[str, Any]:
     """
     Generuje schema.org strukturu z dostupných dat
@@ -595,9 +602,13 @@ def transform_to_PublishInput(pipeline_data: Dict[str, Any]) -> Dict[str, Any]:
         content_html = f"<article>\n{content_html}\n</article>"
     
     # ✅ APLIKUJ NADPISY ze SEO asistenta (volitelné)
+    # Stejný průchod spočítá i slova a nadpisy pro validaci a metadata publishe
     seo_headings = seo_data.get("headings", {})
+    try:
+        content_html, stats = rewrite_headings(content_html, seo_headings)
+    except Exception as e:
+        raise ValueError(f"❌ Selhala aplikace SEO nadpisů na content: {str(e)}")
     if seo_headings:
-        content_html = apply_seo_headings_to_content(content_html, seo_headings)
         logger.info(f"✅ Aplikovány SEO nadpisy: H1={bool(seo_headings.get('h1'))}, H2={len(seo_headings.get('h2', []))}, H3={len(seo_headings.get('h3', []))}")
     else:
         logger.info("⚠️ SEO headings nejsou k dispozici - pokračuji bez úprav nadpisů")
@@ -612,6 +623,8 @@ def transform_to_PublishInput(pipeline_data: Dict[str, Any]) -> Dict[str, Any]:
         logger.info(f"✅ Vizuály načteny z multimedia_assistant.primary_visuals: {len(visuals)} obrázků")
     except ValueError as e:
         raise ValueError(f"❌ CHYBA při načítání vizuálů z multimedia_assistant.primary_visuals: {str(e)}")
+    if pipeline_data.get("image_assets"):
+        visuals = apply_image_assets(visuals, pipeline_data["image_assets"])
     
     # 5. Schema.org
     schema_org = parse_schema_org(content_html, seo_data, current_date)
@@ -634,12 +647,66 @@ def transform_to_PublishInput(pipeline_data: Dict[str, Any]) -> Dict[str, Any]:
         "schema_org": schema_org,
         "format": "html",
         "language": "cs",
-        "date_published": current_date
+        "date_published": current_date,
+        "content_stats": asdict(stats)
     }
     
     return publish_input
 
 
+PIPELINE_COMPONENT_KEYS = (
+    "draft_assistant_output",
+    "seo_assistant_output",
+    "humanizer_assistant_output",
+    "humanizer_output_after_fact_validation",
+    "multimedia_assistant_output",
+    "image_renderer_assistant_output",
+    "qa_assistant_output",
+    "fact_validator_assistant_output",
+    "brief_assistant_output",
+    "image_assets",
+)
+
+
+def pipeline_components_from_stage_logs(stage_logs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Namapuje výstupy stage_logs na vstupní klíče transform_to_PublishInput.
+
+    Stage se rozpozná podle názvu (SEOAssistant -> seo_assistant_output, ...),
+    pozdější log stejného asistenta přepíše dřívější. Humanizer se použije i jako
+    humanizer_output_after_fact_validation.
+    """
+    components: Dict[str, Any] = {key: "" for key in PIPELINE_COMPONENT_KEYS}
+    for log in stage_logs or []:
+        stage_name = (log.get("stage") or "").lower()
+        output = log.get("output", "")
+        if not stage_name or not output:
+            continue
+        if not isinstance(output, (str, dict, list)):
+            output = str(output)
+
+        if "seo" in stage_name:
+            components["seo_assistant_output"] = output
+        elif "draft" in stage_name:
+            components["draft_assistant_output"] = output
+        elif "humanizer" in stage_name:
+            components["humanizer_assistant_output"] = output
+            components["humanizer_output_after_fact_validation"] = output
+        elif "multimedia" in stage_name:
+            components["multimedia_assistant_output"] = output
+        elif "assets" in stage_name:
+            components["image_assets"] = output
+        elif "image" in stage_name:
+            components["image_renderer_assistant_output"] = output
+        elif "qa" in stage_name:
+            components["qa_assistant_output"] = output
+        elif "fact" in stage_name or "validator" in stage_name:
+            components["fact_validator_assistant_output"] = output
+        elif "brief" in stage_name:
+            components["brief_assistant_output"] = output
+    return components
+
+
 def create_project_config(base_domain: str = "https://seofarm.ai") -> Dict[str, Any]:
     """
     Vytvoří základní project config s defaults
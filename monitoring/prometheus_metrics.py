@@ -43,10 +43,18 @@ llm_response_time = Histogram(
     registry=REGISTRY
 )
 
+llm_time_to_first_token = Histogram(
+    'seo_farm_llm_time_to_first_token_seconds',
+    'Doba do prvního tokenu streamované LLM odpovědi',
+    ['provider', 'model'],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+    registry=REGISTRY
+)
+
 llm_tokens_total = Counter(
     'seo_farm_llm_tokens_total',
     'Celkový počet tokenů',
-    ['provider', 'model', 'type'],  # type: prompt|completion
+    ['provider', 'model', 'type'],  # type: prompt|completion|cached
     registry=REGISTRY
 )
 
@@ -91,6 +99,114 @@ queue_depth = Gauge(
     registry=REGISTRY
 )
 
+queue_backlog_age = Gauge(
+    'seo_farm_queue_backlog_age_seconds',
+    'Stáří nejstaršího úkolu ve frontě (schedule-to-start latence)',
+    ['queue_name'],
+    registry=REGISTRY
+)
+
+desired_worker_replicas = Gauge(
+    'seo_farm_desired_worker_replicas',
+    'Požadovaný počet worker procesů podle autoscaleru',
+    registry=REGISTRY
+)
+
+# Circuit breaker metriky
+llm_circuit_state = Gauge(
+    'seo_farm_llm_circuit_state',
+    'Stav circuit breakeru LLM providera (0 = closed, 1 = half-open, 2 = open)',
+    ['provider'],
+    registry=REGISTRY
+)
+
+llm_circuit_failure_rate = Gauge(
+    'seo_farm_llm_circuit_failure_rate',
+    'Chybovost LLM providera v klouzavém okně breakeru',
+    ['provider'],
+    registry=REGISTRY
+)
+
+llm_circuit_transitions_total = Counter(
+    'seo_farm_llm_circuit_transitions_total',
+    'Počet přechodů circuit breakeru',
+    ['provider', 'state'],
+    registry=REGISTRY
+)
+
+llm_hedged_requests_total = Counter(
+    'seo_farm_llm_hedged_requests_total',
+    'Počet hedged LLM requestů (launched = spuštěný duplikát, won = duplikát odpověděl první)',
+    ['provider', 'model', 'outcome'],
+    registry=REGISTRY
+)
+
+llm_batch_requests_total = Counter(
+    'seo_farm_llm_batch_requests_total',
+    'Počet LLM requestů odeslaných přes provider batch API (succeeded / errored / failed)',
+    ['provider', 'model', 'outcome'],
+    registry=REGISTRY
+)
+
+llm_batch_size = Histogram(
+    'seo_farm_llm_batch_size',
+    'Počet requestů v jedné batch submission',
+    ['provider'],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+    registry=REGISTRY
+)
+
+llm_batch_turnaround = Histogram(
+    'seo_farm_llm_batch_turnaround_seconds',
+    'Doba od odeslání batch submission do stažení výsledků',
+    ['provider'],
+    buckets=(60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400),
+    registry=REGISTRY
+)
+
+llm_micro_batch_size = Histogram(
+    'seo_farm_llm_micro_batch_size',
+    'Počet témat sloučených do jednoho multi-topic volání asistenta',
+    ['function_key'],
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+    registry=REGISTRY
+)
+
+llm_micro_batch_items_total = Counter(
+    'seo_farm_llm_micro_batch_items_total',
+    'Témata zpracovaná micro-batchingem (merged / fallback = samostatné volání po chybějícím výsledku)',
+    ['function_key', 'outcome'],
+    registry=REGISTRY
+)
+
+image_generation_cache_total = Counter(
+    'seo_farm_image_generation_cache_total',
+    'Image prompty podle výsledku deduplikační cache (exact / near = ušetřené generování, miss = nový obrázek)',
+    ['provider', 'model', 'outcome'],
+    registry=REGISTRY
+)
+
+publish_pool_task_seconds = Histogram(
+    'seo_farm_publish_pool_task_seconds',
+    'Doba publish exportu v process poolu (queue = čekání na volný proces, run = výpočet)',
+    ['phase'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    registry=REGISTRY
+)
+
+publish_pool_tasks_total = Counter(
+    'seo_farm_publish_pool_tasks_total',
+    'Publish exporty zpracované process poolem (success / error / broken = spadlý proces poolu)',
+    ['outcome'],
+    registry=REGISTRY
+)
+
+publish_pool_inflight = Gauge(
+    'seo_farm_publish_pool_inflight',
+    'Publish exporty odeslané do process poolu (běžící + čekající ve frontě poolu)',
+    registry=REGISTRY
+)
+
 class MetricsCollector:
     """Sběrač metrik pro SEO Farm."""
     
@@ -171,6 +287,14 @@ class MetricsCollector:
                     type='completion'
                 ).inc(completion_tokens)
     
+    def record_llm_cached_tokens(self, provider: str, model: str, tokens: int):
+        """Zaznamenání tokenů promptu přečtených z provider-side cache."""
+        llm_tokens_total.labels(provider=provider, model=model, type='cached').inc(tokens)
+    
+    def record_llm_ttft(self, provider: str, model: str, seconds: float):
+        """Zaznamenání time-to-first-token streamované odpovědi."""
+        llm_time_to_first_token.labels(provider=provider, model=model).observe(seconds)
+    
     def record_activity(self, activity_name: str, success: bool = True):
         """Zaznamenání aktivity."""
         status = 'success' if success else 'error'
@@ -186,6 +310,56 @@ class MetricsCollector:
     def set_queue_depth(self, queue_name: str, depth: int):
         """Nastavení hloubky fronty."""
         queue_depth.labels(queue_name=queue_name).set(depth)
+    
+    def set_queue_backlog_age(self, queue_name: str, age_seconds: float):
+        """Nastavení stáří nejstaršího úkolu ve frontě."""
+        queue_backlog_age.labels(queue_name=queue_name).set(age_seconds)
+    
+    def set_desired_replicas(self, replicas: int):
+        """Nastavení požadovaného počtu workerů (pro externí autoscaling, např. K8s HPA)."""
+        desired_worker_replicas.set(replicas)
+    
+    def set_circuit_state(self, provider: str, state_value: int, failure_rate: float):
+        """Nastavení stavu circuit breakeru providera."""
+        llm_circuit_state.labels(provider=provider).set(state_value)
+        llm_circuit_failure_rate.labels(provider=provider).set(failure_rate)
+    
+    def record_circuit_transition(self, provider: str, state: str):
+        """Zaznamenání přechodu circuit breakeru."""
+        llm_circuit_transitions_total.labels(provider=provider, state=state).inc()
+    
+    def record_llm_hedge(self, provider: str, model: str, outcome: str):
+        """Zaznamenání hedged requestu."""
+        llm_hedged_requests_total.labels(provider=provider, model=model, outcome=outcome).inc()
+    
+    def record_llm_batch(self, provider: str, model: str, size: int, turnaround: float, outcomes: Dict[str, int]):
+        """Zaznamenání dokončené batch submission."""
+        llm_batch_size.labels(provider=provider).observe(size)
+        llm_batch_turnaround.labels(provider=provider).observe(turnaround)
+        for outcome, count in outcomes.items():
+            llm_batch_requests_total.labels(provider=provider, model=model, outcome=outcome).inc(count)
+    
+    def record_llm_micro_batch(self, function_key: str, size: int, outcomes: Dict[str, int]):
+        """Zaznamenání sloučeného multi-topic volání."""
+        llm_micro_batch_size.labels(function_key=function_key).observe(size)
+        for outcome, count in outcomes.items():
+            llm_micro_batch_items_total.labels(function_key=function_key, outcome=outcome).inc(count)
+
+    def record_image_cache(self, provider: str, model: str, outcomes: Dict[str, int]):
+        """Zaznamenání výsledků image cache za jednu dávku promptů."""
+        for outcome, count in outcomes.items():
+            if count:
+                image_generation_cache_total.labels(provider=provider, model=model, outcome=outcome).inc(count)
+
+    def record_publish_task(self, outcome: str, queued: float, run: float):
+        """Zaznamenání publish exportu z process poolu."""
+        publish_pool_tasks_total.labels(outcome=outcome).inc()
+        publish_pool_task_seconds.labels(phase='queue').observe(queued)
+        publish_pool_task_seconds.labels(phase='run').observe(run)
+    
+    def set_publish_pool_inflight(self, count: int):
+        """Nastavení počtu publish exportů v process poolu."""
+        publish_pool_inflight.set(count)
 
 # Globální instance
 metrics = MetricsCollector()
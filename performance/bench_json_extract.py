@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+SEO Farm Orchestrator - JSON Extractor Benchmark
+Mikro-benchmark sdíleného extraktoru (helpers.json_extract) proti původním
+ad-hoc parserům na reálných výstupech asistentů z outputs/seo_output_*.json
+
+Usage: python performance/bench_json_extract.py [--outputs outputs] [--repeat 5] [--number 20]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.json_extract import extract_json
+
+STAGES = ("SEOAssistant", "QAAssistant", "MultimediaAssistant")
+
+_MARKDOWN_FENCE = re.compile(r'```json\s*\n(.*?)\n```', re.DOTALL | re.IGNORECASE)
+_GENERIC_FENCE = re.compile(r'```\s*\n(\{.*?\})\s*\n```', re.DOTALL)
+_BATCH_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def legacy_markdown(text):
+    """Původní transformers.extract_json_from_markdown + json.loads"""
+    match = _MARKDOWN_FENCE.search(text) or _GENERIC_FENCE.search(text)
+    return json.loads(match.group(1).strip() if match else text.strip())
+
+
+def legacy_slicing(text):
+    """Původní micro_batching - odstranění fence + find/rfind závorek"""
+    text = _BATCH_FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        raise ValueError("bez JSON objektu")
+    return json.loads(text[start:end + 1])
+
+
+def legacy_fence_find(text):
+    """Původní parse_seo_metadata - find('```json') a slicing do uzavírací fence"""
+    text = text.strip()
+    if text.startswith("{"):
+        return json.loads(text)
+    start = text.find("```json")
+    if start < 0:
+        raise ValueError("bez ```json bloku")
+    end = text.find("```", start + 7)
+    return json.loads(text[start + 7:end].strip())
+
+
+def shared_extractor(text):
+    return extract_json(text)
+
+
+PARSERS = {
+    "json_extract": shared_extractor,
+    "legacy_markdown": legacy_markdown,
+    "legacy_slicing": legacy_slicing,
+    "legacy_fence_find": legacy_fence_find,
+}
+
+
+def load_samples(outputs_dir):
+    """Textové výstupy SEO/QA/Multimedia stage z uložených pipeline výsledků"""
+    samples = {stage: [] for stage in STAGES}
+    for path in sorted(glob.glob(os.path.join(outputs_dir, "seo_output_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        for log in result.get("stage_logs") or []:
+            stage = (log.get("stage") or "").strip()
+            if stage in samples and isinstance(log.get("output"), str):
+                samples[stage].append(log["output"])
+    return samples
+
+
+def success_count(parser, texts):
+    ok = 0
+    for text in texts:
+        try:
+            parser(text)
+            ok += 1
+        except ValueError:
+            pass
+    return ok
+
+
+def run_parser(parser, texts):
+    for text in texts:
+        try:
+            parser(text)
+        except ValueError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extrakce JSON z výstupů LLM")
+    parser.add_argument("--outputs", default="outputs", help="Adresář s seo_output_*.json")
+    parser.add_argument("--repeat", type=int, default=5, help="Počet opakování měření (bere se minimum)")
+    parser.add_argument("--number", type=int, default=20, help="Počet průchodů vzorky v jednom měření")
+    args = parser.parse_args()
+
+    samples = load_samples(args.outputs)
+    if not any(samples.values()):
+        print(f"❌ V {args.outputs} nejsou žádné výstupy SEO/QA/Multimedia stage")
+        sys.exit(1)
+
+    print(f"{'stage':<20} {'parser':<18} {'vzorků':>7} {'úspěšně':>8} {'µs/vzorek':>10}")
+    print("-" * 67)
+    for stage, texts in samples.items():
+        if not texts:
+            continue
+        for name, fn in PARSERS.items():
+            best = min(timeit.repeat(lambda: run_parser(fn, texts), repeat=args.repeat, number=args.number))
+            per_sample = best / (args.number * len(texts)) * 1e6
+            print(f"{stage:<20} {name:<18} {len(texts):>7} {success_count(fn, texts):>8} {per_sample:>10.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
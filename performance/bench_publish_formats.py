@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+SEO Farm Orchestrator - Publish Formats Benchmark
+Export HTML/JSON/WordPress po formátech (každý generate_* si článek odvozuje sám)
+proti jednomu zkompilovanému ArticleIR a render_formats, na článcích
+sestavených z outputs/seo_output_*.json
+
+Usage: python performance/bench_publish_formats.py [--outputs outputs] [--repeat 5] [--number 20]
+"""
+
+import argparse
+import glob
+import io
+import json
+import logging
+import os
+import sys
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activities.publish_script import (
+    PublishFAQ,
+    PublishInput,
+    PublishMeta,
+    PublishVisual,
+    compile_article,
+    generate_html_output,
+    generate_json_output,
+    generate_slug,
+    generate_wordpress_output,
+    render_formats,
+    write_formats,
+)
+from helpers.transformers import parse_multimedia_primary_visuals, parse_qa_faq
+
+CONTENT_STAGES = ("HumanizerAssistant", "DraftAssistant", "ContentAssistant")
+
+
+def _stage_outputs(result):
+    outputs = {}
+    for log in result.get("stage_logs") or []:
+        if isinstance(log.get("output"), str):
+            outputs[(log.get("stage") or "").strip()] = log["output"]
+    return outputs
+
+
+def _try(parser, value, default):
+    try:
+        return parser(value) if value else default
+    except ValueError:
+        return default
+
+
+def build_publish_input(result):
+    """PublishInput z uloženého pipeline výsledku (obsah, FAQ a vizuály z výstupů stage)"""
+    outputs = _stage_outputs(result)
+    content = next((outputs[stage] for stage in CONTENT_STAGES if stage in outputs), None)
+    if not content:
+        return None
+    title = str(result.get("topic") or "Článek")
+    slug = generate_slug(title)
+    faq = _try(parse_qa_faq, outputs.get("QAAssistant"), [])
+    visuals = _try(parse_multimedia_primary_visuals, outputs.get("MultimediaAssistant"), [])
+    return PublishInput(
+        title=title,
+        meta=PublishMeta(description=title[:160], keywords=title.lower().split()[:8],
+                         canonical=f"https://seofarm.ai/{slug}"),
+        content_html=f"<article>\n{content}\n</article>",
+        faq=[PublishFAQ(question=f["question"], answer_html=f["answer_html"]) for f in faq],
+        visuals=[PublishVisual(image_url=f"https://seofarm.ai/img/{slug}-{i}.webp", prompt=v["prompt"],
+                               alt=v.get("alt") or title, position="top" if i == 0 else "bottom")
+                 for i, v in enumerate(visuals)],
+        schema_org={"@context": "https://schema.org", "@type": "Article", "headline": title,
+                    "author": {"@type": "Person", "name": "SEO Farm Editorial"},
+                    "datePublished": "2025-08-05T10:00:00Z"},
+        format="html",
+        language="cs",
+        date_published="2025-08-05T10:00:00Z"
+    )
+
+
+def load_articles(outputs_dir):
+    articles = []
+    for path in sorted(glob.glob(os.path.join(outputs_dir, "seo_output_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            article = build_publish_input(json.load(f))
+        if article:
+            articles.append(article)
+    return articles
+
+
+def per_format(articles):
+    for article in articles:
+        generate_html_output(article)
+        generate_json_output(article)
+        generate_wordpress_output(article)
+
+
+def shared_ir(articles):
+    for article in articles:
+        render_formats(compile_article(article))
+
+
+def per_format_files(articles):
+    for article in articles:
+        html, data, wordpress = io.StringIO(), io.StringIO(), io.StringIO()
+        html.write(generate_html_output(article))
+        json.dump(generate_json_output(article), data, ensure_ascii=False, indent=2)
+        json.dump(generate_wordpress_output(article), wordpress, ensure_ascii=False, indent=2)
+
+
+def shared_ir_files(articles, executor=None):
+    for article in articles:
+        write_formats(compile_article(article), {"html": io.StringIO(), "json": io.StringIO(), "wordpress": io.StringIO()},
+                      executor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark publish exportu HTML/JSON/WordPress")
+    parser.add_argument("--outputs", default="outputs", help="Adresář s seo_output_*.json")
+    parser.add_argument("--repeat", type=int, default=5, help="Počet opakování měření (bere se minimum)")
+    parser.add_argument("--number", type=int, default=20, help="Počet průchodů články v jednom měření")
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    articles = load_articles(args.outputs)
+    if not articles:
+        print(f"❌ V {args.outputs} nejsou žádné články s obsahem")
+        sys.exit(1)
+
+    executor = ThreadPoolExecutor(max_workers=3)
+    cases = [
+        ("render", "per_format", per_format),
+        ("render", "shared_ir", shared_ir),
+        ("stream", "per_format", per_format_files),
+        ("stream", "shared_ir", shared_ir_files),
+        ("stream", "shared_ir_3t", lambda items: shared_ir_files(items, executor)),
+    ]
+    print(f"Článků: {len(articles)}, průměrná délka obsahu: "
+          f"{sum(len(a.content_html) for a in articles) // len(articles)} znaků")
+    print(f"{'výstup':<10} {'varianta':<12} {'µs/článek':>10}")
+    print("-" * 34)
+    for output, name, fn in cases:
+        best = min(timeit.repeat(lambda: fn(articles), repeat=args.repeat, number=args.number))
+        print(f"{output:<10} {name:<12} {best / (args.number * len(articles)) * 1e6:>10.1f}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,10 @@ Stabilní, modulární worker připravený pro nasazení v produkčním prostře
 """
 
 import asyncio
+import os
 import signal
 import sys
+from datetime import timedelta
 from typing import List, Optional
 
 # 🛡️ OCHRANA PŘED DEPRECATED MODULY - ZABRÁNÍ NAČÍTÁNÍ STARÝCH VERZÍ
@@ -14,8 +16,9 @@ for banned in ["worker_DEPRECATED", "assistant_activities_DEPRECATED", "simple_w
         raise RuntimeError(f"❌ ZAKÁZÁN DEPRECATED MODUL: {banned} - použij safe_assistant_activities.py!")
 
 # Naše nové moduly
-from config import get_temporal_config, get_logging_config
+from config import get_temporal_config, get_logging_config, WORKLOAD_CLASSES, WORKLOAD_TEXT, WORKLOAD_IMAGE, WORKLOAD_PUBLISH
 from logger import get_logger, log_workflow_start
+from worker_supervisor import InFlightActivities, write_heartbeat
 
 # Temporal imports
 from temporalio.client import Client
@@ -41,6 +44,11 @@ from activities.safe_assistant_activities import (
 
 # Publish activity - deterministický script
 from activities.publish_activity import publish_activity
+from activities.publish_pool import get_publish_pool
+# Post-generation stage obrázků - WebP/AVIF varianty pro srcset
+from activities.image_assets import image_assets_activity, close_image_asset_pipeline
+# Checkpointy stage pro resume selhaných pipeline
+from activities.checkpoint_activities import save_stage_checkpoint, load_stage_checkpoints
 from activities.db_debug_assistant import db_debug_assistant
 
 # Originální aktivity (pokud existují)
@@ -61,14 +69,32 @@ print("✅ Worker načetl safe_assistant_activities.py")
 print("✅ Aktivita: image_renderer_assistant")
 print("✅ Concurrency: 3")
 
+# Pooly, které proces obsluhuje - "workflow" = workflow + lehké aktivity na hlavní task queue
+WORKFLOW_POOL = "workflow"
+ALL_POOLS = (WORKFLOW_POOL,) + WORKLOAD_CLASSES
+
+def get_enabled_pools() -> List[str]:
+    """Načte pooly z ENV WORKER_POOLS (např. "workflow,text"), default všechny."""
+    raw = os.getenv("WORKER_POOLS")
+    if not raw:
+        return list(ALL_POOLS)
+    pools = [p.strip() for p in raw.split(",") if p.strip()]
+    unknown = [p for p in pools if p not in ALL_POOLS]
+    if unknown:
+        raise ValueError(f"❌ Neznámé pooly ve WORKER_POOLS: {unknown}. Podporované: {list(ALL_POOLS)}")
+    return pools
+
 class ProductionWorker:
     """Produkční Temporal worker s graceful shutdown a error handling."""
     
-    def __init__(self):
+    def __init__(self, pools: Optional[List[str]] = None):
         self.client: Optional[Client] = None
-        self.worker: Optional[Worker] = None
+        self.workers: List[Worker] = []
         self.config = get_temporal_config()
+        self.pools = pools or get_enabled_pools()
         self.running = False
+        # Rozběhnuté aktivity pro heartbeat - supervisor ubírá jen procesy bez práce
+        self.in_flight = InFlightActivities()
         
     async def setup(self):
         """Nastaví připojení k Temporal serveru."""
@@ -80,11 +106,11 @@ class ProductionWorker:
                 namespace=self.config.namespace
             )
             
-            # Příprava aktivit
+            # Příprava lehkých aktivit pro hlavní task queue
             activities = [
                 load_assistants_from_database,
-                execute_assistant,
-                publish_activity  # 🔧 Deterministický publish script
+                save_stage_checkpoint,
+                load_stage_checkpoints
                 # db_debug_assistant temporarily disabled due to async issue
             ]
             
@@ -97,23 +123,58 @@ class ProductionWorker:
                 ])
                 logger.info("✅ Originální aktivity přidány")
             
-            # Vytvoření workera
-            self.worker = Worker(
-                self.client,
-                task_queue=self.config.task_queue,
-                workflows=[
-                    SEOWorkflow,
-                    AssistantPipelineWorkflow
-                    # Debug workflows temporarily disabled
-                ],
-                activities=activities,
-                max_concurrent_activities=self.config.max_workers
-            )
+            # Workflow worker na hlavní task queue
+            if WORKFLOW_POOL in self.pools:
+                self.workers.append(Worker(
+                    self.client,
+                    task_queue=self.config.task_queue,
+                    workflows=[
+                        SEOWorkflow,
+                        AssistantPipelineWorkflow
+                        # Debug workflows temporarily disabled
+                    ],
+                    activities=activities,
+                    max_concurrent_activities=self.config.max_workers,
+                    graceful_shutdown_timeout=timedelta(seconds=self.config.graceful_shutdown_timeout),
+                    interceptors=[self.in_flight]
+                ))
+                logger.info(f"✅ Worker nastaven pro task queue: {self.config.task_queue}")
+                logger.info(f"📊 Max concurrent activities: {self.config.max_workers}")
+                logger.info(f"🔄 Workflows: {len([SEOWorkflow, AssistantPipelineWorkflow])}")
+                logger.info(f"⚙️ Activities: {len(activities)}")
+            
+            # 🚦 Dedikované pooly per workload - pomalé obrázky a CPU publish neblokují LLM text
+            pool_activities = {
+                WORKLOAD_TEXT: [execute_assistant],
+                WORKLOAD_IMAGE: [execute_assistant, image_assets_activity],
+                WORKLOAD_PUBLISH: [publish_activity]  # 🔧 Deterministický publish script
+            }
+            for workload, workload_activities in pool_activities.items():
+                if workload not in self.pools:
+                    continue
+                queue = self.config.queues[workload]
+                worker_kwargs = {"max_concurrent_activities": queue.max_concurrent_activities}
+                if queue.max_activities_per_second is not None:
+                    worker_kwargs["max_activities_per_second"] = queue.max_activities_per_second
+                if queue.max_task_queue_activities_per_second is not None:
+                    worker_kwargs["max_task_queue_activities_per_second"] = queue.max_task_queue_activities_per_second
+                
+                self.workers.append(Worker(
+                    self.client,
+                    task_queue=queue.name,
+                    activities=workload_activities,
+                    graceful_shutdown_timeout=timedelta(seconds=self.config.graceful_shutdown_timeout),
+                    interceptors=[self.in_flight],
+                    **worker_kwargs
+                ))
+                logger.info(f"✅ Pool '{workload}' nastaven pro task queue: {queue.name} {worker_kwargs}")
             
-            logger.info(f"✅ Worker nastaven pro task queue: {self.config.task_queue}")
-            logger.info(f"📊 Max concurrent activities: {self.config.max_workers}")
-            logger.info(f"🔄 Workflows: {len([SEOWorkflow, AssistantPipelineWorkflow])}")
-            logger.info(f"⚙️ Activities: {len(activities)}")
+            if not self.workers:
+                raise RuntimeError(f"❌ Žádný pool není povolen: {self.pools}")
+            
+            # ⚙️ Warm process pool pro CPU publish export - první export nečeká na start procesů
+            if WORKLOAD_PUBLISH in self.pools and get_publish_pool().settings.enabled:
+                await get_publish_pool().start()
             
         except Exception as e:
             logger.error(f"❌ Chyba při nastavení workera: {e}")
@@ -121,22 +182,47 @@ class ProductionWorker:
     
     async def run(self):
         """Spustí worker s graceful shutdown."""
-        if not self.worker:
+        if not self.workers:
             raise RuntimeError("Worker není nastaven. Zavolejte setup() nejdříve.")
         
         self.running = True
-        logger.info("🚀 Produkční worker spuštěn a čeká na úkoly...")
+        logger.info(f"🚀 Produkční worker spuštěn ({len(self.workers)} poolů: {', '.join(self.pools)}) a čeká na úkoly...")
+        
+        # 💓 Heartbeat pro supervisor (jen pokud běžíme pod worker_supervisor.py)
+        heartbeat_task = None
+        if os.getenv("WORKER_HEARTBEAT_FILE"):
+            heartbeat_task = asyncio.create_task(self._heartbeat_loop(os.getenv("WORKER_HEARTBEAT_FILE")))
         
         try:
-            await self.worker.run()
+            await asyncio.gather(*(worker.run() for worker in self.workers))
         except KeyboardInterrupt:
             logger.info("⏹️ Přijat signal pro ukončení")
         except Exception as e:
             logger.error(f"❌ Worker spadl s chybou: {e}")
             raise
         finally:
+            if heartbeat_task:
+                heartbeat_task.cancel()
             await self.shutdown()
     
+    async def _heartbeat_loop(self, heartbeat_file: str):
+        """Pravidelně zapisuje heartbeat - zaseknutý event loop = chybějící heartbeat = restart."""
+        interval = int(os.getenv("WORKER_HEARTBEAT_INTERVAL", "10"))
+        try:
+            import psutil
+            process = psutil.Process()
+        except ImportError:
+            process = None
+        
+        while self.running:
+            try:
+                rss_mb = round(process.memory_info().rss / (1024 * 1024), 1) if process else None
+                write_heartbeat(heartbeat_file, pools=self.pools, rss_mb=rss_mb,
+                                running_activities=self.in_flight.running)
+            except Exception as e:
+                logger.warning(f"⚠️ Nelze zapsat heartbeat: {e}")
+            await asyncio.sleep(interval)
+    
     async def shutdown(self):
         """Gracefully ukončí worker."""
         if not self.running:
@@ -145,6 +231,12 @@ class ProductionWorker:
         logger.info("🛑 Ukončování workera...")
         self.running = False
         
+        # Graceful shutdown - přestaneme brát nové úkoly a dokončíme rozběhnuté aktivity
+        if self.workers:
+            await asyncio.gather(*(worker.shutdown() for worker in self.workers), return_exceptions=True)
+        get_publish_pool().shutdown()
+        await close_image_asset_pipeline()
+        
         # Cleanup
         if self.client:
             try:
@@ -210,6 +302,11 @@ async def main():
     logger.info("👋 Worker ukončen")
 
 if __name__ == "__main__":
+    # 🧑‍✈️ Supervisor mód - N procesů workeru místo jednoho
+    if "--supervise" in sys.argv:
+        from worker_supervisor import main as supervise
+        sys.exit(supervise([arg for arg in sys.argv[1:] if arg != "--supervise"]))
+    
     # Nastavení event loop policy pro Windows kompatibilitu
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
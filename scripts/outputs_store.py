@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+SEO Farm Orchestrator - Output Store
+Správa content-addressed úložiště výstupů (outputs/store/): import starých
+outputs/seo_output_*.json, retence + kompakce (včetně checkpointů a handoffů
+starých runů) a výpis uložených runů
+
+Usage:
+    python scripts/outputs_store.py import-legacy [--outputs outputs] [--delete]
+    python scripts/outputs_store.py gc [--checkpoint-max-age-days 30] [--handoff-max-age-hours 48]
+    python scripts/outputs_store.py list [--workflow ID] [--limit 20]
+    python scripts/outputs_store.py show WORKFLOW_ID [RUN_ID]
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from helpers.checkpoint_store import prune_checkpoints
+from helpers.output_store import get_output_store
+from helpers.stage_handoff import DEFAULT_PRUNE_AGE, prune_handoffs
+
+LEGACY_NAME = re.compile(r"seo_output_(\d{8}_\d{6})_")
+# Bez retence úložiště (retention_days=0) zůstávají checkpointy pro resume takhle dlouho
+DEFAULT_CHECKPOINT_MAX_AGE_DAYS = 30
+
+
+def import_legacy(store, outputs_dir, delete=False):
+    """Naimportuje ploché seo_output_*.json; se --delete smaže jen soubory, které se přečtou zpět beze změny."""
+    paths = sorted(glob.glob(os.path.join(outputs_dir, "seo_output_*.json")))
+    imported, raw_bytes, stored_bytes = 0, 0, 0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        match = LEGACY_NAME.search(os.path.basename(path))
+        saved_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").isoformat() if match else None
+        stored = store.write_run(result, saved_at=saved_at)
+        imported += 1
+        raw_bytes += os.path.getsize(path)
+        stored_bytes += stored.stored_bytes
+        if delete:
+            if store.load_run(stored.workflow_id, stored.run_id) != result:
+                print(f"⚠️ {path}: uložený run se liší od originálu - soubor ponechán")
+                continue
+            os.remove(path)
+    print(f"✅ Importováno {imported} runů: {raw_bytes / 1024:.0f} KiB JSON -> {stored_bytes / 1024:.0f} KiB nových blobů")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Správa úložiště výstupů pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+    legacy = commands.add_parser("import-legacy", help="Import outputs/seo_output_*.json do úložiště")
+    legacy.add_argument("--outputs", default="outputs", help="Adresář se starými seo_output_*.json")
+    legacy.add_argument("--delete", action="store_true", help="Po ověřeném importu staré soubory smazat")
+    gc_parser = commands.add_parser("gc", help="Retence a kompakce (smazání blobů bez odkazu a starých handoffů)")
+    gc_parser.add_argument("--checkpoint-max-age-days", type=float,
+                           help="Checkpointy runů starší než N dní se smažou (default retention_days úložiště, jinak 30)")
+    gc_parser.add_argument("--handoff-max-age-hours", type=float, default=DEFAULT_PRUNE_AGE / 3600,
+                    help="Handoffy runů bez zápisu déle než N hodin se smažou")
+    listing = commands.add_parser("list", help="Výpis uložených runů")
+    listing.add_argument("--workflow", help="Jen runy daného workflow")
+    listing.add_argument("--limit", type=int, default=20)
+    show = commands.add_parser("show", help="Vypíše uložený výsledek runu jako JSON")
+    show.add_argument("workflow_id")
+    show.add_argument("run_id", nargs="?")
+    args = parser.parse_args()
+
+    store = get_output_store()
+    if args.command == "import-legacy":
+        import_legacy(store, args.outputs, args.delete)
+    elif args.command == "gc":
+        stats = store.maintain()
+        checkpoint_days = args.checkpoint_max_age_days or store.settings.retention_days or DEFAULT_CHECKPOINT_MAX_AGE_DAYS
+        stats["removed_checkpoint_runs"] = prune_checkpoints(checkpoint_days)
+        stats["removed_handoff_runs"] = prune_handoffs(args.handoff_max_age_hours * 3600)
+        print(json.dumps(stats, indent=2))
+    elif args.command == "list":
+        for run in store.list_runs(workflow_id=args.workflow, limit=args.limit):
+            print(f"{run.saved_at:<26} {run.workflow_id} {run.run_id} {run.topic[:60]}")
+    elif args.command == "show":
+        result = store.load_run(args.workflow_id, args.run_id)
+        if result is None:
+            print(f"❌ Run {args.workflow_id} {args.run_id or ''} v úložišti není")
+            sys.exit(1)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
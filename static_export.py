@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+📦 STATIC EXPORT DOKONČENÝCH RUNŮ PROJEKTU
+==========================================
+
+Hromadný export všech dokončených runů projektu do statického bundle:
+    <out>/<slug>/index.html   (+ .gz, .br)  - stránka článku
+    <out>/feed.json, feed.xml (+ .gz, .br)  - JSON Feed 1.1 a RSS 2.0
+    <out>/sitemap.xml         (+ .gz, .br)  - sitemap (nad 50 000 URL index + sitemap-<n>.xml)
+
+- runy se z DB čtou po dávkách (stream), v paměti je jen rozpracovaná dávka
+- mapování stage_logs -> PublishInput -> ArticleIR -> HTML a komprese běží
+  v process poolu (PublishProcessPool), event loop jen zapisuje soubory
+- inkrementální rebuild - manifest (.export-manifest.json) drží hash uloženého
+  výsledku každého runu; znovu se renderují jen nové a změněné runy, stránky
+  smazaných runů se z bundle odstraní
+- předkomprimované varianty pro statický hosting (gzip deterministicky bez mtime,
+  brotli jen pokud je nainstalovaný balíček brotli)
+- slug z SEO výstupu se převádí na [a-z0-9-] a bundle se zapisuje jen pod
+  nastavený out_dir (i --out je podadresář out_dir)
+- více runů se stejným slugem - stránku zapíše jen nejnovější run (pořadí finishedAt)
+- do jednoho bundle běží vždy jen jeden export (flock na <out>/.export.lock, i mezi
+  API a CLI) - souběžný export skončí ExportInProgressError (API vrací 409)
+
+Konfigurace přes ENV STATIC_EXPORT (JSON):
+STATIC_EXPORT='{"out_dir": "static_export", "base_url": "https://seofarm.ai", "batch_size": 50, "workers": 0, "api_workers": 2}'
+    workers      - procesy poolu pro CLI export (0 = počet CPU)
+    api_workers  - procesy poolu pro export spuštěný z API (API proces nesmí zabrat všechna jádra)
+
+POUŽITÍ:
+    python static_export.py --project <project_id> [--out PODADRESÁŘ] [--base-url URL] [--full]
+"""
+
+import argparse
+import asyncio
+import fcntl
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field, replace
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from activities.publish_pool import PublishPoolSettings, PublishProcessPool
+from activities.publish_script import (
+    PublishFAQ,
+    PublishInput,
+    PublishMeta,
+    PublishVisual,
+    compile_article,
+    generate_slug,
+    render_html,
+)
+from config import load_env_settings
+from helpers.article_index import (
+    ArticleIndexEntry,
+    entry_from_publish_input,
+    render_json_feed,
+    render_rss,
+    render_sitemap_files,
+)
+from helpers.atomic_write import write_atomic
+from helpers.transformers import pipeline_components_from_stage_logs, transform_to_PublishInput
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Zvyšte při změně šablon stránky nebo feed položky - vynutí rebuild všech stránek
+STATIC_EXPORT_VERSION = 2
+MANIFEST_NAME = ".export-manifest.json"
+LOCK_NAME = ".export.lock"
+COMPRESSED_SUFFIXES = (".gz", ".br")
+SLUG_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+@dataclass
+class StaticExportSettings:
+    """Nastavení static exportu."""
+    out_dir: str = "static_export"
+    base_url: str = "https://seofarm.ai"
+    batch_size: int = 50
+    workers: int = 0  # 0 = počet CPU
+    api_workers: int = 2  # pool exportu spuštěného z API
+
+
+def _validate_settings(settings: StaticExportSettings) -> None:
+    if settings.batch_size < 1 or settings.workers < 0 or settings.api_workers < 1:
+        raise ValueError("batch_size a api_workers musí být kladné a workers nezáporný")
+
+
+def load_static_export_settings() -> StaticExportSettings:
+    """Nastavení z ENV STATIC_EXPORT."""
+    return load_env_settings("STATIC_EXPORT", StaticExportSettings, _validate_settings)
+
+
+@dataclass
+class RunRecord:
+    """Dokončený run tak, jak je uložený v DB (resultJson se parsuje až v poolu)."""
+    id: str
+    topic: str
+    finished_at: Optional[str]
+    result_json: str
+
+
+@dataclass
+class ExportSummary:
+    """Výsledek jednoho exportu."""
+    out_dir: str
+    pages: int = 0
+    rendered: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    brotli: bool = BROTLI_AVAILABLE
+    duration_seconds: float = 0.0
+
+
+# ===== ZDROJ RUNŮ =====
+
+async def iter_completed_runs(prisma, project_id: str, batch_size: int = 50) -> AsyncIterator[RunRecord]:
+    """Streamuje dokončené runy projektu z DB po dávkách (nejstarší první)."""
+    skip = 0
+    while True:
+        runs = await prisma.workflowrun.find_many(
+            where={"projectId": project_id, "status": "COMPLETED"},
+            order={"finishedAt": "asc"},
+            skip=skip,
+            take=batch_size
+        )
+        for run in runs:
+            if run.resultJson:
+                yield RunRecord(
+                    id=run.id,
+                    topic=run.topic,
+                    finished_at=run.finishedAt.isoformat() if run.finishedAt else None,
+                    result_json=run.resultJson
+                )
+        if len(runs) < batch_size:
+            return
+        skip += batch_size
+
+
+def run_content_hash(run: RunRecord) -> str:
+    """Hash uloženého výsledku runu - změna výsledku (retry, oprava) = nový render."""
+    digest = hashlib.sha256(f"{STATIC_EXPORT_VERSION}\0{run.finished_at}\0".encode("utf-8"))
+    digest.update(run.result_json.encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ===== RENDER (běží v procesu poolu) =====
+
+def _compress(data: bytes) -> Dict[str, bytes]:
+    """Předkomprimované varianty - gzip s mtime=0, aby stejný obsah dal stejné bajty."""
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if BROTLI_AVAILABLE:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def _publish_input_from_dict(data: Dict[str, Any]) -> PublishInput:
+    meta = data["meta"]
+    return PublishInput(
+        title=data["title"],
+        meta=PublishMeta(description=meta["description"], keywords=meta["keywords"], canonical=meta.get("canonical", "")),
+        content_html=data["content_html"],
+        faq=[PublishFAQ(question=f["question"], answer_html=f["answer_html"]) for f in data["faq"]],
+        visuals=[PublishVisual(image_url=v["image_url"], prompt=v["prompt"], alt=v["alt"], position=v["position"],
+                               srcset=v.get("srcset"), width=v.get("width"), height=v.get("height"),
+                               sources=v.get("sources"))
+                 for v in data["visuals"]],
+        schema_org=data["schema_org"],
+        format=data["format"],
+        language=data["language"],
+        date_published=data["date_published"]
+    )
+
+
+def render_run_page(run: RunRecord) -> Dict[str, Any]:
+    """
+    Stránka a feed položka jednoho runu.
+
+    Returns:
+        {"slug", "files": {přípona: bajty}, "item": řádek indexu článků (ArticleIndexEntry jako dict)}
+
+    Raises:
+        ValueError: Run nemá data potřebná pro publish (strict transform)
+    """
+    result = json.loads(run.result_json)
+    stage_logs = result.get("stage_logs") or (result.get("result") or {}).get("stage_logs")
+    if not stage_logs:
+        raise ValueError("❌ Run nemá stage_logs")
+
+    components = pipeline_components_from_stage_logs(stage_logs)
+    components["current_date"] = run.finished_at or "1970-01-01T00:00:00Z"
+    publish_input = transform_to_PublishInput(components)
+    # Slug je výstup LLM - do cesty v bundle jde jen [a-z0-9-]
+    slug = generate_slug(publish_input["meta"]["slug"])
+    if not SLUG_PATTERN.fullmatch(slug):
+        raise ValueError(f"❌ Slug '{publish_input['meta']['slug'][:100]}' nelze převést na [a-z0-9-]")
+    publish_input["meta"]["slug"] = slug
+    html = render_html(compile_article(_publish_input_from_dict(publish_input))).encode("utf-8")
+
+    files = {"": html}
+    files.update(_compress(html))
+    return {
+        "slug": slug,
+        "files": files,
+        "item": asdict(entry_from_publish_input(publish_input)),
+    }
+
+
+# ===== ZÁPIS BUNDLE =====
+
+def _write_variants(path: str, files: Dict[str, bytes]) -> None:
+    for suffix, data in files.items():
+        write_atomic(path + suffix, data)
+    # Stará .br varianta by po odinstalování brotli servírovala zastaralý obsah
+    for suffix in COMPRESSED_SUFFIXES:
+        if suffix not in files and os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _page_dir(out_dir: str, slug: str) -> str:
+    if not SLUG_PATTERN.fullmatch(slug):
+        raise ValueError(f"❌ Neplatný slug stránky: '{slug[:100]}'")
+    return os.path.join(out_dir, slug)
+
+
+def _remove_page(out_dir: str, slug: str) -> None:
+    page_dir = _page_dir(out_dir, slug)
+    for suffix in ("",) + COMPRESSED_SUFFIXES:
+        path = os.path.join(page_dir, "index.html" + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.isdir(page_dir) and not os.listdir(page_dir):
+        os.rmdir(page_dir)
+
+
+def _page_path(out_dir: str, slug: str) -> str:
+    return os.path.join(_page_dir(out_dir, slug), "index.html")
+
+
+def confined_out_dir(root: str, out_dir: str) -> str:
+    """Cílový adresář bundle jako podadresář root (po realpath - ani symlink nesmí ven)."""
+    root_path = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root_path, out_dir))
+    if path == root_path or os.path.commonpath([root_path, path]) != root_path:
+        raise ValueError(f"❌ Adresář exportu '{out_dir}' není podadresářem {root}")
+    return path
+
+
+def _page_url(base_url: str, slug: str) -> str:
+    return f"{base_url.rstrip('/')}/{slug}/"
+
+
+def _feed_entries(entries: List[Dict[str, Any]], base_url: str) -> List[ArticleIndexEntry]:
+    """Řádky indexu s URL stránek bundle (canonical ze SEO může mířit jinam), nejnovější první."""
+    items = [replace(ArticleIndexEntry(**entry["item"]), canonical=_page_url(base_url, entry["slug"])) for entry in entries]
+    return sorted(items, key=lambda item: item.date_published, reverse=True)
+
+
+class ExportInProgressError(Exception):
+    """Do stejného bundle už běží jiný export."""
+
+
+@contextmanager
+def export_lock(out_dir: str):
+    """Exkluzivní zámek bundle - flock platí napříč procesy a uvolní se i při pádu procesu."""
+    os.makedirs(out_dir, exist_ok=True)
+    fd = os.open(os.path.join(out_dir, LOCK_NAME), os.O_CREAT | os.O_RDWR)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise ExportInProgressError(f"❌ Export do {out_dir} už běží")
+        yield
+    finally:
+        os.close(fd)
+
+
+def _load_manifest(out_dir: str) -> Dict[str, Dict[str, Any]]:
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError:
+        logger.warning(f"⚠️ Poškozený manifest {path} - provádím plný rebuild")
+        return {}
+    if manifest.get("version") != STATIC_EXPORT_VERSION:
+        return {}
+    # Záznamy se slugem mimo [a-z0-9-] (ruční zásah) se vyrenderují znovu
+    return {run_id: entry for run_id, entry in manifest.get("runs", {}).items()
+            if SLUG_PATTERN.fullmatch(str(entry.get("slug", "")))}
+
+
+# ===== EXPORT =====
+
+async def _enumerate(runs: AsyncIterator[RunRecord]) -> AsyncIterator[Tuple[int, RunRecord]]:
+    seq = 0
+    async for run in runs:
+        yield seq, run
+        seq += 1
+
+
+class StaticSiteExporter:
+    """Inkrementální export runů do statického bundle přes process pool."""
+
+    def __init__(self, out_dir: str, base_url: str, title: str = "SEO Farm",
+                 pool: Optional[PublishProcessPool] = None, settings: Optional[StaticExportSettings] = None):
+        self.settings = settings or load_static_export_settings()
+        self.out_dir = out_dir
+        self.base_url = base_url
+        self.title = title
+        self.pool = pool or PublishProcessPool(PublishPoolSettings(workers=self.settings.workers))
+        # slug -> (pořadí ve streamu, run), jehož stránka v bundle platí - runy jdou od nejstaršího
+        self._claims: Dict[str, Tuple[int, str]] = {}
+        self._slug_locks: Dict[str, asyncio.Lock] = {}
+
+    async def export(self, runs: AsyncIterator[RunRecord], full: bool = False) -> ExportSummary:
+        """Vyrenderuje nové/změněné runy, odstraní smazané a přepíše feed a sitemap."""
+        started = time.perf_counter()
+        summary = ExportSummary(out_dir=self.out_dir)
+        previous = {} if full else _load_manifest(self.out_dir)
+        current: Dict[str, Dict[str, Any]] = {}
+        pending: Set[asyncio.Task] = set()
+        # Rozpracovaných renderů nejvýš tolik, kolik pojme pool - zbytek streamu čeká v DB
+        limit = self.pool.workers + self.pool.settings.max_queue
+        self._claims, self._slug_locks = {}, {}
+
+        async for seq, run in _enumerate(runs):
+            content_hash = run_content_hash(run)
+            entry = previous.get(run.id)
+            # Beze změny, pokud stránku slugu mezitím nepřepsal starší run
+            if (entry and entry["hash"] == content_hash and entry["slug"] not in self._claims
+                    and os.path.exists(_page_path(self.out_dir, entry["slug"]))):
+                self._claims[entry["slug"]] = (seq, run.id)
+                current[run.id] = entry
+                summary.unchanged += 1
+                continue
+            pending.add(asyncio.create_task(self._render(seq, run, content_hash, previous, current, summary)))
+            if len(pending) >= limit:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()
+        if pending:
+            await asyncio.gather(*pending)
+
+        # Stránky runů, které už v projektu nejsou (nebo změnily slug)
+        live_slugs = {entry["slug"] for entry in current.values()}
+        for run_id, entry in previous.items():
+            if run_id not in current:
+                summary.removed += 1
+            if entry["slug"] not in live_slugs:
+                await asyncio.to_thread(_remove_page, self.out_dir, entry["slug"])
+                live_slugs.add(entry["slug"])  # smazat jen jednou
+
+        # Více runů se stejným slugem (opakovaný článek) - ve feedu a sitemap ten, jehož stránka je v bundle
+        latest = {slug: current[run_id] for slug, (_, run_id) in self._claims.items()}
+        for entry in current.values():
+            if entry["slug"] not in latest:  # run, který nejde vyrenderovat, drží dřívější stránku
+                latest[entry["slug"]] = entry
+        entries = list(latest.values())
+        items = _feed_entries(entries, self.base_url)
+        documents = {"feed.json": render_json_feed(items, self.base_url, self.title),
+                     "feed.xml": render_rss(items, self.base_url, self.title)}
+        documents.update(render_sitemap_files(items, self.base_url))
+        manifest = json.dumps({"version": STATIC_EXPORT_VERSION, "runs": current}, ensure_ascii=False).encode("utf-8")
+        await asyncio.to_thread(self._write_index, documents, manifest)
+
+        summary.pages = len(entries)
+        summary.duration_seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"📦 Static export {self.out_dir}: {summary.rendered} vyrenderováno, {summary.unchanged} beze změny, "
+                    f"{summary.removed} odstraněno, {len(summary.failed)} chyb ({summary.duration_seconds}s)")
+        if not BROTLI_AVAILABLE:
+            logger.warning("⚠️ Balíček brotli není nainstalovaný - .br varianty se nevytváří")
+        return summary
+
+    async def _render(self, seq: int, run: RunRecord, content_hash: str, previous: Dict[str, Dict[str, Any]],
+                      current: Dict[str, Dict[str, Any]], summary: ExportSummary) -> None:
+        try:
+            page = await self.pool.run(render_run_page, run)
+        except Exception as e:
+            summary.failed[run.id] = str(e)
+            logger.warning(f"⚠️ Run {run.id} nelze exportovat: {e}")
+            # Dřív exportovaná verze zůstává, dokud run nejde znovu vyrenderovat
+            if run.id in previous:
+                current[run.id] = previous[run.id]
+            return
+        current[run.id] = {"hash": content_hash, "slug": page["slug"], "item": page["item"]}
+        summary.rendered += 1
+        # Runy se stejným slugem se renderují souběžně - stránku zapíše jen nejnovější z nich
+        slug = page["slug"]
+        async with self._slug_locks.setdefault(slug, asyncio.Lock()):
+            if slug in self._claims and self._claims[slug][0] > seq:
+                return
+            self._claims[slug] = (seq, run.id)
+            await asyncio.to_thread(_write_variants, _page_path(self.out_dir, slug), page["files"])
+
+    def _write_index(self, documents: Dict[str, bytes], manifest: bytes) -> None:
+        for name, data in documents.items():
+            files = {"": data}
+            files.update(_compress(data))
+            _write_variants(os.path.join(self.out_dir, name), files)
+        # Shardy sitemap z dřívějšího (většího) exportu
+        for path in glob.glob(os.path.join(self.out_dir, "sitemap-*.xml")):
+            if os.path.basename(path) not in documents:
+                for suffix in ("",) + COMPRESSED_SUFFIXES:
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+        # Manifest až nakonec - přerušený export se příště dorenderuje
+        write_atomic(os.path.join(self.out_dir, MANIFEST_NAME), manifest)
+
+
+async def export_project(prisma, project_id: str, out_dir: Optional[str] = None, base_url: Optional[str] = None,
+                         full: bool = False, workers: Optional[int] = None) -> ExportSummary:
+    """
+    Export dokončených runů projektu z DB.
+
+    Args:
+        out_dir: Podadresář nastaveného out_dir (výchozí slug projektu); cesta mimo out_dir je chyba
+        workers: Velikost process poolu (výchozí settings.workers)
+
+    Raises:
+        ExportInProgressError: Do stejného bundle už běží jiný export
+    """
+    settings = load_static_export_settings()
+    project = await prisma.project.find_unique(where={"id": project_id})
+    if not project:
+        raise ValueError(f"❌ Projekt {project_id} neexistuje")
+
+    target = confined_out_dir(settings.out_dir, out_dir or project.slug)
+    with export_lock(target):
+        exporter = StaticSiteExporter(
+            out_dir=target,
+            base_url=base_url or settings.base_url,
+            title=project.name,
+            pool=PublishProcessPool(PublishPoolSettings(workers=workers or settings.workers)),
+            settings=settings
+        )
+        try:
+            await exporter.pool.start()
+            return await exporter.export(iter_completed_runs(prisma, project_id, settings.batch_size), full=full)
+        finally:
+            exporter.pool.shutdown()
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Static export dokončených runů projektu")
+    parser.add_argument("--project", required=True, help="ID projektu")
+    parser.add_argument("--out", help="Podadresář out_dir pro bundle (výchozí slug projektu)")
+    parser.add_argument("--base-url", help="Veřejná URL webu pro feed a sitemap")
+    parser.add_argument("--full", action="store_true", help="Ignorovat manifest a vyrenderovat vše znovu")
+    args = parser.parse_args(argv)
+
+    from prisma import Prisma
+
+    prisma = Prisma()
+    await prisma.connect()
+    try:
+        summary = await export_project(prisma, args.project, args.out, args.base_url, args.full)
+    finally:
+        await prisma.disconnect()
+    print(json.dumps(asdict(summary), ensure_ascii=False, indent=2))
+    return 1 if summary.failed and not summary.pages else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST INDEXU PUBLIKOVANÝCH ČLÁNKŮ
+Ověřuje inkrementální upsert článků (revize jen při změně), oddělení projektů,
+shardování sitemap nad limitem URL a per-projektové sitemap/RSS/JSON feed endpointy
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from helpers import article_index
+from helpers.article_index import (
+    ArticleIndex,
+    ArticleIndexEntry,
+    ArticleIndexSettings,
+    entry_from_publish_input,
+    load_article_index_settings,
+    render_sitemap_files,
+)
+
+PUBLISH_INPUT = {
+    "title": "ETF pro začátečníky",
+    "summary": "Jak začít s ETF.",
+    "meta": {"title": "ETF pro začátečníky", "description": "Jak začít s ETF.", "slug": "etf-zacatecnici",
+             "keywords": ["etf", "investice"], "canonical": ""},
+    "content_html": "<article><h2>Co je ETF</h2></article>",
+    "faq": [], "visuals": [], "schema_org": {}, "format": "html", "language": "cs",
+    "date_published": "2025-08-05T10:00:00Z",
+}
+
+
+def _entry(slug, day, content_hash="h", project_id="p1"):
+    return ArticleIndexEntry(slug=slug, language="cs", canonical="", title=slug.title(), summary=f"O {slug}",
+                             date_published=f"2025-08-{day:02d}T10:00:00Z", content_hash=content_hash,
+                             project_id=project_id)
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("ARTICLE_INDEX", '{"path": "/tmp/index.sqlite3", "shard_size": 1000, "base_urls": {"p1": "https://a.cz"}}')
+    assert load_article_index_settings() == ArticleIndexSettings(path="/tmp/index.sqlite3", shard_size=1000,
+                                                                 base_urls={"p1": "https://a.cz"})
+    for invalid in ('{"shard_size": 60000}', '{"base_urls": {"p1": "/blog"}}', '{"base_url": "https://a.cz"}'):
+        monkeypatch.setenv("ARTICLE_INDEX", invalid)
+        with pytest.raises(ValueError, match="ARTICLE_INDEX"):
+            load_article_index_settings()
+
+
+def test_upsert_changes_revision_only_on_change(tmp_path):
+    index = ArticleIndex(str(tmp_path / "index.sqlite3"))
+    entry = entry_from_publish_input(PUBLISH_INPUT, "p1")
+    assert entry.url("https://seofarm.ai") == "https://seofarm.ai/etf-zacatecnici/"
+    assert index.upsert(entry) is True
+    assert index.upsert(entry_from_publish_input(dict(PUBLISH_INPUT), "p1")) is False
+    assert index.revision("p1") == 1
+
+    changed = entry_from_publish_input({**PUBLISH_INPUT, "content_html": "<article><h2>Poplatky</h2></article>"}, "p1")
+    assert changed.content_hash != entry.content_hash
+    assert index.upsert(changed) is True
+    assert (index.revision("p1"), index.count("p1")) == (2, 1)
+    assert index.latest("p1", 10) == [changed]
+
+
+def test_projects_with_same_slug_are_separate(tmp_path):
+    index = ArticleIndex(str(tmp_path / "index.sqlite3"))
+    assert index.upsert(entry_from_publish_input(PUBLISH_INPUT, "p1")) is True
+    other = entry_from_publish_input({**PUBLISH_INPUT, "title": "ETF v jiném projektu"}, "p2")
+    assert index.upsert(other) is True
+    assert (index.count("p1"), index.count("p2")) == (1, 1)
+    assert index.latest("p2", 10) == [other]
+    assert index.latest("p1", 10)[0].title == "ETF pro začátečníky"
+    # Publish v jednom projektu nezneplatní cache druhého
+    assert (index.revision("p1"), index.revision("p2"), index.revision("p3")) == (1, 1, 0)
+
+
+def test_index_without_projects_is_recreated(tmp_path):
+    path = tmp_path / "index.sqlite3"
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE articles (slug TEXT NOT NULL, language TEXT NOT NULL, PRIMARY KEY (slug, language))")
+        conn.execute("INSERT INTO articles VALUES ('etf', 'cs')")
+    index = ArticleIndex(str(path))
+    assert index.count("p1") == 0
+    assert index.upsert(_entry("etf", 1)) is True
+
+
+def test_shards_and_sitemap_index(tmp_path):
+    index = ArticleIndex(str(tmp_path / "index.sqlite3"))
+    for day, slug in enumerate(["delta", "alfa", "echo", "bravo", "charlie"], start=1):
+        index.upsert(_entry(slug, day))
+    index.upsert(_entry("aaa", 9, project_id="p2"))
+    assert [e.slug for e in index.shard("p1", 0, 2)] == ["alfa", "bravo"]
+    assert [e.slug for e in index.shard("p1", 2, 2)] == ["echo"]
+    assert index.shard_lastmods("p1", 2) == ["2025-08-04T10:00:00Z", "2025-08-05T10:00:00Z", "2025-08-03T10:00:00Z"]
+    assert [e.slug for e in index.latest("p1", 2)] == ["charlie", "bravo"]
+
+    files = render_sitemap_files(index.latest("p1", 10), "https://seofarm.ai", shard_size=2)
+    assert sorted(files) == ["sitemap-0.xml", "sitemap-1.xml", "sitemap-2.xml", "sitemap.xml"]
+    assert b"<sitemapindex" in files["sitemap.xml"]
+    assert b"<loc>https://seofarm.ai/sitemap-2.xml</loc><lastmod>2025-08-03</lastmod>" in files["sitemap.xml"]
+    assert list(render_sitemap_files(index.latest("p1", 10), "https://seofarm.ai")) == ["sitemap.xml"]
+
+
+def test_endpoints_served_from_index(tmp_path, monkeypatch):
+    """Sitemap a feedy projektu z indexu s jeho base URL; ETag = revize projektu"""
+    from backend.api.routes import feeds
+
+    monkeypatch.setenv("ARTICLE_INDEX", json.dumps({"path": str(tmp_path / "index.sqlite3"), "shard_size": 2,
+                                                    "base_urls": {"p1": "https://etf.cz", "p2": "https://akcie.cz/blog"}}))
+    monkeypatch.setattr(article_index, "_index", None)
+    monkeypatch.setattr(feeds, "_cache", {})
+    index = article_index.get_article_index()
+    index.upsert(_entry("alfa", 1))
+    index.upsert(_entry("dividendy", 1, project_id="p2"))
+    app = FastAPI()
+    app.include_router(feeds.router)
+    client = TestClient(app)
+
+    response = client.get("/api/project/p1/sitemap.xml")
+    assert response.status_code == 200 and b"<loc>https://etf.cz/alfa/</loc>" in response.content
+    assert b"dividendy" not in response.content
+    assert client.get("/api/project/p1/sitemap.xml", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    index.upsert(_entry("bravo", 2))
+    index.upsert(_entry("charlie", 3))
+    response = client.get("/api/project/p1/sitemap.xml")
+    assert b"<loc>http://testserver/api/project/p1/sitemap-1.xml</loc>" in response.content
+    assert b"https://etf.cz/charlie/" in client.get("/api/project/p1/sitemap-1.xml").content
+    assert client.get("/api/project/p1/sitemap-5.xml").status_code == 404
+    # Publish v p1 nezměnil dokumenty p2
+    assert client.get("/api/project/p2/feed.json").json()["items"][0]["url"] == "https://akcie.cz/blog/dividendy/"
+    # Projekt bez veřejné URL nemá sitemap ani feed
+    assert client.get("/api/project/p3/sitemap.xml").status_code == 404
+
+    feed = client.get("/api/project/p1/feed.json").json()
+    assert [item["url"] for item in feed["items"]] == ["https://etf.cz/charlie/", "https://etf.cz/bravo/",
+                                                       "https://etf.cz/alfa/"]
+    rss = client.get("/api/project/p1/feed.xml")
+    assert rss.headers["content-type"].startswith("application/rss+xml")
+    assert b"<pubDate>Sun, 03 Aug 2025 10:00:00 +0000</pubDate>" in rss.content
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST CHECKPOINT STORE
+Ověřuje ukládání checkpointů stage, jejich znovupoužití podle input hashe a úklid starých runů
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from helpers.checkpoint_store import (
+    compute_input_hash,
+    find_reusable_checkpoint,
+    load_checkpoints,
+    prune_checkpoints,
+    save_checkpoint,
+)
+
+ASSISTANT = {
+    "name": "Draft Assistant",
+    "function_key": "draft_assistant",
+    "system_prompt": "Napiš článek",
+    "model_provider": "openai",
+    "model": "gpt-4o",
+    "temperature": 0.7,
+    "max_tokens": None,
+    "order": 4,
+}
+
+
+def test_input_hash_is_stable_and_sensitive():
+    """Stejný vstup = stejný hash, změna promptu nebo předchozího výstupu hash změní"""
+    previous = {"brief_assistant_output": "brief", "current_output": "brief"}
+    first = compute_input_hash(ASSISTANT, "brief", "1. 8. 2025", previous)
+    assert first == compute_input_hash(dict(ASSISTANT), "brief", "1. 8. 2025", dict(previous))
+
+    changed_prompt = {**ASSISTANT, "system_prompt": "Napiš delší článek"}
+    assert first != compute_input_hash(changed_prompt, "brief", "1. 8. 2025", previous)
+    assert first != compute_input_hash(ASSISTANT, "brief", "1. 8. 2025", {**previous, "brief_assistant_output": "jiný brief"})
+
+
+def test_save_and_load_checkpoints(tmp_path):
+    """Checkpoint se uloží pod (run, stage) a načte zpět podle function_key"""
+    base_dir = str(tmp_path)
+    input_hash = compute_input_hash(ASSISTANT, "brief", None, {})
+    save_checkpoint("assistant_pipeline_test_abc", "run-1", {
+        "stage": "Draft Assistant",
+        "function_key": "draft_assistant",
+        "order": 4,
+        "input_hash": input_hash,
+        "output": "Hotový draft",
+        "metadata": {"tokens": 10},
+    }, base_dir=base_dir)
+
+    checkpoints = load_checkpoints("assistant_pipeline_test_abc", "run-1", base_dir=base_dir)
+    assert list(checkpoints.keys()) == ["draft_assistant"]
+    assert checkpoints["draft_assistant"]["output"] == "Hotový draft"
+    assert load_checkpoints("assistant_pipeline_test_abc", "run-2", base_dir=base_dir) == {}
+
+
+def test_checkpoint_reused_only_for_matching_hash(tmp_path):
+    """Checkpoint s jiným input hashem se znovu nepoužije"""
+    checkpoints = {"draft_assistant": {"function_key": "draft_assistant", "input_hash": "aaa", "output": "x"}}
+    assert find_reusable_checkpoint(checkpoints, "draft_assistant", "aaa")["output"] == "x"
+    assert find_reusable_checkpoint(checkpoints, "draft_assistant", "bbb") is None
+    assert find_reusable_checkpoint(checkpoints, "seo_assistant", "aaa") is None
+
+
+def test_prune_removes_only_old_runs(tmp_path):
+    """gc smaže checkpointy runů bez zápisu déle než max_age_days"""
+    base_dir = str(tmp_path)
+    checkpoint = {"function_key": "draft_assistant", "order": 4, "input_hash": "aaa", "output": "x"}
+    old_path = save_checkpoint("wf-old", "run-1", checkpoint, base_dir=base_dir)
+    save_checkpoint("wf-new", "run-1", checkpoint, base_dir=base_dir)
+    past = time.time() - 40 * 86400
+    os.utime(old_path, (past, past))
+
+    assert prune_checkpoints(30, base_dir=base_dir) == 1
+    assert load_checkpoints("wf-old", "run-1", base_dir=base_dir) == {}
+    assert list(load_checkpoints("wf-new", "run-1", base_dir=base_dir)) == ["draft_assistant"]
+    assert sorted(os.listdir(base_dir)) == ["wf-new"]
+
+
+if __name__ == "__main__":
+    import pytest
+    pytest.main([__file__, "-v"])
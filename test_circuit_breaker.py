@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST CIRCUIT BREAKERU LLM PROVIDERŮ
+Ověřuje otevření při chybovosti/pomalých voláních, half-open probe a fallback v safe_llm_call
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from backend.llm_clients import circuit_breaker as circuit_breaker_module
+from backend.llm_clients.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitBreakerSettings,
+    CircuitOpenError,
+    load_breaker_settings,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(**overrides):
+    clock = FakeClock()
+    settings = CircuitBreakerSettings(**dict(dict(min_calls=4, consecutive_failures=3, open_seconds=30), **overrides))
+    return CircuitBreaker("claude", settings, clock=clock), clock
+
+
+def test_opens_after_consecutive_failures():
+    """Tři chyby za sebou otevřou breaker hned"""
+    breaker, _ = _breaker()
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure(1.0)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_opens_on_failure_rate():
+    """Chybovost nad prahem v okně otevře breaker i bez chyb za sebou"""
+    breaker, _ = _breaker(consecutive_failures=100)
+    for failed in (False, True, False, True):
+        breaker.record_failure(1.0) if failed else breaker.record_success(1.0)
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_count_toward_failure_rate():
+    """Pomalé úspěšné odpovědi zvyšují chybovost okna, ale nejsou chybami za sebou"""
+    breaker, _ = _breaker(slow_call_seconds=10)
+    breaker.record_failure(1.0)
+    breaker.record_failure(1.0)
+    breaker.record_success(15.0)  # pomalý úspěch přeruší řadu chyb
+    breaker.record_failure(1.0)
+    assert breaker.snapshot()["failure_rate"] == 1.0
+    assert breaker.state == OPEN  # otevřela ho chybovost okna (4 z 4), ne chyby za sebou
+
+    breaker, _ = _breaker(slow_call_seconds=10)
+    for _ in range(3):
+        breaker.record_success(15.0)
+    assert breaker.state == CLOSED  # pod min_calls se chybovost nevyhodnocuje
+    breaker.record_success(15.0)
+    assert breaker.state == OPEN
+
+
+def test_slow_call_threshold_per_stage():
+    """Reasoning stage má vlastní práh pomalého volání"""
+    breaker, _ = _breaker(slow_call_seconds=10, slow_call_stages={"brief_assistant": 120})
+    for _ in range(4):
+        breaker.record_success(60.0, stage="brief_assistant")
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["failure_rate"] == 0.0
+    breaker.record_success(60.0, stage="qa_assistant")
+    assert breaker.snapshot()["failure_rate"] == pytest.approx(0.2)
+
+
+def test_old_failures_leave_window():
+    """Chyby starší než okno se nezapočítávají"""
+    breaker, clock = _breaker(consecutive_failures=100, window_seconds=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 120
+    breaker.record_success(1.0)
+    breaker.record_success(1.0)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["failure_rate"] == 0.0
+
+
+def test_half_open_single_probe_closes_on_success():
+    """Po open_seconds projde jediné zkušební volání, úspěch breaker zavře"""
+    breaker, clock = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # druhý probe nepustí
+    breaker.record_success(2.0)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_half_open_failure_reopens():
+    """Selhání zkušebního volání breaker znovu otevře na celou dobu"""
+    breaker, clock = _breaker()
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_in() == pytest.approx(30)
+
+
+def test_state_change_listener():
+    """Přechody se hlásí listeneru (metriky)"""
+    transitions = []
+    breaker = CircuitBreaker("gemini", CircuitBreakerSettings(consecutive_failures=1),
+                             on_state_change=lambda b, old, new: transitions.append((old, new)))
+    breaker.record_failure()
+    assert transitions == [(CLOSED, OPEN)]
+
+
+def test_settings_from_env(monkeypatch):
+    """LLM_CIRCUIT_BREAKER přepíše default i per provider"""
+    monkeypatch.setenv("LLM_CIRCUIT_BREAKER", '{"default": {"open_seconds": 60}, "Claude": {"min_calls": 10, "slow_call_stages": {"brief_assistant": 300}}}')
+    settings = load_breaker_settings()
+    assert settings["default"].open_seconds == 60
+    assert settings["claude"].open_seconds == 60
+    assert settings["claude"].min_calls == 10
+    assert settings["claude"].slow_call_threshold("brief_assistant") == 300
+    assert settings["claude"].slow_call_threshold("qa_assistant") == settings["claude"].slow_call_seconds
+
+
+@pytest.fixture
+def fresh_breakers(monkeypatch, tmp_path):
+    monkeypatch.setattr(circuit_breaker_module, "_breakers", {})
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    monkeypatch.setenv("LLM_CIRCUIT_BREAKER", '{"default": {"consecutive_failures": 2, "open_seconds": 600}}')
+
+
+def _run(coro_factory):
+    async def call():
+        return await coro_factory()
+    return asyncio.run(ActivityEnvironment().run(call))
+
+
+def test_safe_llm_call_fails_fast_when_open(fresh_breakers):
+    """Bez fallbacku otevřený breaker odmítne volání bez kontaktu s API"""
+    from activity_wrappers import safe_llm_call
+
+    breaker = circuit_breaker_module.get_circuit_breaker("claude")
+    breaker.record_failure()
+    breaker.record_failure()
+    calls = []
+
+    async def chat_completion(**kwargs):
+        calls.append(kwargs)
+        return {"content": "ok"}
+
+    with pytest.raises(CircuitOpenError):
+        _run(lambda: safe_llm_call(chat_completion, "claude", "claude-3-5-haiku-20241022",
+                                   system_prompt="s", user_message="u", max_tokens=100))
+    assert calls == []
+
+
+def test_safe_llm_call_routes_to_fallback(fresh_breakers, monkeypatch):
+    """Po otevření breakeru jde další pokus rovnou na fallback provider/model"""
+    from activity_wrappers import safe_llm_call
+    from backend.llm_clients.factory import LLMClientFactory
+
+    fallback_calls = []
+
+    class FallbackClient:
+        async def chat_completion(self, **kwargs):
+            fallback_calls.append(kwargs["model"])
+            return {"content": "z fallbacku", "usage": {}}
+
+    monkeypatch.setattr(LLMClientFactory, "create_client", staticmethod(lambda provider: FallbackClient()))
+
+    async def chat_completion(**kwargs):
+        raise Exception("503 Service Unavailable")
+
+    result = _run(lambda: safe_llm_call(chat_completion, "claude", "claude-3-5-haiku-20241022",
+                                        max_retries=3, fallback_provider="openai", fallback_model="gpt-4o",
+                                        system_prompt="s", user_message="u", max_tokens=100))
+    assert result["content"] == "z fallbacku"
+    assert result["fallback"] == {"provider": "openai", "model": "gpt-4o"}
+    assert fallback_calls == ["gpt-4o"]
+    assert circuit_breaker_module.get_circuit_breaker("claude").state == OPEN
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
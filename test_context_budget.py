@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST TOKENOVÉHO ROZPOČTU KONTEXTU
+Ověřuje odhad tokenů, rozdělení rozpočtu podle priority, deduplikaci mezi stage a krácení vstupů
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from helpers.context_budget import (
+    ContextBudgetPolicy,
+    ContextSource,
+    allocate_budget,
+    budget_context,
+    compress_text,
+    context_window,
+    count_tokens,
+    load_context_policies,
+)
+
+PARAGRAPH = ("Investice do ETF fondů patří mezi nejlevnější způsoby, jak dlouhodobě zhodnotit úspory. "
+             "Poplatky jsou nízké a diverzifikace široká. Vyplatí se hlavně pravidelné investování.")
+
+
+def article(sections, prefix="Sekce"):
+    return "\n\n".join(f"## {prefix} {i}\n\n{PARAGRAPH} ({prefix} {i})" for i in range(sections))
+
+
+def test_token_estimate_and_context_windows():
+    """Čeština s diakritikou je hustší než angličtina; kontextové okno podle prefixu modelu"""
+    assert count_tokens("") == 0
+    czech, english = "Příliš žluťoučký kůň úpěl ďábelské ódy.", "The quick brown fox jumps over the lazy dog."
+    assert count_tokens(czech) / len(czech) > count_tokens(english) / len(english)
+    assert context_window("claude-3-5-haiku-20241022") == 200_000
+    assert context_window("gpt-4o-mini") == 128_000
+    assert context_window("gpt-4") == 8_192
+    assert context_window("neznámý-model") == 32_000
+
+
+def test_allocation_by_priority():
+    """Malé zdroje dostanou vše, zbytek se dělí podle priority; bez minima se vynechá nejnižší priorita"""
+    assert allocate_budget([(1, 100), (2, 5000), (3, 5000)], 3000) == [100, 1740, 1160]
+    assert allocate_budget([(1, 500), (2, 500)], 2000) == [500, 500]
+    assert allocate_budget([(1, 5000), (5, 5000)], 1000, min_tokens=200) == [1000, 0]
+
+
+def test_deduplicates_content_repeated_across_stages():
+    """Draft shodný s humanizerem se neposílá dvakrát - ponechá se zdroj s vyšší prioritou"""
+    humanized = article(4)
+    budget = budget_context(
+        [
+            ContextSource("draft_assistant_output", "Draft Assistant", humanized, priority=5),
+            ContextSource("humanizer_assistant_output", "Humanizer Assistant", humanized, priority=1),
+        ],
+        model="claude-3-5-haiku-20241022"
+    )
+    draft, final = budget.sources
+    assert draft.mode == "duplicate" and "Humanizer Assistant" in draft.text
+    assert final.mode == "full" and final.text == humanized
+    assert draft.tokens < draft.original_tokens / 10
+
+
+def test_low_priority_inputs_are_compressed_high_priority_truncated():
+    """Nad rozpočtem - nízká priorita extraktivně (nadpisy + první věty), nejvyšší ořezem na odstavci"""
+    policy = ContextBudgetPolicy(max_input_tokens=1800, min_source_tokens=50)
+    budget = budget_context(
+        [
+            ContextSource("research_assistant_output", "Research Assistant", article(12, "Výzkum"), priority=4),
+            ContextSource("humanizer_assistant_output", "Humanizer Assistant", article(20, "Článek"), priority=1),
+            ContextSource("seo_assistant_output", "SEO Assistant", '{"title": "ETF"}', priority=2),
+        ],
+        model="gpt-4o",
+        policy=policy
+    )
+    research, final, seo = budget.sources
+    assert budget.used <= budget.budget
+    assert research.mode == "compressed"
+    # Extraktivní zkrácení pokryje víc sekcí než prostý ořez stejného rozpočtu (~4 sekce)
+    assert research.text.count("## Výzkum") > 6 and "Poplatky jsou nízké" not in research.text
+    assert final.mode == "truncated" and final.text.startswith("## Článek 0\n\n" + PARAGRAPH)
+    assert seo.mode == "full"
+    assert final.tokens > research.tokens  # vyšší priorita dostala větší příděl
+
+
+def test_budget_respects_small_context_window():
+    """Rozpočet se řídí kontextovým oknem modelu po odečtení system promptu a rezervy na výstup"""
+    budget = budget_context(
+        [ContextSource("humanizer_assistant_output", "Humanizer Assistant", article(200), priority=1)],
+        model="gpt-4",
+        system_prompt="Jsi QA. " * 500,
+        max_output_tokens=2000,
+        policy=ContextBudgetPolicy(max_input_tokens=50_000)
+    )
+    assert budget.budget < 8_192 - 2000 - count_tokens("Jsi QA. " * 500)
+    assert budget.used <= budget.budget
+
+
+def test_compress_structured_output_is_truncated_only():
+    text = "```json\n" + ",\n".join(f'"k{i}": "{PARAGRAPH}"' for i in range(30)) + "\n```"
+    compressed, mode = compress_text(text, 300)
+    assert mode == "truncated" and compressed.startswith("```json")
+
+
+def test_policies_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_BUDGET", '{"qa_assistant": {"max_input_tokens": 16000}, '
+                                             '"seo_assistant": {"sources": ["brief_assistant_output"]}}')
+    policies = load_context_policies()
+    assert policies["qa_assistant"].max_input_tokens == 16000
+    assert policies["seo_assistant"].sources == ("brief_assistant_output",)
+    monkeypatch.setenv("LLM_CONTEXT_BUDGET", '{"qa_assistant": {"max_tokens": 1}}')
+    with pytest.raises(ValueError):
+        load_context_policies()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
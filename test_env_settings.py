@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST SDÍLENÉHO NAČÍTÁNÍ NASTAVENÍ A ATOMICKÉHO ZÁPISU
+Ověřuje load_env_settings (výchozí hodnoty, neznámé klíče, validace, tuple pole)
+a write_atomic (bez dočasných souborů, práva podle umask)
+"""
+
+import os
+import stat
+import sys
+from dataclasses import dataclass
+from typing import Tuple
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from config import load_env_settings, settings_from_dict
+from helpers.atomic_write import write_atomic, write_json_atomic
+
+
+@dataclass
+class _Settings:
+    enabled: bool = True
+    size: int = 10
+    stages: Tuple[str, ...] = ()
+
+
+def _validate(settings):
+    if settings.size < 1:
+        raise ValueError("size musí být kladný")
+
+
+def test_env_settings(monkeypatch):
+    monkeypatch.delenv("TEST_SETTINGS", raising=False)
+    assert load_env_settings("TEST_SETTINGS", _Settings) == _Settings()
+    monkeypatch.setenv("TEST_SETTINGS", '{"size": 3, "stages": ["draft_assistant"]}')
+    assert load_env_settings("TEST_SETTINGS", _Settings, _validate, tuple_keys=("stages",)) == \
+        _Settings(size=3, stages=("draft_assistant",))
+
+    for raw, error in [('{"sizes": 3}', "neznámé klíče"), ('{"size": 0}', "size musí"), ("[1]", "JSON objekt"),
+                       ('{"stages": "draft"}', "stages musí být seznam"), ("{", "")]:
+        monkeypatch.setenv("TEST_SETTINGS", raw)
+        with pytest.raises(ValueError, match=f"❌ Neplatná konfigurace TEST_SETTINGS: .*{error}"):
+            load_env_settings("TEST_SETTINGS", _Settings, _validate, tuple_keys=("stages",))
+
+
+def test_settings_from_dict_names_the_entry():
+    with pytest.raises(ValueError, match="pro draft_assistant"):
+        settings_from_dict(_Settings, {"x": 1}, where=" pro draft_assistant")
+
+
+def test_write_atomic(tmp_path):
+    path = tmp_path / "a" / "b.json"
+    write_json_atomic(str(path), {"název": "článek"})
+    write_atomic(str(path), "nový".encode("utf-8"))
+    assert path.read_text(encoding="utf-8") == "nový"
+    assert os.listdir(path.parent) == ["b.json"]
+    # Exportované soubory čte web server - práva jako u běžného open(), ne 0600 z mkstemp
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o666 & ~umask
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST HTML REWRITERU NADPISŮ
+Ověřuje jednoprůchodovou náhradu H1-H3 ze SEO asistenta podle pořadí výskytu
+a statistiky (slova, nadpisy) počítané ve stejném průchodu
+"""
+
+import os
+import re
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from activities.publish_script import count_h2_tags, count_words
+from helpers.html_rewriter import ContentStats, content_stats, rewrite_headings
+from helpers.transformers import apply_seo_headings_to_content
+
+ARTICLE = """<article>
+<h1 class="title">Starý titulek</h1>
+<p>Úvod o <b>ETF</b>fondech.</p>
+<h2 id="uvod">Shrnutí</h2><p>První sekce.</p>
+<h2>Shrnutí</h2><p>Druhá sekce.</p>
+<h3>Detail</h3>
+<h2>Shrnutí</h2>
+</article>"""
+
+
+def test_headings_replaced_by_position():
+    """Duplicitní nadpisy - každý výskyt dostane svůj nadpis ze SEO, atributy tagu zůstávají"""
+    html, stats = rewrite_headings(ARTICLE, {"h1": "ETF pro začátečníky", "h2": ["Co je ETF", "Poplatky"], "h3": ["Rizika"]})
+    assert '<h1 class="title">ETF pro začátečníky</h1>' in html
+    assert re.findall(r"<h2[^>]*>(.*?)</h2>", html) == ["Co je ETF", "Poplatky", "Shrnutí"]
+    assert '<h2 id="uvod">Co je ETF</h2>' in html
+    assert "<h3>Rizika</h3>" in html
+    assert (stats.h1_count, stats.h2_count, stats.h3_count) == (1, 3, 1)
+    assert apply_seo_headings_to_content(ARTICLE, {"h2": ["Co je ETF", "Poplatky"]}).count("Shrnutí") == 1
+
+
+def test_stats_match_publish_counters():
+    """Slova přes hranici tagu (<b>ETF</b>fondech) se počítají jako jedno - stejně jako dřív count_words"""
+    stats = content_stats(ARTICLE)
+    assert stats == ContentStats(word_count=11, h1_count=1, h2_count=3, h3_count=1)
+    assert count_words(ARTICLE) == len(re.findall(r"\b\w+\b", re.sub(r"<[^>]+>", "", ARTICLE)))
+    assert count_h2_tags(ARTICLE) == 3
+
+    _, rewritten = rewrite_headings(ARTICLE, {"h1": "Nový dlouhý titulek článku"})
+    assert rewritten.word_count == stats.word_count + 2
+
+
+def test_unclosed_or_missing_headings_left_intact():
+    html = "<h2>Otevřený nadpis<p>text</p>"
+    assert rewrite_headings(html, {"h2": ["Nový"]})[0] == html
+    assert rewrite_headings("<p>Bez nadpisů</p>", {"h1": "Titulek", "h2": ["A"]})[0] == "<p>Bez nadpisů</p>"
+    assert apply_seo_headings_to_content(ARTICLE, {}) == ARTICLE
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
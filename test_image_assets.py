@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST IMAGE ASSET PIPELINE
+Ověřuje stažení obrázků z lokálního serveru, převod na WebP/AVIF varianty se srcset,
+přeskočení již převedeného obrázku, doplnění assetů do vizuálů a <picture> v HTML
+a že se <img src> vyrenderovaného článku skutečně stáhne (asset host i původní URL)
+"""
+
+import asyncio
+import functools
+import io
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import replace
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.getcwd())
+
+import httpx
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+from activities import image_assets
+from activities.image_assets import (
+    ImageAssetPipeline,
+    ImageAssetSettings,
+    extract_image_urls,
+    image_assets_activity,
+    load_image_asset_settings,
+)
+from activities.publish_pool import PublishPoolSettings, PublishProcessPool
+from activities.publish_script import PublishInput, PublishMeta, PublishVisual, generate_html_output
+from helpers.transformers import apply_image_assets
+
+
+def _png(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (40, 120, 200)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+IMAGES = {"/hero.png": _png(1200, 600), "/small.png": _png(400, 300), "/slow.png": _png(300, 200)}
+
+
+class _QuietStaticHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow.png":
+            time.sleep(0.5)
+        body = IMAGES.get(self.path)
+        self.send_response(200 if body else 404)
+        self.send_header("Content-Type", "image/png" if body else "text/plain")
+        self.end_headers()
+        self.wfile.write(body or b"missing")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+@pytest.fixture
+def asset_host(tmp_path):
+    """Veřejný asset host - statický server nad adresářem assetů."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_QuietStaticHandler, directory=str(tmp_path)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}/"
+    httpd.shutdown()
+
+
+def _pipeline(tmp_path, base_url="https://cdn.seofarm.ai/assets", **overrides):
+    settings = ImageAssetSettings(dir=str(tmp_path), base_url=base_url, **overrides)
+    return ImageAssetPipeline(settings, PublishProcessPool(PublishPoolSettings(workers=1)))
+
+
+def _article(visuals):
+    return PublishInput(
+        title="ETF pro začátečníky",
+        meta=PublishMeta(description="Jak začít s ETF.", keywords=["etf"], canonical=""),
+        content_html="<article><p>Obsah</p></article>",
+        faq=[],
+        visuals=[PublishVisual(**visual) for visual in visuals],
+        schema_org={"@type": "Article"},
+        format="html",
+        language="cs",
+        date_published="2025-08-05T10:00:00Z"
+    )
+
+
+def test_settings_and_url_extraction(monkeypatch):
+    monkeypatch.setenv("IMAGE_ASSETS", '{"widths": [320, 640], "formats": ["webp"]}')
+    assert load_image_asset_settings() == ImageAssetSettings(widths=[320, 640], formats=["webp"])
+    assert load_image_asset_settings().base_url == ""
+    for invalid in ('{"formats": ["webp", "avif"]}', '{"base_url": "/assets"}'):
+        monkeypatch.setenv("IMAGE_ASSETS", invalid)
+        with pytest.raises(ValueError, match="IMAGE_ASSETS"):
+            load_image_asset_settings()
+
+    output = {"images": [{"url": "https://fal.media/a.png", "status": "completed"},
+                         {"url": "", "status": "failed"},
+                         {"url": "https://fal.media/b.png?sig=1", "status": "completed"}]}
+    assert extract_image_urls(output) == ["https://fal.media/a.png", "https://fal.media/b.png?sig=1"]
+    assert extract_image_urls({"generated_images": [{"image_url": "https://x/c.png"}]}) == ["https://x/c.png"]
+    assert extract_image_urls("neplatný výstup") == []
+
+
+def test_download_and_transcode(tmp_path, server):
+    pipeline = _pipeline(tmp_path)
+
+    async def scenario():
+        try:
+            return await pipeline.process_all([f"{server}/hero.png", f"{server}/small.png", f"{server}/missing.png"])
+        finally:
+            await pipeline.close()
+
+    result = asyncio.run(scenario())
+    hero, small, missing = result["assets"]
+    assert missing is None and f"{server}/missing.png" in result["errors"]
+
+    assert (hero["width"], hero["height"]) == (1024, 512)
+    assert hero["image_url"] == f"https://cdn.seofarm.ai/assets/{hero['hash'][:2]}/{hero['hash']}/1024.webp"
+    assert [entry.split()[-1] for entry in hero["srcset"].split(", ")] == ["480w", "768w", "1024w"]
+    assert hero["source_url"] == f"{server}/hero.png"
+    # Menší originál se nezvětšuje
+    assert (small["width"], small["height"]) == (400, 300)
+    assert small["srcset"].endswith("/400.webp 400w")
+
+    asset_dir = tmp_path / hero["hash"][:2] / hero["hash"]
+    with Image.open(asset_dir / "768.webp") as variant:
+        assert (variant.format, variant.size) == ("WEBP", (768, 384))
+    if image_assets.AVIF_AVAILABLE:
+        assert hero["sources"][0]["type"] == "image/avif"
+        assert (asset_dir / "1024.avif").exists()
+    else:
+        assert hero["sources"] == []
+    assert (asset_dir / "asset.json").exists()
+    assert not list(tmp_path.rglob("*.tmp"))
+
+
+def test_heartbeat_while_processing(tmp_path, server):
+    """Dlouhé stažení/převod heartbeatuje průběžně, ne až po dokončení všech obrázků"""
+    pipeline = _pipeline(tmp_path, heartbeat_interval=0.05)
+    beats = []
+
+    async def scenario():
+        try:
+            return await pipeline.process_all([f"{server}/slow.png", f"{server}/small.png"], on_wait=beats.append)
+        finally:
+            await pipeline.close()
+
+    result = asyncio.run(scenario())
+    assert all(result["assets"])
+    assert len(beats) >= 5
+    assert beats[-1] == {"done": 2, "total": 2}
+    assert {"done": 1, "total": 2} in beats
+
+
+def test_converted_image_is_not_transcoded_again(tmp_path, server, monkeypatch):
+    async def scenario(pipeline):
+        try:
+            return await pipeline.process_all([f"{server}/small.png"])
+        finally:
+            await pipeline.close()
+
+    first = asyncio.run(scenario(_pipeline(tmp_path)))["assets"][0]
+    pipeline = _pipeline(tmp_path)
+
+    async def no_transcode(*args):
+        raise AssertionError("obrázek se neměl převádět znovu")
+
+    monkeypatch.setattr(pipeline.pool, "run", no_transcode)
+    assert asyncio.run(scenario(pipeline))["assets"][0] == first
+
+    # Změna variant = nový převod
+    changed = _pipeline(tmp_path, widths=[200])
+    assert asyncio.run(scenario(changed))["assets"][0]["width"] == 200
+
+
+def test_assets_applied_to_visuals_and_rendered():
+    cdn = "https://cdn.seofarm.ai/assets/ab/hero"
+    asset = {"hash": "ab" * 32, "source_url": "https://fal.media/hero.png", "image_url": f"{cdn}/1024.webp",
+             "srcset": f"{cdn}/480.webp 480w, {cdn}/1024.webp 1024w", "width": 1024, "height": 512,
+             "sources": [{"type": "image/avif", "srcset": f"{cdn}/1024.avif 1024w"}]}
+    visuals = [{"image_url": "", "prompt": "Graf", "alt": "Graf", "position": "top"},
+               {"image_url": "https://seofarm.ai/img/jiny.webp", "prompt": "Investor", "alt": "Investor", "position": "bottom"}]
+    applied = apply_image_assets(visuals, {"assets": [asset, None]})
+    assert applied[0]["image_url"] == asset["image_url"] and applied[0]["width"] == 1024
+    assert applied[1] == visuals[1]
+    # Asset s relativní URL (výstup bez veřejného hostu) se nepoužije
+    relative = {**asset, "source_url": "https://seofarm.ai/img/jiny.webp", "image_url": "/assets/ab/hero/1024.webp"}
+    assert apply_image_assets(visuals[1:], [relative]) == visuals[1:]
+
+    article = _article(applied)
+    html = generate_html_output(article)
+    assert f'<source type="image/avif" srcset="{cdn}/1024.avif 1024w" />' in html
+    assert 'loading="eager"' in html and 'fetchpriority="high"' in html
+    assert html.count('loading="lazy"') == 1
+
+    plain = generate_html_output(replace(article, visuals=[replace(v, sources=None) for v in article.visuals]))
+    assert "<picture>" not in plain
+
+
+def _rendered_image_urls(html):
+    urls = re.findall(r'<img[^>]* src="([^"]+)"', html)
+    for srcset in re.findall(r'srcset="([^"]+)"', html):
+        urls.extend(candidate.split()[0] for candidate in srcset.split(", "))
+    return urls
+
+
+def test_rendered_img_src_resolves(tmp_path, server, asset_host, monkeypatch):
+    """Obrázky v HTML článku jdou stáhnout - z asset hostu, bez něj z původní URL"""
+    source = f"{server}/hero.png"
+    visuals = [{"image_url": source, "prompt": "Graf", "alt": "Graf", "position": "top"}]
+
+    def render(pipeline):
+        monkeypatch.setattr(image_assets, "_pipeline", pipeline)
+        environment = ActivityEnvironment()
+        environment.on_heartbeat = lambda *details: None
+        try:
+            result = asyncio.run(environment.run(image_assets_activity, {"image_output": {"images": [{"url": source}]}}))
+        finally:
+            asyncio.run(pipeline.close())
+        return result, generate_html_output(_article(apply_image_assets(visuals, result)))
+
+    result, html = render(_pipeline(tmp_path, base_url=asset_host))
+    urls = _rendered_image_urls(html)
+    assert result["assets"][0] and urls and all(url.startswith(asset_host) for url in urls)
+    for url in urls:
+        response = httpx.get(url)
+        assert response.status_code == 200, url
+        assert response.headers["content-type"] in ("image/webp", "image/avif")
+
+    # Bez veřejného asset hostu zůstává původní (funkční) URL
+    result, html = render(_pipeline(tmp_path / "jinam", base_url=""))
+    assert result["assets"] == [None]
+    assert _rendered_image_urls(html) == [source]
+    assert httpx.get(source).status_code == 200
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST DEDUPLIKAČNÍ CACHE GENEROVÁNÍ OBRÁZKŮ
+Ověřuje přesnou shodu normalizovaného promptu a parametrů, LRU a TTL,
+blízkou shodu přes shingly a souhrn ušetřených generování za dávku
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from backend.llm_clients import image_cache
+from backend.llm_clients.image_cache import (
+    EXACT,
+    MISS,
+    NEAR,
+    ImageCacheBatch,
+    ImageCacheSettings,
+    ImageGenerationCache,
+    load_image_cache_settings,
+    normalize_prompt,
+)
+
+PARAMS = {"size": "1024x1024", "quality": "standard", "style": "vivid"}
+PROMPT = "Modern flat illustration of a young investor reviewing ETF charts on a laptop, blue palette"
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("IMAGE_GENERATION_CACHE", '{"max_entries": 50, "similarity": 0.8}')
+    assert load_image_cache_settings() == ImageCacheSettings(max_entries=50, similarity=0.8)
+    monkeypatch.setenv("IMAGE_GENERATION_CACHE", '{"similarity": 1.5}')
+    with pytest.raises(ValueError, match="IMAGE_GENERATION_CACHE"):
+        load_image_cache_settings()
+
+
+def test_exact_match_on_normalized_prompt_and_params():
+    cache = ImageGenerationCache(ImageCacheSettings())
+    assert cache.lookup(PROMPT, "openai", "dall-e-3", **PARAMS) == (MISS, None)
+    cache.store(PROMPT, "openai", "dall-e-3", "https://img/1.png", **PARAMS)
+
+    assert normalize_prompt("  Modern  FLAT illustration, ETF!") == "modern flat illustration etf"
+    variant = PROMPT.upper().replace(",", " ;") + "."
+    assert cache.lookup(variant, "openai", "dall-e-3", **PARAMS) == (EXACT, "https://img/1.png")
+    assert cache.lookup(PROMPT, "openai", "dall-e-3", **{**PARAMS, "style": "natural"}) == (MISS, None)
+    assert cache.lookup(PROMPT, "gemini", "imagen-4", **PARAMS) == (MISS, None)
+    # Obrázek už použitý ve stejném článku se nevrací
+    assert cache.lookup(PROMPT, "openai", "dall-e-3", exclude_urls={"https://img/1.png"}, **PARAMS) == (MISS, None)
+
+
+def test_lru_eviction_and_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(image_cache.time, "time", lambda: clock[0])
+    cache = ImageGenerationCache(ImageCacheSettings(max_entries=2, ttl_seconds=60))
+    for i in range(2):
+        cache.store(f"prompt {i}", "openai", "dall-e-3", f"https://img/{i}.png")
+    assert cache.lookup("prompt 0", "openai", "dall-e-3")[0] == EXACT  # prompt 0 je teď nejnovější
+    cache.store("prompt 2", "openai", "dall-e-3", "https://img/2.png")
+    assert len(cache) == 2
+    assert cache.lookup("prompt 1", "openai", "dall-e-3")[0] == MISS
+    assert cache.lookup("prompt 0", "openai", "dall-e-3")[0] == EXACT
+
+    clock[0] += 61
+    assert cache.lookup("prompt 2", "openai", "dall-e-3") == (MISS, None)
+    assert len(cache) == 1
+
+
+def test_near_duplicate_matching():
+    exact_only = ImageGenerationCache(ImageCacheSettings())
+    near = ImageGenerationCache(ImageCacheSettings(similarity=0.6))
+    for cache in (exact_only, near):
+        cache.store(PROMPT, "openai", "dall-e-3", "https://img/1.png", **PARAMS)
+        cache.store("Photograph of a mountain lake at sunrise", "openai", "dall-e-3", "https://img/2.png", **PARAMS)
+
+    similar = PROMPT + " and a coffee cup"
+    assert exact_only.lookup(similar, "openai", "dall-e-3", **PARAMS) == (MISS, None)
+    assert near.lookup(similar, "openai", "dall-e-3", **PARAMS) == (NEAR, "https://img/1.png")
+    assert near.lookup(similar, "openai", "dall-e-3", **{**PARAMS, "size": "1792x1024"}) == (MISS, None)
+    assert near.lookup("Watercolor painting of a city skyline at night", "openai", "dall-e-3", **PARAMS) == (MISS, None)
+
+    # Vyřazený záznam zmizí i z indexu shinglů
+    near.settings.max_entries = 1
+    near.store("Photograph of a desert road", "openai", "dall-e-3", "https://img/3.png", **PARAMS)
+    assert near.lookup(similar, "openai", "dall-e-3", **PARAMS) == (MISS, None)
+    assert all(keys for keys in near._shingle_index.values())
+
+
+def test_batch_summary():
+    batch = ImageCacheBatch()
+    for match in (EXACT, NEAR, MISS, MISS):
+        batch.record(match)
+    assert image_cache.record_image_cache_batch("openai", "dall-e-3", batch) == {
+        "hits": 1, "near_hits": 1, "misses": 2, "saved_generations": 2, "hit_rate": 0.5
+    }
+    assert ImageCacheBatch().summary()["hit_rate"] == 0.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST SDÍLENÉHO JSON EXTRAKTORU PRO VÝSTUPY LLM
+Ověřuje extrakci z ```json bloků a okolního textu, trailing čárky, chyby s offsetem
+a napojení parserů (transformers, structured output, micro-batching, sekční drafting)
+"""
+
+import glob
+import json
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from backend.llm_clients.micro_batching import parse_combined_response
+from helpers.json_extract import JSONExtractError, extract_json, locate_json
+from helpers.section_drafting import outline_from_seo
+from helpers.transformers import extract_json_from_markdown, parse_qa_faq, parse_seo_metadata
+
+FAQ = [{"question": "Co je ETF?", "answer": "Burzovně obchodovaný fond."}]
+
+
+def test_fence_with_commentary_and_trailing_commas():
+    """```json blok s textem před i za ním, trailing čárky se tolerují"""
+    text = ('Tady je FAQ {viz níže}:\n```json\n[\n  {"question": "Co je ETF?", '
+            '"answer": "Burzovně obchodovaný fond.",},\n]\n```\nDoufám, že pomůže!')
+    assert extract_json(text) == FAQ
+
+
+def test_prose_brackets_are_skipped():
+    """Závorky v úvodním textu ([1. krok], {název}) nejsou JSON - hledá se další kandidát"""
+    text = 'Postup [1. krok] a {název}: {"results": [{"id": 1, "output": "A"}]} hotovo } ]'
+    value, start, end = locate_json(text)
+    assert value == {"results": [{"id": 1, "output": "A"}]}
+    assert text[start:end].startswith('{"results"') and text[end:] == " hotovo } ]"
+    assert extract_json('{"text": "uvozovka \\" a závorka } v řetězci"}') == {"text": 'uvozovka " a závorka } v řetězci'}
+
+
+def test_errors_report_offset():
+    text = "Výstup:\n```json\n{'question': 'Co je ETF?'}\n```"
+    with pytest.raises(JSONExtractError) as error:
+        extract_json(text)
+    assert error.value.offset == text.index("'question'")
+    assert (error.value.line, error.value.column) == (3, 2)
+
+    with pytest.raises(JSONExtractError, match="neukončený řetězec") as error:
+        extract_json('{"faq": [{"question": "Co je ET')
+    assert error.value.offset == 22
+
+    with pytest.raises(JSONExtractError) as error:
+        extract_json("FAQ: Co je ETF? Burzovně obchodovaný fond.")
+    assert error.value.found is False
+    assert extract_json("bez JSONu", default=None) is None
+
+
+def test_parsers_share_extractor():
+    """Micro-batching, sekční drafting i transformers používají stejný extraktor"""
+    combined = 'Výsledky:\n```json\n{"results": [{"id": 1, "output": "A"}, {"id": 2, "output": "B"},]}\n```'
+    assert parse_combined_response(combined, 2) == {1: "A", 2: "B"}
+
+    seo = ('Metadata:\n```json\n{"seo_metadata": {"title": "ETF", "meta_description": "Jak začít s ETF.", '
+           '"slug": "etf"}, "headings": {"h1": "ETF", "h2": ["Co je ETF", "Poplatky", "Rizika"],}}\n```')
+    assert [section.title for section in outline_from_seo(seo).sections] == ["Co je ETF", "Poplatky", "Rizika"]
+
+    assert json.loads(extract_json_from_markdown("Text\n```json\n[1, 2]\n```\nkonec")) == [1, 2]
+    assert extract_json_from_markdown("  bez JSONu ") == "bez JSONu"
+    assert parse_qa_faq("FAQ níže:\n" + json.dumps(FAQ * 5, ensure_ascii=False) + "\nKonec.")[0]["question"] == "Co je ETF?"
+
+
+def test_seo_parser_reports_invalid_json_offset():
+    with pytest.raises(ValueError, match="nevalidní JSON.*řádek 2, sloupec 27"):
+        parse_seo_metadata('```json\n{"seo_metadata": {"title" "ETF"}}\n```')
+
+
+def test_real_outputs_parse_at_least_as_before():
+    """Na uložených výstupech pipeline extraktor najde JSON všude, kde ho našel původní fence parser"""
+    fence = "```json"
+    checked = 0
+    for path in glob.glob("outputs/seo_output_*.json"):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        for log in result.get("stage_logs") or []:
+            output = log.get("output")
+            if not isinstance(output, str) or fence not in output:
+                continue
+            start = output.find(fence) + len(fence)
+            end = output.find("```", start)
+            try:
+                legacy = json.loads(output[start:end].strip())
+            except ValueError:
+                continue
+            assert extract_json(output) == legacy
+            checked += 1
+    if not checked:
+        pytest.skip("outputs/ neobsahuje výstupy s ```json blokem")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
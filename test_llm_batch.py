@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST BATCH REŽIMU LLM VOLÁNÍ
+Ověřuje sběr requestů souběžných pipeline do jedné batch submission, pollování,
+rozdání výsledků a navázání retry aktivity na už odeslaný batch proti lokálnímu
+stub serveru (Anthropic Message Batches + OpenAI Batch API)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.getcwd())
+
+import pytest
+from openai import AsyncOpenAI
+
+from backend.llm_clients.batching import BatchDispatcher, BatchSettings, checkpoint_from_heartbeat, load_batch_settings
+from backend.llm_clients.claude_client import ClaudeClient
+from backend.openai_client import OpenAIClient
+
+
+class StubState:
+    """Stav stub serveru - odeslané batche a počet pollů."""
+
+    def __init__(self):
+        self.batches = {}
+        self.files = {}
+        self.polls = {}
+        self.fail_openai = False
+
+
+def _echo(user_message):
+    return f"echo: {user_message}"
+
+
+class BatchStubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _jsonl(self, lines):
+        body = "\n".join(json.dumps(line) for line in lines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        state = self.state
+        if self.path == "/v1/messages/batches":
+            batch_id = f"msgbatch_{len(state.batches) + 1}"
+            state.batches[batch_id] = json.loads(raw)["requests"]
+            return self._json({"id": batch_id, "type": "message_batch", "processing_status": "in_progress"})
+        if self.path == "/v1/files":
+            # Multipart upload - vytáhneme JSONL řádky
+            lines = [json.loads(line.strip(b"\r")) for line in raw.split(b"\n") if line.strip(b"\r").startswith(b'{"custom_id"')]
+            file_id = f"file-in-{len(state.files) + 1}"
+            state.files[file_id] = lines
+            return self._json({"id": file_id, "object": "file", "bytes": len(raw), "created_at": 0,
+                               "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+        if self.path == "/v1/batches":
+            input_file_id = json.loads(raw)["input_file_id"]
+            batch_id = f"batch_{len(state.batches) + 1}"
+            state.batches[batch_id] = state.files[input_file_id]
+            return self._json({"id": batch_id, "object": "batch", "endpoint": "/v1/chat/completions", "status": "validating",
+                               "input_file_id": input_file_id, "completion_window": "24h", "created_at": 0})
+        self._json({"error": {"message": "not found"}}, 404)
+
+    def do_GET(self):
+        state = self.state
+        parts = self.path.strip("/").split("/")
+        if parts[:3] == ["v1", "messages", "batches"] and len(parts) == 4:
+            batch_id = parts[3]
+            state.polls[batch_id] = state.polls.get(batch_id, 0) + 1
+            ended = state.polls[batch_id] >= 3
+            return self._json({
+                "id": batch_id, "processing_status": "ended" if ended else "in_progress",
+                "results_url": f"http://{self.headers['Host']}/v1/messages/batches/{batch_id}/results" if ended else None
+            })
+        if parts[:3] == ["v1", "messages", "batches"] and parts[-1] == "results":
+            lines = []
+            for request in state.batches[parts[3]]:
+                user_message = request["params"]["messages"][0]["content"]
+                if "FAIL" in user_message:
+                    lines.append({"custom_id": request["custom_id"], "result": {
+                        "type": "errored", "error": {"type": "error", "error": {"type": "invalid_request_error", "message": "prompt is too long"}}}})
+                else:
+                    lines.append({"custom_id": request["custom_id"], "result": {"type": "succeeded", "message": {
+                        "model": request["params"]["model"], "content": [{"type": "text", "text": _echo(user_message)}],
+                        "stop_reason": "end_turn", "usage": {"input_tokens": 10, "output_tokens": 5}}}})
+            return self._jsonl(lines)
+        if parts[:2] == ["v1", "batches"]:
+            batch_id = parts[2]
+            if state.fail_openai:
+                return self._json({"id": batch_id, "object": "batch", "status": "failed", "endpoint": "/v1/chat/completions",
+                                   "input_file_id": "x", "completion_window": "24h", "created_at": 0,
+                                   "errors": {"object": "list", "data": [{"code": "invalid_model", "message": "model not found"}]}})
+            return self._json({"id": batch_id, "object": "batch", "status": "completed", "endpoint": "/v1/chat/completions",
+                               "input_file_id": "x", "completion_window": "24h", "created_at": 0,
+                               "output_file_id": f"out-{batch_id}", "error_file_id": None})
+        if parts[:2] == ["v1", "files"] and parts[-1] == "content":
+            batch_id = parts[2][len("out-"):]
+            lines = []
+            for request in state.batches[batch_id]:
+                user_message = request["body"]["messages"][1]["content"]
+                lines.append({"id": "r", "custom_id": request["custom_id"], "error": None, "response": {"status_code": 200, "body": {
+                    "model": request["body"]["model"], "choices": [{"message": {"role": "assistant", "content": _echo(user_message)}}],
+                    "usage": {"prompt_tokens": 8, "completion_tokens": 4, "total_tokens": 12}}}})
+            return self._jsonl(lines)
+        self._json({"error": {"message": "not found"}}, 404)
+
+
+@pytest.fixture
+def stub():
+    state = StubState()
+    handler = type("Handler", (BatchStubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+
+
+FAST = BatchSettings(window_seconds=0.1, max_requests=100, poll_interval=0.05, heartbeat_interval=0.02)
+
+
+def claude_factory(stub):
+    client = ClaudeClient("test-key")
+    client.base_url = f"{stub.url}/v1"
+    return lambda provider: client
+
+
+def test_concurrent_pipelines_share_one_submission(stub):
+    """Requesty souběžných pipeline končí v jedné submission, výsledky se rozdají podle custom_id"""
+    dispatcher = BatchDispatcher(FAST, client_factory=claude_factory(stub))
+    heartbeats = []
+
+    async def pipeline(topic):
+        return await dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", topic, 0.7, 500,
+                                       on_wait=lambda: heartbeats.append(topic))
+
+    async def main():
+        return await asyncio.gather(*(pipeline(f"téma {i}") for i in range(3)))
+
+    results = asyncio.run(main())
+    assert len(stub.batches) == 1
+    assert len(stub.batches["msgbatch_1"]) == 3
+    assert [r["content"] for r in results] == ["echo: téma 0", "echo: téma 1", "echo: téma 2"]
+    assert results[0]["usage"]["total_tokens"] == 15
+    assert heartbeats  # aktivita během čekání na batch heartbeatuje
+
+
+def test_errored_request_fails_only_its_pipeline(stub):
+    """Chyba jednoho requestu v batchi neshodí ostatní pipeline"""
+    dispatcher = BatchDispatcher(FAST, client_factory=claude_factory(stub))
+
+    async def main():
+        return await asyncio.gather(
+            dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "ok"),
+            dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "FAIL"),
+            return_exceptions=True
+        )
+
+    ok, failed = asyncio.run(main())
+    assert ok["content"] == "echo: ok"
+    assert isinstance(failed, Exception) and "prompt is too long" in str(failed)
+
+
+def test_full_submission_is_sent_without_waiting_for_window(stub):
+    """Dosažení max_requests odešle submission hned, nečeká se na okno"""
+    settings = BatchSettings(window_seconds=30, max_requests=2, poll_interval=0.05, heartbeat_interval=0.02)
+    dispatcher = BatchDispatcher(settings, client_factory=claude_factory(stub))
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(
+            dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "a"),
+            dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "b"),
+        ), timeout=5)
+
+    assert [r["content"] for r in asyncio.run(main())] == ["echo: a", "echo: b"]
+
+
+def test_cancelled_request_leaves_the_batch(stub):
+    """Zrušená aktivita (workflow cancel) před odesláním vypadne ze sběru"""
+    dispatcher = BatchDispatcher(FAST, client_factory=claude_factory(stub))
+
+    async def main():
+        cancelled = asyncio.create_task(dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "zrušeno"))
+        kept = asyncio.create_task(dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "ponecháno"))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        return await kept
+
+    assert asyncio.run(main())["content"] == "echo: ponecháno"
+    assert [r["params"]["messages"][0]["content"] for r in stub.batches["msgbatch_1"]] == ["ponecháno"]
+
+
+def test_retry_resumes_submitted_batch(stub):
+    """Retry aktivity (nový worker) dopolluje batch z heartbeat checkpointu místo nové submission"""
+    heartbeats = []
+
+    async def first_attempt():
+        checkpoint = {}
+        task = asyncio.create_task(BatchDispatcher(FAST, client_factory=claude_factory(stub)).submit(
+            "claude", "claude-3-5-haiku-20241022", "s", "téma", 0.7, 500,
+            on_wait=lambda *details: heartbeats.append(details), checkpoint=checkpoint))
+        while not checkpoint:
+            await asyncio.sleep(0.005)
+        task.cancel()  # worker ukončen uprostřed čekání na batch
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(first_attempt())
+    checkpoint = checkpoint_from_heartbeat(heartbeats[-1])
+    assert [entry["batch_id"] for entry in checkpoint.values()] == ["msgbatch_1"]
+
+    async def retry():
+        dispatcher = BatchDispatcher(FAST, client_factory=claude_factory(stub))
+        return await dispatcher.submit("claude", "claude-3-5-haiku-20241022", "s", "téma", 0.7, 500, checkpoint=checkpoint)
+
+    assert asyncio.run(retry())["content"] == "echo: téma"
+    assert list(stub.batches) == ["msgbatch_1"]
+
+    # Batch z checkpointu request neobsahuje - odešle se znovu
+    stale = {fingerprint: {"batch_id": "msgbatch_1", "custom_id": "jiny"} for fingerprint in checkpoint}
+    resubmitted = asyncio.run(BatchDispatcher(FAST, client_factory=claude_factory(stub)).submit(
+        "claude", "claude-3-5-haiku-20241022", "s", "téma", 0.7, 500, checkpoint=stale))
+    assert resubmitted["content"] == "echo: téma"
+    assert list(stub.batches) == ["msgbatch_1", "msgbatch_2"]
+    assert [entry["batch_id"] for entry in stale.values()] == ["msgbatch_2"]
+
+
+def test_openai_batch_api(stub):
+    """OpenAI - upload JSONL, založení batche, stažení výstupního souboru"""
+    client = OpenAIClient("test-key")
+    client._async_client = AsyncOpenAI(api_key="test-key", base_url=f"{stub.url}/v1")
+    dispatcher = BatchDispatcher(FAST, client_factory=lambda provider: client)
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.submit("openai", "gpt-4o", "s", topic) for topic in ("x", "y")))
+
+    results = asyncio.run(main())
+    assert [r["content"] for r in results] == ["echo: x", "echo: y"]
+    assert results[0]["usage"]["total_tokens"] == 12
+    assert stub.batches["batch_1"][0]["url"] == "/v1/chat/completions"
+
+
+def test_failed_batch_fails_all_requests(stub):
+    """Batch odmítnutý při validaci shodí všechny requesty se srozumitelnou chybou"""
+    stub.fail_openai = True
+    client = OpenAIClient("test-key")
+    client._async_client = AsyncOpenAI(api_key="test-key", base_url=f"{stub.url}/v1")
+    dispatcher = BatchDispatcher(FAST, client_factory=lambda provider: client)
+
+    async def main():
+        return await asyncio.gather(*(dispatcher.submit("openai", "gpt-4o", "s", t) for t in ("x", "y")), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, Exception) and "model not found" in str(e) for e in errors)
+
+
+def test_batch_support_and_settings(monkeypatch):
+    """Gemini batch API nemá - stage poběží interaktivně; LLM_BATCH odmítá neznámé klíče"""
+    from backend.llm_clients.gemini_client import GeminiClient
+    assert not BatchDispatcher(FAST, client_factory=lambda provider: GeminiClient("k")).supports("gemini")
+    monkeypatch.setenv("LLM_BATCH", '{"window_seconds": 120}')
+    assert load_batch_settings().window_seconds == 120
+    monkeypatch.setenv("LLM_BATCH", '{"windows": 120}')
+    with pytest.raises(ValueError):
+        load_batch_settings()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST HEDGED LLM REQUESTŮ
+Ověřuje zpoždění podle kvantilu latence, zrušení poraženého volání, rozpočet a integraci do safe_llm_call
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from backend.llm_clients import circuit_breaker as circuit_breaker_module
+from backend.llm_clients import hedging as hedging_module
+from backend.llm_clients.hedging import (
+    HedgeBudget,
+    HedgePolicy,
+    LatencyTracker,
+    hedge_delay,
+    hedged_call,
+    load_hedge_policies,
+)
+
+
+def test_hedge_delay_uses_latency_quantile():
+    """Zpoždění = kvantil nedávných latencí, nejméně min_delay"""
+    tracker = LatencyTracker()
+    policy = HedgePolicy(quantile=0.9, min_samples=10, min_delay=1.0)
+    assert hedge_delay(policy, tracker, "claude", "m") is None  # málo vzorků
+    for latency in range(1, 11):
+        tracker.record("claude", "m", float(latency))
+    assert hedge_delay(policy, tracker, "claude", "m") == 9.0
+    assert hedge_delay(HedgePolicy(min_samples=100, initial_delay=0.5, min_delay=2.0), tracker, "claude", "m") == 2.0
+
+
+def test_budget_caps_hedge_volume():
+    """Počet hedgí v okně nepřekročí budget_ratio * počet volání (min. burst)"""
+    now = [0.0]
+    budget = HedgeBudget(clock=lambda: now[0])
+    policy = HedgePolicy(budget_ratio=0.2, budget_burst=1, budget_window=60)
+    for _ in range(10):
+        budget.record_call("draft")
+    assert budget.try_spend("draft", policy)
+    assert budget.try_spend("draft", policy)
+    assert not budget.try_spend("draft", policy)
+    assert budget.try_spend("seo", policy)  # rozpočet je per asistent
+    now[0] = 120.0  # okno vypršelo
+    assert budget.try_spend("draft", policy)
+
+
+def test_fast_primary_skips_hedge():
+    """Rychlá odpověď primárního volání hedge vůbec nespustí"""
+    hedges = []
+
+    async def primary():
+        return "primary"
+
+    async def hedge():
+        hedges.append(1)
+        return "hedge"
+
+    assert asyncio.run(hedged_call(primary, hedge, delay=0.5)) == ("primary", False)
+    assert hedges == []
+
+
+def test_slow_primary_loses_and_is_cancelled():
+    """Pomalé primární volání prohraje a je zrušeno"""
+    cancelled = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(5)
+            return "primary"
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def hedge():
+        return "hedge"
+
+    assert asyncio.run(hedged_call(primary, hedge, delay=0.05)) == ("hedge", True)
+    assert cancelled == [True]
+
+
+def test_failed_hedge_waits_for_primary():
+    """Selhání duplikátu neukončí čekání na primární odpověď"""
+    async def primary():
+        await asyncio.sleep(0.2)
+        return "primary"
+
+    async def hedge():
+        raise RuntimeError("503")
+
+    assert asyncio.run(hedged_call(primary, hedge, delay=0.05)) == ("primary", False)
+
+
+def test_budget_denied_keeps_primary():
+    """Vyčerpaný rozpočet = žádný duplikát, čeká se na primární volání"""
+    async def primary():
+        await asyncio.sleep(0.1)
+        return "primary"
+
+    async def hedge():
+        return "hedge"
+
+    assert asyncio.run(hedged_call(primary, hedge, delay=0.01, on_hedge=lambda: False)) == ("primary", False)
+
+
+def test_policies_from_env(monkeypatch):
+    """LLM_HEDGING je opt-in a odmítá neznámé klíče"""
+    monkeypatch.setenv("LLM_HEDGING", '{"draft_assistant": {"quantile": 0.9, "provider": "openai", "model": "gpt-4o"}}')
+    policies = load_hedge_policies()
+    assert policies["draft_assistant"].quantile == 0.9
+    assert hedging_module.get_hedge_policy("seo_assistant") is None
+    monkeypatch.setenv("LLM_HEDGING", '{"draft_assistant": {"qantile": 0.9}}')
+    with pytest.raises(ValueError):
+        load_hedge_policies()
+
+
+def test_safe_llm_call_hedges_to_other_provider(monkeypatch):
+    """Pomalý primární provider - odpověď dodá duplikát na jiném provideru"""
+    from activity_wrappers import safe_llm_call
+    from backend.llm_clients.factory import LLMClientFactory
+
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    monkeypatch.setenv("LLM_HEDGING", '{"draft_assistant": {"initial_delay": 0.05, "min_delay": 0.05, "provider": "openai", "model": "gpt-4o"}}')
+    monkeypatch.setattr(circuit_breaker_module, "_breakers", {})
+    monkeypatch.setattr(hedging_module, "_latency_tracker", LatencyTracker())
+    monkeypatch.setattr(hedging_module, "_hedge_budget", HedgeBudget())
+
+    class HedgeClient:
+        async def chat_completion(self, **kwargs):
+            return {"content": f"hedge {kwargs['model']}", "usage": {}}
+
+    monkeypatch.setattr(LLMClientFactory, "create_client", staticmethod(lambda provider: HedgeClient()))
+
+    async def chat_completion(**kwargs):
+        await asyncio.sleep(5)
+        return {"content": "primary"}
+
+    async def call():
+        return await safe_llm_call(chat_completion, "claude", "claude-3-5-haiku-20241022", hedge_key="draft_assistant",
+                                   system_prompt="s", user_message="u", max_tokens=100)
+
+    result = asyncio.run(ActivityEnvironment().run(call))
+    assert result["content"] == "hedge gpt-4o"
+    assert result["hedge"]["provider"] == "openai"
+    assert circuit_breaker_module.get_circuit_breaker("claude").state == "closed"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST LLM RATE LIMITERU
+Ověřuje token bucket (RPM, vstupní a výstupní TPM), sdílení přes procesy, Retry-After,
+vypnutý výchozí stav a integraci do safe_llm_call
+"""
+
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from backend.llm_clients import rate_limiter as rate_limiter_module
+from backend.llm_clients.base import LLMRateLimitError, parse_retry_after, retry_after_from_headers
+from backend.llm_clients.rate_limiter import (
+    ProviderRateLimiter,
+    RateLimit,
+    SQLiteTokenBucketStore,
+    estimate_request_tokens,
+)
+
+
+def test_request_bucket_enforces_rpm(tmp_path):
+    """Po vyčerpání RPM je nutné počkat na doplnění"""
+    store = SQLiteTokenBucketStore(str(tmp_path / "limits.sqlite"))
+    limit = RateLimit(rpm=2)
+    assert store.try_acquire("openai/dall-e-3", limit, 0, now=100.0) == 0
+    assert store.try_acquire("openai/dall-e-3", limit, 0, now=100.0) == 0
+    wait = store.try_acquire("openai/dall-e-3", limit, 0, now=100.0)
+    assert wait == pytest.approx(30.0)
+    assert store.try_acquire("openai/dall-e-3", limit, 0, now=130.0) == 0
+
+
+def test_token_bucket_enforces_tpm(tmp_path):
+    """Velký prompt vyčerpá TPM budget dřív než RPM"""
+    store = SQLiteTokenBucketStore(str(tmp_path / "limits.sqlite"))
+    limit = RateLimit(rpm=100, input_tpm=6000)
+    assert store.try_acquire("claude", limit, 5000, now=0.0) == 0
+    wait = store.try_acquire("claude", limit, 5000, now=0.0)
+    assert wait == pytest.approx(40.0)  # chybí 4000 tokenů při 100 tokenech/s
+    # Request větší než celý budget projde s plným bucketem
+    assert store.try_acquire("claude", limit, 50000, now=60.0) == 0
+
+
+def test_block_honors_retry_after(tmp_path):
+    """Retry-After zablokuje klíč i když je budget volný"""
+    store = SQLiteTokenBucketStore(str(tmp_path / "limits.sqlite"))
+    limit = RateLimit(rpm=100, input_tpm=100000)
+    store.block("openai", limit, 12.0, now=0.0)
+    assert store.try_acquire("openai", limit, 10, now=5.0) == pytest.approx(7.0)
+    assert store.try_acquire("openai", limit, 10, now=12.5) == 0
+
+
+def test_input_and_output_budgets_are_separate(tmp_path):
+    """Výstupní budget (max_tokens) se nestrhává ze vstupního - každý čeká jen na svůj limit"""
+    store = SQLiteTokenBucketStore(str(tmp_path / "limits.sqlite"))
+    limit = RateLimit(rpm=100, input_tpm=30000, output_tpm=6000)
+    # Dlouhý prompt s velkým max_tokens - dohromady přes oba limity, odděleně projde
+    assert store.try_acquire("claude", limit, 20000, 6000, now=0.0) == 0
+    # Vstupní budget zbývá, výstupní je vyčerpaný
+    assert store.try_acquire("claude", limit, 1000, 3000, now=0.0) == pytest.approx(30.0)
+    # Skutečný výstup byl menší než max_tokens - rozdíl se vrátí do výstupního budgetu
+    store.adjust_tokens("claude", limit, 0, -3000, now=0.0)
+    assert store.try_acquire("claude", limit, 1000, 3000, now=0.0) == 0
+
+
+def test_limiter_disabled_by_default(tmp_path, monkeypatch):
+    """Bez LLM_RATE_LIMIT_ENABLED=true se nelimituje - limity závisí na tieru účtu"""
+    monkeypatch.delenv("LLM_RATE_LIMIT_ENABLED", raising=False)
+    monkeypatch.setenv("LLM_RATE_LIMIT_DB", str(tmp_path / "limits.sqlite"))
+    monkeypatch.setattr(rate_limiter_module, "_rate_limiter", None)
+    assert rate_limiter_module.get_rate_limiter() is None
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "true")
+    assert rate_limiter_module.get_rate_limiter() is not None
+
+
+def test_rate_limits_from_env(monkeypatch):
+    """LLM_RATE_LIMITS přepisuje limity s oddělenými budgety, neznámý klíč je chyba"""
+    monkeypatch.setenv("LLM_RATE_LIMITS", '{"Claude": {"rpm": 4000, "input_tpm": 2000000, "output_tpm": 400000}}')
+    assert rate_limiter_module.load_rate_limits()["claude"] == RateLimit(rpm=4000, input_tpm=2000000, output_tpm=400000)
+    monkeypatch.setenv("LLM_RATE_LIMITS", '{"claude": {"rpm": 50, "tpm": 40000}}')
+    with pytest.raises(ValueError, match="tpm"):
+        rate_limiter_module.load_rate_limits()
+
+
+def _grab(db_path, results):
+    store = SQLiteTokenBucketStore(db_path)
+    granted = sum(1 for _ in range(10) if store.try_acquire("gemini", RateLimit(rpm=12), 0, now=1000.0) == 0)
+    results.put(granted)
+
+
+def test_budget_shared_across_processes(tmp_path):
+    """Více procesů dohromady nedostane víc requestů než RPM"""
+    db_path = str(tmp_path / "limits.sqlite")
+    SQLiteTokenBucketStore(db_path)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_grab, args=(db_path, results)) for _ in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(timeout=30)
+    assert sum(results.get() for _ in processes) == 12
+
+
+def test_limit_resolution_prefers_model_key(tmp_path):
+    """provider/model má přednost před limitem provideru"""
+    limiter = ProviderRateLimiter(SQLiteTokenBucketStore(str(tmp_path / "l.sqlite")),
+                                  limits={"openai": RateLimit(rpm=500, input_tpm=30000), "openai/dall-e-3": RateLimit(rpm=5)})
+    assert limiter.resolve("OpenAI", "dall-e-3")[0] == "openai/dall-e-3"
+    assert limiter.resolve("openai", "gpt-4o")[0] == "openai"
+    assert limiter.resolve("mistral", "large")[1].rpm == 60
+
+
+def test_retry_after_parsing():
+    """Retry-After v sekundách i retry-after-ms"""
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None) is None
+    assert retry_after_from_headers({"retry-after-ms": "1500"}) == 1.5
+    assert retry_after_from_headers({"retry-after": "3"}) == 3.0
+
+
+def test_estimate_request_tokens():
+    """Odhad = (prompt ~4 znaky/token, očekávaný výstup)"""
+    assert estimate_request_tokens("a" * 40, "b" * 400, 500) == (110, 500)
+
+
+def test_safe_llm_call_waits_after_rate_limit(tmp_path, monkeypatch):
+    """safe_llm_call po 429 respektuje Retry-After a pak uspěje"""
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "true")
+    monkeypatch.setenv("LLM_RATE_LIMIT_DB", str(tmp_path / "limits.sqlite"))
+    monkeypatch.setattr(rate_limiter_module, "_rate_limiter", None)
+    from activity_wrappers import safe_llm_call
+
+    calls = []
+
+    async def chat_completion(**kwargs):
+        calls.append(time.time())
+        if len(calls) == 1:
+            raise LLMRateLimitError("claude", "429", retry_after=0.5)
+        return {"content": "ok", "usage": {"prompt_tokens": 30, "completion_tokens": 12, "total_tokens": 42}}
+
+    async def call():
+        return await safe_llm_call(chat_completion, "claude", "claude-3-5-haiku-20241022",
+                                   system_prompt="s", user_message="u", max_tokens=100)
+
+    result = asyncio.run(ActivityEnvironment().run(call))
+    assert result["content"] == "ok"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.45
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST STREAMOVANÉ CHAT COMPLETION
+Ověřuje chat_completion_stream všech providerů proti lokálnímu SSE stub serveru,
+heartbeat na chunk, TTFT metadata, detekci zaseknutého streamu a idle timeout
+počítaný až od prvního bajtu (per model)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.getcwd())
+
+import httpx
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from backend.llm_clients import base as base_module
+from backend.llm_clients.base import LLMRateLimitError, StreamTimeouts, stream_timeouts_for
+from backend.llm_clients.claude_client import ClaudeClient
+from backend.llm_clients.gemini_client import GeminiClient
+from config import WORKLOAD_IMAGE, WORKLOAD_TEXT, LLMConfig
+
+CLAUDE_EVENTS = [
+    {"type": "message_start", "message": {"model": "claude-3-5-haiku-20241022", "usage": {"input_tokens": 12, "output_tokens": 1}}},
+    {"type": "ping"},
+    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "Ahoj "}},
+    {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "světe"}},
+    {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 5}},
+    {"type": "message_stop"},
+]
+
+GEMINI_EVENTS = [
+    {"candidates": [{"content": {"parts": [{"text": "Ahoj "}]}}]},
+    {"candidates": [{"content": {"parts": [{"text": "světe"}]}, "finishReason": "STOP"}],
+     "usageMetadata": {"promptTokenCount": 7, "candidatesTokenCount": 3, "totalTokenCount": 10}},
+]
+
+OPENAI_EVENTS = [
+    {"id": "c1", "object": "chat.completion.chunk", "created": 1, "model": "gpt-4o",
+     "choices": [{"index": 0, "delta": {"role": "assistant", "content": "Ahoj "}, "finish_reason": None}]},
+    {"id": "c1", "object": "chat.completion.chunk", "created": 1, "model": "gpt-4o",
+     "choices": [{"index": 0, "delta": {"content": "světe"}, "finish_reason": "stop"}]},
+    {"id": "c1", "object": "chat.completion.chunk", "created": 1, "model": "gpt-4o", "choices": [],
+     "usage": {"prompt_tokens": 9, "completion_tokens": 2, "total_tokens": 11}},
+]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    SSE stub - cesta určuje provider, /hang/ simuluje zaseknuté spojení, /slow-start/
+    dlouhé přemýšlení před první událostí, /limited/ vrací 429.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path.startswith("/limited/"):
+            body = json.dumps({"error": {"message": "rate limited"}}).encode()
+            self.send_response(429)
+            self.send_header("retry-after", "3")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if "streamGenerateContent" in self.path:
+            events = GEMINI_EVENTS
+        elif "chat/completions" in self.path:
+            events = OPENAI_EVENTS
+        else:
+            events = CLAUDE_EVENTS
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        if self.path.startswith("/slow-start/"):
+            time.sleep(1)
+        for i, event in enumerate(events):
+            if self.path.startswith("/hang/") and i == 1:
+                time.sleep(2)
+                return
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        if events is OPENAI_EVENTS:
+            self.wfile.write(b"data: [DONE]\n\n")
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_claude_stream(stub_url):
+    """Claude SSE - text z delt, usage z message_start/message_delta, heartbeat na každou událost"""
+    client = ClaudeClient("test-key")
+    client.base_url = stub_url
+    beats = []
+    result = asyncio.run(client.chat_completion_stream("s", "u", "claude-3-5-haiku-20241022", on_chunk=lambda: beats.append(1)))
+    assert result["content"] == "Ahoj světe"
+    assert result["usage"] == {"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17,
+                               "cached_tokens": 0, "cache_write_tokens": 0}
+    assert result["metadata"]["claude_data"]["stop_reason"] == "end_turn"
+    assert result["metadata"]["streaming"]["chunks"] == 2
+    assert result["metadata"]["streaming"]["ttft"] is not None
+    assert len(beats) == len(CLAUDE_EVENTS)
+
+
+def test_gemini_stream(stub_url):
+    """Gemini streamGenerateContent?alt=sse"""
+    client = GeminiClient("test-key")
+    client.base_url = stub_url
+    result = asyncio.run(client.chat_completion_stream("s", "u", "gemini-1.5-flash"))
+    assert result["content"] == "Ahoj světe"
+    assert result["usage"]["total_tokens"] == 10
+    assert result["metadata"]["gemini_data"]["finish_reason"] == "STOP"
+
+
+def test_openai_stream(stub_url):
+    """OpenAI stream s include_usage"""
+    from openai import AsyncOpenAI
+    from backend.openai_client import OpenAIClient
+
+    client = OpenAIClient("test-key")
+    client._async_client = AsyncOpenAI(api_key="test-key", base_url=f"{stub_url}/v1")
+    beats = []
+    result = asyncio.run(client.chat_completion_stream("s", "u", "gpt-4o", on_chunk=lambda: beats.append(1)))
+    assert result["content"] == "Ahoj světe"
+    assert result["usage"]["total_tokens"] == 11
+    assert result["metadata"]["streaming"]["chunks"] == 2
+    assert len(beats) == 3
+
+
+def test_hung_stream_detected_quickly(stub_url, monkeypatch):
+    """Zaseknuté spojení spadne na idle timeoutu, ne po minutách"""
+    monkeypatch.setenv("LLM_STREAM_TIMEOUTS", '{"default": {"idle_seconds": 0.3}}')
+    client = ClaudeClient("test-key")
+    client.base_url = f"{stub_url}/hang"
+    started = time.monotonic()
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client.chat_completion_stream("s", "u", "claude-3-5-haiku-20241022"))
+    assert time.monotonic() - started < 1.5
+
+
+def test_idle_timeout_starts_after_first_byte(stub_url, monkeypatch):
+    """Dlouhé čekání na první událost (reasoning model) není zaseknutí a heartbeat během něj běží"""
+    from openai import AsyncOpenAI
+    from backend.openai_client import OpenAIClient
+
+    monkeypatch.setenv("LLM_STREAM_TIMEOUTS", '{"default": {"idle_seconds": 0.3}}')
+    monkeypatch.setattr(base_module, "STREAM_KEEPALIVE_INTERVAL", 0.2)
+    client = ClaudeClient("test-key")
+    client.base_url = f"{stub_url}/slow-start"
+    beats = []
+    result = asyncio.run(client.chat_completion_stream("s", "u", "claude-3-5-haiku-20241022", on_chunk=lambda: beats.append(1)))
+    assert result["content"] == "Ahoj světe"
+    assert len(beats) > len(CLAUDE_EVENTS)  # keepalive heartbeaty během čekání na první bajt
+
+    openai_client = OpenAIClient("test-key")
+    openai_client._async_client = AsyncOpenAI(api_key="test-key", base_url=f"{stub_url}/slow-start/v1")
+    assert asyncio.run(openai_client.chat_completion_stream("s", "u", "gpt-4o"))["content"] == "Ahoj světe"
+
+
+def test_stream_timeouts_per_model(monkeypatch):
+    """LLM_STREAM_TIMEOUTS - přesná shoda, nejdelší prefix modelu, default"""
+    assert stream_timeouts_for("gpt-4o") == StreamTimeouts()
+    monkeypatch.setenv("LLM_STREAM_TIMEOUTS", '{"default": {"idle_seconds": 20}, "o3": {"idle_seconds": 90, "first_byte_seconds": 900}, '
+                                             '"o3-mini": {"idle_seconds": 40}}')
+    assert stream_timeouts_for("gpt-4o").idle_seconds == 20
+    assert stream_timeouts_for("o3-2025-04-16") == StreamTimeouts(idle_seconds=90, first_byte_seconds=900)
+    assert stream_timeouts_for("o3-mini").idle_seconds == 40
+    monkeypatch.setenv("LLM_STREAM_TIMEOUTS", '{"o3": {"idle": 90}}')
+    with pytest.raises(ValueError, match="LLM_STREAM_TIMEOUTS"):
+        stream_timeouts_for("o3")
+
+
+def test_stream_rate_limit_error(stub_url):
+    """429 při streamu se převede na LLMRateLimitError s Retry-After"""
+    client = ClaudeClient("test-key")
+    client.base_url = f"{stub_url}/limited"
+    with pytest.raises(LLMRateLimitError) as exc:
+        asyncio.run(client.chat_completion_stream("s", "u", "claude-3-5-haiku-20241022"))
+    assert exc.value.retry_after == 3.0
+
+
+def test_safe_llm_call_heartbeats_per_chunk(stub_url, monkeypatch):
+    """safe_llm_call předá streamu heartbeat aktivity"""
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    from activity_wrappers import safe_llm_call
+
+    client = ClaudeClient("test-key")
+    client.base_url = stub_url
+    env = ActivityEnvironment()
+    heartbeats = []
+    env.on_heartbeat = lambda *details: heartbeats.append(details)
+
+    async def call():
+        return await safe_llm_call(client.chat_completion_stream, "claude", "claude-3-5-haiku-20241022",
+                                   system_prompt="s", user_message="u", max_tokens=100)
+
+    result = asyncio.run(env.run(call))
+    assert result["content"] == "Ahoj světe"
+    assert len(heartbeats) > len(CLAUDE_EVENTS)  # heartbeat před pokusem + na každou událost
+
+
+def test_retry_after_wait_heartbeats(monkeypatch):
+    """Čekání na Retry-After bez rate limiteru heartbeatuje v průběhu, ne jen před ním"""
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    monkeypatch.setenv("LLM_CIRCUIT_BREAKER_ENABLED", "false")
+    import activity_wrappers
+    from activity_wrappers import safe_llm_call
+
+    monkeypatch.setattr(activity_wrappers, "STREAM_KEEPALIVE_INTERVAL", 0.1)
+    calls = []
+
+    async def chat_completion(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise LLMRateLimitError("claude", "rate limited", retry_after=0.5)
+        return {"content": "ok"}
+
+    env = ActivityEnvironment()
+    heartbeats = []
+    env.on_heartbeat = lambda *details: heartbeats.append(time.monotonic())
+
+    async def call():
+        return await safe_llm_call(chat_completion, "claude", "claude-3-5-haiku-20241022", system_prompt="s", user_message="u")
+
+    assert asyncio.run(env.run(call))["content"] == "ok"
+    gaps = [b - a for a, b in zip(heartbeats, heartbeats[1:])]
+    assert len(heartbeats) >= 6 and max(gaps) < 0.3
+
+
+def test_heartbeat_timeout_per_workload():
+    """Streamované textové stage mají heartbeat v sekundách, obrázky a blokující volání minuty"""
+    config = LLMConfig()
+    assert config.heartbeat_timeout_for(WORKLOAD_TEXT) == 30
+    assert config.heartbeat_timeout_for(WORKLOAD_IMAGE) == 180
+    config.streaming = False
+    assert config.heartbeat_timeout_for(WORKLOAD_TEXT) == 180
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
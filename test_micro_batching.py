@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST CROSS-TOPIC MICRO-BATCHINGU
+Ověřuje sloučení requestů stejného asistenta do jednoho multi-topic volání a rozdělení výsledků
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from backend.llm_clients.micro_batching import (
+    MicroBatcher,
+    MicroBatchSettings,
+    build_combined_message,
+    load_micro_batch_settings,
+    parse_combined_response,
+)
+
+FAST = MicroBatchSettings(stages=("brief_assistant",), window_seconds=0.05, max_topics=8, heartbeat_interval=0.01)
+
+
+class FakeLLM:
+    """Odpovídá na sloučený prompt JSONem, na samostatné volání přímo."""
+
+    def __init__(self, drop=()):
+        self.calls = []
+        self.drop = drop
+
+    async def __call__(self, message, max_tokens, heartbeat):
+        self.calls.append((message, max_tokens))
+        await asyncio.sleep(0.03)
+        if "=== ZADÁNÍ 1 ===" not in message:
+            return {"content": f"brief: {message}", "usage": {"total_tokens": 10}, "model": "m"}
+        topics = [part.split("\n", 1)[1].strip() for part in message.split("=== ZADÁNÍ ")[1:]]
+        results = [{"id": i, "output": f"brief: {t}"} for i, t in enumerate(topics, start=1) if t not in self.drop]
+        content = "```json\n" + json.dumps({"results": results}, ensure_ascii=False) + "\n```"
+        return {"content": content, "usage": {"prompt_tokens": 100, "completion_tokens": 60, "total_tokens": 160}, "model": "m"}
+
+
+def run_topics(batcher, llm, topics, key="k", max_tokens=500, heartbeats=None):
+    async def main():
+        return await asyncio.gather(*(
+            batcher.submit(key, "brief_assistant", topic, llm, max_tokens=max_tokens,
+                           on_wait=(lambda: heartbeats.append(1)) if heartbeats is not None else None)
+            for topic in topics
+        ))
+    return asyncio.run(main())
+
+
+def test_topics_share_one_call_and_results_split_back():
+    """Souběžná témata jdou jedním voláním, každé workflow dostane svůj výstup"""
+    llm = FakeLLM()
+    heartbeats = []
+    results = run_topics(MicroBatcher(FAST), llm, ["ESG", "ETF", "Hypotéky"], heartbeats=heartbeats)
+    assert len(llm.calls) == 1
+    assert llm.calls[0][1] == 1500  # limit výstupu = součet limitů témat
+    assert [r["content"] for r in results] == ["brief: ESG", "brief: ETF", "brief: Hypotéky"]
+    assert results[0]["usage"]["total_tokens"] == 53
+    assert results[0]["micro_batch"] == {"size": 3}
+    assert heartbeats
+
+
+def test_missing_result_falls_back_to_standalone_call():
+    """Chybějící výsledek ve sloučené odpovědi se dopočítá samostatným voláním"""
+    llm = FakeLLM(drop=("ETF",))
+    results = run_topics(MicroBatcher(FAST), llm, ["ESG", "ETF"])
+    assert [r["content"] for r in results] == ["brief: ESG", "brief: ETF"]
+    assert "micro_batch" not in results[1]
+    assert llm.calls[1] == ("ETF", 500)
+
+
+def test_failed_combined_call_runs_topics_standalone():
+    """Selhání sloučeného volání neshodí stage - témata poběží samostatně"""
+    calls = []
+
+    async def llm(message, max_tokens, heartbeat):
+        calls.append(message)
+        if "=== ZADÁNÍ" in message:
+            raise RuntimeError("output too long")
+        return {"content": f"brief: {message}"}
+
+    results = run_topics(MicroBatcher(FAST), llm, ["A", "B"])
+    assert [r["content"] for r in results] == ["brief: A", "brief: B"]
+    assert len(calls) == 3
+
+
+def test_groups_respect_key_and_max_topics():
+    """Různé klíče (model, system prompt) se neslučují; plná skupina se odešle hned"""
+    llm = FakeLLM()
+    batcher = MicroBatcher(MicroBatchSettings(stages=("brief_assistant",), window_seconds=30, max_topics=2))
+
+    async def main():
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.submit("a", "brief_assistant", "A1", llm),
+            batcher.submit("a", "brief_assistant", "A2", llm),
+        ), timeout=5)
+
+    results = asyncio.run(main())
+    assert len(llm.calls) == 1 and llm.calls[0][1] is None
+    assert [r["content"] for r in results] == ["brief: A1", "brief: A2"]
+
+    llm = FakeLLM()
+    batcher = MicroBatcher(FAST)
+
+    async def mixed():
+        return await asyncio.gather(
+            batcher.submit("a", "brief_assistant", "A1", llm),
+            batcher.submit("b", "brief_assistant", "B1", llm),
+        )
+
+    asyncio.run(mixed())
+    assert sorted(call[0] for call in llm.calls) == ["A1", "B1"]  # osamocená témata jdou samostatně
+
+
+def test_group_call_is_independent_of_activities_and_heartbeats_each_waiter():
+    """Sloučené volání nedědí kontext žádné aktivity, heartbeat z něj dostane každá čekající aktivita
+    a zrušení aktivity, která skupinu založila, ostatní nezastaví"""
+    current = contextvars.ContextVar("activity", default=None)
+    seen, heartbeats = [], []
+
+    async def llm(message, max_tokens, heartbeat):
+        seen.append(current.get())
+        for _ in range(3):
+            heartbeat()
+            await asyncio.sleep(0.02)
+        return await FakeLLM()(message, max_tokens, heartbeat)
+
+    batcher = MicroBatcher(MicroBatchSettings(stages=("brief_assistant",), window_seconds=0.01, heartbeat_interval=10))
+
+    async def topic(name):
+        current.set(name)
+        return await batcher.submit("k", "brief_assistant", name, llm, on_wait=lambda: heartbeats.append(current.get()))
+
+    async def main():
+        first = asyncio.create_task(topic("ESG"))
+        others = [asyncio.create_task(topic(name)) for name in ("ETF", "Hypotéky")]
+        await asyncio.sleep(0.03)  # skupina odeslána, sloučené volání běží
+        first.cancel()
+        return await asyncio.gather(*others)
+
+    results = asyncio.run(main())
+    assert seen == [None]
+    assert [r["content"] for r in results] == ["brief: ETF", "brief: Hypotéky"]
+    assert {"ETF", "Hypotéky"} <= set(heartbeats)
+
+
+def test_parse_combined_response_is_strict():
+    assert parse_combined_response("není json", 2) == {}
+    content = json.dumps({"results": [{"id": "1", "output": {"title": "T"}}, {"id": 3, "output": "mimo"}, {"id": 2, "output": ""}]})
+    assert parse_combined_response(content, 2) == {1: '{\n  "title": "T"\n}'}
+    assert "=== ZADÁNÍ 2 ===\nB" in build_combined_message(["A", "B"])
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("LLM_MICRO_BATCH", '{"stages": ["brief_assistant"], "max_topics": 4}')
+    settings = load_micro_batch_settings()
+    assert settings.stages == ("brief_assistant",) and settings.max_topics == 4
+    assert MicroBatcher(settings).enabled_for("brief_assistant")
+    assert not MicroBatcher(settings).enabled_for("draft_assistant")
+    for raw in ('{"stage": ["x"]}', '{"stages": "x"}', '{"max_topics": 1}'):
+        monkeypatch.setenv("LLM_MICRO_BATCH", raw)
+        with pytest.raises(ValueError):
+            load_micro_batch_settings()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
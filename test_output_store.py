@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST CONTENT-ADDRESSED ÚLOŽIŠTĚ VÝSTUPŮ
+Ověřuje uložení runu do komprimovaných blobů, deduplikaci stejných výstupů stage,
+dohledání přes manifest a retenci s kompakcí nepoužitých blobů
+"""
+
+import asyncio
+import glob
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from helpers.output_store import BLOB_REF, OutputStore, OutputStoreSettings, load_output_store_settings
+
+HUMANIZED = "<article><h2>Co je ETF</h2><p>Burzovně obchodovaný fond.</p></article>"
+
+
+def _result(run_id, seo="SEO výstup"):
+    return {
+        "workflow_id": "assistant_pipeline_etf",
+        "run_id": run_id,
+        "topic": "ETF pro začátečníky",
+        "final_output": HUMANIZED,
+        "pipeline_success": True,
+        "stage_logs": [
+            {"stage": "load_assistants_config", "status": "COMPLETED", "timestamp": 1.0},
+            {"stage": "HumanizerAssistant", "status": "COMPLETED", "output": HUMANIZED, "timestamp": 2.0},
+            {"stage": "SEOAssistant", "status": "COMPLETED", "output": {"seo_metadata": {"title": seo}}, "timestamp": 3.0},
+        ],
+    }
+
+
+def _blobs(store):
+    return glob.glob(os.path.join(store.blob_dir, "*", "*", "*.json.gz"))
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("OUTPUT_STORE", '{"dir": "/tmp/store", "retention_days": 30}')
+    assert load_output_store_settings() == OutputStoreSettings(dir="/tmp/store", retention_days=30)
+    monkeypatch.setenv("OUTPUT_STORE", '{"path": "/tmp/store"}')
+    with pytest.raises(ValueError, match="OUTPUT_STORE"):
+        load_output_store_settings()
+
+
+def test_roundtrip_and_dedup(tmp_path):
+    """Humanizer výstup = final_output -> jeden blob; druhý run sdílí nezměněné výstupy"""
+    store = OutputStore(OutputStoreSettings(dir=str(tmp_path)))
+    first = store.write_run(_result("run-1"))
+    assert first.path.startswith(os.path.join(str(tmp_path), "blobs", first.root_blob[:2], first.root_blob[2:4]))
+    assert first.new_blobs == 3  # humanizer/final_output, SEO, dokument runu
+    assert len(_blobs(store)) == 3
+    assert store.get_blob(first.root_blob)["final_output"] == {BLOB_REF: store.get_blob(first.root_blob)["stage_logs"][1]["output"][BLOB_REF]}
+
+    second = store.write_run(_result("run-2", seo="Jiný SEO výstup"))
+    assert second.new_blobs == 2  # nový SEO výstup a dokument, humanizer sdílený
+    assert len(_blobs(store)) == 5
+    assert not glob.glob(os.path.join(store.blob_dir, "**", "*.tmp"), recursive=True)
+
+    assert store.load_run("assistant_pipeline_etf", "run-1") == _result("run-1")
+    assert store.load_run("assistant_pipeline_etf") == _result("run-2", seo="Jiný SEO výstup")
+    assert store.load_run("neexistuje") is None
+    assert [run.run_id for run in store.list_runs()] == ["run-2", "run-1"]
+
+
+def test_retention_and_compaction(tmp_path):
+    store = OutputStore(OutputStoreSettings(dir=str(tmp_path), max_runs=1))
+    store.write_run(_result("run-1", seo="Starý"), saved_at="2025-08-01T10:00:00")
+    store.write_run(_result("run-2"), saved_at="2025-08-02T10:00:00")
+
+    assert store.apply_retention() == 1
+    assert store.compact()["removed_blobs"] == 0  # grace period - čerstvé bloby zůstávají
+    stats = store.compact(grace_seconds=0)
+    assert (stats["removed_blobs"], stats["kept_blobs"]) == (2, 3)
+    assert store.load_run("assistant_pipeline_etf", "run-2") == _result("run-2")
+
+    aged = OutputStore(OutputStoreSettings(dir=str(tmp_path), retention_days=7))
+    assert aged.apply_retention(now=datetime(2025, 8, 5)) == 0
+    assert aged.apply_retention(now=datetime(2025, 8, 20)) == 1
+
+
+def test_async_save_runs_maintenance_periodically(tmp_path, monkeypatch):
+    """Retence a kompakce běží na pozadí - save_run na ně nečeká"""
+    store = OutputStore(OutputStoreSettings(dir=str(tmp_path), maintenance_every=2))
+    calls = []
+    release = threading.Event()
+
+    def slow_maintain():
+        release.wait(5)
+        calls.append(1)
+
+    monkeypatch.setattr(store, "maintain", slow_maintain)
+
+    async def scenario():
+        return [await store.save_run(_result(f"run-{i}")) for i in range(4)]
+
+    started = time.monotonic()
+    stored = asyncio.run(scenario())
+    assert time.monotonic() - started < 2
+    assert [run.run_id for run in stored] == ["run-0", "run-1", "run-2", "run-3"]
+    # Druhá údržba se nespustí, dokud první běží
+    assert not calls
+    release.set()
+    deadline = time.monotonic() + 5
+    while store._maintaining and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls == [1]
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST PROMPT CACHINGU STATICKÝCH SYSTEM PROMPTŮ
+Ověřuje cache_control (Claude), stabilní prefix + prompt_cache_key (OpenAI), cachedContents (Gemini)
+a hlášení cached_tokens v usage proti lokálnímu stub serveru
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.getcwd())
+
+import pytest
+from openai import AsyncOpenAI
+
+from backend.llm_clients import gemini_client, prompt_cache
+from backend.llm_clients.claude_client import ClaudeClient
+from backend.llm_clients.gemini_client import GeminiClient
+from backend.llm_clients.prompt_cache import (
+    GeminiContextCache,
+    PromptCacheSettings,
+    load_prompt_cache_settings,
+    shared_prefix,
+)
+from backend.openai_client import OpenAIClient
+
+SYSTEM_PROMPT = "Jsi SEO copywriter. " * 20  # 400 znaků - nad testovacím minimem
+SHARED = "Zadání článku a osnova.\n" * 10 + "\n"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    requests = None
+    fail_cache = False
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        path = self.path.split("?")[0]
+        self.requests.append((path, body))
+        if path == "/v1/messages" and body.get("stream"):
+            events = [
+                {"type": "message_start", "message": {"model": body["model"], "usage": {
+                    "input_tokens": 20, "output_tokens": 1, "cache_read_input_tokens": 300, "cache_creation_input_tokens": None}}},
+                {"type": "content_block_delta", "delta": {"type": "text_delta", "text": "ahoj"}},
+                {"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": 5}},
+            ]
+            data = "".join(f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            return self.wfile.write(data)
+        if path == "/v1/messages":
+            return self._json({"model": body["model"], "content": [{"type": "text", "text": "ahoj"}], "stop_reason": "end_turn",
+                               "usage": {"input_tokens": 20, "output_tokens": 5,
+                                         "cache_creation_input_tokens": 0, "cache_read_input_tokens": 300}})
+        if path == "/v1/chat/completions":
+            return self._json({"id": "c", "object": "chat.completion", "created": 0, "model": body["model"],
+                               "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "ahoj"}}],
+                               "usage": {"prompt_tokens": 1200, "completion_tokens": 5, "total_tokens": 1205,
+                                         "prompt_tokens_details": {"cached_tokens": 1024}}})
+        if path == "/v1beta/cachedContents":
+            if self.fail_cache:
+                return self._json({"error": {"message": "Cached content is too small"}}, 400)
+            return self._json({"name": f"cachedContents/c{len(self.requests)}", "model": body["model"]})
+        if path.endswith(":generateContent"):
+            return self._json({"candidates": [{"content": {"parts": [{"text": "ahoj"}]}, "finishReason": "STOP"}],
+                               "usageMetadata": {"promptTokenCount": 400, "candidatesTokenCount": 5, "totalTokenCount": 405,
+                                                 "cachedContentTokenCount": 380 if "cachedContent" in body else 0}})
+        self._json({"error": {"message": "not found"}}, 404)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "_settings", PromptCacheSettings(min_chars=200))
+    monkeypatch.setattr(gemini_client, "_context_cache", GeminiContextCache())
+    handler = type("Handler", (StubHandler,), {"requests": [], "fail_cache": False})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield handler
+    server.shutdown()
+
+
+def claude(stub):
+    client = ClaudeClient("test-key")
+    client.base_url = f"{stub.url}/v1"
+    return client
+
+
+def test_claude_marks_system_prompt_and_shared_context(stub):
+    """Claude - cache_control breakpointy, cached_tokens v usage, prompt_tokens včetně cache"""
+    result = asyncio.run(claude(stub).chat_completion(
+        SYSTEM_PROMPT, "Napiš sekci 2.", "claude-3-5-haiku-20241022", shared_context=SHARED
+    ))
+    payload = stub.requests[0][1]
+    assert payload["system"] == [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    assert payload["messages"][0]["content"][0] == {"type": "text", "text": SHARED, "cache_control": {"type": "ephemeral"}}
+    assert payload["messages"][0]["content"][1]["text"] == "Napiš sekci 2."
+    assert result["usage"] == {"prompt_tokens": 320, "completion_tokens": 5, "total_tokens": 325,
+                               "cached_tokens": 300, "cache_write_tokens": 0}
+
+
+def test_claude_short_prompt_stays_plain(stub):
+    """Krátký prompt provider necachuje - payload zůstává beze změny"""
+    asyncio.run(claude(stub).chat_completion("Krátký prompt", "téma", "claude-3-5-haiku-20241022"))
+    payload = stub.requests[0][1]
+    assert payload["system"] == "Krátký prompt"
+    assert payload["messages"][0]["content"] == "téma"
+
+
+def test_claude_stream_reports_cached_tokens(stub):
+    result = asyncio.run(claude(stub).chat_completion_stream(SYSTEM_PROMPT, "téma", "claude-3-5-haiku-20241022"))
+    assert result["content"] == "ahoj"
+    assert result["usage"]["cached_tokens"] == 300
+    assert result["usage"]["prompt_tokens"] == 320
+
+
+def test_openai_stable_prefix_and_cache_key(stub):
+    """OpenAI - system -> sdílený kontext -> proměnná část, stejný prompt_cache_key pro stejný system prompt"""
+    client = OpenAIClient("test-key")
+    client._async_client = AsyncOpenAI(api_key="test-key", base_url=f"{stub.url}/v1")
+    for topic in ("ESG", "ETF"):
+        result = asyncio.run(client.chat_completion(SYSTEM_PROMPT, topic, "gpt-4o", shared_context=SHARED))
+    first, second = stub.requests[0][1], stub.requests[1][1]
+    assert first["messages"][0] == {"role": "system", "content": SYSTEM_PROMPT}
+    assert first["messages"][1]["content"] == f"{SHARED}ESG"
+    assert first["prompt_cache_key"] == second["prompt_cache_key"]
+    assert result["usage"]["cached_tokens"] == 1024
+
+    # Připnuté openai==1.58.1 nezná prompt_cache_key jako argument create() - posílá se v extra_body
+    params = client._sdk_params(client._build_chat_params(SYSTEM_PROMPT, "ETF", "gpt-4o"))
+    assert "prompt_cache_key" not in params
+    assert params["extra_body"] == {"prompt_cache_key": first["prompt_cache_key"]}
+
+
+def test_gemini_cached_content_is_created_once(stub):
+    """Gemini - cachedContents se založí jednou, další volání posílají jen proměnnou část"""
+    client = GeminiClient("test-key")
+    client.base_url, client.cache_base_url = f"{stub.url}/v1", f"{stub.url}/v1beta"
+
+    async def main():
+        return [await client.chat_completion(SYSTEM_PROMPT, topic, "gemini-2.5-flash") for topic in ("ESG", "ETF")]
+
+    results = asyncio.run(main())
+    paths = [path for path, _ in stub.requests]
+    assert paths == ["/v1beta/cachedContents", "/v1beta/models/gemini-2.5-flash:generateContent",
+                     "/v1beta/models/gemini-2.5-flash:generateContent"]
+    created = stub.requests[0][1]
+    assert created["systemInstruction"]["parts"][0]["text"] == SYSTEM_PROMPT
+    call = stub.requests[2][1]
+    assert call["cachedContent"] == "cachedContents/c1"
+    assert call["contents"] == [{"role": "user", "parts": [{"text": "ETF"}]}]
+    assert results[1]["usage"]["cached_tokens"] == 380
+
+
+def test_gemini_falls_back_without_cache(stub):
+    """Neúspěšné založení cache - volání bez cache a bez opakovaných pokusů o založení"""
+    stub.fail_cache = True
+    client = GeminiClient("test-key")
+    client.base_url, client.cache_base_url = f"{stub.url}/v1", f"{stub.url}/v1beta"
+
+    async def main():
+        return [await client.chat_completion(SYSTEM_PROMPT, topic, "gemini-2.5-flash") for topic in ("ESG", "ETF")]
+
+    results = asyncio.run(main())
+    paths = [path for path, _ in stub.requests]
+    assert paths.count("/v1beta/cachedContents") == 1
+    assert paths[1:] == ["/v1/models/gemini-2.5-flash:generateContent"] * 2
+    assert SYSTEM_PROMPT in stub.requests[1][1]["contents"][0]["parts"][0]["text"]
+    assert results[0]["usage"]["cached_tokens"] == 0
+
+
+def test_safe_llm_call_forwards_shared_context(stub, monkeypatch):
+    """Sdílený kontext projde přes safe_llm_call až do payloadu providera"""
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    from temporalio.testing import ActivityEnvironment
+    from activity_wrappers import safe_llm_call
+
+    async def call():
+        return await safe_llm_call(claude(stub).chat_completion, "claude", "claude-3-5-haiku-20241022",
+                                   system_prompt=SYSTEM_PROMPT, user_message="Napiš sekci 2.", shared_context=SHARED)
+
+    asyncio.run(ActivityEnvironment().run(call))
+    content = stub.requests[0][1]["messages"][0]["content"]
+    assert [block["text"] for block in content] == [SHARED, "Napiš sekci 2."]
+
+
+def test_shared_prefix_and_settings(monkeypatch):
+    monkeypatch.setattr(prompt_cache, "_settings", PromptCacheSettings(min_chars=50))
+    common = "Zadání.\n" * 10 + "\nOsnova: A, B\n\nNapiš sekci "
+    prefix = shared_prefix([common + "1", common + "2"])
+    assert prefix.endswith("\n\n") and prefix.startswith("Zadání.") and "Napiš" not in prefix
+    assert shared_prefix([common + "1"]) is None
+    assert shared_prefix(["krátké 1", "krátké 2"]) is None
+    monkeypatch.setenv("LLM_PROMPT_CACHE", '{"min_char": 10}')
+    with pytest.raises(ValueError):
+        load_prompt_cache_settings()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST EXPORTNÍCH FORMÁTŮ ZE SDÍLENÉHO ARTICLE IR
+Ověřuje jednorázovou kompilaci PublishInput, renderery HTML/JSON/WordPress
+z jednoho IR a streamovaný (i souběžný) zápis všech formátů
+"""
+
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from activities import publish_script
+from activities.publish_script import (
+    PublishFAQ,
+    PublishInput,
+    PublishMeta,
+    PublishVisual,
+    compile_article,
+    generate_html_output,
+    generate_json_output,
+    generate_wordpress_output,
+    render_formats,
+    render_html,
+    write_formats,
+)
+
+ARTICLE = PublishInput(
+    title="ETF pro začátečníky: Jak začít investovat",
+    meta=PublishMeta(description="Jak začít s ETF.", keywords=["etf", "investice", "fondy"],
+                     canonical="https://seofarm.ai/etf-pro-zacatecniky"),
+    content_html="<article><h2>Co je ETF</h2><p>Burzovně obchodovaný fond.</p></article>",
+    faq=[PublishFAQ(question="Co je ETF?", answer_html="<p>Fond.</p>")],
+    visuals=[PublishVisual(image_url="https://seofarm.ai/img/etf-0.webp", prompt="Graf", alt="Graf růstu",
+                           position="top", width=1200, height=630),
+             PublishVisual(image_url="https://seofarm.ai/img/etf-1.webp", prompt="Investor", alt="Investor",
+                           position="bottom", srcset="etf-1-640.webp 640w")],
+    schema_org={"@type": "Article", "headline": "ETF pro začátečníky", "author": "SEO Farm", "datePublished": "2025-08-05"},
+    format="html",
+    language="cs",
+    date_published="2025-08-05T10:00:00Z"
+)
+
+
+def test_ir_compiled_once_for_all_formats(monkeypatch):
+    """Slug a schema.org se odvodí jednou při kompilaci, renderery je už jen vypisují"""
+    calls = []
+    original = publish_script.generate_slug
+    monkeypatch.setattr(publish_script, "generate_slug", lambda title: calls.append(title) or original(title))
+    ir = compile_article(ARTICLE)
+    outputs = render_formats(ir)
+    assert len(calls) == 1
+    assert outputs["json"]["slug"] == outputs["wordpress"]["post_name"] == "etf-pro-zacatecniky-jak-zacit-investovat"
+    assert outputs["json"]["meta"]["slug"] == outputs["json"]["slug"]
+    assert json.loads(outputs["wordpress"]["meta_input"]["_schema_org"]) == ARTICLE.schema_org
+    with pytest.raises(ValueError, match="Invalid format"):
+        render_formats(ir, ("html", "pdf"))
+
+
+def test_html_template_output():
+    html = generate_html_output(ARTICLE)
+    assert html.startswith('<!DOCTYPE html>\n<html lang="cs">')
+    assert '<meta name="keywords" content="etf, investice, fondy">' in html
+    assert '"headline": "ETF pro začátečníky"' in html
+    assert 'alt="Graf růstu" width="1200" height="630"' in html
+    assert 'alt="Investor" srcset="etf-1-640.webp 640w"' in html
+    assert html.index("etf-0.webp") < html.index("<section class=\"article-content\">") < html.index("etf-1.webp")
+    assert '<h3 class="faq-question">Co je ETF?</h3>' in html
+
+
+def test_wrappers_match_renderers():
+    ir = compile_article(ARTICLE)
+    assert generate_html_output(ARTICLE) == render_html(ir)
+    assert generate_json_output(ARTICLE) == render_formats(ir, ("json",))["json"]
+    wordpress = generate_wordpress_output(ARTICLE)
+    assert wordpress["post_content"].endswith("<h2>Často kladené otázky</h2>\n<h3>Co je ETF?</h3>\n<p>Fond.</p>\n")
+    assert wordpress["meta_input"]["_featured_image"] == "https://seofarm.ai/img/etf-0.webp"
+
+
+def test_streaming_writers_sequential_and_concurrent():
+    """Zápis do streamů - HTML po kouscích, výsledek stejný postupně i souběžně"""
+    ir = compile_article(ARTICLE)
+    chunks = []
+    render_html(ir, chunks.append)
+    assert len(chunks) > 10 and "".join(chunks) == render_html(ir)
+
+    sequential = {fmt: io.StringIO() for fmt in ("html", "json", "wordpress")}
+    write_formats(ir, sequential)
+    concurrent = {fmt: io.StringIO() for fmt in ("html", "json", "wordpress")}
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        write_formats(ir, concurrent, executor)
+    for fmt in sequential:
+        assert sequential[fmt].getvalue() == concurrent[fmt].getvalue()
+    assert json.loads(sequential["json"].getvalue())["title"] == ARTICLE.title
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
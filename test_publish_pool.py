@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST PROCESS POOLU PRO PUBLISH EXPORT
+Ověřuje, že deterministický publish běží v procesech poolu mimo event loop,
+s omezenou frontou, metrikami per export a stejným výsledkem jako přímé volání
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from activities import publish_pool
+from activities.publish_pool import (
+    PublishPoolSettings,
+    PublishProcessPool,
+    build_publish_exports,
+    load_publish_pool_settings,
+    run_publish_exports,
+)
+
+SEO = {"seo_metadata": {"title": "ETF pro začátečníky", "meta_description": "Jak začít s ETF.", "slug": "etf-zacatecnici",
+                        "keywords": ["etf", "investice", "fondy", "burza", "portfolio"]},
+       "headings": {"h1": "ETF pro začátečníky", "h2": ["Co je ETF", "Poplatky"]}}
+PIPELINE = {
+    "seo_assistant_output": SEO,
+    "humanizer_assistant_output": "<h1>ETF</h1><h2>A</h2><p>Investice do fondů.</p><h2>B</h2><p>Poplatky.</p>",
+    "qa_assistant_output": {"faq": [{"question": "Co je ETF?", "answer": "Burzovně obchodovaný fond."}]},
+    "multimedia_assistant_output": {"primary_visuals": [{"image_prompt": "Graf růstu ETF", "alt": "Graf"},
+                                                        {"image_prompt": "Investor u notebooku", "alt": "Investor"}]},
+    "current_date": "2025-08-05T10:00:00+00:00",
+}
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("PUBLISH_PROCESS_POOL", '{"workers": 2, "max_queue": 4}')
+    assert load_publish_pool_settings() == PublishPoolSettings(enabled=True, workers=2, max_queue=4)
+    monkeypatch.setenv("PUBLISH_PROCESS_POOL", '{"processes": 2}')
+    with pytest.raises(ValueError, match="PUBLISH_PROCESS_POOL"):
+        load_publish_pool_settings()
+
+
+def test_export_runs_in_warm_pool_process():
+    """Export v poolu dává stejný výsledek jako přímé volání, ale v jiném procesu"""
+    async def scenario():
+        pool = PublishProcessPool(PublishPoolSettings(workers=1))
+        try:
+            await pool.start()
+            pid = await pool.run(os.getpid)
+            exported = await pool.run(build_publish_exports, PIPELINE)
+            with pytest.raises(ValueError):
+                await pool.run(int, "není číslo")
+            return pid, exported
+        finally:
+            pool.shutdown()
+
+    pid, (publish_input, ai_farma, error) = asyncio.run(scenario())
+    assert pid != os.getpid()
+    assert (publish_input, ai_farma, error) == build_publish_exports(PIPELINE)
+    assert publish_input["content_stats"]["h2_count"] == 2
+    assert "<h2>Co je ETF</h2>" in publish_input["content_html"]
+
+
+def test_event_loop_not_blocked_and_queue_bounded():
+    """Během exportů event loop běží dál; v poolu je nejvýš workers + max_queue exportů"""
+    async def scenario():
+        pool = PublishProcessPool(PublishPoolSettings(workers=1, max_queue=0))
+        ticks, max_inflight = 0, 0
+        try:
+            await pool.start()
+            tasks = [asyncio.create_task(pool.run(time.sleep, 0.3)) for _ in range(2)]
+            while not all(task.done() for task in tasks):
+                ticks += 1
+                max_inflight = max(max_inflight, pool.inflight)
+                await asyncio.sleep(0.01)
+            await asyncio.gather(*tasks)
+            return ticks, max_inflight
+        finally:
+            pool.shutdown()
+
+    started = time.perf_counter()
+    ticks, max_inflight = asyncio.run(scenario())
+    assert max_inflight == 1
+    assert time.perf_counter() - started >= 0.6
+    assert ticks > 20
+
+
+def test_disabled_pool_runs_inline(monkeypatch):
+    monkeypatch.setattr(publish_pool, "_pool", PublishProcessPool(PublishPoolSettings(enabled=False)))
+    publish_input, ai_farma, error = asyncio.run(run_publish_exports(PIPELINE))
+    assert publish_input["title"] == "ETF pro začátečníky"
+    assert (ai_farma is None) == (error is not None)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST SEKČNÍHO PARALELNÍHO DRAFTINGU
+Ověřuje parsování osnovy z Briefu/SEO, dělení draftu po H2, paralelní běh a skládání v pořadí
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from helpers.section_drafting import (
+    build_part_messages,
+    outline_from_brief,
+    outline_from_seo,
+    plan_sections,
+    run_section_parallel,
+    split_markdown_sections,
+    stitch_parts,
+)
+
+BRIEF = """Připravuji výzkumný brief.
+
+### **Hlavní výzkumné otázky**
+1. Jaké jsou nejvýnosnější investice?
+2. Jak diverzifikovat portfolio?
+
+### **Doporučená struktura článku (outline)**
+
+**H1: Jak investovat peníze v roce 2025**
+
+*   **H2: Proč je rok 2025 pro investice zlomový?**
+    *   H3: Dopad sazeb ČNB
+    *   H3: Inflace
+*   **H2: Kam investovat v roce 2025**
+    *   H3: Akcie a ETF
+*   **H2: Jak sestavit portfolio**
+*   **H2: Daně a DIP**
+
+### **Poznámky**
+*   Toto už není osnova
+"""
+
+SEO = """```json
+{"metadata": {"title": "ESG"}, "headings": {"h1": "ESG investice", "h2": ["Co jsou ESG investice", "Typy ESG produktů", "Výkonnost", "FAQ"]}}
+```"""
+
+DRAFT = """# ESG investice
+
+Úvodní odstavec.
+
+## Co jsou ESG investice
+
+Text A.
+
+```python
+## tohle není nadpis
+```
+
+## Typy ESG produktů
+
+Text B.
+
+## Výkonnost
+
+Text C.
+"""
+
+
+def test_outline_from_brief():
+    """Osnova z Briefu - H1, H2 sekce s H3 podnadpisy, konec na dalším nadpisu"""
+    plan = outline_from_brief(BRIEF)
+    assert plan.h1 == "Jak investovat peníze v roce 2025"
+    assert [s.title for s in plan.sections] == [
+        "Proč je rok 2025 pro investice zlomový?", "Kam investovat v roce 2025", "Jak sestavit portfolio", "Daně a DIP"
+    ]
+    assert plan.sections[0].subheadings == ["Dopad sazeb ČNB", "Inflace"]
+
+
+def test_outline_from_seo_prefers_native_headings():
+    """SEO výstup (i v ```json bloku) má přednost před Briefem"""
+    plan = plan_sections("draft_assistant", "vstup", {"seo_assistant_output": SEO, "brief_assistant_output": BRIEF})
+    assert plan.h1 == "ESG investice"
+    assert len(plan.sections) == 4
+    assert outline_from_seo({"headings": {"h2": ["A"]}}).sections[0].title == "A"
+
+
+def test_no_outline_falls_back_to_single_call():
+    """Bez osnovy nebo s malým počtem sekcí se fan-out nepoužije"""
+    assert plan_sections("draft_assistant", "vstup", {"brief_assistant_output": "Žádná osnova"}) is None
+    assert plan_sections("humanizer_assistant", "# A\n\n## Jen jedna\n\ntext", {}) is None
+    assert plan_sections("seo_assistant", DRAFT, {}) is None
+
+
+def test_split_draft_ignores_code_blocks():
+    """Draft se dělí po H2 mimo code bloky, preambule (H1 + úvod) je samostatná část"""
+    plan = split_markdown_sections(DRAFT)
+    assert plan.preamble.startswith("# ESG investice")
+    assert [s.title for s in plan.sections] == ["Co jsou ESG investice", "Typy ESG produktů", "Výkonnost"]
+    assert "## tohle není nadpis" in plan.sections[0].source
+    assert len(build_part_messages(plan, "msg", "2025-08-06")) == 4
+
+
+def test_stitch_restores_missing_headings_and_fences():
+    """Chybějící H2 nadpis se doplní, obalový code blok odstraní"""
+    plan = outline_from_seo({"headings": {"h1": "T", "h2": ["A", "B"]}})
+    article = stitch_parts(plan, ["# T\n\nÚvod\n\n## A\n\nText A", "```markdown\nText B\n```"])
+    assert article == "# T\n\nÚvod\n\n## A\n\nText A\n\n## B\n\nText B"
+    with pytest.raises(ValueError):
+        stitch_parts(plan, ["jen jedna"])
+
+
+def test_parallel_run_keeps_order_and_sums_usage():
+    """Sekce běží paralelně, výsledek je v pořadí osnovy bez ohledu na pořadí dokončení"""
+    plan = plan_sections("humanizer_assistant", DRAFT, {})
+
+    async def call_part(message):
+        # Dřívější části trvají déle - dokončí se v opačném pořadí
+        index = int(message.split("část ")[1].split("/")[0])
+        await asyncio.sleep(0.2 - index * 0.04)
+        part = message.split("formátování, nepřidávej úvod ani závěr celého článku:\n\n", 1)[1]
+        return {"content": part.replace("Text", "Humanizovaný text"), "usage": {"total_tokens": 10, "cached_tokens": 3}, "model": "m"}
+
+    started = time.monotonic()
+    result = asyncio.run(run_section_parallel(plan, "msg", call_part, concurrency=4))
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.35  # ~ nejpomalejší sekce, ne součet (0.5 s)
+    assert result["usage"]["total_tokens"] == 40
+    assert result["usage"]["cached_tokens"] == 12
+    assert result["metadata"]["sections"] == 4
+    content = result["content"]
+    assert content.index("# ESG investice") < content.index("## Co jsou") < content.index("## Typy") < content.index("## Výkonnost")
+    assert "Humanizovaný text C." in content
+
+
+def test_failed_section_fails_stage():
+    """Selhání jedné sekce = selhání stage"""
+    plan = outline_from_seo({"headings": {"h2": ["A", "B", "C"]}})
+
+    async def call_part(message):
+        if "sekci 2/3" in message:
+            raise RuntimeError("503")
+        return {"content": "ok"}
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_section_parallel(plan, "msg", call_part))
+
+
+def test_failed_section_cancels_siblings():
+    """Po selhání jedné sekce se ostatní rozběhnuté i čekající sekce zruší"""
+    plan = outline_from_seo({"headings": {"h2": ["A", "B", "C", "D"]}})
+    finished, cancelled = [], []
+
+    async def call_part(message):
+        if "sekci 1/4" in message:
+            raise RuntimeError("503")
+        try:
+            await asyncio.sleep(0.3)
+        except asyncio.CancelledError:
+            cancelled.append(message)
+            raise
+        finished.append(message)
+        return {"content": "ok"}
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await run_section_parallel(plan, "msg", call_part, concurrency=2)
+        await asyncio.sleep(0.5)  # zrušené sekce už nedoběhnou
+
+    asyncio.run(scenario())
+    assert cancelled and not finished
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST PIPELINED HANDOFFU MEZI STAGE
+Ověřuje deterministický prefix, publikaci streamovaného textu a start downstream stage před koncem upstream
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import pytest
+from temporalio.testing import ActivityEnvironment
+
+from helpers.section_drafting import outline_from_seo, run_section_parallel
+from helpers.stage_handoff import (
+    HandoffPublisher,
+    handoff_prefix,
+    prune_handoffs,
+    read_handoff,
+    remove_handoffs,
+    validate_handoff_spec,
+    wait_for_handoff,
+)
+
+ARTICLE = """# ESG investice
+
+Úvod.
+
+## Co jsou ESG
+
+Text A.
+
+```markdown
+## nadpis v kódu
+```
+
+## Typy produktů
+
+Text B.
+
+## Výkonnost
+
+Text C."""
+
+
+def test_sections_prefix_waits_for_next_heading():
+    """K-tá sekce je hotová až se začátkem další - nadpisy v code blocích se nepočítají"""
+    spec = {"sections": 2}
+    partial = ARTICLE.split("## Výkonnost")[0]
+    assert handoff_prefix(partial, spec, complete=False) is None
+    prefix = handoff_prefix(ARTICLE, spec)
+    assert prefix.endswith("Text B.")
+    assert "## nadpis v kódu" in prefix
+    assert handoff_prefix(partial + "## Výk", spec, complete=False) == prefix
+
+
+def test_chars_prefix_is_stable_while_streaming():
+    """Prefix podle znaků je stejný nad rozpracovaným i hotovým výstupem"""
+    spec = {"chars": 30}
+    assert handoff_prefix(ARTICLE[:20], spec, complete=False) is None
+    assert handoff_prefix(ARTICLE[:35], spec, complete=False) == handoff_prefix(ARTICLE, spec) == "# ESG investice\n\nÚvod."
+    assert handoff_prefix("krátký", spec) == "krátký"  # hotový kratší výstup se použije celý
+
+
+def test_spec_validation():
+    assert validate_handoff_spec("seo_assistant", {"sections": 3}) == {"sections": 3}
+    for spec in ({"sections": 0}, {"lines": 3}, {"sections": 2, "chars": 10}, {"chars": True}):
+        with pytest.raises(ValueError):
+            validate_handoff_spec("seo_assistant", spec)
+
+
+def test_consumer_starts_before_upstream_finishes(tmp_path):
+    """Downstream dostane prefix, zatímco upstream ještě streamuje"""
+    publisher = HandoffPublisher("wf", "run", "humanizer_assistant", base_dir=str(tmp_path), min_interval=0)
+    chunks = [line + "\n" for line in ARTICLE.splitlines()]
+    timeline = {}
+
+    async def upstream():
+        for chunk in chunks:
+            publisher.append(chunk)
+            await asyncio.sleep(0.02)
+        publisher.complete(ARTICLE)
+        timeline["upstream_done"] = time.monotonic()
+
+    async def downstream():
+        prefix = await wait_for_handoff("wf", "run", "humanizer_assistant", {"sections": 1},
+                                        poll_interval=0.01, base_dir=str(tmp_path))
+        timeline["downstream_ready"] = time.monotonic()
+        return prefix
+
+    async def main():
+        return (await asyncio.gather(upstream(), downstream()))[1]
+
+    prefix = asyncio.run(main())
+    assert prefix == handoff_prefix(ARTICLE, {"sections": 1})
+    assert timeline["downstream_ready"] < timeline["upstream_done"]
+
+
+def test_upstream_failure_and_retry_reset(tmp_path):
+    """Retry upstream zahodí rozpracovaný text, selhání ukončí čekání downstream výjimkou"""
+    publisher = HandoffPublisher("wf", "run", "humanizer_assistant", base_dir=str(tmp_path), min_interval=0)
+    publisher.append("# Rozpracovaný pokus\n\n## A\n")
+    publisher.reset()
+    assert read_handoff("wf", "run", "humanizer_assistant", base_dir=str(tmp_path))["text"] == ""
+    publisher.fail("503")
+    with pytest.raises(Exception, match="503"):
+        asyncio.run(wait_for_handoff("wf", "run", "humanizer_assistant", {"chars": 10}, base_dir=str(tmp_path)))
+
+
+def test_wait_for_handoff_deadline(tmp_path):
+    """Upstream nic nepublikuje (jiný HANDOFF_DIR, zabitý worker) - čekání skončí po timeoutu"""
+    waits = []
+    with pytest.raises(Exception, match="nedorazil"):
+        asyncio.run(wait_for_handoff("wf", "run", "humanizer_assistant", {"chars": 10}, on_wait=lambda: waits.append(1),
+                                     poll_interval=0.01, base_dir=str(tmp_path), timeout=0.1))
+    assert waits
+
+
+def test_handoff_cleanup(tmp_path):
+    """Dokončený run smaže své handoffy, gc uklidí jen zbytky runů bez nedávného zápisu"""
+    for run in ("done", "stale", "live"):
+        HandoffPublisher("wf", run, "humanizer_assistant", base_dir=str(tmp_path)).complete(ARTICLE)
+    assert remove_handoffs("wf", "done", base_dir=str(tmp_path))
+    assert not remove_handoffs("wf", "done", base_dir=str(tmp_path))
+    stale = tmp_path / "wf" / "stale" / "humanizer_assistant.json"
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    assert prune_handoffs(max_age=3600, base_dir=str(tmp_path)) == 1
+    assert sorted(p.name for p in (tmp_path / "wf").iterdir()) == ["live"]
+
+
+def test_handoff_stage_previous_outputs_match_sequential_run():
+    """Souběžně spuštěná stage dostane stejné previous_outputs jako sekvenční běh (bez current_output)"""
+    from workflows.assistant_pipeline_workflow import _handoff_previous_outputs
+
+    before_upstream = {"current_output": "brief", "brief_assistant_output": "brief", "current_date": "2025-08-05"}
+    after_upstream = {**before_upstream, "draft_assistant_output": ARTICLE, "current_output": ARTICLE}
+    prefetched = _handoff_previous_outputs(before_upstream, "draft_assistant")
+    assert prefetched == _handoff_previous_outputs(after_upstream, "draft_assistant") == {"brief_assistant_output": "brief"}
+
+
+def test_section_parallel_publishes_contiguous_prefix():
+    """Sekční režim publikuje jen souvislý prefix hotových částí - poslední publikace = výsledný článek"""
+    plan = outline_from_seo({"headings": {"h1": "T", "h2": ["A", "B", "C"]}})
+    published = []
+
+    async def call_part(message):
+        index = int(message.split("sekci ")[1].split("/")[0])
+        await asyncio.sleep(0.1 - index * 0.03)  # dokončí se v opačném pořadí
+        return {"content": f"## {'ABC'[index - 1]}\n\nText {index}"}
+
+    result = asyncio.run(run_section_parallel(plan, "msg", call_part, on_progress=published.append))
+    assert published == [result["content"]]  # A doběhne poslední - do té doby není co publikovat
+    assert result["content"].startswith("## A")
+
+
+def test_safe_llm_call_streams_into_sink(tmp_path, monkeypatch):
+    """safe_llm_call předá streamovaný text do stream_sink"""
+    monkeypatch.setenv("LLM_RATE_LIMIT_ENABLED", "false")
+    from activity_wrappers import safe_llm_call
+    from backend.llm_clients.base import StreamCollector
+
+    publisher = HandoffPublisher("wf", "run", "humanizer_assistant", base_dir=str(tmp_path), min_interval=0)
+
+    async def chat_completion_stream(model, on_chunk=None, on_text=None, **kwargs):
+        collector = StreamCollector(on_chunk, on_text)
+        for part in ("# T\n\n", "## A\n\nText"):
+            collector.add(part)
+        return {"content": collector.content, "usage": {}}
+
+    async def call():
+        return await safe_llm_call(chat_completion_stream, "claude", "claude-3-5-haiku-20241022", stream_sink=publisher,
+                                   system_prompt="s", user_message="u", max_tokens=100)
+
+    result = asyncio.run(ActivityEnvironment().run(call))
+    assert read_handoff("wf", "run", "humanizer_assistant", base_dir=str(tmp_path))["text"] == result["content"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
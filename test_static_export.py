@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST STATIC EXPORTU DOKONČENÝCH RUNŮ
+Ověřuje render runů v process poolu do statického bundle (stránky, feed, sitemap,
+předkomprimované varianty), inkrementální rebuild jen změněných runů, bezpečné
+slugy a cílový adresář a stránku nejnovějšího runu u sdíleného slugu
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+import static_export
+from activities.publish_pool import PublishPoolSettings, PublishProcessPool
+from static_export import (
+    MANIFEST_NAME,
+    ExportInProgressError,
+    RunRecord,
+    StaticExportSettings,
+    StaticSiteExporter,
+    confined_out_dir,
+    export_lock,
+    load_static_export_settings,
+    render_run_page,
+)
+
+
+def _result(slug, title, h2="Co je ETF"):
+    seo = {"seo_metadata": {"title": title, "meta_description": f"{title} - průvodce.", "slug": slug,
+                            "keywords": ["etf", "investice", "fondy", "burza", "portfolio"]},
+           "headings": {"h1": title, "h2": [h2]}}
+    return {"stage_logs": [
+        {"stage": "SEOAssistant", "status": "COMPLETED", "output": seo},
+        {"stage": "HumanizerAssistant", "status": "COMPLETED", "output": "<h1>X</h1><h2>A</h2><p>Investice do fondů.</p>"},
+        {"stage": "QAAssistant", "status": "COMPLETED",
+         "output": {"faq": [{"question": "Co je ETF?", "answer": "Burzovně obchodovaný fond."}]}},
+        {"stage": "MultimediaAssistant", "status": "COMPLETED",
+         "output": {"primary_visuals": [{"image_prompt": "Graf růstu ETF", "alt": "Graf"},
+                                        {"image_prompt": "Investor u notebooku", "alt": "Investor"}]}},
+    ]}
+
+
+def _run(run_id, slug, title, day, **kwargs):
+    return RunRecord(id=run_id, topic=title, finished_at=f"2025-08-0{day}T10:00:00+00:00",
+                     result_json=json.dumps(_result(slug, title, **kwargs), ensure_ascii=False))
+
+
+async def _source(runs):
+    for run in runs:
+        yield run
+
+
+def _export(out_dir, runs, full=False):
+    async def scenario():
+        pool = PublishProcessPool(PublishPoolSettings(workers=1, max_queue=1))
+        exporter = StaticSiteExporter(str(out_dir), "https://seofarm.ai/blog", title="Blog", pool=pool,
+                                      settings=StaticExportSettings())
+        try:
+            return await exporter.export(_source(runs), full=full)
+        finally:
+            pool.shutdown()
+    return asyncio.run(scenario())
+
+
+def test_settings_from_env(monkeypatch):
+    monkeypatch.setenv("STATIC_EXPORT", '{"out_dir": "/tmp/site", "batch_size": 10}')
+    assert load_static_export_settings() == StaticExportSettings(out_dir="/tmp/site", batch_size=10)
+    monkeypatch.setenv("STATIC_EXPORT", '{"output": "/tmp/site"}')
+    with pytest.raises(ValueError, match="STATIC_EXPORT"):
+        load_static_export_settings()
+    monkeypatch.setenv("STATIC_EXPORT", '{"api_workers": 0}')
+    with pytest.raises(ValueError, match="STATIC_EXPORT"):
+        load_static_export_settings()
+
+
+def test_render_run_page():
+    page = render_run_page(_run("r1", "etf-zacatecnici", "ETF pro začátečníky", 5))
+    assert page["slug"] == "etf-zacatecnici"
+    html = page["files"][""].decode("utf-8")
+    assert html.startswith("<!DOCTYPE html>") and "<h2>Co je ETF</h2>" in html
+    assert gzip.decompress(page["files"][".gz"]) == page["files"][""]
+    assert page["item"]["date_published"] == "2025-08-05T10:00:00+00:00"
+    with pytest.raises(ValueError):
+        render_run_page(RunRecord(id="r2", topic="x", finished_at=None, result_json='{"stage_logs": []}'))
+
+
+def test_bundle_with_feed_sitemap_and_compressed_variants(tmp_path):
+    runs = [_run("r1", "etf-zacatecnici", "ETF pro začátečníky", 5),
+            _run("r2", "akcie-dividendy", "Dividendové akcie", 6),
+            RunRecord(id="r3", topic="Rozbitý", finished_at=None, result_json='{"stage_logs": []}')]
+    summary = _export(tmp_path, runs)
+    assert (summary.pages, summary.rendered, summary.unchanged) == (2, 2, 0)
+    assert list(summary.failed) == ["r3"]
+
+    page = tmp_path / "etf-zacatecnici" / "index.html"
+    assert gzip.decompress((tmp_path / "etf-zacatecnici" / "index.html.gz").read_bytes()) == page.read_bytes()
+    assert (tmp_path / "etf-zacatecnici" / "index.html.br").exists() == static_export.BROTLI_AVAILABLE
+
+    feed = json.loads((tmp_path / "feed.json").read_text(encoding="utf-8"))
+    assert feed["version"] == "https://jsonfeed.org/version/1.1"
+    assert [item["url"] for item in feed["items"]] == ["https://seofarm.ai/blog/akcie-dividendy/",
+                                                       "https://seofarm.ai/blog/etf-zacatecnici/"]
+    sitemap = (tmp_path / "sitemap.xml").read_text(encoding="utf-8")
+    assert "<loc>https://seofarm.ai/blog/etf-zacatecnici/</loc><lastmod>2025-08-05</lastmod>" in sitemap
+    assert gzip.decompress((tmp_path / "sitemap.xml.gz").read_bytes()).decode("utf-8") == sitemap
+
+
+def test_incremental_rebuild_renders_only_changed_runs(tmp_path):
+    """Druhý export vyrenderuje jen změněný run, smazaný run zmizí z bundle i feedu"""
+    runs = [_run("r1", "etf-zacatecnici", "ETF pro začátečníky", 5),
+            _run("r2", "akcie-dividendy", "Dividendové akcie", 6),
+            _run("r3", "dluhopisy", "Dluhopisy", 7)]
+    _export(tmp_path, runs)
+    untouched = (tmp_path / "etf-zacatecnici" / "index.html").stat().st_mtime_ns
+
+    changed = [runs[0], _run("r2", "akcie-dividendy", "Dividendové akcie", 6, h2="Výplata dividend")]
+    summary = _export(tmp_path, changed)
+    assert (summary.rendered, summary.unchanged, summary.removed) == (1, 1, 1)
+    assert (tmp_path / "etf-zacatecnici" / "index.html").stat().st_mtime_ns == untouched
+    assert "<h2>Výplata dividend</h2>" in (tmp_path / "akcie-dividendy" / "index.html").read_text(encoding="utf-8")
+    assert not (tmp_path / "dluhopisy").exists()
+    feed = json.loads((tmp_path / "feed.json").read_text(encoding="utf-8"))
+    assert sorted(item["url"] for item in feed["items"]) == ["https://seofarm.ai/blog/akcie-dividendy/",
+                                                            "https://seofarm.ai/blog/etf-zacatecnici/"]
+    assert set(json.loads((tmp_path / MANIFEST_NAME).read_text())["runs"]) == {"r1", "r2"}
+
+    assert _export(tmp_path, changed, full=True).rendered == 2
+
+
+def test_llm_slug_cannot_escape_bundle(tmp_path):
+    page = render_run_page(_run("r1", "/etc/Cron.d", "ETF pro začátečníky", 5))
+    assert page["slug"] == "etccrond"
+    with pytest.raises(ValueError, match="Slug"):
+        render_run_page(_run("r2", "../..", "ETF pro začátečníky", 5))
+    with pytest.raises(ValueError):
+        static_export._page_path(str(tmp_path), "/etc")
+
+    # Manifest s podvrženým slugem nesmí vést k mazání mimo bundle
+    outside = tmp_path / "outside"
+    (outside / "index.html").parent.mkdir()
+    (outside / "index.html").write_text("cizí")
+    bundle = tmp_path / "bundle"
+    bundle.mkdir()
+    (bundle / MANIFEST_NAME).write_text(json.dumps({"version": static_export.STATIC_EXPORT_VERSION,
+                                                    "runs": {"r9": {"hash": "x", "slug": "../outside", "item": {}}}}))
+    _export(bundle, [_run("r1", "etf-zacatecnici", "ETF pro začátečníky", 5)])
+    assert (outside / "index.html").read_text() == "cizí"
+
+
+def test_out_dir_confined_to_settings_dir(tmp_path):
+    assert confined_out_dir(str(tmp_path), "projekt") == os.path.join(os.path.realpath(tmp_path), "projekt")
+    for escape in ("..", "../jinam", "/tmp", ""):
+        with pytest.raises(ValueError, match="podadresářem"):
+            confined_out_dir(str(tmp_path), escape)
+    os.symlink("/tmp", tmp_path / "odkaz")
+    with pytest.raises(ValueError):
+        confined_out_dir(str(tmp_path), "odkaz")
+
+
+def test_newest_run_owns_shared_slug(tmp_path):
+    """Opakovaný článek se stejným slugem - stránku a feed drží nejnovější run i při změně staršího"""
+    runs = [_run("r1", "etf-zacatecnici", "ETF pro začátečníky", 5, h2="Starší verze"),
+            _run("r2", "etf-zacatecnici", "ETF pro začátečníky", 6, h2="Novější verze")]
+    summary = _export(tmp_path, runs)
+    page = tmp_path / "etf-zacatecnici" / "index.html"
+    assert summary.pages == 1 and "<h2>Novější verze</h2>" in page.read_text(encoding="utf-8")
+
+    # Změněný starší run se vyrenderuje, ale nejnovější (beze změny) se zapíše znovu po něm
+    summary = _export(tmp_path, [_run("r1", "etf-zacatecnici", "ETF pro začátečníky", 5, h2="Oprava"), runs[1]])
+    assert "<h2>Novější verze</h2>" in page.read_text(encoding="utf-8")
+    feed = json.loads((tmp_path / "feed.json").read_text(encoding="utf-8"))
+    assert [item["date_published"] for item in feed["items"]] == ["2025-08-06T10:00:00+00:00"]
+
+
+def test_concurrent_export_of_same_bundle_rejected(tmp_path):
+    """Druhý export do stejného bundle skončí ExportInProgressError, po doběhnutí prvního zámek zmizí"""
+    with export_lock(str(tmp_path)):
+        with pytest.raises(ExportInProgressError):
+            with export_lock(str(tmp_path)):
+                pass
+        with export_lock(str(tmp_path / "jiny-projekt")):
+            pass
+    with export_lock(str(tmp_path)):
+        pass
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
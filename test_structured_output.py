@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST STRUCTURED OUTPUT REŽIMU ASISTENTŮ
+Ověřuje schémata výstupů, nativní JSON režimy providerů (Claude tool use, OpenAI json_schema,
+Gemini responseSchema) a jednorázové parsování - publish přebírá nativní objekty
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.getcwd())
+
+import pytest
+from openai import AsyncOpenAI
+
+from backend.llm_clients.claude_client import ClaudeClient
+from backend.llm_clients.gemini_client import GeminiClient
+from backend.openai_client import OpenAIClient
+from helpers import output_schemas
+from helpers.output_schemas import (
+    OUTPUT_SCHEMAS,
+    StructuredOutputSettings,
+    load_structured_output_settings,
+    output_schema_for,
+    parse_structured_output,
+    visual_prompts,
+)
+from helpers.transformers import parse_multimedia_primary_visuals, parse_qa_faq, parse_seo_metadata
+
+SEO = {"seo_metadata": {"title": "ETF pro začátečníky", "meta_description": "Jak začít s ETF.", "slug": "etf-zacatecnici",
+                        "keywords": ["etf", "investice"]},
+       "headings": {"h1": "ETF pro začátečníky", "h2": ["Co je ETF", "Poplatky"]}}
+MULTIMEDIA = {"primary_visuals": [{"image_prompt": "Graf růstu ETF", "alt": "Graf"},
+                                  {"image_prompt": "Investor u notebooku", "alt": "Investor"}],
+              "optional_visuals": [{"image_prompt": "Mince", "alt": "Mince"}]}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    requests = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        path = self.path.split("?")[0]
+        self.requests.append((path, body))
+        if path == "/v1/messages" and body.get("stream"):
+            partial = json.dumps(SEO, ensure_ascii=False)
+            events = [
+                {"type": "message_start", "message": {"model": body["model"], "usage": {"input_tokens": 20, "output_tokens": 1}}},
+                {"type": "content_block_start", "index": 0, "content_block": {"type": "tool_use", "name": "structured_output", "input": {}}},
+                {"type": "content_block_delta", "delta": {"type": "input_json_delta", "partial_json": partial[:30]}},
+                {"type": "content_block_delta", "delta": {"type": "input_json_delta", "partial_json": partial[30:]}},
+                {"type": "message_delta", "delta": {"stop_reason": "tool_use"}, "usage": {"output_tokens": 50}},
+            ]
+            data = "".join(f"event: {e['type']}\ndata: {json.dumps(e)}\n\n" for e in events).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            return self.wfile.write(data)
+        if path == "/v1/messages":
+            return self._json({"model": body["model"], "stop_reason": "tool_use",
+                               "content": [{"type": "tool_use", "id": "t1", "name": "structured_output", "input": SEO}],
+                               "usage": {"input_tokens": 20, "output_tokens": 50}})
+        if path == "/v1/chat/completions":
+            return self._json({"id": "c", "object": "chat.completion", "created": 0, "model": body["model"],
+                               "choices": [{"index": 0, "finish_reason": "stop",
+                                            "message": {"role": "assistant", "content": json.dumps(MULTIMEDIA)}}],
+                               "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}})
+        if path.endswith(":generateContent"):
+            return self._json({"candidates": [{"content": {"parts": [{"text": json.dumps({"faq": []})}]}, "finishReason": "STOP"}],
+                               "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": 5, "totalTokenCount": 15}})
+        self._json({"error": {"message": "not found"}}, 404)
+
+
+@pytest.fixture
+def stub():
+    handler = type("Handler", (StubHandler,), {"requests": []})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield handler
+    server.shutdown()
+
+
+def claude(stub):
+    client = ClaudeClient("test-key")
+    client.base_url = f"{stub.url}/v1"
+    return client
+
+
+def test_claude_forces_schema_tool(stub):
+    """Claude - vynucený tool use se schématem, content je JSON vstup toolu"""
+    result = asyncio.run(claude(stub).chat_completion(
+        "Jsi SEO specialista.", "ETF", "claude-3-5-haiku-20241022", output_schema=OUTPUT_SCHEMAS["seo_assistant"]
+    ))
+    payload = stub.requests[0][1]
+    assert payload["tools"][0]["input_schema"] == OUTPUT_SCHEMAS["seo_assistant"]
+    assert payload["tool_choice"] == {"type": "tool", "name": "structured_output"}
+    assert json.loads(result["content"]) == SEO
+
+
+def test_claude_stream_collects_tool_json(stub):
+    streamed = []
+    result = asyncio.run(claude(stub).chat_completion_stream(
+        "Jsi SEO specialista.", "ETF", "claude-3-5-haiku-20241022",
+        on_text=streamed.append, output_schema=OUTPUT_SCHEMAS["seo_assistant"]
+    ))
+    assert json.loads(result["content"]) == SEO
+    assert len(streamed) == 2
+
+
+def test_openai_uses_json_schema_response_format(stub):
+    client = OpenAIClient("test-key")
+    client._async_client = AsyncOpenAI(api_key="test-key", base_url=f"{stub.url}/v1")
+    result = asyncio.run(client.chat_completion("Jsi art director.", "ETF", "gpt-4o",
+                                                output_schema=OUTPUT_SCHEMAS["multimedia_assistant"]))
+    response_format = stub.requests[0][1]["response_format"]
+    assert response_format["type"] == "json_schema"
+    assert response_format["json_schema"]["schema"] == OUTPUT_SCHEMAS["multimedia_assistant"]
+    assert parse_structured_output("multimedia_assistant", result["content"]) == MULTIMEDIA
+
+
+def test_gemini_json_mode_with_response_schema(stub):
+    """Gemini - responseMimeType + responseSchema (typy velkými písmeny) přes v1beta"""
+    client = GeminiClient("test-key")
+    client.base_url, client.cache_base_url = f"{stub.url}/v1", f"{stub.url}/v1beta"
+    asyncio.run(client.chat_completion("QA", "článek", "gemini-2.5-flash", output_schema=OUTPUT_SCHEMAS["qa_assistant"]))
+    path, payload = stub.requests[0]
+    assert path == "/v1beta/models/gemini-2.5-flash:generateContent"
+    config = payload["generationConfig"]
+    assert config["responseMimeType"] == "application/json"
+    assert config["responseSchema"]["type"] == "OBJECT"
+    assert config["responseSchema"]["properties"]["faq"]["items"]["properties"]["question"] == {"type": "STRING"}
+
+    asyncio.run(client.chat_completion("QA", "článek", "gemini-2.5-flash", output_schema={"type": "object"}))
+    assert "responseSchema" not in stub.requests[1][1]["generationConfig"]
+
+
+def test_parse_once_validates_against_schema():
+    """Výstup se naparsuje a zvaliduje na konci stage; chyby schématu jsou chyba stage"""
+    fenced = "Tady jsou metadata:\n```json\n" + json.dumps(SEO, ensure_ascii=False) + "\n```"
+    assert parse_structured_output("seo_assistant", fenced) == SEO
+    assert parse_structured_output("qa_assistant", '[{"question": "Co je ETF?", "answer": "Fond."}]') == \
+        {"faq": [{"question": "Co je ETF?", "answer": "Fond."}]}
+    with pytest.raises(ValueError, match="primary_visuals: minimálně 2"):
+        parse_structured_output("multimedia_assistant", {"primary_visuals": MULTIMEDIA["primary_visuals"][:1]})
+    with pytest.raises(ValueError, match="seo_metadata.slug: očekáván string"):
+        parse_structured_output("seo_assistant", {"seo_metadata": {"title": "T", "meta_description": "D", "slug": 1}})
+    with pytest.raises(ValueError, match="není validní JSON"):
+        parse_structured_output("qa_assistant", "FAQ: Co je ETF?")
+
+    text = "**title:** ETF pro začátečníky\n**meta_description:** Jak začít.\n**slug:** etf-zacatecnici"
+    assert parse_structured_output("seo_assistant", text)["seo_metadata"]["slug"] == "etf-zacatecnici"
+
+
+def test_publish_parsers_take_native_objects(monkeypatch):
+    """Transformers přebírají nativní objekty bez dalšího parsování"""
+    def no_reparse(*args, **kwargs):
+        raise AssertionError("nativní výstup se znovu parsuje")
+
+    monkeypatch.setattr("helpers.transformers.json.loads", no_reparse)
+    assert parse_seo_metadata(SEO)["slug"] == "etf-zacatecnici"
+    assert parse_qa_faq({"faq": [{"question": "Co je ETF?", "answer": "Fond."}]})[0]["answer_html"] == "Fond."
+    assert [v["prompt"] for v in parse_multimedia_primary_visuals(MULTIMEDIA)] == ["Graf růstu ETF", "Investor u notebooku"]
+    assert visual_prompts(MULTIMEDIA) == ["Graf růstu ETF", "Investor u notebooku", "Mince"]
+
+
+def test_schema_lookup_and_settings(monkeypatch):
+    monkeypatch.setattr(output_schemas, "_settings", StructuredOutputSettings())
+    assert output_schema_for("seo_assistant") is OUTPUT_SCHEMAS["seo_assistant"]
+    assert output_schema_for("brief_assistant") is None
+    assert output_schema_for("custom_assistant", "json") == {"type": "object"}
+    monkeypatch.setattr(output_schemas, "_settings", StructuredOutputSettings(enabled=False))
+    assert output_schema_for("seo_assistant") is None
+    monkeypatch.setenv("LLM_STRUCTURED_OUTPUT", '{"native": false}')
+    with pytest.raises(ValueError):
+        load_structured_output_settings()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST TASK QUEUES PER WORKLOAD
+Ověřuje směrování stage na task queues a načítání konfigurace z ENV
+"""
+
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from config import Config, TemporalConfig, workload_for_stage, WORKLOAD_TEXT, WORKLOAD_IMAGE, WORKLOAD_PUBLISH
+
+
+def test_stage_routing():
+    """Textové stage jdou na text queue, obrázky na image, publish na CPU queue"""
+    assert workload_for_stage("draft_assistant") == WORKLOAD_TEXT
+    assert workload_for_stage("qa_assistant") == WORKLOAD_TEXT
+    assert workload_for_stage("image_renderer_assistant") == WORKLOAD_IMAGE
+    assert workload_for_stage("publish_script") == WORKLOAD_PUBLISH
+
+
+def test_each_workload_has_own_queue():
+    """Každá workload třída má vlastní queue oddělenou od workflow queue"""
+    config = TemporalConfig()
+    names = {config.queue_for(w) for w in (WORKLOAD_TEXT, WORKLOAD_IMAGE, WORKLOAD_PUBLISH)}
+    assert len(names) == 3
+    assert config.task_queue not in names
+    with pytest.raises(ValueError):
+        config.queue_for("video")
+
+
+def test_queue_settings_from_env(monkeypatch):
+    """Název, concurrency a rate limit queue lze přepsat z ENV"""
+    monkeypatch.setenv("TEMPORAL_QUEUE_IMAGE_NAME", "images-eu")
+    monkeypatch.setenv("TEMPORAL_QUEUE_IMAGE_CONCURRENCY", "2")
+    monkeypatch.setenv("TEMPORAL_QUEUE_TEXT_RATE", "5.5")
+    config = Config()
+    assert config.temporal.queue_for(WORKLOAD_IMAGE) == "images-eu"
+    assert config.temporal.queues[WORKLOAD_IMAGE].max_concurrent_activities == 2
+    assert config.temporal.queues[WORKLOAD_TEXT].max_activities_per_second == 5.5
+
+
+def test_workflow_uses_options_pinned_at_start(monkeypatch):
+    """Queue a timeouty aktivit bere workflow z options["pinned"], ne z ENV workera (replay determinismus)"""
+    import config as config_module
+    from workflows.assistant_pipeline_workflow import _assistant_activity_options
+
+    pinned = config_module.pinned_workflow_options()
+    pinned["task_queues"][WORKLOAD_TEXT] = "llm-text-v1"
+    pinned["activity_timeouts"]["heartbeat"][WORKLOAD_TEXT] = 45
+    options = {"pinned": pinned}
+
+    # Worker s jinou konfigurací musí naplánovat stejné příkazy
+    monkeypatch.setattr(config_module.config.temporal.queues[WORKLOAD_TEXT], "name", "llm-text-v2")
+    monkeypatch.setattr(config_module.config.llm, "stream_heartbeat_timeout", 90)
+    activity_options = _assistant_activity_options("draft_assistant", options)
+    assert activity_options["task_queue"] == "llm-text-v1"
+    assert activity_options["heartbeat_timeout"].total_seconds() == 45
+    assert _assistant_activity_options("draft_assistant", options, batch=True)["start_to_close_timeout"].total_seconds() == pinned["activity_timeouts"]["batch_stage"]
+    # Batch stage se při retry napojí na odeslaný batch, ostatní stage jsou fail fast
+    assert _assistant_activity_options("draft_assistant", options, batch=True)["retry_policy"].maximum_attempts == 3
+    assert _assistant_activity_options("draft_assistant", options)["retry_policy"].maximum_attempts == 1
+
+    # Pipelined handoff se zapéká také - změna LLM_PIPELINED_HANDOFF nemění už běžící workflow
+    from workflows.assistant_pipeline_workflow import _pinned
+    monkeypatch.setattr(config_module.config.llm, "pipelined_handoff", {"humanizer_assistant": {"min_chars": 500}})
+    assert _pinned(options, "pipelined_handoff") == {}
+    assert _pinned({}, "pipelined_handoff") == {"humanizer_assistant": {"min_chars": 500}}
+
+    # Workflow spuštěné před pinem (bez options["pinned"]) dopočítá hodnoty z ENV jako dřív
+    assert _assistant_activity_options("draft_assistant", {})["task_queue"] == "llm-text-v2"
+
+
+def test_unserved_pinned_queues_reported(monkeypatch):
+    """Backend hlásí fronty ze svého ENV, na kterých nepolluje žádný worker (worker má jiný název)"""
+    import asyncio
+    from types import SimpleNamespace
+
+    import config as config_module
+    sys.path.append(os.path.join(os.getcwd(), "backend"))
+    from temporal_client import find_unserved_task_queues
+
+    monkeypatch.setattr(config_module.config.temporal.queues[WORKLOAD_IMAGE], "name", "images-eu")
+    served = {"default", config_module.config.temporal.queue_for(WORKLOAD_TEXT), config_module.config.temporal.queue_for(WORKLOAD_PUBLISH)}
+
+    class _Service:
+        async def describe_task_queue(self, request):
+            return SimpleNamespace(pollers=[object()] if request.task_queue.name in served else [])
+
+    monkeypatch.delenv("TEMPORAL_TASK_QUEUE", raising=False)
+    client = SimpleNamespace(workflow_service=_Service())
+    assert asyncio.run(find_unserved_task_queues(client, "default")) == {"images-eu": WORKLOAD_IMAGE}
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
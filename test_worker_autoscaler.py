@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST AUTOSCALERU WORKERŮ
+Ověřuje rozhodování podle backlogu/latence a rozběhnutých aktivit, hysterezi, cooldowny a min/max hranice
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from config import AutoscalerConfig
+from worker_autoscaler import QueueSample, ScalingPolicy, WorkerAutoscaler
+
+
+def make_config(**overrides):
+    values = dict(min_workers=1, max_workers=10, target_backlog_per_worker=5, scale_up_latency=30.0,
+                  scale_down_backlog=1, scale_up_cooldown=60, scale_down_cooldown=300)
+    values.update(overrides)
+    return AutoscalerConfig(**values)
+
+
+def backlog(count, age=0.0):
+    return [QueueSample(queue="seo-llm-text", backlog=count, backlog_age=age)]
+
+
+def test_batch_upload_scales_up_to_max():
+    """Velká dávka okamžitě naškáluje až na max"""
+    policy = ScalingPolicy(make_config())
+    assert policy.decide(1, backlog(200), now=0) == 10
+
+
+def test_high_latency_adds_worker_even_for_small_backlog():
+    """Malá fronta, ale dlouho čekající úkoly = přidej worker"""
+    policy = ScalingPolicy(make_config())
+    assert policy.decide(2, backlog(3, age=120), now=0) == 3
+
+
+def test_scale_up_respects_cooldown():
+    """Během cooldownu se znovu neškáluje nahoru"""
+    policy = ScalingPolicy(make_config())
+    assert policy.decide(1, backlog(20), now=0) == 4
+    assert policy.decide(4, backlog(40), now=30) == 4
+    assert policy.decide(4, backlog(40), now=61) == 8
+
+
+def test_scale_down_needs_sustained_idle_queue():
+    """Ubírá se až po souvisle prázdné frontě, po polovinách, ne pod minimum"""
+    policy = ScalingPolicy(make_config())
+    policy.decide(1, backlog(100), now=0)  # scale up na 10
+
+    assert policy.decide(10, backlog(3), now=400) == 10  # fronta není prázdná - hystereze
+    assert policy.decide(10, backlog(0), now=500) == 10  # prázdná, ale teprve začíná idle
+    assert policy.decide(10, backlog(0), now=700) == 10
+    assert policy.decide(10, backlog(0), now=800) == 5
+    assert policy.decide(5, backlog(0), now=900) == 5  # cooldown po scale down
+    assert policy.decide(5, backlog(0), now=1100) == 2
+    assert policy.decide(2, backlog(0), now=1400) == 1
+    assert policy.decide(1, backlog(0), now=2000) == 1
+
+
+def test_scale_down_keeps_workers_with_running_activities():
+    """Prázdná fronta, ale rozběhnuté aktivity - neubírá se pod počet vytížených workerů"""
+    policy = ScalingPolicy(make_config())
+    policy.decide(1, backlog(100), now=0)  # scale up na 10
+
+    assert policy.decide(10, backlog(0), now=400, busy=10) == 10  # všichni pracují - fronta není idle
+    assert policy.decide(10, backlog(0), now=500, busy=7) == 10
+    assert policy.decide(10, backlog(0), now=800, busy=7) == 7
+    assert policy.decide(7, backlog(0), now=1100, busy=0) == 3
+
+
+def test_invalid_bounds_rejected():
+    """Min/max musí dávat smysl"""
+    with pytest.raises(ValueError):
+        ScalingPolicy(make_config(min_workers=5, max_workers=2))
+
+
+class FakeSampler:
+    def __init__(self, samples):
+        self.samples = samples
+
+    async def sample(self):
+        return self.samples
+
+
+class FakeMetrics:
+    def __init__(self):
+        self.depths, self.ages, self.desired = {}, {}, None
+
+    def set_queue_depth(self, queue, depth):
+        self.depths[queue] = depth
+
+    def set_queue_backlog_age(self, queue, age):
+        self.ages[queue] = age
+
+    def set_desired_replicas(self, replicas):
+        self.desired = replicas
+
+
+def test_metric_mode_feeds_queue_depth_and_desired_replicas():
+    """Režim metric krmí set_queue_depth a publikuje desired replicas"""
+    metrics = FakeMetrics()
+    sampler = FakeSampler(backlog(12, age=4.0) + [QueueSample(queue="seo-image", backlog=3, backlog_age=1.0)])
+    autoscaler = WorkerAutoscaler(sampler, make_config(mode="metric"), metrics=metrics)
+
+    desired = asyncio.run(autoscaler.step(now=0))
+    assert desired == 3
+    assert metrics.depths == {"seo-llm-text": 12, "seo-image": 3}
+    assert metrics.ages["seo-llm-text"] == 4.0
+    assert metrics.desired == 3
+
+
+def test_local_mode_requires_supervisor():
+    """Režim local bez supervisoru nedává smysl"""
+    with pytest.raises(ValueError):
+        WorkerAutoscaler(FakeSampler([]), make_config(mode="local"))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST WORKER SUPERVISORU
+Spouští fake worker procesy a ověřuje health, restart spadlého i zaseknutého procesu, rolling restart,
+dokončení rozběhnuté aktivity před ukončením procesu a scale down jen nevytížených procesů
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+import pytest
+
+from config import SupervisorConfig, get_temporal_config
+from worker_supervisor import InFlightActivities, WorkerSupervisor
+from workflows.assistant_pipeline_workflow import _assistant_activity_options
+
+# Fake worker - zapisuje heartbeat jako production_worker.py pod supervisorem
+FAKE_WORKER = """
+import os, sys, time
+sys.path.insert(0, {root!r})
+from worker_supervisor import write_heartbeat
+busy = os.environ["WORKER_SLOT"] in os.environ.get("BUSY_SLOTS", "").split(",")
+while True:
+    write_heartbeat(os.environ["WORKER_HEARTBEAT_FILE"], pools=["text"], rss_mb=1.0,
+                    running_activities=1 if busy else 0)
+    time.sleep(0.1)
+"""
+
+# Fake worker s dlouhou aktivitou - na SIGTERM přestane brát úkoly, aktivitu ale dokončí
+LONG_ACTIVITY_WORKER = """
+import os, signal, sys, time
+sys.path.insert(0, {root!r})
+from worker_supervisor import write_heartbeat
+stopping = []
+signal.signal(signal.SIGTERM, lambda *_: stopping.append(time.time()))
+while not stopping:
+    write_heartbeat(os.environ["WORKER_HEARTBEAT_FILE"], pools=["text"], rss_mb=1.0)
+    time.sleep(0.1)
+time.sleep({activity_seconds})
+with open(os.environ["WORKER_HEARTBEAT_FILE"] + ".done", "w") as f:
+    f.write("completed")
+"""
+
+# Zaseknutý worker - jeden heartbeat, pak visí a SIGTERM ignoruje
+HUNG_WORKER = """
+import os, signal, sys, time
+sys.path.insert(0, {root!r})
+from worker_supervisor import write_heartbeat
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+write_heartbeat(os.environ["WORKER_HEARTBEAT_FILE"], pools=["text"], rss_mb=1.0)
+time.sleep(3600)
+"""
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    config = SupervisorConfig(processes=2, heartbeat_interval=1, heartbeat_timeout=5, startup_grace=5,
+                              restart_backoff=1.0, run_dir=str(tmp_path))
+    command = [sys.executable, "-c", FAKE_WORKER.format(root=os.getcwd())]
+    sup = WorkerSupervisor(config, command=command)
+    sup.start()
+    yield sup
+    sup.stop()
+
+
+def test_all_processes_become_ready(supervisor):
+    """Všechny procesy pošlou heartbeat a agregovaný status je zdravý"""
+    assert wait_until(lambda: all(w.is_ready() for w in supervisor.workers))
+    supervisor.monitor_once()
+    status = supervisor.status()
+    assert status["processes"] == 2
+    assert status["healthy"] == 2
+    assert status["rss_mb_total"] == 2.0
+    assert os.path.exists(os.path.join(supervisor.run_dir, "status.json"))
+
+
+def test_crashed_process_is_restarted(supervisor):
+    """Spadlý proces supervisor znovu spustí ve stejném slotu"""
+    assert wait_until(lambda: all(w.is_ready() for w in supervisor.workers))
+    victim = supervisor.workers[0]
+    old_pid = victim.pid
+    victim.process.kill()
+    victim.process.wait()
+
+    assert wait_until(lambda: (supervisor.monitor_once() or victim.is_ready()) and victim.pid != old_pid)
+    assert victim.restarts == 1
+
+
+def test_rolling_restart_replaces_every_process(supervisor):
+    """Rolling restart vymění všechny procesy a každý nový je připravený"""
+    assert wait_until(lambda: all(w.is_ready() for w in supervisor.workers))
+    old_pids = [w.pid for w in supervisor.workers]
+    supervisor.rolling_restart()
+    assert all(w.is_ready() for w in supervisor.workers)
+    assert not set(old_pids) & {w.pid for w in supervisor.workers}
+
+
+def test_scale_to_adds_and_removes_slots(supervisor):
+    """Autoscaler mění počet procesů - přidané sloty naběhnou, odebrané skončí"""
+    supervisor.scale_to(3)
+    assert wait_until(lambda: len(supervisor.workers) == 3 and all(w.is_ready() for w in supervisor.workers))
+    removed = supervisor.workers[1:]
+    supervisor.scale_to(1)
+    assert len(supervisor.workers) == 1
+    # Odebrané procesy dobíhají na pozadí, dočká je monitor smyčka
+    assert wait_until(lambda: supervisor.monitor_once() or not supervisor.retiring)
+    assert not any(w.is_alive() for w in removed)
+
+
+def test_hung_process_killed_after_kill_grace(tmp_path):
+    """Zaseknutý proces nečeká celý drain_timeout - SIGKILL po kill_grace, monitor smyčka mezitím neblokuje"""
+    config = SupervisorConfig(processes=1, heartbeat_interval=1, heartbeat_timeout=1, startup_grace=5,
+                              kill_grace=1, restart_backoff=1.0, run_dir=str(tmp_path))
+    sup = WorkerSupervisor(config, command=[sys.executable, "-c", HUNG_WORKER.format(root=os.getcwd())])
+    assert sup.drain_timeout() > 60
+    sup.start()
+    try:
+        worker = sup.workers[0]
+        hung_process = worker.process
+        assert wait_until(worker.is_ready)
+        assert wait_until(lambda: sup.monitor_once() or worker.stopping, timeout=5)
+        started = time.time()
+        sup.monitor_once()
+        assert time.time() - started < 0.5 and hung_process.poll() is None
+        assert wait_until(lambda: sup.monitor_once() or hung_process.poll() is not None, timeout=5)
+        assert hung_process.returncode == -9  # SIGKILL
+        assert time.time() - started < 5
+    finally:
+        for worker in sup.workers:
+            if worker.is_alive():
+                worker.process.kill()
+
+
+def test_in_flight_counter_tracks_running_activities():
+    """Interceptor počítá aktivity po dobu jejich běhu, i když skončí chybou"""
+    counter = InFlightActivities()
+    seen = []
+
+    class FakeNext:
+        async def execute_activity(self, input):
+            seen.append(counter.running)
+            if input == "fail":
+                raise RuntimeError("aktivita selhala")
+            return "ok"
+
+    inbound = counter.intercept_activity(FakeNext())
+    assert asyncio.run(inbound.execute_activity("run")) == "ok"
+    with pytest.raises(RuntimeError):
+        asyncio.run(inbound.execute_activity("fail"))
+    assert seen == [1, 1] and counter.running == 0
+
+
+def test_scale_down_stops_only_drained_workers(supervisor, monkeypatch):
+    """Scale down neukončí proces s rozběhnutou aktivitou, i když je na konci"""
+    monkeypatch.setenv("BUSY_SLOTS", "2")
+    supervisor.scale_to(3)
+    assert wait_until(lambda: all(w.is_ready() for w in supervisor.workers))
+    busy = supervisor.workers[2]
+    assert supervisor.busy_workers() == 1
+    assert supervisor.status()["running_activities"] == 1
+
+    supervisor.scale_to(1)
+    assert supervisor.workers == [busy] and busy.is_alive()
+    # Busy proces zůstává, i když autoscaler chce méně procesů
+    supervisor.scale_to(1)
+    assert supervisor.workers == [busy]
+
+    # Uvolněný slot se použije znovu až po doběhnutí jeho procesu
+    assert wait_until(lambda: supervisor.monitor_once() or not supervisor.retiring)
+    supervisor.scale_to(2)
+    assert sorted(w.slot for w in supervisor.workers) == [0, 2]
+
+
+def test_drain_timeout_covers_longest_activity():
+    """Supervisor čeká na graceful shutdown déle, než smí běžet nejdelší aktivita"""
+    options = {"pinned": {"task_queues": {"text": "t", "image": "i", "publish": "p"},
+                          "activity_timeouts": {"heartbeat": {"text": 30, "image": 180, "publish": 180},
+                                                "blocking_heartbeat": 180, "batch_stage": 90000}}}
+    longest = _assistant_activity_options("brief_assistant", options, pipelined=True)["start_to_close_timeout"]
+    assert get_temporal_config().graceful_shutdown_timeout >= longest.total_seconds()
+    assert WorkerSupervisor(SupervisorConfig()).drain_timeout() > longest.total_seconds()
+
+
+def test_rolling_restart_waits_for_running_activity(tmp_path, monkeypatch):
+    """Rolling restart nezabije worker uprostřed aktivity - proces se ukončí sám po jejím dokončení"""
+    monkeypatch.setattr(get_temporal_config(), "graceful_shutdown_timeout", 10)
+    config = SupervisorConfig(processes=1, heartbeat_interval=1, heartbeat_timeout=30, startup_grace=10,
+                              kill_grace=1, run_dir=str(tmp_path))
+    command = [sys.executable, "-c", LONG_ACTIVITY_WORKER.format(root=os.getcwd(), activity_seconds=2)]
+    sup = WorkerSupervisor(config, command=command)
+    sup.start()
+    try:
+        worker = sup.workers[0]
+        assert wait_until(worker.is_ready)
+        old_process = worker.process
+        started = time.time()
+        sup.rolling_restart()
+        assert time.time() - started >= 2
+        assert old_process.returncode == 0  # ne -SIGKILL
+        assert (tmp_path / "worker-0.heartbeat.done").read_text() == "completed"
+        assert worker.is_ready() and worker.pid != old_process.pid
+    finally:
+        sup.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST DETERMINISTICKÝCH WORKFLOW ID
+Ověřuje normalizaci témat, stabilitu ID a parsování reuse politiky
+"""
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), "backend"))  # backend moduly importují workflow_ids přímo
+
+import pytest
+
+from backend.workflow_ids import (
+    WorkflowReusePolicy,
+    build_forced_workflow_id,
+    build_workflow_id,
+    content_version_from_workflow_id,
+    normalize_topic,
+    parse_reuse_policy,
+    pipeline_succeeded,
+)
+
+
+def test_normalize_topic_ignores_case_diacritics_and_spacing():
+    """Varianty stejného tématu se normalizují na stejný řetězec"""
+    assert normalize_topic("Má ještě cenu  si pořizovat Fotovoltaiku?") == "ma jeste cenu si porizovat fotovoltaiku"
+    assert normalize_topic("  FOTOVOLTAIKA ") == normalize_topic("fotovoltaika")
+
+
+def test_workflow_id_is_deterministic():
+    """Stejný projekt + téma + verze = stejné ID"""
+    first = build_workflow_id("project-1", "Fotovoltaika pro rodinný dům")
+    second = build_workflow_id("project-1", "  fotovoltaika PRO rodinny dum ")
+    assert first == second
+    assert first.startswith("assistant_pipeline_fotovoltaika_pro_rodinny_dum_")
+
+
+def test_workflow_id_changes_with_project_and_version():
+    """Jiný projekt nebo verze obsahu vytvoří nové ID"""
+    base = build_workflow_id("project-1", "Tepelná čerpadla")
+    assert base != build_workflow_id("project-2", "Tepelná čerpadla")
+    assert base != build_workflow_id("project-1", "Tepelná čerpadla", content_version=2)
+
+
+def test_forced_workflow_id_keeps_deterministic_prefix():
+    """FORCE politika přidá unikátní suffix k deterministickému základu"""
+    base = build_workflow_id("project-1", "Tepelná čerpadla")
+    forced = build_forced_workflow_id("project-1", "Tepelná čerpadla")
+    assert forced.startswith(base + "_r")
+    assert forced != build_forced_workflow_id("project-1", "Tepelná čerpadla")
+
+
+def test_content_version_recovered_from_workflow_id():
+    """Resume převezme verzi obsahu z ID původního běhu (i FORCE)"""
+    assert content_version_from_workflow_id(build_workflow_id("project-1", "Tepelná čerpadla", 3), "project-1", "Tepelná čerpadla") == 3
+    forced = build_forced_workflow_id("project-1", "Tepelná čerpadla", 2)
+    assert content_version_from_workflow_id(forced, "project-1", "Tepelná čerpadla") == 2
+    assert content_version_from_workflow_id("seo_pipeline_tepelna_cerpadla_1753811442", "project-1", "Tepelná čerpadla") is None
+
+
+def test_parse_reuse_policy():
+    """Parsování politiky z API/ENV hodnot"""
+    assert parse_reuse_policy(None) == WorkflowReusePolicy.REJECT
+    assert parse_reuse_policy("Attach") == WorkflowReusePolicy.ATTACH
+    assert parse_reuse_policy("force") == WorkflowReusePolicy.FORCE
+    with pytest.raises(ValueError):
+        parse_reuse_policy("ignore")
+
+
+def test_empty_topic_is_rejected():
+    """Prázdné téma nelze použít pro workflow ID"""
+    with pytest.raises(ValueError):
+        build_workflow_id("project-1", "   ")
+
+
+def test_pipeline_succeeded_requires_article():
+    """Selhaná pipeline končí v Temporalu jako COMPLETED s failed_result - nesmí se počítat"""
+    success = {"pipeline_success": True, "publish_output": {"success": True}}
+    assert pipeline_succeeded(success)
+    assert pipeline_succeeded(json.dumps(success))
+    assert pipeline_succeeded(json.dumps({"status": "COMPLETED", "result": success}))  # resultJson z DB
+    assert not pipeline_succeeded({"pipeline_success": False, "error": "Asistent selhal"})
+    assert not pipeline_succeeded({"pipeline_success": True})  # publish neproběhl
+    assert not pipeline_succeeded({"pipeline_success": True, "publish_output": {"success": False}})
+    assert not pipeline_succeeded(None) and not pipeline_succeeded("neplatný json")
+
+
+class _FakeHandle:
+    def __init__(self, description, result):
+        self._description, self._result = description, result
+
+    async def describe(self):
+        if self._description is None:
+            from temporalio.service import RPCError, RPCStatusCode
+            raise RPCError("not found", RPCStatusCode.NOT_FOUND, b"")
+        return self._description
+
+    async def result(self):
+        return self._result
+
+
+class _FakeClient:
+    def __init__(self, status=None, result=None):
+        from temporalio.client import WorkflowExecutionStatus
+        description = SimpleNamespace(run_id="run-1", status=getattr(WorkflowExecutionStatus, status)) if status else None
+        self.handle = _FakeHandle(description, result)
+
+    def get_workflow_handle(self, workflow_id, run_id=None):
+        return self.handle
+
+
+def test_existing_pipeline_blocks_only_running_or_successful_runs():
+    from temporal_client import find_existing_pipeline
+
+    def existing(status=None, result=None):
+        return asyncio.run(find_existing_pipeline(_FakeClient(status, result), "assistant_pipeline_x"))
+
+    assert existing() is None
+    assert existing("RUNNING") == ("run-1", "RUNNING")
+    assert existing("COMPLETED", {"pipeline_success": True, "publish_output": {"success": True}}) == ("run-1", "COMPLETED")
+    assert existing("COMPLETED", {"pipeline_success": False}) is None
+    assert existing("FAILED") is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+🧪 TEST REPLAY PIPELINE WORKFLOW
+Ověřuje, že historie workflow spuštěného před nasazením nových aktivit
+(load -> execute_assistant... -> save -> publish) se s aktuálním kódem přehraje
+bez non-determinism chyby a nové běhy aktivity za workflow.patched() plánují
+"""
+
+import asyncio
+import base64
+import json
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import pytest
+from temporalio.client import WorkflowHistory
+from temporalio.worker import Replayer
+
+from workflows.assistant_pipeline_workflow import AssistantPipelineWorkflow
+
+TIME = "2025-08-05T10:00:00Z"
+ASSISTANTS = [
+    {"id": "a1", "name": "DraftAssistant", "function_key": "draft_assistant", "order": 1},
+    {"id": "a2", "name": "HumanizerAssistant", "function_key": "humanizer_assistant", "order": 2},
+]
+IMAGE_ASSISTANT = {"id": "a3", "name": "ImageRendererAssistant", "function_key": "image_renderer_assistant", "order": 3}
+
+
+def _payloads(*values):
+    return {"payloads": [{"metadata": {"encoding": base64.b64encode(b"json/plain").decode()},
+                          "data": base64.b64encode(json.dumps(value).encode("utf-8")).decode()}
+                         for value in values]}
+
+
+class _History:
+    """Minimální historie workflow v JSON formátu Temporal API."""
+
+    def __init__(self, *args):
+        self.events = []
+        self._event("EXECUTION_STARTED", "workflowExecutionStartedEventAttributes", {
+            "workflowType": {"name": "AssistantPipelineWorkflow"},
+            "taskQueue": {"name": "default", "kind": "TASK_QUEUE_KIND_NORMAL"},
+            "input": _payloads(*args),
+            "workflowTaskTimeout": "10s",
+            "originalExecutionRunId": "run-1",
+            "firstExecutionRunId": "run-1",
+            "attempt": 1,
+        })
+        self._workflow_task()
+
+    def _event(self, kind, attributes_key, attributes):
+        event = {"eventId": str(len(self.events) + 1), "eventTime": TIME,
+                 "eventType": f"EVENT_TYPE_WORKFLOW_{kind}" if kind.startswith(("EXECUTION", "TASK")) else f"EVENT_TYPE_{kind}",
+                 attributes_key: attributes}
+        self.events.append(event)
+        return len(self.events)
+
+    def _workflow_task(self):
+        scheduled = self._event("TASK_SCHEDULED", "workflowTaskScheduledEventAttributes",
+                                {"taskQueue": {"name": "default"}, "startToCloseTimeout": "10s", "attempt": 1})
+        started = self._event("TASK_STARTED", "workflowTaskStartedEventAttributes", {"scheduledEventId": str(scheduled)})
+        self._completed = self._event("TASK_COMPLETED", "workflowTaskCompletedEventAttributes",
+                                      {"scheduledEventId": str(scheduled), "startedEventId": str(started)})
+
+    def activity(self, activity_type, result):
+        return self.finish(self.schedule(activity_type), result)
+
+    def schedule(self, activity_type):
+        """Naplánovaná a spuštěná aktivita bez výsledku (souběžné aktivity v jednom workflow tasku)."""
+        activity_id = str(sum(1 for e in self.events if e["eventType"] == "EVENT_TYPE_ACTIVITY_TASK_SCHEDULED") + 1)
+        return self._event("ACTIVITY_TASK_SCHEDULED", "activityTaskScheduledEventAttributes", {
+            "activityId": activity_id, "activityType": {"name": activity_type}, "taskQueue": {"name": "default"},
+            "scheduleToCloseTimeout": "30s", "workflowTaskCompletedEventId": str(self._completed),
+        })
+
+    def finish(self, scheduled, result=None, failure=None):
+        """Dokončení (nebo selhání s failure zprávou) dříve naplánované aktivity."""
+        started = self._event("ACTIVITY_TASK_STARTED", "activityTaskStartedEventAttributes",
+                              {"scheduledEventId": str(scheduled), "attempt": 1})
+        if failure is None:
+            self._event("ACTIVITY_TASK_COMPLETED", "activityTaskCompletedEventAttributes",
+                        {"result": _payloads(result), "scheduledEventId": str(scheduled), "startedEventId": str(started)})
+        else:
+            self._event("ACTIVITY_TASK_FAILED", "activityTaskFailedEventAttributes", {
+                "failure": {"message": failure, "applicationFailureInfo": {"type": "Exception"}},
+                "scheduledEventId": str(scheduled), "startedEventId": str(started),
+                "retryState": "RETRY_STATE_MAXIMUM_ATTEMPTS_REACHED",
+            })
+        self._workflow_task()
+        return self
+
+    def marker(self, patch_id):
+        """Patch marker workflow.patched(patch_id) zapsaný v posledním workflow tasku."""
+        self._event("MARKER_RECORDED", "markerRecordedEventAttributes", {
+            "markerName": "core_patch",
+            "details": {"patch_id": {"payloads": [{"data": base64.b64encode(patch_id.encode("utf-8")).decode()}]},
+                        "deprecated": _payloads(False)},
+            "workflowTaskCompletedEventId": str(self._completed),
+        })
+        return self
+
+    def completed(self, result):
+        """Dokončení workflow - každý příkaz navíc oproti historii je pak non-determinism chyba."""
+        self._event("EXECUTION_COMPLETED", "workflowExecutionCompletedEventAttributes",
+                    {"result": _payloads(result), "workflowTaskCompletedEventId": str(self._completed)})
+        return self
+
+    def build(self):
+        return WorkflowHistory.from_json("wf-legacy", {"events": self.events})
+
+
+def _replay(history):
+    async def scenario():
+        await Replayer(workflows=[AssistantPipelineWorkflow]).replay_workflow(history.build())
+    asyncio.run(scenario())
+
+
+def test_history_from_before_new_stages_replays():
+    """Běh přerušený nasazením - další stage bez save_stage_checkpoint, pak save a publish"""
+    history = _History("ETF pro začátečníky", "p1", None, "2025-08-05").activity(
+        "load_assistants_from_database", {"status": "completed", "assistants": ASSISTANTS, "project_id": "p1"})
+    for assistant in ASSISTANTS:
+        history.activity("execute_assistant", {"output": f"výstup {assistant['function_key']}", "metadata": {}})
+    history.activity("save_output_to_json", "outputs/etf.json")
+    history.activity("publish_activity", {"success": True}).completed({"pipeline_success": True})
+    _replay(history)
+
+
+def test_patched_history_schedules_stage_checkpoints():
+    """Nový běh má v historii patch marker - checkpoint po každé stage je součástí replay"""
+    history = _History("ETF pro začátečníky", "p1", None, "2025-08-05").activity(
+        "load_assistants_from_database", {"status": "completed", "assistants": ASSISTANTS, "project_id": "p1"})
+    history.marker("stage-checkpoints")
+    for assistant in ASSISTANTS:
+        history.activity("execute_assistant", {"output": f"výstup {assistant['function_key']}", "metadata": {}})
+        history.activity("save_stage_checkpoint", "outputs/checkpoints/x.json")
+    history.activity("save_output_to_json", "outputs/etf.json")
+    history.activity("publish_activity", {"success": True}).completed({"pipeline_success": True})
+    _replay(history)
+
+    # Bez markeru (starý běh) by stejná historie měla příkazy navíc
+    legacy = _History("ETF pro začátečníky", "p1", None, "2025-08-05").activity(
+        "load_assistants_from_database", {"status": "completed", "assistants": ASSISTANTS, "project_id": "p1"})
+    for assistant in ASSISTANTS:
+        legacy.activity("execute_assistant", {"output": "x", "metadata": {}})
+        legacy.activity("save_stage_checkpoint", "x.json")
+    legacy.activity("save_output_to_json", "x.json").activity("publish_activity", {"success": True}).completed({})
+    with pytest.raises(Exception, match="[Nn]ondeterminism"):
+        _replay(legacy)
+
+
+def test_image_assets_only_for_patched_runs():
+    """Legacy běh s obrázky pokračuje po save rovnou publishem, nový běh plánuje image_assets_activity"""
+    assistants = ASSISTANTS + [IMAGE_ASSISTANT]
+
+    def history(patched):
+        h = _History("ETF pro začátečníky", "p1", None, "2025-08-05").activity(
+            "load_assistants_from_database", {"status": "completed", "assistants": assistants, "project_id": "p1"})
+        for assistant in assistants:
+            h.activity("execute_assistant", {"output": {"images": [{"url": "https://fal.media/a.png"}]}, "metadata": {}})
+        h.activity("save_output_to_json", "outputs/etf.json")
+        if patched:
+            h.marker("image-assets").activity("image_assets_activity", {"assets": [None], "errors": {}})
+        return h.activity("publish_activity", {"success": True}).completed({"pipeline_success": True})
+
+    _replay(history(patched=False))
+    _replay(history(patched=True))
+
+
+def test_failed_prefetched_stage_reruns_sequentially():
+    """Souběžně spuštěná stage selže (handoff nedorazil) - workflow ji zopakuje nad hotovým výstupem upstream"""
+    options = {"pinned": {"pipelined_handoff": {"humanizer_assistant": {"sections": 1}}}}
+    history = _History("ETF pro začátečníky", "p1", None, "2025-08-05", options).activity(
+        "load_assistants_from_database", {"status": "completed", "assistants": ASSISTANTS, "project_id": "p1"})
+    history.marker("stage-checkpoints")
+    humanizer = history.schedule("execute_assistant")  # start_activity downstream před upstream
+    draft = history.schedule("execute_assistant")
+    history.finish(draft, {"output": "# ETF\n\nÚvod\n\n## Co je ETF\n\nText", "metadata": {}})
+    history.activity("save_stage_checkpoint", "outputs/checkpoints/draft.json")
+    history.finish(humanizer, failure="❌ Handoff z draft_assistant nedorazil do 600s")
+    history.activity("execute_assistant", {"output": "lidský text", "metadata": {}})
+    history.activity("save_stage_checkpoint", "outputs/checkpoints/humanizer.json")
+    history.activity("save_output_to_json", "outputs/etf.json")
+    history.activity("publish_activity", {"success": True}).completed({"pipeline_success": True})
+    _replay(history)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
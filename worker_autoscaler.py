@@ -0,0 +1,266 @@
+"""
+📐 AUTOSCALER WORKERŮ PODLE HLOUBKY FRONT
+Sleduje backlog a schedule-to-start latenci Temporal task queues a podle nich
+škáluje lokální worker procesy (přes WorkerSupervisor) nebo jen publikuje
+požadovaný počet replik jako Prometheus metriku pro externí orchestrátor.
+
+POUŽITÍ:
+    python worker_autoscaler.py [--mode local|metric] [--min N] [--max N]
+"""
+
+import argparse
+import asyncio
+import math
+import signal
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from config import AutoscalerConfig, get_autoscaler_config, get_temporal_config
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+try:
+    from monitoring.prometheus_metrics import MetricsCollector, get_metrics_collector
+    METRICS_AVAILABLE = True
+except ImportError:
+    METRICS_AVAILABLE = False
+
+
+@dataclass
+class QueueSample:
+    """Jeden vzorek stavu task queue."""
+    queue: str
+    backlog: int
+    backlog_age: float  # sekundy - jak dlouho čeká nejstarší úkol (schedule-to-start)
+
+
+class ScalingPolicy:
+    """
+    Rozhodování o počtu workerů s hysterezí, cooldowny a min/max hranicemi.
+
+    - scale up: backlog nad target_backlog_per_worker na worker nebo latence nad scale_up_latency
+    - scale down: až když je fronta téměř prázdná po celou dobu scale_down_cooldown, po polovinách
+      a nikdy pod počet workerů s rozběhnutými aktivitami (prázdná fronta neznamená, že workery nepracují)
+    """
+
+    def __init__(self, config: AutoscalerConfig):
+        if config.min_workers < 1 or config.max_workers < config.min_workers:
+            raise ValueError(f"❌ Neplatné hranice autoscaleru: min={config.min_workers} max={config.max_workers}")
+        self.config = config
+        self.last_scale_up = -math.inf
+        self.last_scale_down = -math.inf
+        self.idle_since: Optional[float] = None
+
+    def _clamp(self, value: int) -> int:
+        return max(self.config.min_workers, min(self.config.max_workers, value))
+
+    def decide(self, current: int, samples: List[QueueSample], now: float, busy: Optional[int] = None) -> int:
+        """
+        Vrátí požadovaný počet workerů pro aktuální vzorky front.
+
+        Args:
+            busy: počet workerů s rozběhnutými aktivitami (None = neznámý, jen podle front)
+        """
+        c = self.config
+        backlog = sum(s.backlog for s in samples)
+        max_age = max((s.backlog_age for s in samples), default=0.0)
+
+        target = self._clamp(math.ceil(backlog / c.target_backlog_per_worker))
+        if max_age > c.scale_up_latency:
+            # Úkoly čekají příliš dlouho i při malé frontě - chybí kapacita
+            target = max(target, self._clamp(current + 1))
+
+        # Hystereze - sledujeme, jak dlouho je fronta souvisle téměř prázdná
+        all_busy = busy is not None and busy >= current
+        if backlog <= c.scale_down_backlog and max_age < c.scale_up_latency and not all_busy:
+            if self.idle_since is None:
+                self.idle_since = now
+        else:
+            self.idle_since = None
+
+        desired = current
+        if target > current:
+            if now - self.last_scale_up >= c.scale_up_cooldown:
+                desired = target
+                self.last_scale_up = now
+        elif target < current:
+            idle_long_enough = self.idle_since is not None and now - self.idle_since >= c.scale_down_cooldown
+            cooled_down = now - max(self.last_scale_up, self.last_scale_down) >= c.scale_down_cooldown
+            if idle_long_enough and cooled_down:
+                desired = max(target, current // 2, busy or 0)
+                if desired < current:
+                    self.last_scale_down = now
+
+        return self._clamp(desired)
+
+
+class TemporalQueueSampler:
+    """Čte backlog a stáří backlogu task queues přes DescribeTaskQueue."""
+
+    def __init__(self, client, namespace: str, queues: Dict[str, int]):
+        """
+        Args:
+            client: Temporal Client
+            namespace: Temporal namespace
+            queues: název task queue -> TaskQueueType (workflow / activity)
+        """
+        self.client = client
+        self.namespace = namespace
+        self.queues = queues
+        self._stats_warning_logged = False
+
+    @classmethod
+    def for_config(cls, client) -> "TemporalQueueSampler":
+        """Sampler pro hlavní workflow queue a všechny workload pooly z TemporalConfig."""
+        from temporalio.api.enums.v1 import TaskQueueType
+
+        temporal_config = get_temporal_config()
+        queues = {temporal_config.task_queue: TaskQueueType.TASK_QUEUE_TYPE_WORKFLOW}
+        for queue in temporal_config.queues.values():
+            queues[queue.name] = TaskQueueType.TASK_QUEUE_TYPE_ACTIVITY
+        return cls(client, temporal_config.namespace, queues)
+
+    async def sample(self) -> List[QueueSample]:
+        from temporalio.api.taskqueue.v1 import TaskQueue
+        from temporalio.api.workflowservice.v1 import DescribeTaskQueueRequest
+
+        samples = []
+        for name, queue_type in self.queues.items():
+            request = DescribeTaskQueueRequest(
+                namespace=self.namespace,
+                task_queue=TaskQueue(name=name),
+                task_queue_type=queue_type,
+                report_stats=True
+            )
+            try:
+                response = await self.client.workflow_service.describe_task_queue(request)
+            except Exception as e:
+                logger.warning(f"⚠️ Nelze načíst stav fronty {name}: {e}")
+                continue
+
+            if not response.HasField("stats"):
+                if not self._stats_warning_logged:
+                    logger.warning("⚠️ Temporal server nevrací statistiky front (report_stats) - backlog bude 0")
+                    self._stats_warning_logged = True
+                samples.append(QueueSample(queue=name, backlog=0, backlog_age=0.0))
+                continue
+
+            stats = response.stats
+            samples.append(QueueSample(
+                queue=name,
+                backlog=int(stats.approximate_backlog_count),
+                backlog_age=stats.approximate_backlog_age.ToTimedelta().total_seconds()
+            ))
+        return samples
+
+
+class WorkerAutoscaler:
+    """Řídicí smyčka - vzorkuje fronty, rozhoduje a škáluje."""
+
+    def __init__(self, sampler, config: Optional[AutoscalerConfig] = None, supervisor=None, metrics=None):
+        self.config = config or get_autoscaler_config()
+        if self.config.mode not in ("local", "metric"):
+            raise ValueError(f"❌ Neznámý režim autoscaleru '{self.config.mode}'. Podporované: local, metric")
+        if self.config.mode == "local" and supervisor is None:
+            raise ValueError("❌ Režim local potřebuje WorkerSupervisor")
+        self.sampler = sampler
+        self.supervisor = supervisor
+        self.metrics = metrics
+        self.policy = ScalingPolicy(self.config)
+        self.current = self.config.min_workers
+        self.running = False
+
+    async def step(self, now: Optional[float] = None) -> int:
+        """Jeden cyklus autoscaleru. Vrací požadovaný počet workerů."""
+        now = time.monotonic() if now is None else now
+        samples = await self.sampler.sample()
+
+        if self.metrics:
+            for s in samples:
+                self.metrics.set_queue_depth(s.queue, s.backlog)
+                self.metrics.set_queue_backlog_age(s.queue, s.backlog_age)
+
+        busy = None
+        if self.supervisor:
+            self.current = len(self.supervisor.workers)
+            busy = await asyncio.to_thread(self.supervisor.busy_workers)
+        desired = self.policy.decide(self.current, samples, now, busy=busy)
+
+        if desired != self.current:
+            backlog = sum(s.backlog for s in samples)
+            logger.info(f"📐 Škálování {self.current} -> {desired} (backlog={backlog}, busy={busy}, max_age={max((s.backlog_age for s in samples), default=0):.1f}s)")
+            if self.supervisor:
+                await asyncio.to_thread(self.supervisor.scale_to, desired)
+                self.current = len(self.supervisor.workers)
+            else:
+                self.current = desired
+
+        if self.metrics:
+            self.metrics.set_desired_replicas(desired)
+        return desired
+
+    async def run(self):
+        """Hlavní smyčka - v režimu local zároveň hlídá zdraví procesů supervisoru."""
+        self.running = True
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, lambda: setattr(self, "running", False))
+            except NotImplementedError:
+                pass
+
+        logger.info(f"📐 Autoscaler běží (mode={self.config.mode}, min={self.config.min_workers}, max={self.config.max_workers})")
+        try:
+            while self.running:
+                try:
+                    await self.step()
+                except Exception as e:
+                    logger.error(f"❌ Chyba v cyklu autoscaleru: {e}")
+                if self.supervisor:
+                    await asyncio.to_thread(self.supervisor.monitor_once)
+                await asyncio.sleep(self.config.sample_interval)
+        finally:
+            if self.supervisor:
+                self.supervisor.stop()
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Autoscaler Temporal workerů podle hloubky front")
+    parser.add_argument("--mode", choices=["local", "metric"], help="local = škáluje procesy, metric = jen publikuje metriku")
+    parser.add_argument("--min", type=int, dest="min_workers", help="Minimální počet workerů")
+    parser.add_argument("--max", type=int, dest="max_workers", help="Maximální počet workerů")
+    args = parser.parse_args(argv)
+
+    config = get_autoscaler_config()
+    for field_name in ("mode", "min_workers", "max_workers"):
+        if getattr(args, field_name):
+            setattr(config, field_name, getattr(args, field_name))
+
+    from temporalio.client import Client
+    temporal_config = get_temporal_config()
+    client = await Client.connect(temporal_config.host, namespace=temporal_config.namespace)
+
+    metrics = None
+    if METRICS_AVAILABLE:
+        metrics = get_metrics_collector()
+        MetricsCollector(port=config.metrics_port).start_server()
+    else:
+        logger.warning("⚠️ prometheus_client není nainstalován - metriky front nebudou exportovány")
+
+    supervisor = None
+    if config.mode == "local":
+        from worker_supervisor import WorkerSupervisor
+        supervisor = WorkerSupervisor()
+        supervisor.start_metrics_server()
+        supervisor.start(count=config.min_workers)
+
+    autoscaler = WorkerAutoscaler(TemporalQueueSampler.for_config(client), config, supervisor=supervisor, metrics=metrics)
+    await autoscaler.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
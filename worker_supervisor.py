@@ -0,0 +1,507 @@
+"""
+🧑‍✈️ MULTI-PROCESS WORKER SUPERVISOR
+Spouští N procesů production_worker.py (default = počet CPU jader), hlídá jejich
+zdraví přes heartbeat soubory, restartuje spadlé/zaseknuté procesy a umí
+postupný (rolling) restart bez výpadku zpracování.
+
+Graceful stop (restart, rolling restart, scale down) monitor smyčku neblokuje -
+proces dostane SIGTERM a monitor_once ho dočeká (po termínu SIGKILL). Zaseknutý
+proces (starý heartbeat) aktivity nedokončí, SIGKILL dostane už po kill_grace.
+
+POUŽITÍ:
+    python worker_supervisor.py [--processes N] [--metrics-port PORT]
+    kill -HUP <pid supervisoru>   # rolling restart všech workerů
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+
+from config import SupervisorConfig, get_supervisor_config, get_temporal_config
+from helpers.atomic_write import write_json_atomic
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "production_worker.py")
+STATUS_FILE = "status.json"
+
+
+def write_heartbeat(path: str, **extra: Any) -> None:
+    """Atomicky zapíše heartbeat workeru (volá se z běžícího procesu workeru)."""
+    write_json_atomic(path, {"pid": os.getpid(), "timestamp": time.time(), **extra})
+
+
+def read_heartbeat(path: str) -> Optional[Dict[str, Any]]:
+    """Načte heartbeat workeru, None pokud ještě neexistuje nebo je rozepsaný."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class InFlightActivities(Interceptor):
+    """
+    Počítá rozběhnuté aktivity workeru - production_worker je posílá v heartbeatu,
+    aby supervisor při scale down ukončoval jen procesy bez rozpracované práce.
+    """
+
+    def __init__(self):
+        self.running = 0
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _InFlightActivityInbound(next, self)
+
+
+class _InFlightActivityInbound(ActivityInboundInterceptor):
+    def __init__(self, next: ActivityInboundInterceptor, counter: InFlightActivities):
+        super().__init__(next)
+        self.counter = counter
+
+    async def execute_activity(self, input: ExecuteActivityInput) -> Any:
+        self.counter.running += 1
+        try:
+            return await super().execute_activity(input)
+        finally:
+            self.counter.running -= 1
+
+
+class WorkerProcess:
+    """Jeden proces workeru ve slotu supervisoru."""
+
+    def __init__(self, slot: int, command: List[str], run_dir: str, env: Dict[str, str]):
+        self.slot = slot
+        self.command = command
+        self.env = env
+        self.heartbeat_file = os.path.join(run_dir, f"worker-{slot}.heartbeat")
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.next_start_at = 0.0
+        self.stop_deadline: Optional[float] = None  # probíhající stop - po termínu SIGKILL
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def start(self) -> None:
+        if os.path.exists(self.heartbeat_file):
+            os.remove(self.heartbeat_file)
+        env = {**self.env, "WORKER_SLOT": str(self.slot), "WORKER_HEARTBEAT_FILE": self.heartbeat_file}
+        self.process = subprocess.Popen(self.command, env=env)
+        self.started_at = time.time()
+        self.stop_deadline = None
+        logger.info(f"🚀 Worker slot {self.slot} spuštěn (pid {self.process.pid})")
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def heartbeat(self) -> Optional[Dict[str, Any]]:
+        beat = read_heartbeat(self.heartbeat_file)
+        # Heartbeat předchozího procesu ve stejném slotu se nepočítá
+        if beat and beat.get("pid") == self.pid:
+            return beat
+        return None
+
+    def heartbeat_age(self) -> Optional[float]:
+        beat = self.heartbeat()
+        return time.time() - beat["timestamp"] if beat else None
+
+    def is_healthy(self, config: SupervisorConfig) -> bool:
+        """Proces běží a heartbeat je čerstvý (během startup grace stačí, že běží)."""
+        if not self.is_alive():
+            return False
+        age = self.heartbeat_age()
+        if age is None:
+            return time.time() - self.started_at < config.startup_grace
+        return age < config.heartbeat_timeout
+
+    def is_ready(self) -> bool:
+        """Proces poslal první heartbeat - je připojený a zpracovává úkoly."""
+        return self.is_alive() and self.heartbeat() is not None
+
+    def running_activities(self) -> Optional[int]:
+        """Počet rozběhnutých aktivit z heartbeatu, None = neznámý (worker ho nehlásí)."""
+        if not self.is_alive():
+            return 0
+        beat = self.heartbeat()
+        if beat is None:
+            # Ještě se nepřipojil k Temporal - nemůže mít žádnou aktivitu
+            return 0
+        return beat.get("running_activities")
+
+    def is_drained(self) -> bool:
+        """Proces nemá rozpracovanou aktivitu - lze ho ukončit bez přerušení práce."""
+        return self.running_activities() == 0
+
+    @property
+    def stopping(self) -> bool:
+        return self.stop_deadline is not None
+
+    def begin_stop(self, timeout: float) -> None:
+        """SIGTERM bez čekání - dokončení (a případný SIGKILL po timeoutu) obstará reap()."""
+        if self.is_alive():
+            self.process.terminate()
+        self.stop_deadline = time.time() + timeout
+
+    def reap(self) -> bool:
+        """Proces zastavovaný přes begin_stop skončil? Po termínu ho ukončí SIGKILL."""
+        if not self.is_alive():
+            return True
+        if time.time() < self.stop_deadline:
+            return False
+        logger.warning(f"⚠️ Worker slot {self.slot} (pid {self.pid}) neskončil v termínu - SIGKILL")
+        self.process.kill()
+        self.process.wait()
+        return True
+
+    def stop(self, timeout: float) -> Optional[int]:
+        """
+        Graceful stop (SIGTERM), po timeoutu SIGKILL. Vrací exit code.
+
+        Worker na SIGTERM přestane brát úkoly a dokončí rozběhnuté aktivity, timeout
+        proto musí pokrýt graceful shutdown Temporal workeru (viz drain_timeout).
+        """
+        if not self.process:
+            return None
+        if self.is_alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"⚠️ Worker slot {self.slot} (pid {self.pid}) neskončil do {timeout}s - SIGKILL")
+                self.process.kill()
+                self.process.wait()
+        return self.process.returncode
+
+    def status(self, config: SupervisorConfig) -> Dict[str, Any]:
+        beat = self.heartbeat() or {}
+        age = self.heartbeat_age()
+        return {
+            "slot": self.slot,
+            "pid": self.pid,
+            "alive": self.is_alive(),
+            "healthy": self.is_healthy(config),
+            "restarts": self.restarts,
+            "uptime": round(time.time() - self.started_at, 1) if self.is_alive() else 0,
+            "heartbeat_age": round(age, 1) if age is not None else None,
+            "rss_mb": beat.get("rss_mb"),
+            "pools": beat.get("pools"),
+            "running_activities": self.running_activities(),
+            "stopping": self.stopping,
+        }
+
+
+class WorkerSupervisor:
+    """Supervisor N procesů workeru se sdílenou konfigurací."""
+
+    def __init__(self, config: Optional[SupervisorConfig] = None, command: Optional[List[str]] = None):
+        self.config = config or get_supervisor_config()
+        self.command = command or [sys.executable, WORKER_SCRIPT]
+        self.run_dir = os.path.abspath(self.config.run_dir)
+        self.metrics_dir = os.path.join(self.run_dir, "prometheus")
+        self.workers: List[WorkerProcess] = []
+        self.retiring: List[WorkerProcess] = []  # procesy odebrané scale downem, dokončují aktivity
+        self.running = False
+        self._rolling_restart_requested = False
+        self._rolling: List[WorkerProcess] = []  # sloty čekající na rolling restart, první právě probíhá
+        self._rolling_old_pid: Optional[int] = None  # proces právě restartovaného slotu
+        self._rolling_ready_deadline: Optional[float] = None
+        self._metrics = None
+
+    def drain_timeout(self) -> float:
+        """Jak dlouho se čeká na dokončení rozběhnutých aktivit, než přijde SIGKILL."""
+        return get_temporal_config().graceful_shutdown_timeout + self.config.kill_grace
+
+    def _shared_env(self) -> Dict[str, str]:
+        """Sdílená konfigurace pro všechny procesy - stejné ENV jako supervisor."""
+        return {
+            **os.environ,
+            "PROMETHEUS_MULTIPROC_DIR": self.metrics_dir,
+            "WORKER_HEARTBEAT_INTERVAL": str(self.config.heartbeat_interval),
+        }
+
+    def start(self, count: Optional[int] = None) -> None:
+        """Připraví run adresář a spustí všechny procesy."""
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        os.makedirs(self.metrics_dir, exist_ok=True)
+
+        count = count or self.config.resolved_processes()
+        env = self._shared_env()
+        self.workers = [WorkerProcess(slot, self.command, self.run_dir, env) for slot in range(count)]
+        for worker in self.workers:
+            worker.start()
+
+        self.running = True
+        logger.info(f"🧑‍✈️ Supervisor spustil {count} worker procesů")
+
+    def scale_to(self, count: int) -> None:
+        """
+        Změní počet procesů - nové sloty spustí, nadbytečné gracefully ukončí.
+
+        Ubírají se jen procesy bez rozběhnutých aktivit (podle heartbeatu), takže
+        výsledný počet může zůstat nad count - autoscaler to zkusí v dalším cyklu.
+        Odebrané procesy dobíhají na pozadí, dočká je monitor_once.
+        """
+        if count < 1:
+            raise ValueError("❌ Supervisor musí mít alespoň jeden worker proces")
+        current = len(self.workers)
+        if count > current:
+            env = self._shared_env()
+            # Slot dobíhajícího procesu je obsazený (heartbeat soubor)
+            used = {worker.slot for worker in self.workers + self.retiring}
+            free_slots = (slot for slot in range(count + len(used)) if slot not in used)
+            for _ in range(count - current):
+                worker = WorkerProcess(next(free_slots), self.command, self.run_dir, env)
+                worker.start()
+                self.workers.append(worker)
+        elif count < current:
+            drained = [worker for worker in reversed(self.workers) if worker.is_drained()]
+            removed = drained[:current - count]
+            if len(removed) < current - count:
+                logger.info(f"⏳ Scale down na {count}: jen {len(removed)} procesů je bez rozběhnutých aktivit")
+            self.workers = [worker for worker in self.workers if worker not in removed]
+            timeout = self.drain_timeout()
+            for worker in removed:
+                worker.begin_stop(timeout)
+            self.retiring.extend(removed)
+        if len(self.workers) != current:
+            logger.info(f"📐 Supervisor přeškálován: {current} -> {len(self.workers)} procesů")
+            self._write_status()
+
+    def busy_workers(self) -> int:
+        """Počet procesů s rozběhnutými aktivitami (neznámý stav se počítá jako busy)."""
+        return sum(1 for worker in self.workers if not worker.is_drained())
+
+    def _restart(self, worker: WorkerProcess, reason: str) -> None:
+        """
+        Zastaví proces a naplánuje nový start - s exponenciálním backoffem při crash loopu.
+        Zaseknutý proces aktivity nedokončí - SIGKILL dostane už po kill_grace, ne po drain_timeout.
+        """
+        logger.warning(f"🔄 Restart worker slot {worker.slot} (pid {worker.pid}): {reason}")
+        crashed_early = time.time() - worker.started_at < self.config.startup_grace
+        worker.begin_stop(self.config.kill_grace)
+        worker.restarts += 1
+        worker.consecutive_failures = worker.consecutive_failures + 1 if crashed_early else 0
+
+        delay = 0.0
+        if worker.consecutive_failures:
+            delay = min(self.config.restart_backoff ** worker.consecutive_failures, self.config.max_restart_backoff)
+            logger.warning(f"⏳ Worker slot {worker.slot} v crash loopu - další start za {delay:.0f}s")
+        worker.next_start_at = time.time() + delay
+
+    def _finish_stop(self, worker: WorkerProcess) -> None:
+        if worker.pid:
+            self._mark_process_dead(worker.pid)
+        worker.process = None
+        worker.stop_deadline = None
+
+    def monitor_once(self) -> None:
+        """Jedna kontrola zdraví všech procesů - dočká zastavované procesy a posune rolling restart."""
+        if self._rolling_restart_requested:
+            self._rolling_restart_requested = False
+            self._begin_rolling_restart()
+        for worker in self.workers:
+            if worker.stopping:
+                if not worker.reap():
+                    continue
+                self._finish_stop(worker)
+            if worker.process is None:
+                if time.time() >= worker.next_start_at:
+                    worker.start()
+                continue
+            if not worker.is_alive():
+                self._restart(worker, f"proces skončil s kódem {worker.process.returncode}")
+            elif not worker.is_healthy(self.config):
+                self._restart(worker, f"heartbeat starší než {self.config.heartbeat_timeout}s")
+        for worker in [worker for worker in self.retiring if worker.reap()]:
+            self._finish_stop(worker)
+            self.retiring.remove(worker)
+            if os.path.exists(worker.heartbeat_file):
+                os.remove(worker.heartbeat_file)
+        self._advance_rolling_restart()
+        self._write_status()
+        self._update_metrics()
+
+    def _begin_rolling_restart(self) -> None:
+        if self._rolling:
+            logger.info("🔁 Rolling restart už probíhá")
+            return
+        logger.info("🔁 Rolling restart workerů...")
+        self._rolling = list(self.workers)
+        self._rolling_old_pid = None
+        self._rolling_ready_deadline = None
+
+    def _advance_rolling_restart(self) -> None:
+        """
+        Jeden krok rolling restartu - vždy jen jeden proces, další až když je nový připravený.
+        Starý proces dostane na dokončení rozběhnutých aktivit celý drain_timeout.
+        """
+        if not self._rolling:
+            return
+        worker = self._rolling[0]
+        if worker not in self.workers:
+            # Slot mezitím odebral scale down
+            self._next_rolling_slot()
+            return
+        if self._rolling_old_pid is None:
+            self._rolling_old_pid = worker.pid or -1
+            if worker.is_alive() and not worker.stopping:
+                worker.begin_stop(self.drain_timeout())
+                worker.restarts += 1
+                worker.consecutive_failures = 0
+                worker.next_start_at = 0.0
+            return
+        if worker.stopping or worker.process is None or worker.pid == self._rolling_old_pid:
+            return  # drain běží - nový proces spustí monitor_once hned po skončení starého
+        if self._rolling_ready_deadline is None:
+            self._rolling_ready_deadline = time.time() + self.config.startup_grace
+        if worker.is_ready():
+            self._next_rolling_slot()
+            if not self._rolling:
+                logger.info("✅ Rolling restart dokončen")
+        elif not worker.is_alive() or time.time() > self._rolling_ready_deadline:
+            logger.error(f"❌ Worker slot {worker.slot} se po restartu nepřipravil - rolling restart přerušen")
+            self._rolling = []
+            self._next_rolling_slot()
+
+    def _next_rolling_slot(self) -> None:
+        self._rolling = self._rolling[1:]
+        self._rolling_old_pid = None
+        self._rolling_ready_deadline = None
+
+    def rolling_restart(self) -> None:
+        """Rolling restart s čekáním na dokončení (v hlavní smyčce ho po krocích posouvá monitor_once)."""
+        self.request_rolling_restart()
+        self.monitor_once()
+        while self._rolling:
+            time.sleep(0.2)
+            self.monitor_once()
+
+    def request_rolling_restart(self) -> None:
+        self._rolling_restart_requested = True
+
+    def stop(self) -> None:
+        """Graceful stop všech procesů najednou (i dobíhajících po scale down)."""
+        self.running = False
+        timeout = self.drain_timeout()
+        workers = self.workers + self.retiring
+        for worker in workers:
+            if worker.is_alive() and not worker.stopping:
+                worker.process.terminate()
+        for worker in workers:
+            if worker.stopping:
+                while not worker.reap():
+                    time.sleep(0.1)
+            else:
+                worker.stop(timeout)
+        self.retiring = []
+        self._write_status()
+        logger.info("👋 Všechny worker procesy ukončeny")
+
+    def status(self) -> Dict[str, Any]:
+        """Agregovaný stav všech procesů."""
+        workers = [worker.status(self.config) for worker in self.workers]
+        return {
+            "supervisor_pid": os.getpid(),
+            "timestamp": time.time(),
+            "processes": len(workers),
+            "healthy": sum(1 for w in workers if w["healthy"]),
+            "restarts_total": sum(w["restarts"] for w in workers),
+            "rss_mb_total": round(sum(w["rss_mb"] or 0 for w in workers), 1),
+            "running_activities": sum(w["running_activities"] or 0 for w in workers),
+            "workers": workers,
+        }
+
+    def _write_status(self) -> None:
+        try:
+            write_heartbeat(os.path.join(self.run_dir, STATUS_FILE), **self.status())
+        except OSError as e:
+            logger.warning(f"⚠️ Nelze zapsat status supervisoru: {e}")
+
+    def _mark_process_dead(self, pid: int) -> None:
+        if self._metrics is None:
+            return
+        try:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid, self.metrics_dir)
+        except Exception:
+            pass
+
+    def start_metrics_server(self) -> None:
+        """Prometheus endpoint agregující metriky všech procesů + stav supervisoru."""
+        try:
+            from prometheus_client import CollectorRegistry, Gauge, start_http_server
+            from prometheus_client.multiprocess import MultiProcessCollector
+        except ImportError:
+            logger.warning("⚠️ prometheus_client není nainstalován - agregované metriky nebudou exportovány")
+            return
+
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=self.metrics_dir)
+        self._metrics = {
+            "up": Gauge("seo_farm_worker_process_up", "Worker proces běží a je zdravý", ["slot"], registry=registry),
+            "restarts": Gauge("seo_farm_worker_process_restarts", "Počet restartů worker procesu", ["slot"], registry=registry),
+            "heartbeat_age": Gauge("seo_farm_worker_process_heartbeat_age_seconds", "Stáří heartbeatu", ["slot"], registry=registry),
+            "rss": Gauge("seo_farm_worker_process_rss_megabytes", "Paměť worker procesu", ["slot"], registry=registry),
+        }
+        start_http_server(self.config.metrics_port, registry=registry)
+        logger.info(f"📊 Agregované metriky workerů na portu {self.config.metrics_port}")
+
+    def _update_metrics(self) -> None:
+        if self._metrics is None:
+            return
+        for worker in self.workers:
+            status = worker.status(self.config)
+            slot = str(worker.slot)
+            self._metrics["up"].labels(slot=slot).set(1 if status["healthy"] else 0)
+            self._metrics["restarts"].labels(slot=slot).set(status["restarts"])
+            self._metrics["heartbeat_age"].labels(slot=slot).set(status["heartbeat_age"] or 0)
+            self._metrics["rss"].labels(slot=slot).set(status["rss_mb"] or 0)
+
+    def run(self) -> None:
+        """Hlavní smyčka supervisoru - SIGTERM/SIGINT ukončí, SIGHUP spustí rolling restart."""
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "running", False))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "running", False))
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, lambda *_: self.request_rolling_restart())
+
+        self.start_metrics_server()
+        self.start()
+        try:
+            while self.running:
+                self.monitor_once()
+                time.sleep(min(self.config.heartbeat_interval, 5))
+        finally:
+            self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Multi-process supervisor Temporal workerů")
+    parser.add_argument("--processes", type=int, help="Počet worker procesů (default: počet CPU jader)")
+    parser.add_argument("--metrics-port", type=int, help="Port pro agregované Prometheus metriky")
+    args = parser.parse_args(argv)
+
+    config = get_supervisor_config()
+    if args.processes:
+        config.processes = args.processes
+    if args.metrics_port:
+        config.metrics_port = args.metrics_port
+
+    logger.info(f"🧑‍✈️ === WORKER SUPERVISOR === procesů: {config.resolved_processes()}")
+    WorkerSupervisor(config).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
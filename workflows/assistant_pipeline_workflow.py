@@ -5,18 +5,93 @@ from temporalio import workflow, activity
 from datetime import timedelta
 from typing import Dict, List, Any, Optional
 import temporalio.common
+from temporalio.exceptions import ActivityError
+
+with workflow.unsafe.imports_passed_through():
+    from helpers.checkpoint_store import compute_input_hash, find_reusable_checkpoint
+    from helpers.stage_handoff import handoff_input_sha, handoff_prefix
+    from config import (
+        pinned_workflow_options, workload_for_stage,
+        WORKLOAD_IMAGE, WORKLOAD_PUBLISH, WORKLOAD_TEXT, EXECUTION_MODES, EXECUTION_MODE_BATCH, EXECUTION_MODE_INTERACTIVE
+    )
 
 # Nastavení loggingu
 logger = logging.getLogger(__name__)
 
+# 10 minut pro dlouhé LLM odpovědi
+ASSISTANT_TIMEOUT = 600
+
+
+def _pinned(options: dict, key: str) -> Any:
+    """
+    Nastavení zapečené do options["pinned"] při startu workflow.
+
+    Workflow spuštěné před zavedením pinu hodnotu v options nemají - dopočítá se
+    z ENV stejně jako při jejich původním běhu.
+    """
+    pinned = options.get("pinned") or {}
+    return pinned[key] if key in pinned else pinned_workflow_options()[key]
+
+
+def _assistant_activity_options(function_key: str, options: dict, pipelined: bool = False, batch: bool = False) -> dict:
+    """Options execute_assistant pro stage - task queue podle typu stage (text / image)."""
+    timeouts = _pinned(options, "activity_timeouts")
+    workload = workload_for_stage(function_key)
+    # Streamované textové stage heartbeatují na každý chunk - zaseknuté spojení se pozná v sekundách
+    heartbeat = timeouts["heartbeat"][workload]
+    timeout = ASSISTANT_TIMEOUT
+    attempts = 1  # 🚫 ŽÁDNÉ RETRY - strict fail fast
+    if batch and workload == WORKLOAD_TEXT:
+        # 📦 Batch API vrací výsledky až v řádu hodin - čekající aktivita heartbeatuje průběžně.
+        # Hodiny se při restartu workeru nedrainují - retry naváže na batch z heartbeat checkpointu.
+        heartbeat = timeouts["blocking_heartbeat"]
+        timeout = timeouts["batch_stage"]
+        attempts = 3
+    # Pipelined downstream běží souběžně s upstream stage - čekání na handoff se počítá do jeho timeoutu
+    if pipelined:
+        timeout *= 2
+    return {
+        "task_queue": _pinned(options, "task_queues")[workload],
+        "start_to_close_timeout": timedelta(seconds=timeout),
+        "schedule_to_close_timeout": timedelta(seconds=timeout),
+        "heartbeat_timeout": timedelta(seconds=heartbeat),
+        "retry_policy": temporalio.common.RetryPolicy(
+            initial_interval=timedelta(seconds=1),
+            maximum_interval=timedelta(seconds=10),
+            maximum_attempts=attempts,
+            backoff_coefficient=1.0
+        )
+    }
+
+def _handoff_previous_outputs(pipeline_data: dict, upstream_key: str) -> dict:
+    """
+    previous_outputs pipelined stage - bez výstupu upstream i bez current_output, který ho zrcadlí
+    (stage dostává jen prefix v topic). Stejné při souběžném startu, sekvenčním běhu i přepočtu.
+    """
+    return {k: v for k, v in pipeline_data.items() if k.endswith("_output") and k not in ("current_output", f"{upstream_key}_output")}
+
+
 @workflow.defn
 class AssistantPipelineWorkflow:
     @workflow.run
-    async def run(self, topic: str, project_id: Optional[str] = None, csv_base64: Optional[str] = None, current_date: Optional[str] = None) -> dict:
+    async def run(self, topic: str, project_id: Optional[str] = None, csv_base64: Optional[str] = None, current_date: Optional[str] = None, options: Optional[dict] = None) -> dict:
         workflow_id = workflow.info().workflow_id
         run_id = workflow.info().run_id
+        options = options or {}
+        task_queues = _pinned(options, "task_queues")
+        
+        # 📦 Režim provádění - batch posílá textová LLM volání přes provider batch API (noční CSV běhy)
+        execution_mode = options.get("execution_mode") or EXECUTION_MODE_INTERACTIVE
+        if execution_mode not in EXECUTION_MODES:
+            raise Exception(f"❌ Neznámý execution_mode '{execution_mode}' (podporované: {EXECUTION_MODES})")
+        batch_mode = execution_mode == EXECUTION_MODE_BATCH
         
-        workflow.logger.info(f"🚀 ASSISTANT_PIPELINE_STARTED: topic='{topic}' project_id={project_id} date='{current_date}' workflow_id={workflow_id} run_id={run_id}")
+        # ♻️ RESUME - checkpointy předchozího běhu {"workflow_id", "run_id"}
+        resume_from = options.get("resume_from")
+        checkpoints = {}
+        stages_reused = []
+        
+        workflow.logger.info(f"🚀 ASSISTANT_PIPELINE_STARTED: topic='{topic}' project_id={project_id} date='{current_date}' workflow_id={workflow_id} run_id={run_id} resume_from={resume_from}")
         
         # Inicializace stage logs pro tracking
         stage_logs = []
@@ -64,6 +139,28 @@ class AssistantPipelineWorkflow:
                 workflow.logger.warning("⚠️ Žádní asistenti nenalezeni - ukončuji workflow")
                 raise Exception("Žádní aktivní asistenti nenalezeni pro daný projekt")
 
+            # 💾 Stage checkpointy přibyly za běhu produkce - workflow spuštěné před nasazením
+            # je nesmí při replay naplánovat (jeho historie pokračuje rovnou další stage)
+            stage_checkpoints = workflow.patched("stage-checkpoints")
+
+            # ♻️ Načtení checkpointů předchozího běhu pro resume
+            if resume_from and stage_checkpoints:
+                checkpoint_data = await workflow.execute_activity(
+                    "load_stage_checkpoints",
+                    resume_from,
+                    schedule_to_close_timeout=timedelta(seconds=30)
+                )
+                checkpoints = checkpoint_data.get("checkpoints") or {}
+                # Resume musí použít stejné datum jako původní běh, jinak by nesouhlasily input hashe
+                if checkpoint_data.get("current_date"):
+                    pipeline_data["current_date"] = checkpoint_data["current_date"]
+                workflow.logger.info(f"♻️ RESUME: načteno {len(checkpoints)} checkpointů z {resume_from.get('workflow_id')}/{resume_from.get('run_id')}")
+
+            # 🔀 Pipelined handoff: downstream function_key -> požadovaný prefix výstupu předchozí stage
+            # (zapečený při startu - worker s jiným LLM_PIPELINED_HANDOFF by při replay naplánoval jiné aktivity)
+            pipelined_handoff = _pinned(options, "pipelined_handoff")
+            prefetched = None  # downstream aktivita spuštěná souběžně s upstream stage
+
             # 2️⃣ Postupné spuštění asistentů podle pořadí
             for i, assistant in enumerate(assistants):
                 # 🚫 STRICT ASSISTANT VALIDATION - žádné fallbacky
@@ -76,9 +173,6 @@ class AssistantPipelineWorkflow:
                 if not function_key:
                     workflow.logger.error(f"❌ Asistent {assistant_name} nemá function_key - workflow nelze spustit")
                     raise Exception(f"❌ Asistent {assistant_name} nemá function_key - workflow nelze spustit")
-                # Nastavení timeoutů pro asistenta - prodlouženo pro finální asistenty
-                timeout = 600  # 10 minut pro dlouhé LLM odpovědi
-                heartbeat = 180  # 3 minuty heartbeat pro Claude API volání
                 
                 stage_name = assistant_name
                 stage_start = workflow.now().timestamp()
@@ -114,26 +208,85 @@ class AssistantPipelineWorkflow:
                     
                     # ✅ STANDARDNÍ SEKVENČNÍ TOK pro všechny asistenty
                     topic_input = pipeline_data["current_output"]
+                    previous_outputs = {k: v for k, v in pipeline_data.items() if k.endswith("_output")}
                     
-                    # Spuštění assistant activity s konfiguračními parametry  
-                    assistant_output = await workflow.execute_activity(
-                        "execute_assistant",
-                        {
-                            "assistant_config": assistant,
-                            "topic": topic_input,  # 🔧 INTELIGENTNÍ TOPIC SELECTION
-                            "current_date": pipeline_data["current_date"],  # 📅 AKTUÁLNÍ DATUM PRO VŠECHNY ASISTENTY
-                            "previous_outputs": {k: v for k, v in pipeline_data.items() if k.endswith("_output")}
-                        },
-                        start_to_close_timeout=timedelta(seconds=600),  # 10 minut pro finální asistenty
-                        schedule_to_close_timeout=timedelta(seconds=timeout),
-                        heartbeat_timeout=timedelta(seconds=heartbeat),
-                        retry_policy=temporalio.common.RetryPolicy(
-                            initial_interval=timedelta(seconds=1),
-                            maximum_interval=timedelta(seconds=10),
-                            maximum_attempts=1,  # 🚫 ŽÁDNÉ RETRY - strict fail fast
-                            backoff_coefficient=1.0
+                    # 🔀 Pipelined stage dostává deterministický prefix výstupu upstream stage -
+                    # stejný vstup při souběžném běhu, sekvenčním běhu i resume z checkpointu
+                    upstream_key = assistants[i - 1].get("function_key") if i > 0 else None
+                    handoff_spec = None
+                    if function_key in pipelined_handoff and isinstance(pipeline_data.get(f"{upstream_key}_output"), str):
+                        handoff_spec = pipelined_handoff[function_key]
+                        topic_input = handoff_prefix(pipeline_data[f"{upstream_key}_output"], handoff_spec)
+                        previous_outputs = _handoff_previous_outputs(pipeline_data, upstream_key)
+                    if prefetched and (prefetched["function_key"] != function_key or not handoff_spec):
+                        prefetched["handle"].cancel()
+                        prefetched = None
+                    
+                    input_hash = compute_input_hash(assistant, topic_input, pipeline_data["current_date"], previous_outputs)
+                    activity_args = {
+                        "assistant_config": assistant,
+                        "topic": topic_input,  # 🔧 INTELIGENTNÍ TOPIC SELECTION
+                        "current_date": pipeline_data["current_date"],  # 📅 AKTUÁLNÍ DATUM PRO VŠECHNY ASISTENTY
+                        "previous_outputs": previous_outputs,
+                        "execution_mode": execution_mode
+                    }
+                    
+                    reusable = find_reusable_checkpoint(checkpoints, function_key, input_hash)
+                    if reusable:
+                        # ♻️ Stage se shodným vstupem už v předchozím běhu proběhla
+                        workflow.logger.info(f"♻️ CHECKPOINT_REUSED: {assistant_name} (input_hash={input_hash[:12]})")
+                        assistant_output = {"output": reusable.get("output"), "metadata": reusable.get("metadata") or {}}
+                        stages_reused.append(function_key)
+                    elif prefetched:
+                        # 🔀 Stage už běží od chvíle, kdy upstream publikoval potřebný prefix
+                        try:
+                            assistant_output = await prefetched["handle"]
+                        except ActivityError as prefetch_error:
+                            # Souběžný pokus selhal (handoff nedorazil, timeout...) - upstream je hotový, stage se zopakuje sekvenčně
+                            workflow.logger.warning(f"🔀 HANDOFF_FAILED: {assistant_name} error={prefetch_error.cause or prefetch_error}")
+                            assistant_output = None
+                        prefetched = None
+                        used_sha = ((assistant_output or {}).get("metadata") or {}).get("handoff", {}).get("input_sha")
+                        if used_sha != handoff_input_sha(topic_input):
+                            # Streamovaný prefix se liší od výsledného výstupu upstream (nebo pokus selhal) - přepočet nad finálním prefixem
+                            workflow.logger.warning(f"🔀 HANDOFF_MISMATCH: {assistant_name} - spouštím znovu nad výsledným výstupem {upstream_key}")
+                            assistant_output = await workflow.execute_activity(
+                                "execute_assistant", activity_args, **_assistant_activity_options(function_key, options, batch=batch_mode)
+                            )
+                    else:
+                        upstream_args = activity_args
+                        next_assistant = assistants[i + 1] if i + 1 < len(assistants) else None
+                        next_key = next_assistant.get("function_key") if next_assistant else None
+                        # Souběh jen pro textový upstream (publikuje streamovaný text) a mimo resume
+                        if next_key in pipelined_handoff and not checkpoints and workload_for_stage(function_key) == WORKLOAD_TEXT:
+                            handoff_ids = {"workflow_id": workflow_id, "run_id": run_id}
+                            upstream_options = _assistant_activity_options(function_key, options, batch=batch_mode)
+                            workflow.logger.info(f"🔀 PIPELINED_START: {next_assistant.get('name')} čeká na {pipelined_handoff[next_key]} z {assistant_name}")
+                            prefetched = {
+                                "function_key": next_key,
+                                "handle": workflow.start_activity(
+                                    "execute_assistant",
+                                    {
+                                        "assistant_config": next_assistant,
+                                        "topic": None,  # doplní se z handoffu
+                                        "current_date": pipeline_data["current_date"],
+                                        "previous_outputs": _handoff_previous_outputs(pipeline_data, function_key),
+                                        "execution_mode": execution_mode,
+                                        "handoff": {
+                                            **handoff_ids, "consume": function_key, "spec": pipelined_handoff[next_key],
+                                            # déle než upstream stage handoff čekat nemá - pak proběhne sekvenční přepočet
+                                            "timeout": upstream_options["start_to_close_timeout"].total_seconds()
+                                        }
+                                    },
+                                    **_assistant_activity_options(next_key, options, pipelined=True, batch=batch_mode)
+                                )
+                            }
+                            upstream_args = {**activity_args, "handoff": {**handoff_ids, "publish": function_key}}
+                        
+                        # Spuštění assistant activity na task queue podle typu stage (text / image)
+                        assistant_output = await workflow.execute_activity(
+                            "execute_assistant", upstream_args, **_assistant_activity_options(function_key, options, batch=batch_mode)
                         )
-                    )
                     
                     # 🚫 STRICT OUTPUT VALIDATION - žádné fallbacky
                     if not assistant_output:
@@ -152,6 +305,30 @@ class AssistantPipelineWorkflow:
                     # ✅ STANDARDNÍ SEKVENČNÍ TOK - aktualizace current_output
                     pipeline_data["current_output"] = output_content
                     
+                    # 💾 Checkpoint dokončené stage (i převzaté - navazující resume pak vidí celý běh)
+                    try:
+                        if stage_checkpoints:
+                            await workflow.execute_activity(
+                                "save_stage_checkpoint",
+                                {
+                                    "workflow_id": workflow_id,
+                                    "run_id": run_id,
+                                    "checkpoint": {
+                                        "stage": assistant_name,
+                                        "function_key": function_key,
+                                        "order": order,
+                                        "input_hash": input_hash,
+                                        "current_date": pipeline_data["current_date"],
+                                        "output": output_content,
+                                        "metadata": assistant_output.get("metadata") or {}
+                                    }
+                                },
+                                schedule_to_close_timeout=timedelta(seconds=30)
+                            )
+                    except Exception as checkpoint_error:
+                        # Checkpoint není kritický pro úspěch pipeline
+                        workflow.logger.warning(f"⚠️ CHECKPOINT_SAVE_FAILED: {assistant_name} error={str(checkpoint_error)}")
+                    
                     stage_duration = workflow.now().timestamp() - stage_start
                     workflow.logger.info(f"✅ ASSISTANT_FINISHED: {assistant_name} duration={stage_duration:.2f}s output_length={len(str(output_content))}")
                     
@@ -164,10 +341,15 @@ class AssistantPipelineWorkflow:
                         "function_key": function_key,
                         "order": order,
                         "output": output_content,
-                        "metadata": assistant_output.get("metadata") or {}
+                        "metadata": assistant_output.get("metadata") or {},
+                        "from_checkpoint": bool(reusable)
                     })
                     
                 except Exception as assistant_error:
+                    if prefetched:
+                        # Downstream nad selhanou stage nemá na co čekat
+                        prefetched["handle"].cancel()
+                        prefetched = None
                     stage_duration = workflow.now().timestamp() - stage_start
                     workflow.logger.error(f"❌ ASSISTANT_FAILED: {assistant_name} duration={stage_duration:.2f}s error={str(assistant_error)}")
                     
@@ -196,7 +378,10 @@ class AssistantPipelineWorkflow:
                 "stage_logs": stage_logs,
                 "assistants_executed": len([log for log in stage_logs if log.get("status") == "COMPLETED" and log.get("stage") != "load_assistants_config"]),
                 "total_assistants": len(assistants),
-                "pipeline_success": True
+                "pipeline_success": True,
+                "resumed_from": resume_from,
+                "execution_mode": execution_mode,
+                "stages_reused": stages_reused
             }
 
             # 4️⃣ Uložení finálního výsledku
@@ -236,6 +421,27 @@ class AssistantPipelineWorkflow:
                 workflow.logger.info(f"🎉 ASSISTANT_PIPELINE_COMPLETED: total_duration={total_duration:.2f}s assistants_completed={completed_assistants}/{expected_assistants} ✅")
                 workflow.logger.info(f"🏆 FINÁLNÍ PIPELINE ÚSPĚŠNĚ DOKONČENA - všech {expected_assistants} asistentů z databáze proběhlo!")
                 
+                # 🖼️ IMAGE ASSETY - stažení a převod obrázků na WebP/AVIF varianty (best-effort, publish poběží i bez nich)
+                # Workflow spuštěné před nasazením mají po save rovnou publish - aktivitu jim nesmí přidat replay
+                if pipeline_data.get("image_renderer_assistant_output") and workflow.patched("image-assets"):
+                    assets_start = workflow.now().timestamp()
+                    try:
+                        image_assets = await workflow.execute_activity(
+                            "image_assets_activity",
+                            {"image_output": pipeline_data["image_renderer_assistant_output"]},
+                            task_queue=task_queues[WORKLOAD_IMAGE],  # 🖼️ pomalé stahování v image poolu
+                            start_to_close_timeout=timedelta(seconds=300),
+                            heartbeat_timeout=timedelta(seconds=120),
+                            retry_policy=temporalio.common.RetryPolicy(maximum_attempts=2)
+                        )
+                        pipeline_data["image_assets"] = image_assets
+                        done = len([asset for asset in image_assets.get("assets", []) if asset])
+                        workflow.logger.info(f"🖼️ IMAGE_ASSETS_COMPLETED: {done} obrázků převedeno")
+                        stage_logs.append({"stage": "ImageAssets", "status": "COMPLETED", "timestamp": workflow.now().timestamp(), "duration": workflow.now().timestamp() - assets_start, "output": image_assets})
+                    except Exception as assets_error:
+                        workflow.logger.warning(f"⚠️ IMAGE_ASSETS_FAILED: {assets_error} - publish použije původní URL obrázků")
+                        stage_logs.append({"stage": "ImageAssets", "status": "FAILED", "timestamp": workflow.now().timestamp(), "duration": workflow.now().timestamp() - assets_start, "error": str(assets_error)})
+                
                 # 🚀 AUTOMATICKÉ SPUŠTĚNÍ PUBLISH SCRIPTU PO DOKONČENÍ VŠECH ASISTENTŮ
                 try:
                     stage_name = "PublishScript"
@@ -253,7 +459,8 @@ class AssistantPipelineWorkflow:
                         "seo_assistant_output": pipeline_data.get("seo_assistant_output", ""),
                         "multimedia_assistant_output": pipeline_data.get("multimedia_assistant_output", ""),
                         "qa_assistant_output": pipeline_data.get("qa_assistant_output", ""),
-                        "image_renderer_assistant_output": pipeline_data.get("image_renderer_assistant_output", "")
+                        "image_renderer_assistant_output": pipeline_data.get("image_renderer_assistant_output", ""),
+                        "image_assets": pipeline_data.get("image_assets", "")
                     }
                     
                     active_components = [k for k,v in components.items() if v]
@@ -266,8 +473,10 @@ class AssistantPipelineWorkflow:
                             "assistant_config": {"name": "PublishScript", "function_key": "publish_script"},
                             "topic": components,  # Pipeline data ze všech asistentů
                             "current_date": pipeline_data["current_date"],
-                            "previous_outputs": {k: v for k, v in pipeline_data.items() if k.endswith("_output")}
+                            "previous_outputs": {k: v for k, v in pipeline_data.items() if k.endswith("_output")},
+                            "project_id": project_id  # 🗂️ index článků je per projekt
                         },
+                        task_queue=task_queues[WORKLOAD_PUBLISH],  # 🖥️ CPU pool odděleně od LLM
                         start_to_close_timeout=timedelta(seconds=300),  # 5 minut pro deterministický script
                         schedule_to_close_timeout=timedelta(seconds=300),
                         heartbeat_timeout=timedelta(seconds=60),
@@ -333,7 +542,10 @@ class AssistantPipelineWorkflow:
                 "stage_logs": stage_logs,
                 "pipeline_success": False,
                 "error": str(e),
-                "failed_stage": current_stage
+                "failed_stage": current_stage,
+                "resumed_from": resume_from,
+                "execution_mode": execution_mode,
+                "stages_reused": stages_reused
             }
             
             workflow.logger.error(f"💥 RETURNING_FAILED_RESULT: error={str(e)}")